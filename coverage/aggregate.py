@@ -0,0 +1,437 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Collecting data from many processes into one data file, with a local daemon.
+
+With ``[run] aggregate = True``, a parallel-mode process doesn't write its own
+data file.  When it saves, it sends its data over a Unix socket to an
+aggregator daemon, started by whichever process needs it first.  The daemon
+adds the data from every process to one data file, named like any other
+parallel data file, so ``coverage combine`` works as usual.
+
+If the daemon can't be reached, the process writes its own data file instead.
+
+"""
+
+import errno
+import hashlib
+import json
+import os
+import socket
+import struct
+import subprocess
+import stat
+import sys
+import time
+
+from coverage.backward import iitems
+from coverage.data import CoverageData, InMemoryDataMixin, filename_suffix
+from coverage.debug import NoDebugging, SimpleReprMixin
+from coverage.misc import CoverageException, file_be_gone, private_temp_dir
+
+
+# How long the daemon waits for a process to send data before exiting.
+IDLE_TIMEOUT = 10.0
+
+# How long a process waits for a daemon it started to begin listening.
+START_TIMEOUT = 5.0
+
+# How long to wait for one message in either direction.
+MESSAGE_TIMEOUT = 30.0
+
+# The CoverageData methods a process can ask the daemon to call.
+DATA_OPS = (
+    "set_context", "add_lines", "add_arcs", "add_functions",
+    "add_file_tracers", "touch_file", "touch_files", "add_run_info",
+)
+
+# Each message is a JSON document, preceded by its length.
+LENGTH = struct.Struct("!I")
+
+# The credentials of a socket's peer: pid, uid, gid.
+PEERCRED = struct.Struct("3i")
+
+
+def can_aggregate():
+    """Can this platform use an aggregator daemon?"""
+    return hasattr(socket, "AF_UNIX")
+
+
+def socket_path(basename):
+    """The path of the daemon's socket for the data file named `basename`.
+
+    The socket lives in the user's private temp directory rather than next to
+    the data file, so that `combine` won't find it, because socket paths have
+    to be short, and so that other users can't connect to it or take its name.
+
+    """
+    hashed = hashlib.md5(os.path.abspath(basename).encode("utf8")).hexdigest()
+    return os.path.join(private_temp_dir(), "coverage-%s.sock" % hashed[:16])
+
+
+def is_ours(path):
+    """Is `path` a socket owned by the current user?"""
+    try:
+        st = os.lstat(path)
+    except OSError:
+        return False
+    if not stat.S_ISSOCK(st.st_mode):
+        return False
+    return not hasattr(os, "getuid") or st.st_uid == os.getuid()
+
+
+def peer_is_us(sock):
+    """Is the process at the other end of `sock` run by the current user?
+
+    Where the platform can't tell us, the private directory holding the socket
+    is the only protection, and the peer is trusted.
+
+    """
+    if not hasattr(socket, "SO_PEERCRED"):
+        return True
+    creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, PEERCRED.size)
+    _, uid, _ = PEERCRED.unpack(creds)
+    return uid == os.getuid()
+
+
+def send_message(sock, message):
+    """Send the JSON-able `message` over `sock`."""
+    data = json.dumps(message, separators=(',', ':')).encode("utf8")
+    sock.sendall(LENGTH.pack(len(data)) + data)
+
+
+def recv_message(sock):
+    """Receive one message from `sock`, or None if the other end has closed."""
+    header = _recv_exactly(sock, LENGTH.size)
+    if header is None:
+        return None
+    length, = LENGTH.unpack(header)
+    data = _recv_exactly(sock, length)
+    if data is None:
+        return None
+    return json.loads(data.decode("utf8"))
+
+
+def _recv_exactly(sock, size):
+    """Read exactly `size` bytes from `sock`, or None at end of file."""
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def replay(data, ops):
+    """Apply the recorded operations `ops` to the CoverageData `data`.
+
+    `ops` is a list of [method_name, args] pairs, as sent over the socket.
+
+    """
+    for name, args in ops:
+        if name not in DATA_OPS:
+            raise CoverageException("Unknown aggregator operation: {!r}".format(name))
+        if name == "add_run_info":
+            # Not every storage can record run information yet.
+            if hasattr(data, "add_run_info"):
+                data.add_run_info(**args[0])
+        else:
+            getattr(data, name)(*args)
+
+
+class AggregatingData(InMemoryDataMixin, SimpleReprMixin):
+    """Coverage data that is sent to the aggregator daemon when written.
+
+    This stands in for a parallel-mode :class:`CoverageData`.  The data added
+    to it is kept in memory as a list of operations.  :meth:`write` sends them
+    to the daemon, or replays them into a real data file if the daemon can't be
+    reached.
+
+    Reading gets the data collected since the last write.
+
+    """
+
+    def __init__(self, basename=None, suffix=None, warn=None, debug=None):
+        self._basename = os.path.abspath(basename or ".coverage")
+        self._suffix = suffix
+        self._warn = warn
+        self._debug = debug or NoDebugging()
+        self.filename = self._basename
+        self._current_context = None
+        self._has_arcs = False
+        self._has_functions = False
+        self._reset()
+
+    def _reset(self):
+        """Forget all the collected data."""
+        self._pid = os.getpid()
+        self._ops = []
+        if self._current_context is not None:
+            self._ops.append(["set_context", [self._current_context]])
+        # {context: {filename: set(lines or arcs)}}
+        self._data = {}
+        self._file_tracers = {}
+        self._run_info = {}
+        self._has_arcs = False
+        self._has_functions = False
+
+    def _add_op(self, name, *args):
+        """Record one operation to send to the daemon."""
+        if self._pid != os.getpid():
+            # Looks like we forked! The data so far belongs to our parent.
+            self._reset()
+        self._ops.append([name, list(args)])
+
+    def _add_values(self, data):
+        """Keep the lines or arcs in `data` for reading."""
+        context_data = self._data.setdefault(self._current_context or "", {})
+        for filename, values in iitems(data):
+            context_data.setdefault(filename, set()).update(values)
+
+    def set_context(self, context):
+        """Set the current context for future `add_lines` etc."""
+        self._current_context = context
+        self._add_op("set_context", context)
+
+    def add_lines(self, line_data):
+        """Add measured line data."""
+        self._add_line_data("add_lines", line_data)
+
+    def add_functions(self, function_data):
+        """Add measured function data."""
+        self._add_line_data("add_functions", function_data)
+        self._has_functions = True
+
+    def _add_line_data(self, name, line_data):
+        """Record line data, to be sent with method `name`."""
+        line_data = dict((f, sorted(lines)) for f, lines in iitems(line_data))
+        self._add_op(name, line_data)
+        self._add_values(line_data)
+
+    def add_arcs(self, arc_data):
+        """Add measured arc data."""
+        arc_data = dict((f, sorted(arcs)) for f, arcs in iitems(arc_data))
+        self._add_op("add_arcs", arc_data)
+        self._add_values(arc_data)
+        self._has_arcs = True
+
+    def add_file_tracers(self, file_tracers):
+        """Add per-file plugin information."""
+        if file_tracers:
+            self._add_op("add_file_tracers", file_tracers)
+            self._file_tracers.update(file_tracers)
+
+    def touch_file(self, filename, plugin_name=""):
+        """Ensure that `filename` appears in the data, empty if needed."""
+        self.touch_files([filename], plugin_name)
+
+    def touch_files(self, filenames, plugin_name=""):
+        """Ensure that `filenames` appear in the data, empty if needed."""
+        filenames = list(filenames)
+        self._add_op("touch_files", filenames, plugin_name)
+        self._add_values(dict((filename, ()) for filename in filenames))
+        for filename in filenames:
+            if plugin_name:
+                self._file_tracers[filename] = plugin_name
+
+    def add_run_info(self, **kwargs):
+        """Add information about the run."""
+        self._add_op("add_run_info", kwargs)
+        self._run_info.update(kwargs)
+
+    def _measured_data(self):
+        """Get the data not sent yet: {context: {filename: set(lines or arcs)}}."""
+        if self._pid != os.getpid():
+            self._reset()
+        return self._data
+
+    def _plugin_names(self):
+        """Get the plugin names of the files measured by plugins."""
+        return self._file_tracers
+
+    def read(self):
+        """There is nothing to read: the data only goes to the daemon."""
+        pass
+
+    def erase(self, parallel=False):
+        """Forget the data collected so far."""
+        self._reset()
+        if parallel:
+            CoverageData(self._basename, debug=self._debug).erase(parallel=True)
+
+    def write(self):
+        """Send the collected data to the daemon, or write it to a file."""
+        if self._pid != os.getpid():
+            self._reset()
+        if not self._data:
+            return
+        try:
+            self._send_to_daemon()
+        except (socket.error, EnvironmentError, ValueError, CoverageException) as exc:
+            if self._debug.should('dataio'):
+                self._debug.write("Couldn't send data to aggregator: {}".format(exc))
+            data = CoverageData(
+                basename=self._basename, suffix=self._suffix or True,
+                warn=self._warn, debug=self._debug,
+            )
+            replay(data, self._ops)
+            data.write()
+        self._reset()
+
+    def _send_to_daemon(self):
+        """Send our operations to the daemon, and wait for them to be saved."""
+        path = socket_path(self._basename)
+        sock = connect(path)
+        if sock is None:
+            start_daemon(self._basename, path)
+            deadline = time.time() + START_TIMEOUT
+            while sock is None and time.time() < deadline:
+                time.sleep(0.02)
+                sock = connect(path)
+        if sock is None:
+            raise CoverageException("Couldn't start aggregator at {!r}".format(path))
+
+        try:
+            if self._debug.should('dataio'):
+                self._debug.write("Sending data to aggregator {!r}".format(path))
+            send_message(sock, {"pid": self._pid, "ops": self._ops})
+            reply = recv_message(sock)
+        finally:
+            sock.close()
+        if reply is None:
+            raise CoverageException("Aggregator closed the connection")
+        if reply.get("error"):
+            raise CoverageException(reply["error"])
+
+
+def connect(path):
+    """Connect to the daemon listening at `path`, or return None.
+
+    Only a daemon run by the current user is connected to.
+
+    """
+    if not is_ours(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(MESSAGE_TIMEOUT)
+    try:
+        sock.connect(path)
+        if peer_is_us(sock):
+            return sock
+    except socket.error:
+        pass
+    sock.close()
+    return None
+
+
+def start_daemon(basename, path):
+    """Start an aggregator daemon for `basename` in the background."""
+    env = dict(os.environ)
+    # The daemon itself shouldn't be measured.
+    env.pop("COVERAGE_PROCESS_START", None)
+    kwargs = {}
+    if sys.version_info >= (3, 2):
+        kwargs['start_new_session'] = True
+    with open(os.devnull, "r+b") as devnull:
+        subprocess.Popen(
+            [sys.executable, "-m", "coverage.aggregate", basename, path],
+            stdin=devnull, stdout=devnull, stderr=devnull,
+            close_fds=True, env=env, **kwargs
+        )
+
+
+class Aggregator(object):
+    """The daemon that collects data from processes into one data file."""
+
+    def __init__(self, basename, path, idle_timeout=IDLE_TIMEOUT):
+        self.basename = basename
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.listener = None
+        self.data = None
+        self.data_filename = None
+
+    def listen(self):
+        """Start listening on our socket.
+
+        Returns False if another daemon is already listening there.
+
+        """
+        self.listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.listener.bind(self.path)
+        except socket.error as exc:
+            if exc.errno != errno.EADDRINUSE:
+                raise
+            sock = connect(self.path)
+            if sock is not None:
+                # Someone else is serving this data file.
+                sock.close()
+                self.listener.close()
+                return False
+            # A stale socket from a daemon that died.
+            file_be_gone(self.path)
+            self.listener.bind(self.path)
+        os.chmod(self.path, 0o600)
+        self.listener.listen(128)
+        self.listener.settimeout(self.idle_timeout)
+        return True
+
+    def serve(self):
+        """Handle connections until none have arrived for a while."""
+        try:
+            while True:
+                try:
+                    sock, _ = self.listener.accept()
+                except socket.timeout:
+                    break
+                try:
+                    if not peer_is_us(sock):
+                        # Only our own processes can add to our data file.
+                        continue
+                    sock.settimeout(MESSAGE_TIMEOUT)
+                    self.handle(sock)
+                except (socket.error, ValueError):
+                    pass
+                finally:
+                    sock.close()
+        finally:
+            self.listener.close()
+            file_be_gone(self.path)
+
+    def handle(self, sock):
+        """Read one process's data from `sock`, save it, and reply."""
+        message = recv_message(sock)
+        if message is None:
+            return
+        if self.data is not None and not os.path.exists(self.data_filename):
+            # Our data file has been combined away: start a new one.
+            self.data = None
+        if self.data is None:
+            suffix = filename_suffix(True)
+            self.data_filename = self.basename + "." + suffix
+            self.data = CoverageData(basename=self.basename, suffix=suffix)
+        try:
+            self.data.set_context(None)
+            replay(self.data, message["ops"])
+            self.data.write()
+        except Exception as exc:            # pylint: disable=broad-except
+            # One process's bad data shouldn't stop the daemon: the process
+            # will write its own data file instead.
+            send_message(sock, {"error": str(exc)})
+        else:
+            send_message(sock, {"ok": True})
+
+
+def main(args):
+    """Run an aggregator daemon: `args` are the data file name and socket path."""
+    basename, path = args
+    aggregator = Aggregator(basename, path)
+    if aggregator.listen():
+        aggregator.serve()
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -53,6 +53,12 @@ except ImportError:
     # in Python versions earlier than 3.3.
     from pipes import quote as shlex_quote
 
+# os.scandir is new in 3.5.  Before that, we list directories the slow way.
+try:
+    from os import scandir
+except ImportError:
+    scandir = None
+
 # A function to iterate listlessly over a dict's items, and one to get the
 # items as a list.
 try:
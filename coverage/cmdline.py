@@ -14,11 +14,14 @@ import traceback
 
 from coverage import env
 from coverage.collector import CTracer
+from coverage.compare import json_report, text_report
 from coverage.data import line_counts
 from coverage.debug import info_formatter, info_header
 from coverage.execfile import run_python_file, run_python_module
 from coverage.misc import BaseCoverageException, ExceptionDuringRun, NoSource
+from coverage.pth import install_pth, remove_pth
 from coverage.results import should_fail_under
+from coverage.shard import Shard, is_shard
 
 
 class Opts(object):
@@ -51,6 +54,13 @@ class Opts(object):
         '', '--debug', action='store', metavar="OPTS",
         help="Debug options, separated by commas. [env: COVERAGE_DEBUG]",
     )
+    diff = optparse.make_option(
+        '', '--diff', action='store', metavar="DIFFFILE",
+        help=(
+            "Only report on the files and lines changed by this unified diff. "
+            "The total is the coverage of the changed lines."
+        ),
+    )
     directory = optparse.make_option(
         '-d', '--directory', action='store', metavar="DIR",
         help="Write the output files to DIR.",
@@ -59,10 +69,18 @@ class Opts(object):
         '', '--fail-under', action='store', metavar="MIN", type="float",
         help="Exit with a status of 2 if the total coverage is less than MIN.",
     )
+    format = optparse.make_option(
+        '', '--format', action='store', metavar="FORMAT", choices=["text", "json"],
+        help="Write the output as FORMAT, 'text' or 'json'.  Defaults to 'text'.",
+    )
     help = optparse.make_option(
         '-h', '--help', action='store_true',
         help="Get help on this command.",
     )
+    host = optparse.make_option(
+        '', '--host', action='store', metavar="HOST",
+        help="Listen for requests on HOST.  Defaults to localhost.",
+    )
     ignore_errors = optparse.make_option(
         '-i', '--ignore-errors', action='store_true',
         help="Ignore errors while reading source files.",
@@ -82,6 +100,14 @@ class Opts(object):
             "which isn't done by default."
         ),
     )
+    rollup_depth = optparse.make_option(
+        '', '--rollup-depth', action='store', metavar="DEPTH", type="int",
+        help="Also report the totals for directories, down to DEPTH levels.",
+    )
+    show_contexts = optparse.make_option(
+        '--show-contexts', action='store_true',
+        help="Show the contexts that ran each line.",
+    )
     show_missing = optparse.make_option(
         '-m', '--show-missing', action='store_true',
         help="Show line numbers of statements in each module that weren't executed.",
@@ -98,6 +124,16 @@ class Opts(object):
             "Accepts shell-style wildcards, which must be quoted."
         ),
     )
+    output_json = optparse.make_option(
+        '-o', '', action='store', dest="outfile",
+        metavar="OUTFILE",
+        help="Write the JSON report to this file. Defaults to 'coverage.json'",
+    )
+    output_lcov = optparse.make_option(
+        '-o', '', action='store', dest="outfile",
+        metavar="OUTFILE",
+        help="Write the LCOV report to this file. Defaults to 'coverage.lcov'",
+    )
     output_xml = optparse.make_option(
         '-o', '', action='store', dest="outfile",
         metavar="OUTFILE",
@@ -111,6 +147,10 @@ class Opts(object):
             "many processes."
         ),
     )
+    port = optparse.make_option(
+        '', '--port', action='store', metavar="PORT", type="int",
+        help="Listen for requests on PORT.  Defaults to 8000.",
+    )
     module = optparse.make_option(
         '-m', '--module', action='store_true',
         help=(
@@ -126,6 +166,17 @@ class Opts(object):
             "[env: COVERAGE_RCFILE]"
         ),
     )
+    remove = optparse.make_option(
+        '', '--remove', action='store_true',
+        help="Remove the .pth file instead of installing it.",
+    )
+    socket = optparse.make_option(
+        '', '--socket', action='store', metavar="PATH",
+        help=(
+            "Listen for requests on the Unix socket PATH.  Defaults to the data "
+            "file name with '.sock' added."
+        ),
+    )
     source = optparse.make_option(
         '', '--source', action='store', metavar="SRC1,SRC2,...",
         help="A list of packages or directories of code to be measured.",
@@ -145,6 +196,13 @@ class Opts(object):
         '', '--version', action='store_true',
         help="Display version information and exit.",
     )
+    with_statements = optparse.make_option(
+        '', '--with-statements', action='store_true',
+        help=(
+            "Read the source files, and only compare their current statements "
+            "and branches."
+        ),
+    )
 
 
 class CoverageOptionParser(optparse.OptionParser, object):
@@ -166,22 +224,30 @@ class CoverageOptionParser(optparse.OptionParser, object):
             concurrency=None,
             context=None,
             debug=None,
+            diff=None,
             directory=None,
             fail_under=None,
+            format="text",
             help=None,
+            host="localhost",
             ignore_errors=None,
             include=None,
             module=None,
             omit=None,
             parallel_mode=None,
+            port=8000,
             pylib=None,
             rcfile=True,
+            rollup_depth=None,
+            show_contexts=None,
             show_missing=None,
             skip_covered=None,
+            socket=None,
             source=None,
             timid=None,
             title=None,
             version=None,
+            with_statements=None,
             )
 
         self.disable_interspersed_args()
@@ -302,6 +368,33 @@ CMDS = {
         ),
     ),
 
+    'compare': CmdOptionParser(
+        "compare",
+        [
+            Opts.format,
+            Opts.with_statements,
+            ] + GLOBAL_ARGS,
+        usage="[options] <before> <after>",
+        description=(
+            "Compare two data files, showing the lines and branches that lost "
+            "or gained coverage from <before> to <after>.  The source files "
+            "aren't read unless --with-statements is used."
+        ),
+    ),
+
+    'daemon': CmdOptionParser(
+        "daemon",
+        [
+            Opts.socket,
+            ] + GLOBAL_ARGS,
+        usage="[options]",
+        description=(
+            "Answer requests for the analysis of files on a Unix socket, for "
+            "editors and other tools.  The data and the parsed source files are "
+            "kept in memory, and read again when they change."
+        ),
+    ),
+
     'debug': CmdOptionParser(
         "debug", GLOBAL_ARGS,
         usage="<topic>",
@@ -327,11 +420,13 @@ CMDS = {
     'html': CmdOptionParser(
         "html",
         [
+            Opts.diff,
             Opts.directory,
             Opts.fail_under,
             Opts.ignore_errors,
             Opts.include,
             Opts.omit,
+            Opts.rollup_depth,
             Opts.title,
             Opts.skip_covered,
             ] + GLOBAL_ARGS,
@@ -343,13 +438,63 @@ CMDS = {
         ),
     ),
 
+    'install-pth': CmdOptionParser(
+        "install-pth",
+        [
+            Opts.directory,
+            Opts.remove,
+            ] + GLOBAL_ARGS,
+        usage="[options]",
+        description=(
+            "Install a .pth file in site-packages so that every Python process "
+            "started with COVERAGE_PROCESS_START set is measured.  Processes "
+            "without it don't import coverage.py at all.  Use -d to choose a "
+            "different directory."
+        ),
+    ),
+
+    'json': CmdOptionParser(
+        "json",
+        [
+            Opts.diff,
+            Opts.fail_under,
+            Opts.ignore_errors,
+            Opts.include,
+            Opts.omit,
+            Opts.output_json,
+            Opts.rollup_depth,
+            Opts.show_contexts,
+            ] + GLOBAL_ARGS,
+        usage="[options] [modules]",
+        description=(
+            "Generate a JSON report of coverage results.  Each file's lines and "
+            "summary are written as soon as the file is analyzed."
+        ),
+    ),
+
+    'lcov': CmdOptionParser(
+        "lcov",
+        [
+            Opts.diff,
+            Opts.fail_under,
+            Opts.ignore_errors,
+            Opts.include,
+            Opts.omit,
+            Opts.output_lcov,
+            ] + GLOBAL_ARGS,
+        usage="[options] [modules]",
+        description="Generate an LCOV tracefile of coverage results.",
+    ),
+
     'report': CmdOptionParser(
         "report",
         [
+            Opts.diff,
             Opts.fail_under,
             Opts.ignore_errors,
             Opts.include,
             Opts.omit,
+            Opts.rollup_depth,
             Opts.show_missing,
             Opts.skip_covered,
             ] + GLOBAL_ARGS,
@@ -376,9 +521,29 @@ CMDS = {
         description="Run a Python program, measuring code execution."
     ),
 
+    'serve': CmdOptionParser(
+        "serve",
+        [
+            Opts.host,
+            Opts.ignore_errors,
+            Opts.include,
+            Opts.omit,
+            Opts.port,
+            Opts.title,
+            Opts.skip_covered,
+            ] + GLOBAL_ARGS,
+        usage="[options] [modules]",
+        description=(
+            "Serve an HTML report of the coverage of the files on a local web "
+            "server.  The page for each file is only made when you look at it, "
+            "so nothing is written to disk."
+        ),
+    ),
+
     'xml': CmdOptionParser(
         "xml",
         [
+            Opts.diff,
             Opts.fail_under,
             Opts.ignore_errors,
             Opts.include,
@@ -465,6 +630,10 @@ class CoverageScript(object):
         if self.do_help(options, args, parser):
             return OK
 
+        # Installing the .pth file doesn't need a Coverage object.
+        if options.action == "install-pth":
+            return self.do_install_pth(options)
+
         # We need to be able to import from the current directory, because
         # plugins may try to, for example, to read Django settings.
         sys.path[0] = ''
@@ -509,6 +678,12 @@ class CoverageScript(object):
             self.coverage.save()
             return OK
 
+        elif options.action == "compare":
+            return self.do_compare(options, args)
+
+        elif options.action == "daemon":
+            return self.do_daemon(options)
+
         # Remaining actions are reporting, with some common options.
         report_args = dict(
             morfs=unglob_args(args),
@@ -523,17 +698,29 @@ class CoverageScript(object):
         if options.action == "report":
             total = self.coverage.report(
                 show_missing=options.show_missing,
-                skip_covered=options.skip_covered, **report_args)
+                skip_covered=options.skip_covered, diff=options.diff,
+                rollup_depth=options.rollup_depth, **report_args)
         elif options.action == "annotate":
             self.coverage.annotate(
                 directory=options.directory, **report_args)
         elif options.action == "html":
             total = self.coverage.html_report(
                 directory=options.directory, title=options.title,
-                skip_covered=options.skip_covered, **report_args)
+                skip_covered=options.skip_covered, diff=options.diff,
+                rollup_depth=options.rollup_depth, **report_args)
+        elif options.action == "json":
+            outfile = options.outfile
+            total = self.coverage.json_report(
+                outfile=outfile, contexts=options.show_contexts, diff=options.diff,
+                rollup_depth=options.rollup_depth, **report_args)
+        elif options.action == "lcov":
+            outfile = options.outfile
+            total = self.coverage.lcov_report(outfile=outfile, diff=options.diff, **report_args)
         elif options.action == "xml":
             outfile = options.outfile
-            total = self.coverage.xml_report(outfile=outfile, **report_args)
+            total = self.coverage.xml_report(outfile=outfile, diff=options.diff, **report_args)
+        elif options.action == "serve":
+            return self.do_serve(options, report_args)
 
         if total is not None:
             # Apply the command line fail-under options, and then use the config
@@ -648,6 +835,61 @@ class CoverageScript(object):
 
         return OK
 
+    def do_install_pth(self, options):
+        """Implementation of 'coverage install-pth'."""
+        if options.remove:
+            pth_path = remove_pth(options.directory)
+            if pth_path:
+                print("Removed %s" % pth_path)
+            else:
+                print("No .pth file to remove")
+        else:
+            pth_path = install_pth(options.directory)
+            print("Wrote %s" % pth_path)
+        return OK
+
+    def do_serve(self, options, report_args):
+        """Implementation of 'coverage serve'."""
+        server = self.coverage.html_server(
+            host=options.host, port=options.port, title=options.title,
+            skip_covered=options.skip_covered, **report_args)
+        print("Serving HTML report at %s, press Ctrl-C to stop" % server.url)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+        return OK
+
+    def do_compare(self, options, args):
+        """Implementation of 'coverage compare'."""
+        if len(args) != 2:
+            self.help_fn("Need two data files to compare.")
+            return ERR
+
+        changes = self.coverage.compare(
+            args[0], args[1], with_statements=options.with_statements,
+        )
+        if options.format == "json":
+            json_report(changes, sys.stdout)
+        else:
+            text_report(changes, sys.stdout)
+        return OK
+
+    def do_daemon(self, options):
+        """Implementation of 'coverage daemon'."""
+        self.coverage.load()
+        daemon = self.coverage.analysis_daemon(socket_path=options.socket)
+        print("Answering analysis requests on %s, press Ctrl-C to stop" % daemon.socket_path)
+        try:
+            daemon.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            daemon.server_close()
+        return OK
+
     def do_debug(self, args):
         """Implementation of 'coverage debug'."""
 
@@ -668,17 +910,22 @@ class CoverageScript(object):
                 print("path: %s" % self.coverage.get_data().filename)
                 if data:
                     print("has_arcs: %r" % data.has_arcs())
+                    if data.has_functions():
+                        print("has_functions: True")
                     summary = line_counts(data, fullpath=True)
-                    filenames = sorted(summary.keys())
-                    print("\n%d files:" % len(filenames))
-                    for f in filenames:
-                        line = "%s: %d lines" % (f, summary[f])
-                        plugin = data.file_tracer(f)
-                        if plugin:
-                            line += " [%s]" % plugin
-                        print(line)
+                    print_line_counts(summary, data.file_tracer)
                 else:
                     print("No data collected")
+                shard_files = glob.glob(data.filename + ".*")
+                for shard_file in sorted(f for f in shard_files if is_shard(f)):
+                    shard = Shard(shard_file)
+                    shard.read()
+                    print("\nshard: %s" % shard_file)
+                    print("version: %d" % shard.version)
+                    print("has_arcs: %r" % shard.has_arcs)
+                    if shard.has_functions:
+                        print("has_functions: True")
+                    print_line_counts(shard.line_counts(), shard.file_tracers.get)
             elif info == 'config':
                 print(info_header("config"))
                 config_info = self.coverage.config.__dict__.items()
@@ -691,6 +938,22 @@ class CoverageScript(object):
         return OK
 
 
+def print_line_counts(summary, file_tracer):
+    """Print the {filename: line count} dict `summary` for `debug data`.
+
+    `file_tracer` is a function returning the plugin name for a file name.
+
+    """
+    filenames = sorted(summary.keys())
+    print("\n%d files:" % len(filenames))
+    for f in filenames:
+        line = "%s: %d lines" % (f, summary[f])
+        plugin = file_tracer(f)
+        if plugin:
+            line += " [%s]" % plugin
+        print(line)
+
+
 def unshell_list(s):
     """Turn a command-line argument into a list."""
     if not s:
@@ -728,11 +991,17 @@ HELP_TOPICS = {
         Commands:
             annotate    Annotate source files with execution information.
             combine     Combine a number of data files.
+            compare     Compare the coverage in two data files.
+            daemon      Answer analysis requests from editors on a Unix socket.
             erase       Erase previously collected coverage data.
             help        Get help on using coverage.py.
             html        Create an HTML report.
+            install-pth Install a .pth file to measure sub-processes.
+            json        Create a JSON report of coverage results.
+            lcov        Create an LCOV tracefile of coverage results.
             report      Report coverage stats on modules.
             run         Run a Python program and measure code execution.
+            serve       Serve an HTML report on a local web server.
             xml         Create an XML report of coverage results.
 
         Use "{program_name} help <command>" for detailed help on any command.
@@ -7,7 +7,7 @@ import os
 import sys
 
 from coverage import env
-from coverage.backward import litems, range     # pylint: disable=redefined-builtin
+from coverage.backward import iitems, litems, range     # pylint: disable=redefined-builtin
 from coverage.debug import short_stack
 from coverage.disposition import FileDisposition
 from coverage.files import abs_file
@@ -60,7 +60,7 @@ class Collector(object):
 
     def __init__(
         self, should_trace, check_include, should_start_context,
-        timid, branch, warn, concurrency,
+        timid, branch, warn, concurrency, granularity="line", max_memory=0,
     ):
         """Create a collector.
 
@@ -93,12 +93,21 @@ class Collector(object):
         (the default).  Of these four values, only one can be supplied.  Other
         values are ignored.
 
+        `granularity` is "line" (the default) to record executed lines, or
+        "function" to record only the functions called.  Function data is keyed
+        by the first line of each function's code object.
+
+        `max_memory` is the number of bytes the collected data can use before
+        it is flushed to the `CoverageData`, or 0 for no limit.  The size is
+        checked every so often while tracing, using `memory_estimate`.
+
         """
         self.should_trace = should_trace
         self.check_include = check_include
         self.should_start_context = should_start_context
         self.warn = warn
         self.branch = branch
+        self.functions = (granularity == "function")
         self.threading = None
         self.covdata = None
 
@@ -109,6 +118,16 @@ class Collector(object):
         self.concur_id_func = None
         self.abs_file_cache = {}
 
+        # A dict mapping file names to the number of trace events in them, if
+        # per-file counts are wanted.
+        self.file_events = None
+
+        # The memory ceiling for collected data, and how often we've hit it.
+        self.max_memory = max_memory
+        self.memory_spills = 0
+        # The estimate left after the last spill: the dicts, but no data.
+        self.memory_base = 0
+
         # We can handle a few concurrency options here, but only one at a time.
         these_concurrencies = self.SUPPORTED_CONCURRENCIES.intersection(concurrency)
         if len(these_concurrencies) > 1:
@@ -187,6 +206,7 @@ class Collector(object):
         # branch coverage), or mapping file names to dicts with line number
         # pairs as keys (if branch coverage).
         self.data = {}
+        self.memory_base = 0
 
         # A dictionary mapping file names to file tracer plugin names that will
         # handle them.
@@ -223,6 +243,11 @@ class Collector(object):
         # Our active Tracers.
         self.tracers = []
 
+        # Counters from tracers that are done.
+        self.stats = {}
+        if self.file_events is not None:
+            self.file_events.clear()
+
         self._clear_data()
 
     def _start_tracer(self):
@@ -230,9 +255,13 @@ class Collector(object):
         tracer = self._trace_class()
         tracer.data = self.data
         tracer.trace_arcs = self.branch
+        tracer.trace_functions = self.functions
         tracer.should_trace = self.should_trace
         tracer.should_trace_cache = self.should_trace_cache
         tracer.warn = self.warn
+        tracer.file_events = self.file_events
+        if self.max_memory:
+            tracer.check_memory = self.check_memory
 
         if hasattr(tracer, 'concur_id_func'):
             tracer.concur_id_func = self.concur_id_func
@@ -286,6 +315,8 @@ class Collector(object):
         if self._collectors:
             self._collectors[-1].pause()
 
+        # Keep the counts from the tracers we're about to replace.
+        self.stats = self.get_stats()
         self.tracers = []
 
         # Check to see whether we had a fullcoverage tracer installed. If so,
@@ -345,11 +376,6 @@ class Collector(object):
         """Pause tracing, but be prepared to `resume`."""
         for tracer in self.tracers:
             tracer.stop()
-            stats = tracer.get_stats()
-            if stats:
-                print("\nCoverage.py tracer stats:")
-                for k in sorted(stats.keys()):
-                    print("%20s: %s" % (k, stats[k]))
         if self.threading:
             self.threading.settrace(None)
 
@@ -362,6 +388,22 @@ class Collector(object):
         else:
             self._start_tracer()
 
+    def get_stats(self):
+        """Return a dict of the tracers' counters, summed over all the tracers.
+
+        The keys are "calls", "lines", and "returns" for trace events, "files"
+        for calls to should_trace, "dynamic_calls" for calls to plugins for
+        dynamic file names, and "start_context_calls" for calls to
+        should_start_context.  More are included if the C tracer was compiled
+        with COLLECT_STATS.
+
+        """
+        stats = dict(self.stats)
+        for tracer in self.tracers:
+            for key, value in iitems(tracer.get_stats() or {}):
+                stats[key] = stats.get(key, 0) + value
+        return stats
+
     def _activity(self):
         """Has any activity been traced?
 
@@ -381,6 +423,38 @@ class Collector(object):
             context = new_context
         self.covdata.set_context(context)
 
+    # Rough sizes of one entry in a file's data dict, beyond the dict's own
+    # table: an int for a line or function, a tuple of two ints for an arc.
+    LINE_ENTRY_BYTES = 28
+    ARC_ENTRY_BYTES = 120
+
+    def memory_estimate(self):
+        """Estimate the number of bytes used by the data collected so far.
+
+        This is only an estimate: the dicts are measured, and each entry is
+        assumed to be a fixed size.  Data already flushed to the `CoverageData`
+        isn't counted.
+
+        """
+        entry_bytes = self.ARC_ENTRY_BYTES if self.branch else self.LINE_ENTRY_BYTES
+        size = sys.getsizeof(self.data)
+        for _, d in litems(self.data):
+            size += sys.getsizeof(d) + len(d) * entry_bytes
+        return size
+
+    def check_memory(self):
+        """Flush the collected data if it uses more than `max_memory` bytes.
+
+        Called by the tracers every so often.  What was left after the last
+        spill isn't counted, so that a spill only happens when new data goes
+        over the limit.
+
+        """
+        if self.max_memory and self.memory_estimate() - self.memory_base > self.max_memory:
+            if self.flush_data():
+                self.memory_spills += 1
+            self.memory_base = self.memory_estimate()
+
     def cached_abs_file(self, filename):
         """A locally cached version of `abs_file`."""
         key = (type(filename), filename)
@@ -421,6 +495,8 @@ class Collector(object):
 
         if self.branch:
             self.covdata.add_arcs(abs_file_dict(self.data))
+        elif self.functions:
+            self.covdata.add_functions(abs_file_dict(self.data))
         else:
             self.covdata.add_lines(abs_file_dict(self.data))
         self.covdata.add_file_tracers(abs_file_dict(self.file_tracers))
@@ -0,0 +1,106 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Comparing two coverage data files, for 'coverage compare'."""
+
+import json
+
+from coverage.backward import iitems
+from coverage.files import relative_filename
+from coverage.misc import NoSource, NotPython, format_lines
+from coverage.python import PythonFileReporter
+
+
+def compare_data(before, after, coverage=None):
+    """Find the coverage that changed from the data `before` to `after`.
+
+    Returns a dict mapping file names to dicts with sorted lists of the lines
+    that became covered ("lines_gained") and uncovered ("lines_lost"), and if
+    both are branch data, the same for arcs ("arcs_gained" and "arcs_lost").
+
+    The sources aren't read unless `coverage` is given.  Then the changes in
+    Python files are limited to the file's current statements and possible
+    arcs, and "num_statements" is the number of statements.  Files which can't
+    be parsed are left as they are.
+
+    """
+    changes = after.changes_since(before)
+    if coverage is None:
+        return changes
+
+    narrowed = {}
+    for filename, file_changes in iitems(changes):
+        if after.file_tracer(filename) or before.file_tracer(filename):
+            narrowed[filename] = file_changes
+            continue
+        try:
+            fr = PythonFileReporter(filename, coverage)
+            statements = fr.lines()
+            arcs = fr.arcs() if 'arcs_lost' in file_changes else ()
+        except (NoSource, NotPython):
+            narrowed[filename] = file_changes
+            continue
+
+        file_changes = dict(
+            (key, [item for item in found if item in (arcs if key[:4] == 'arcs' else statements)])
+            for key, found in iitems(file_changes)
+        )
+        if any(file_changes.values()):
+            file_changes['num_statements'] = len(statements)
+            narrowed[filename] = file_changes
+    return narrowed
+
+
+def format_changes(lines, arcs=()):
+    """Format the changed `lines` and `arcs` of a file for the text report.
+
+    Runs of consecutive lines are shown as ranges.  Arcs are only shown if
+    neither end is one of the `lines`, since a line's arcs change with it, and
+    arcs into a function are left out, since its first line changes with them.
+
+    """
+    formatted = []
+    if lines:
+        formatted.append(format_lines(range(lines[0], lines[-1] + 1), lines))
+    for l1, l2 in arcs:
+        if l1 > 0 and l1 not in lines and l2 not in lines:
+            formatted.append("%d->%s" % (l1, l2 if l2 > 0 else "exit"))
+    return ", ".join(formatted)
+
+
+def text_report(changes, outfile):
+    """Write the `changes` from `compare_data` to `outfile` as a table."""
+    rows = []
+    total_lost = total_gained = 0
+    for filename, file_changes in iitems(changes):
+        rows.append((
+            relative_filename(filename),
+            format_changes(file_changes['lines_lost'], file_changes.get('arcs_lost', ())),
+            format_changes(file_changes['lines_gained'], file_changes.get('arcs_gained', ())),
+        ))
+        total_lost += len(file_changes['lines_lost'])
+        total_gained += len(file_changes['lines_gained'])
+    rows.sort()
+
+    header = ("Name", "Lost", "Gained")
+    total = ("TOTAL", str(total_lost), str(total_gained))
+    widths = [max(len(row[i]) for row in rows + [header, total]) for i in range(2)]
+    fmt = "%%-%ds   %%-%ds   %%s" % tuple(widths)
+    rule = "-" * (sum(widths) + 6 + max(len(row[2]) for row in rows + [header, total]))
+
+    lines = [fmt % header, rule]
+    lines.extend(fmt % row for row in rows)
+    lines.extend([rule, fmt % total])
+    for line in lines:
+        outfile.write(line.rstrip() + "\n")
+
+
+def json_report(changes, outfile):
+    """Write the `changes` from `compare_data` to `outfile` as JSON."""
+    files = dict((relative_filename(filename), fc) for filename, fc in iitems(changes))
+    totals = {
+        'lines_lost': sum(len(fc['lines_lost']) for fc in changes.values()),
+        'lines_gained': sum(len(fc['lines_gained']) for fc in changes.values()),
+    }
+    json.dump({'files': files, 'totals': totals}, outfile, sort_keys=True)
+    outfile.write("\n")
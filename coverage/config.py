@@ -4,13 +4,15 @@
 """Config file for coverage.py"""
 
 import collections
+import hashlib
+import json
 import os
 import re
 
 from coverage import env
-from coverage.backward import configparser, iitems, string_class
+from coverage.backward import configparser, iitems, string_class, unicode_class
 from coverage.misc import contract, CoverageException, isolate_module
-from coverage.misc import substitute_variables
+from coverage.misc import private_temp_dir, substitute_variables, write_private_file
 
 os = isolate_module(os)
 
@@ -173,31 +175,40 @@ class CoverageConfig(object):
         self._omit = None
 
         # Defaults for [run]
+        self.aggregate = False
         self.branch = False
         self.concurrency = None
         self.context = None
+        self.core = "trace"
         self.cover_pylib = False
         self.data_file = ".coverage"
         self.debug = []
         self.disable_warnings = []
         self.dynamic_context = None
+        self.granularity = "line"
+        self.max_memory = 0
         self.note = None
         self.parallel = False
         self.plugins = []
+        self.shard = False
+        self.shared_memory = False
         self.source = None
         self.run_include = None
         self.run_omit = None
         self.timid = False
+        self.trace_cache = False
 
         # Defaults for [report]
         self.exclude_list = DEFAULT_EXCLUDE[:]
         self.fail_under = 0.0
         self.ignore_errors = False
+        self.report_diff = None
         self.report_include = None
         self.report_omit = None
         self.partial_always_list = DEFAULT_PARTIAL_ALWAYS[:]
         self.partial_list = DEFAULT_PARTIAL[:]
         self.precision = 0
+        self.rollup_depth = 0
         self.show_missing = False
         self.skip_covered = False
 
@@ -205,6 +216,14 @@ class CoverageConfig(object):
         self.extra_css = None
         self.html_dir = "htmlcov"
         self.html_title = "Coverage report"
+        self.show_contexts = False
+
+        # Defaults for [json]
+        self.json_output = "coverage.json"
+        self.json_show_contexts = False
+
+        # Defaults for [lcov]
+        self.lcov_output = "coverage.lcov"
 
         # Defaults for [xml]
         self.xml_output = "coverage.xml"
@@ -318,21 +337,28 @@ class CoverageConfig(object):
         #       configuration value from the file.
 
         # [run]
+        ('aggregate', 'run:aggregate', 'boolean'),
         ('branch', 'run:branch', 'boolean'),
         ('concurrency', 'run:concurrency', 'list'),
         ('context', 'run:context'),
+        ('core', 'run:core'),
         ('cover_pylib', 'run:cover_pylib', 'boolean'),
         ('data_file', 'run:data_file'),
         ('debug', 'run:debug', 'list'),
         ('disable_warnings', 'run:disable_warnings', 'list'),
         ('dynamic_context', 'run:dynamic_context'),
+        ('granularity', 'run:granularity'),
+        ('max_memory', 'run:max_memory', 'int'),
         ('note', 'run:note'),
         ('parallel', 'run:parallel', 'boolean'),
         ('plugins', 'run:plugins', 'list'),
         ('run_include', 'run:include', 'list'),
         ('run_omit', 'run:omit', 'list'),
+        ('shard', 'run:shard', 'boolean'),
+        ('shared_memory', 'run:shared_memory', 'boolean'),
         ('source', 'run:source', 'list'),
         ('timid', 'run:timid', 'boolean'),
+        ('trace_cache', 'run:trace_cache', 'boolean'),
 
         # [report]
         ('exclude_list', 'report:exclude_lines', 'regexlist'),
@@ -341,8 +367,10 @@ class CoverageConfig(object):
         ('partial_always_list', 'report:partial_branches_always', 'regexlist'),
         ('partial_list', 'report:partial_branches', 'regexlist'),
         ('precision', 'report:precision', 'int'),
+        ('report_diff', 'report:diff'),
         ('report_include', 'report:include', 'list'),
         ('report_omit', 'report:omit', 'list'),
+        ('rollup_depth', 'report:rollup_depth', 'int'),
         ('show_missing', 'report:show_missing', 'boolean'),
         ('skip_covered', 'report:skip_covered', 'boolean'),
         ('sort', 'report:sort'),
@@ -351,6 +379,14 @@ class CoverageConfig(object):
         ('extra_css', 'html:extra_css'),
         ('html_dir', 'html:directory'),
         ('html_title', 'html:title'),
+        ('show_contexts', 'html:show_contexts', 'boolean'),
+
+        # [json]
+        ('json_output', 'json:output'),
+        ('json_show_contexts', 'json:show_contexts', 'boolean'),
+
+        # [lcov]
+        ('lcov_output', 'lcov:output'),
 
         # [xml]
         ('xml_output', 'xml:output'),
@@ -454,12 +490,173 @@ def config_files_to_try(config_file):
     return files_to_try
 
 
-def read_coverage_config(config_file, **kwargs):
+# The config cache holds what was read from the config files, so that many
+# processes starting with the same configuration only need to parse it once.
+CONFIG_CACHE_VERSION = 2
+
+# Environment variables that can be substituted into config values.
+ENV_VARIABLE_REFERENCE = re.compile(r"\$\{?(\w+)")
+
+
+def config_cache_path(files_to_try):
+    """The file caching the configuration read from `files_to_try`.
+
+    Raises CoverageException if there's no private directory for it.
+
+    """
+    ident = json.dumps([os.getcwd(), [os.path.abspath(f) for f, _, _ in files_to_try]])
+    digest = hashlib.md5(ident.encode("utf8")).hexdigest()[:16]
+    return os.path.join(private_temp_dir(), "coverage-config-{}.json".format(digest))
+
+
+def config_files_key(files_to_try):
+    """Identify the current state of `files_to_try`, by size and mtime."""
+    key = []
+    for fname, _, _ in files_to_try:
+        try:
+            stat = os.stat(fname)
+        except OSError:
+            key.append(None)
+        else:
+            key.append([stat.st_mtime, stat.st_size])
+    return key
+
+
+def read_config_cache(cache_path, files_key):
+    """Get the CoverageConfig cached in `cache_path`.
+
+    Returns None if there is no cache, or it doesn't match `files_key` or the
+    current environment variables.
+
+    """
+    try:
+        if hasattr(os, "getuid") and os.stat(cache_path).st_uid != os.getuid():
+            # Someone else's file: don't trust it.
+            return None
+        with open(cache_path) as f:
+            cached = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    if cached.get("version") != CONFIG_CACHE_VERSION or cached.get("files") != files_key:
+        return None
+    for name, value in iitems(cached["env"]):
+        if os.environ.get(name) != value:
+            return None
+
+    try:
+        return config_from_cache(cached["config"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def write_config_cache(cache_path, files_key, config):
+    """Write `config` to `cache_path`, keyed by `files_key`.
+
+    The values of environment variables mentioned in the config files read
+    are also stored, since they could have been substituted into the config.
+
+    """
+    env_names = set()
+    for fname in config.config_files_read:
+        try:
+            with open(fname) as f:
+                env_names.update(ENV_VARIABLE_REFERENCE.findall(f.read()))
+        except (IOError, OSError, UnicodeDecodeError):
+            return
+    cached = {
+        "version": CONFIG_CACHE_VERSION,
+        "files": files_key,
+        "env": dict((name, os.environ.get(name)) for name in env_names),
+        "config": config_to_cache(config),
+    }
+    try:
+        write_private_file(cache_path, json.dumps(cached))
+    except (IOError, OSError):
+        pass
+
+
+def _cache_str(value):
+    """Convert a string from the JSON cache to the type read from config files."""
+    if env.PY2 and isinstance(value, unicode_class):
+        return value.encode("utf8")
+    return value
+
+
+def _cache_list(value):
+    """Convert a list of strings from the JSON cache."""
+    return [_cache_str(v) for v in value]
+
+
+# How to restore each type of option from the config cache, by the type_ in
+# CONFIG_FILE_OPTIONS.
+CACHE_CONVERSIONS = {
+    '': _cache_str,
+    'boolean': bool,
+    'float': float,
+    'int': int,
+    'list': _cache_list,
+    'regexlist': _cache_list,
+}
+
+
+def config_to_cache(config):
+    """Get the settings of `config` read from files, as JSON-able data.
+
+    :func:`config_from_cache` makes a CoverageConfig from the data.
+
+    """
+    options = {}
+    for option_spec in CoverageConfig.CONFIG_FILE_OPTIONS:
+        attr = option_spec[0]
+        if hasattr(config, attr):
+            options[attr] = getattr(config, attr)
+    return {
+        "options": options,
+        # [paths] is kept as a list of pairs, since its order matters.
+        "paths": [[name, list(patterns)] for name, patterns in iitems(config.paths)],
+        "plugin_options": config.plugin_options,
+        "attempted_config_files": config.attempted_config_files,
+        "config_files_read": config.config_files_read,
+        "config_file": config.config_file,
+        "config_contents": config._config_contents,
+    }
+
+
+def config_from_cache(data):
+    """Make a CoverageConfig from the data made by :func:`config_to_cache`."""
+    config = CoverageConfig()
+    options = data["options"]
+    for option_spec in CoverageConfig.CONFIG_FILE_OPTIONS:
+        attr = option_spec[0]
+        if attr in options:
+            value = options[attr]
+            if value is not None:
+                type_ = option_spec[2] if len(option_spec) > 2 else ''
+                value = CACHE_CONVERSIONS[type_](value)
+            setattr(config, attr, value)
+    config.paths = collections.OrderedDict(
+        (_cache_str(name), _cache_list(patterns)) for name, patterns in data["paths"]
+    )
+    config.plugin_options = dict(
+        (_cache_str(plugin), dict((_cache_str(k), _cache_str(v)) for k, v in iitems(opts)))
+        for plugin, opts in iitems(data["plugin_options"])
+    )
+    config.attempted_config_files = _cache_list(data["attempted_config_files"])
+    config.config_files_read = _cache_list(data["config_files_read"])
+    config.config_file = _cache_str(data["config_file"])
+    config._config_contents = _cache_str(data["config_contents"])
+    return config
+
+
+def read_coverage_config(config_file, cache=False, **kwargs):
     """Read the coverage.py configuration.
 
     Arguments:
         config_file: a boolean or string, see the `Coverage` class for the
             tricky details.
+        cache: if true, use the configuration cached by an earlier process if
+            the config files haven't changed since, and cache it otherwise.
         all others: keyword arguments from the `Coverage` class, used for
             setting values in the configuration.
 
@@ -470,19 +667,31 @@ def read_coverage_config(config_file, **kwargs):
 
     """
     # Build the configuration from a number of sources:
-    # 1) defaults:
-    config = CoverageConfig()
-
-    # 2) from a file:
+    # 1) defaults, and 2) from a file, possibly cached:
+    config = None
     if config_file:
         files_to_try = config_files_to_try(config_file)
-
-        for fname, our_file, specified_file in files_to_try:
-            config_read = config.from_file(fname, our_file=our_file)
-            if config_read:
-                break
-            if specified_file:
-                raise CoverageException("Couldn't read '%s' as a config file" % fname)
+        if cache:
+            try:
+                cache_path = config_cache_path(files_to_try)
+            except CoverageException:
+                # There's nowhere safe to keep the cache.
+                cache = False
+        if cache:
+            files_key = config_files_key(files_to_try)
+            config = read_config_cache(cache_path, files_key)
+
+    if config is None:
+        config = CoverageConfig()
+        if config_file:
+            for fname, our_file, specified_file in files_to_try:
+                config_read = config.from_file(fname, our_file=our_file)
+                if config_read:
+                    break
+                if specified_file:
+                    raise CoverageException("Couldn't read '%s' as a config file" % fname)
+            if cache:
+                write_config_cache(cache_path, files_key, config)
 
     # 3) from environment variables:
     env_data_file = os.environ.get('COVERAGE_FILE')
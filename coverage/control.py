@@ -5,12 +5,10 @@
 
 import atexit
 import os
-import platform
 import sys
 import time
 
 from coverage import env
-from coverage.annotate import AnnotateReporter
 from coverage.backward import string_class, iitems
 from coverage.collector import Collector, CTracer
 from coverage.config import read_coverage_config
@@ -19,25 +17,22 @@ from coverage.data import CoverageData, combine_parallel_data
 from coverage.debug import DebugControl, write_formatted_info
 from coverage.disposition import disposition_debug_msg
 from coverage.files import PathAliases, set_relative_directory, abs_file
-from coverage.html import HtmlReporter
-from coverage.inorout import InOrOut
+from coverage.inorout import DirectoryCache, DispositionCache, InOrOut
 from coverage.misc import CoverageException, bool_or_none, join_regex
-from coverage.misc import file_be_gone, isolate_module
+from coverage.misc import isolate_module
 from coverage.plugin import FileReporter
 from coverage.plugin_support import Plugins
-from coverage.python import PythonFileReporter
-from coverage.results import Analysis, Numbers
-from coverage.summary import SummaryReporter
-from coverage.xmlreport import XmlReporter
 
-try:
-    from coverage.multiproc import patch_multiprocessing
-except ImportError:                                         # pragma: only jython
-    # Jython has no multiprocessing module.
-    patch_multiprocessing = None
+# Reporting modules, and the modules for less-used ways of measuring, are
+# imported only when they are needed.  Every process that starts coverage pays
+# for what is imported here, so keep it to what measurement needs.
 
 os = isolate_module(os)
 
+# How many of the files with the most trace events to show for
+# --debug=tracestats.
+TOP_FILE_EVENTS = 20
+
 
 class Coverage(object):
     """Programmatic access to coverage.py.
@@ -59,6 +54,7 @@ class Coverage(object):
         auto_data=False, timid=None, branch=None, config_file=True,
         source=None, omit=None, include=None, debug=None,
         concurrency=None, check_preimported=False, context=None,
+        _cache_config=False,
     ):
         """
         `data_file` is the base name of the data file to use, defaulting to
@@ -129,9 +125,11 @@ class Coverage(object):
             The `check_preimported` and `context` parameters.
 
         """
-        # Build our configuration from a number of sources.
+        # Build our configuration from a number of sources.  Processes started
+        # automatically (see `process_startup`) use _cache_config to share
+        # the work of reading the config files.
         self.config = read_coverage_config(
-            config_file=config_file,
+            config_file=config_file, cache=_cache_config,
             data_file=data_file, cover_pylib=cover_pylib, timid=timid,
             branch=branch, parallel=bool_or_none(data_suffix),
             source=source, run_omit=omit, run_include=include, debug=debug,
@@ -158,6 +156,7 @@ class Coverage(object):
         self._plugins = None
         self._inorout = None
         self._inorout_class = InOrOut
+        self._disposition_cache = None
         self._data_suffix = self._run_suffix = None
         self._exclude_re = None
         self._debug = None
@@ -339,8 +338,11 @@ class Coverage(object):
         # Construct the collector.
         concurrency = self.config.concurrency or []
         if "multiprocessing" in concurrency:
-            if not patch_multiprocessing:
-                raise CoverageException(                    # pragma: only jython
+            try:
+                from coverage.multiproc import patch_multiprocessing
+            except ImportError:                             # pragma: only jython
+                # Jython has no multiprocessing module.
+                raise CoverageException(
                     "multiprocessing is not supported on this Python"
                 )
             patch_multiprocessing(rcfile=self.config.config_file)
@@ -357,14 +359,45 @@ class Coverage(object):
                 "Don't understand dynamic_context setting: {!r}".format(self.config.dynamic_context)
             )
 
-        self._collector = Collector(
-            should_trace=self._should_trace,
-            check_include=self._check_include_omit_etc,
-            should_start_context=should_start_context,
-            timid=self.config.timid,
-            branch=self.config.branch,
-            warn=self._warn,
-            concurrency=concurrency,
+        if self.config.granularity not in ("line", "function"):
+            raise CoverageException(
+                "Don't understand granularity setting: {!r}".format(self.config.granularity)
+            )
+        if self.config.granularity == "function" and self.config.branch:
+            raise CoverageException("Can't measure branches with function granularity")
+        if self.config.max_memory < 0:
+            raise CoverageException(
+                "max_memory can't be negative: {!r}".format(self.config.max_memory)
+            )
+
+        if self.config.core == "trace":
+            self._collector = Collector(
+                should_trace=self._should_trace,
+                check_include=self._check_include_omit_etc,
+                should_start_context=should_start_context,
+                timid=self.config.timid,
+                branch=self.config.branch,
+                warn=self._warn,
+                concurrency=concurrency,
+                granularity=self.config.granularity,
+                max_memory=self.config.max_memory * 1024 * 1024,
+                )
+            if self._debug.should('tracestats'):
+                # Count the trace events in each file, to see where they come from.
+                self._collector.file_events = {}
+        elif self.config.core == "instrument":
+            if should_start_context:
+                raise CoverageException("Can't support dynamic contexts with core = instrument")
+            from coverage.instrument import Instrumenter
+            self._collector = Instrumenter(
+                should_trace=self._should_trace,
+                warn=self._warn,
+                granularity=self.config.granularity,
+                branch=self.config.branch,
+                )
+        else:
+            raise CoverageException(
+                "Don't understand core setting: {!r}".format(self.config.core)
             )
 
         suffix = self._data_suffix_specified
@@ -399,6 +432,31 @@ class Coverage(object):
         self._inorout.plugins = self._plugins
         self._inorout.disp_class = self._collector.file_disposition_class
 
+        if self.config.trace_cache:
+            self._inorout.dir_cache = DirectoryCache(self._inorout)
+            if hasattr(self._collector, "should_trace_cache"):
+                self._disposition_cache = DispositionCache(
+                    self._inorout, self._collector.file_disposition_class,
+                )
+
+        if self.config.shared_memory and hasattr(self._data, "share"):
+            # The files to share have to be known before any forking happens.
+            shared_files = [
+                file_path for file_path, plugin_name in self._inorout.find_unexecuted_files()
+                if plugin_name is None
+            ]
+            if not shared_files:
+                self._warn(
+                    "No source files found to share: shared_memory needs [run] source",
+                    slug="no-shared-files",
+                )
+            self._data.share(
+                shared_files, branch=self.config.branch, exclude=self._exclude_regex('exclude'),
+                granularity=self.config.granularity,
+            )
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(before=self._flush_before_fork)
+
         atexit.register(self._atexit)
 
     def _init_data(self, suffix):
@@ -407,7 +465,19 @@ class Coverage(object):
             # Create the data file.  We do this at construction time so that the
             # data file will be written into the directory where the process
             # started rather than wherever the process eventually chdir'd to.
-            self._data = CoverageData(
+            data_class = CoverageData
+            if suffix and self.config.aggregate:
+                from coverage.aggregate import AggregatingData, can_aggregate
+                if can_aggregate():
+                    data_class = AggregatingData
+            if suffix and data_class is CoverageData and self.config.shard:
+                from coverage.shard import ShardData
+                data_class = ShardData
+            if suffix and data_class is CoverageData and self.config.shared_memory:
+                from coverage.shared import SharedData, can_share
+                if can_share():
+                    data_class = SharedData
+            self._data = data_class(
                 basename=self.config.data_file,
                 suffix=suffix,
                 warn=self._warn,
@@ -442,6 +512,15 @@ class Coverage(object):
         if self._auto_load:
             self.load()
 
+        if self._disposition_cache:
+            # Start with the decisions made by earlier processes.
+            dispositions = self._disposition_cache.load()
+            self._collector.should_trace_cache.update(dispositions)
+            if self._debug.should('trace'):
+                self._debug.write("Loaded {} trace decisions from {!r}".format(
+                    len(dispositions), self._disposition_cache.filename,
+                ))
+
         self._collector.start()
         self._started = True
 
@@ -449,8 +528,20 @@ class Coverage(object):
         """Stop measuring code coverage."""
         if self._started:
             self._collector.stop()
+            if self._debug.should('tracestats'):
+                write_formatted_info(self._debug, "tracestats", self._tracer_stats_info())
         self._started = False
 
+    def _flush_before_fork(self):
+        """Give the data collected so far to the shared data before forking.
+
+        Otherwise the forked process would inherit the collector's data, and
+        save its parent's data as its own.
+
+        """
+        if self._collector:
+            self._collector.flush_data()
+
     def _atexit(self):
         """Clean up on process shutdown."""
         if self._debug.should("process"):
@@ -526,6 +617,8 @@ class Coverage(object):
         """Save the collected coverage data to the data file."""
         data = self.get_data()
         data.write()
+        if self._disposition_cache:
+            self._disposition_cache.save(self._collector.should_trace_cache)
 
     def combine(self, data_paths=None, strict=False):
         """Combine together a number of similarly-named coverage data files.
@@ -600,8 +693,11 @@ class Coverage(object):
             self._warn("No data was collected.", slug="no-data-collected")
 
         # Find files that were never executed at all.
+        unexecuted = {}
         for file_path, plugin_name in self._inorout.find_unexecuted_files():
-            self._data.touch_file(file_path, plugin_name)
+            unexecuted.setdefault(plugin_name, []).append(file_path)
+        for plugin_name, file_paths in iitems(unexecuted):
+            self._data.touch_files(file_paths, plugin_name)
 
         if self.config.note:
             self._data.add_run_info(note=self.config.note)
@@ -644,6 +740,8 @@ class Coverage(object):
         Returns an `Analysis` object.
 
         """
+        from coverage.results import Analysis, Numbers
+
         # All reporting comes through here, so do reporting initialization.
         self._init()
         Numbers.set_precision(self.config.precision)
@@ -676,6 +774,7 @@ class Coverage(object):
                 )
 
         if file_reporter == "python":
+            from coverage.python import PythonFileReporter
             file_reporter = PythonFileReporter(morf, self)
 
         return file_reporter
@@ -704,7 +803,7 @@ class Coverage(object):
     def report(
         self, morfs=None, show_missing=None, ignore_errors=None,
         file=None,                  # pylint: disable=redefined-builtin
-        omit=None, include=None, skip_covered=None,
+        omit=None, include=None, skip_covered=None, diff=None, rollup_depth=None,
     ):
         """Write a textual summary report to `file`.
 
@@ -724,6 +823,13 @@ class Coverage(object):
 
         If `skip_covered` is true, don't report on files with 100% coverage.
 
+        `diff` is the name of a file with a unified diff.  Only the files and
+        lines it adds or changes are reported, so the total is the coverage
+        of the changed lines.
+
+        `rollup_depth` is how many levels of directories to show totals for,
+        after the files.  The totals are collected as the files are reported.
+
         All of the arguments default to the settings read from the
         :ref:`configuration file <config>`.
 
@@ -732,8 +838,10 @@ class Coverage(object):
         """
         self.config.from_args(
             ignore_errors=ignore_errors, report_omit=omit, report_include=include,
-            show_missing=show_missing, skip_covered=skip_covered,
+            show_missing=show_missing, skip_covered=skip_covered, report_diff=diff,
+            rollup_depth=rollup_depth,
             )
+        from coverage.summary import SummaryReporter
         reporter = SummaryReporter(self, self.config)
         return reporter.report(morfs, outfile=file)
 
@@ -754,12 +862,13 @@ class Coverage(object):
         self.config.from_args(
             ignore_errors=ignore_errors, report_omit=omit, report_include=include
             )
+        from coverage.annotate import AnnotateReporter
         reporter = AnnotateReporter(self, self.config)
         reporter.report(morfs, directory=directory)
 
     def html_report(self, morfs=None, directory=None, ignore_errors=None,
                     omit=None, include=None, extra_css=None, title=None,
-                    skip_covered=None):
+                    skip_covered=None, diff=None, rollup_depth=None):
         """Generate an HTML report.
 
         The HTML is written to `directory`.  The file "index.html" is the
@@ -780,14 +889,64 @@ class Coverage(object):
         self.config.from_args(
             ignore_errors=ignore_errors, report_omit=omit, report_include=include,
             html_dir=directory, extra_css=extra_css, html_title=title,
-            skip_covered=skip_covered,
+            skip_covered=skip_covered, report_diff=diff, rollup_depth=rollup_depth,
             )
+        from coverage.html import HtmlReporter
         reporter = HtmlReporter(self, self.config)
         return reporter.report(morfs)
 
+    def html_server(self, morfs=None, host="localhost", port=8000,
+                    ignore_errors=None, omit=None, include=None, extra_css=None,
+                    title=None, skip_covered=None):
+        """Make a local HTTP server for an HTML report.
+
+        The index page is prepared right away, but the page for each file is
+        only rendered when it is requested, and the data file is read again if
+        it changes.  Nothing is written to disk.
+
+        `host` and `port` are the address to listen on.  Use port 0 to pick
+        any free port.  Call the server's ``serve_forever()`` method to serve
+        pages, and read its ``url`` attribute to find the index page.
+
+        See :meth:`html_report` for other arguments.
+
+        Returns an `HtmlServer` object.
+
+        """
+        self.config.from_args(
+            ignore_errors=ignore_errors, report_omit=omit, report_include=include,
+            extra_css=extra_css, html_title=title, skip_covered=skip_covered,
+            )
+        from coverage.htmlserver import HtmlServer, LazyHtmlReporter
+        reporter = LazyHtmlReporter(self, self.config)
+        reporter.prepare(morfs)
+        return HtmlServer(reporter, host, port)
+
+    def analysis_daemon(self, socket_path=None):
+        """Make a daemon to answer analysis requests on a Unix socket.
+
+        The daemon keeps the data and the parsed source files in memory, and
+        reads them again when they change, so editors and other tools can ask
+        for the analysis of a file quickly and often.  Call the daemon's
+        ``serve_forever()`` method to answer requests.
+
+        `socket_path` is the file name of the socket.  The default is the data
+        file name with ".sock" added.
+
+        Returns an `AnalysisDaemon` object.
+
+        """
+        import socket
+        if not hasattr(socket, "AF_UNIX"):
+            raise CoverageException("Unix sockets aren't available on this platform")
+        from coverage.daemon import AnalysisDaemon, WarmAnalyzer
+        if socket_path is None:
+            socket_path = self.config.data_file + ".sock"
+        return AnalysisDaemon(WarmAnalyzer(self), socket_path)
+
     def xml_report(
         self, morfs=None, outfile=None, ignore_errors=None,
-        omit=None, include=None,
+        omit=None, include=None, diff=None,
     ):
         """Generate an XML report of coverage results.
 
@@ -803,41 +962,87 @@ class Coverage(object):
         """
         self.config.from_args(
             ignore_errors=ignore_errors, report_omit=omit, report_include=include,
-            xml_output=outfile,
+            xml_output=outfile, report_diff=diff,
             )
-        file_to_close = None
-        delete_file = False
-        if self.config.xml_output:
-            if self.config.xml_output == '-':
-                outfile = sys.stdout
-            else:
-                # Ensure that the output directory is created; done here
-                # because this report pre-opens the output file.
-                # HTMLReport does this using the Report plumbing because
-                # its task is more complex, being multiple files.
-                output_dir = os.path.dirname(self.config.xml_output)
-                if output_dir and not os.path.isdir(output_dir):
-                    os.makedirs(output_dir)
-                open_kwargs = {}
-                if env.PY3:
-                    open_kwargs['encoding'] = 'utf8'
-                outfile = open(self.config.xml_output, "w", **open_kwargs)
-                file_to_close = outfile
-        try:
-            reporter = XmlReporter(self, self.config)
-            return reporter.report(morfs, outfile=outfile)
-        except CoverageException:
-            delete_file = True
-            raise
-        finally:
-            if file_to_close:
-                file_to_close.close()
-                if delete_file:
-                    file_be_gone(self.config.xml_output)
+        from coverage.report import render_report
+        from coverage.xmlreport import XmlReporter
+        return render_report(self.config.xml_output, XmlReporter(self, self.config), morfs)
+
+    def json_report(
+        self, morfs=None, outfile=None, ignore_errors=None,
+        omit=None, include=None, contexts=None, diff=None, rollup_depth=None,
+    ):
+        """Generate a JSON report of coverage results.
+
+        Each module in `morfs` is included in the report.  `outfile` is the
+        path to write the file to, "-" will write to stdout.  If `contexts` is
+        true, the report includes the contexts that ran each line.
+
+        See :meth:`report` for other arguments.
+
+        Returns a float, the total percentage covered.
+
+        """
+        self.config.from_args(
+            ignore_errors=ignore_errors, report_omit=omit, report_include=include,
+            json_output=outfile, json_show_contexts=contexts, report_diff=diff,
+            rollup_depth=rollup_depth,
+            )
+        from coverage.jsonreport import JsonReporter
+        from coverage.report import render_report
+        return render_report(self.config.json_output, JsonReporter(self, self.config), morfs)
+
+    def lcov_report(
+        self, morfs=None, outfile=None, ignore_errors=None,
+        omit=None, include=None, diff=None,
+    ):
+        """Generate an LCOV tracefile of coverage results.
+
+        Each module in `morfs` is included in the report.  `outfile` is the
+        path to write the file to, "-" will write to stdout.
+
+        See :meth:`report` for other arguments.
+
+        Returns a float, the total percentage covered.
+
+        """
+        self.config.from_args(
+            ignore_errors=ignore_errors, report_omit=omit, report_include=include,
+            lcov_output=outfile, report_diff=diff,
+            )
+        from coverage.lcovreport import LcovReporter
+        from coverage.report import render_report
+        return render_report(self.config.lcov_output, LcovReporter(self, self.config), morfs)
+
+    def compare(self, before, after, with_statements=False):
+        """Compare the coverage in two data files.
+
+        `before` and `after` are the file names of the data files.  The lines
+        and arcs are compared in the data, without reading any source files
+        unless `with_statements` is true.  Then only the current statements
+        and arcs of each file are compared.
+
+        Returns a dict mapping file names to dicts of the changes, as described
+        in :func:`coverage.compare.compare_data`.
+
+        """
+        self._init()
+        self._post_init()
+        datas = []
+        for filename in [before, after]:
+            if not os.path.exists(filename):
+                raise CoverageException("Couldn't compare data file %r: no such file" % filename)
+            data = CoverageData(basename=filename, warn=self._warn, debug=self._debug)
+            data.read()
+            datas.append(data)
+
+        from coverage.compare import compare_data
+        return compare_data(datas[0], datas[1], coverage=self if with_statements else None)
 
     def sys_info(self):
         """Return a list of (key, value) pairs showing internal information."""
 
+        import platform
         import coverage as covmod
 
         self._init()
@@ -884,11 +1089,35 @@ class Coverage(object):
             ('command_line', " ".join(getattr(sys, 'argv', ['-none-']))),
             ]
 
+        info.extend(self._tracer_stats_info())
+
         if self._inorout:
             info.extend(self._inorout.sys_info())
 
         return info
 
+    def _tracer_stats_info(self):
+        """The tracer's counters, memory use, and the busiest files.
+
+        Returns a list of (key, value) pairs, for sys_info and debug output.
+
+        """
+        if not self._collector:
+            return [('tracer_stats', "-none-")]
+        stats = self._collector.get_stats()
+        info = [
+            ('tracer_stats', sorted("%s = %d" % kv for kv in iitems(stats)) or "-none-"),
+            ('collector_memory', self._collector.memory_estimate()),
+            ('memory_spills', self._collector.memory_spills),
+        ]
+        file_events = self._collector.file_events
+        if file_events:
+            busiest = sorted(iitems(file_events), key=lambda kv: (-kv[1], kv[0]))
+            info.append(
+                ('file_events', ["%d %s" % (count, f) for f, count in busiest[:TOP_FILE_EVENTS]])
+            )
+        return info
+
 
 # Mega debugging...
 if int(os.environ.get("COVERAGE_DEBUG_CALLS", 0)):              # pragma: debugging
@@ -916,6 +1145,9 @@ def process_startup():
 
         import coverage; coverage.process_startup()
 
+       or run ``coverage install-pth`` to write one that only imports
+       coverage.py when COVERAGE_PROCESS_START is set.
+
     Returns the :class:`Coverage` instance that was started, or None if it was
     not started by this call.
 
@@ -940,7 +1172,7 @@ def process_startup():
         # started coverage.py in this process.  Nothing to do.
         return None
 
-    cov = Coverage(config_file=cps)
+    cov = Coverage(config_file=cps, _cache_config=True)
     process_startup.coverage = cov
     cov._warn_no_data = False
     cov._warn_unimported_source = False
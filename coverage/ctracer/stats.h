@@ -13,18 +13,20 @@
 #endif
 
 typedef struct Stats {
-    unsigned int calls;     /* Need at least one member, but the rest only if needed. */
-#if COLLECT_STATS
+    /* These are always counted: they are cheap, and show where the time goes. */
+    unsigned int calls;
     unsigned int lines;
     unsigned int returns;
+    unsigned int files;
+    unsigned int dynamic_calls;
+    unsigned int start_context_calls;
+#if COLLECT_STATS
     unsigned int exceptions;
     unsigned int others;
-    unsigned int files;
     unsigned int missed_returns;
     unsigned int stack_reallocs;
     unsigned int errors;
     unsigned int pycalls;
-    unsigned int start_context_calls;
 #endif
 } Stats;
 
@@ -74,6 +74,12 @@ CTracer_init(CTracer *self, PyObject *args_unused, PyObject *kwds_unused)
     self->context = Py_None;
     Py_INCREF(self->context);
 
+    self->file_events = Py_None;
+    Py_INCREF(self->file_events);
+
+    self->check_memory = Py_None;
+    Py_INCREF(self->check_memory);
+
     ret = RET_OK;
     goto ok;
 
@@ -90,7 +96,12 @@ CTracer_dealloc(CTracer *self)
     int i;
 
     if (self->started) {
-        PyEval_SetTrace(NULL, NULL);
+        if (self->tracing_functions) {
+            PyEval_SetProfile(NULL, NULL);
+        }
+        else {
+            PyEval_SetTrace(NULL, NULL);
+        }
     }
 
     Py_XDECREF(self->should_trace);
@@ -103,6 +114,8 @@ CTracer_dealloc(CTracer *self)
     Py_XDECREF(self->should_start_context);
     Py_XDECREF(self->switch_context);
     Py_XDECREF(self->context);
+    Py_XDECREF(self->file_events);
+    Py_XDECREF(self->check_memory);
 
     DataStack_dealloc(&self->stats, &self->data_stack);
     if (self->data_stacks) {
@@ -340,7 +353,19 @@ CTracer_handle_call(CTracer *self, PyFrameObject *frame)
 
     CFileDisposition * pdisp = NULL;
 
-    STATS( self->stats.calls++; )
+    self->stats.calls++;
+
+    /* Every so often, let the collector see how much data it has. */
+    if (self->check_memory != NULL && self->check_memory != Py_None &&
+        self->stats.calls % MEMORY_CHECK_CALLS == 0) {
+        PyObject * val;
+        STATS( self->stats.pycalls++; )
+        val = PyObject_CallFunctionObjArgs(self->check_memory, NULL);
+        if (val == NULL) {
+            goto error;
+        }
+        Py_DECREF(val);
+    }
 
     /* Grow the stack. */
     if (CTracer_set_pdata_stack(self) < 0) {
@@ -355,7 +380,7 @@ CTracer_handle_call(CTracer *self, PyFrameObject *frame)
     if (self->should_start_context != Py_None && self->context == Py_None) {
         PyObject * context;
         /* We're looking for our context, ask should_start_context if this is the start. */
-        STATS( self->stats.start_context_calls++; )
+        self->stats.start_context_calls++;
         STATS( self->stats.pycalls++; )
         context = PyObject_CallFunctionObjArgs(self->should_start_context, frame, NULL);
         if (context == NULL) {
@@ -389,7 +414,7 @@ CTracer_handle_call(CTracer *self, PyFrameObject *frame)
         if (PyErr_Occurred()) {
             goto error;
         }
-        STATS( self->stats.files++; )
+        self->stats.files++;
 
         /* We've never considered this file before. */
         /* Ask should_trace about it. */
@@ -445,6 +470,7 @@ CTracer_handle_call(CTracer *self, PyFrameObject *frame)
             goto error;
         }
         if (has_dynamic_filename == Py_True) {
+            self->stats.dynamic_calls++;
             STATS( self->stats.pycalls++; )
             next_tracename = PyObject_CallMethodObjArgs(
                 file_tracer, str_dynamic_source_filename,
@@ -470,7 +496,7 @@ CTracer_handle_call(CTracer *self, PyFrameObject *frame)
                     if (PyErr_Occurred()) {
                         goto error;
                     }
-                    STATS( self->stats.files++; )
+                    self->stats.files++;
                     STATS( self->stats.pycalls++; )
                     should_include_bool = PyObject_CallFunctionObjArgs(self->check_include, tracename, frame, NULL);
                     if (should_include_bool == NULL) {
@@ -528,6 +554,24 @@ CTracer_handle_call(CTracer *self, PyFrameObject *frame)
         self->pcur_entry->file_data = file_data;
         self->pcur_entry->file_tracer = file_tracer;
 
+        /* With function granularity, the call is all we record, keyed by
+         * the first line of the code object.  Re-entering a generator records
+         * the same key again.  Module, lambda, and comprehension code objects
+         * have names like "<module>", and aren't counted as functions.
+         */
+        if (self->tracing_functions &&
+                !MyText_StartsWithChar(frame->f_code->co_name, '<')) {
+            PyObject * this_line = MyInt_FromInt(frame->f_code->co_firstlineno);
+            if (this_line == NULL) {
+                goto error;
+            }
+            ret2 = PyDict_SetItem(file_data, this_line, Py_None);
+            Py_DECREF(this_line);
+            if (ret2 < 0) {
+                goto error;
+            }
+        }
+
         SHOWLOG(self->pdata_stack->depth, frame->f_lineno, filename, "traced");
     }
     else {
@@ -539,9 +583,11 @@ CTracer_handle_call(CTracer *self, PyFrameObject *frame)
 
     self->pcur_entry->disposition = disposition;
 
-    /* Make the frame right in case settrace(gettrace()) happens. */
-    Py_INCREF(self);
-    My_XSETREF(frame->f_trace, (PyObject*)self);
+    if (!self->tracing_functions) {
+        /* Make the frame right in case settrace(gettrace()) happens. */
+        Py_INCREF(self);
+        My_XSETREF(frame->f_trace, (PyObject*)self);
+    }
 
     /* A call event is really a "start frame" event, and can happen for
      * re-entering a generator also.  f_lasti is -1 for a true call, and a
@@ -672,7 +718,7 @@ CTracer_handle_line(CTracer *self, PyFrameObject *frame)
     int ret = RET_ERROR;
     int ret2;
 
-    STATS( self->stats.lines++; )
+    self->stats.lines++;
     if (self->pdata_stack->depth >= 0) {
         SHOWLOG(self->pdata_stack->depth, frame->f_lineno, frame->f_code->co_filename, "line");
         if (self->pcur_entry->file_data) {
@@ -739,7 +785,7 @@ CTracer_handle_return(CTracer *self, PyFrameObject *frame)
 {
     int ret = RET_ERROR;
 
-    STATS( self->stats.returns++; )
+    self->stats.returns++;
     /* A near-copy of this code is above in the missing-return handler. */
     if (CTracer_set_pdata_stack(self) < 0) {
         goto error;
@@ -820,6 +866,42 @@ CTracer_handle_exception(CTracer *self, PyFrameObject *frame)
     return RET_OK;
 }
 
+/* Count an event for the frame's file in the file_events dictionary. */
+static int
+CTracer_count_file_event(CTracer *self, PyFrameObject *frame)
+{
+    int ret = RET_ERROR;
+    int count = 0;
+    PyObject * filename = frame->f_code->co_filename;   /* Borrowed. */
+    PyObject * old_count = NULL;                        /* Borrowed. */
+    PyObject * new_count = NULL;
+
+    old_count = PyDict_GetItem(self->file_events, filename);
+    if (old_count != NULL) {
+        count = MyInt_AsInt(old_count);
+        if (count == -1 && PyErr_Occurred()) {
+            goto error;
+        }
+    }
+    else if (PyErr_Occurred()) {
+        goto error;
+    }
+
+    new_count = MyInt_FromInt(count + 1);
+    if (new_count == NULL) {
+        goto error;
+    }
+    if (PyDict_SetItem(self->file_events, filename, new_count) < 0) {
+        goto error;
+    }
+
+    ret = RET_OK;
+
+error:
+    Py_XDECREF(new_count);
+    return ret;
+}
+
 /*
  * The Trace Function
  */
@@ -836,7 +918,12 @@ CTracer_trace(CTracer *self, PyFrameObject *frame, int what, PyObject *arg_unuse
         /* If CTracer.stop() has been called from another thread, the tracer
            is still active in the current thread. Let's deactivate ourselves
            now. */
-        PyEval_SetTrace(NULL, NULL);
+        if (self->tracing_functions) {
+            PyEval_SetProfile(NULL, NULL);
+        }
+        else {
+            PyEval_SetTrace(NULL, NULL);
+        }
         return RET_OK;
     }
 
@@ -867,6 +954,12 @@ CTracer_trace(CTracer *self, PyFrameObject *frame, int what, PyObject *arg_unuse
 
     self->activity = TRUE;
 
+    if (self->file_events != NULL && PyDict_Check(self->file_events)) {
+        if (CTracer_count_file_event(self, frame) < 0) {
+            goto error;
+        }
+    }
+
     switch (what) {
     case PyTrace_CALL:
         if (CTracer_handle_call(self, frame) < 0) {
@@ -1013,7 +1106,20 @@ CTracer_call(CTracer *self, PyObject *args, PyObject *kwds)
                         # and it's as if the settrace never happened.
         */
     if (what == PyTrace_CALL) {
-        PyEval_SetTrace((Py_tracefunc)CTracer_trace, (PyObject*)self);
+        if (self->tracing_functions) {
+            /* We only need call and return events, which the profile hook
+               provides without the cost of line events.  Don't install
+               ourselves as the frame's local trace function. */
+            PyEval_SetProfile((Py_tracefunc)CTracer_trace, (PyObject*)self);
+            if (ret != NULL) {
+                Py_DECREF(ret);
+                Py_INCREF(Py_None);
+                ret = Py_None;
+            }
+        }
+        else {
+            PyEval_SetTrace((Py_tracefunc)CTracer_trace, (PyObject*)self);
+        }
     }
 
 done:
@@ -1023,9 +1129,16 @@ done:
 static PyObject *
 CTracer_start(CTracer *self, PyObject *args_unused)
 {
-    PyEval_SetTrace((Py_tracefunc)CTracer_trace, (PyObject*)self);
-    self->started = TRUE;
     self->tracing_arcs = self->trace_arcs && PyObject_IsTrue(self->trace_arcs);
+    self->tracing_functions = self->trace_functions && PyObject_IsTrue(self->trace_functions);
+    if (self->tracing_functions) {
+        /* Function granularity only needs call and return events. */
+        PyEval_SetProfile((Py_tracefunc)CTracer_trace, (PyObject*)self);
+    }
+    else {
+        PyEval_SetTrace((Py_tracefunc)CTracer_trace, (PyObject*)self);
+    }
+    self->started = TRUE;
 
     /* start() returns a trace function usable with sys.settrace() */
     Py_INCREF(self);
@@ -1069,22 +1182,31 @@ CTracer_get_stats(CTracer *self, PyObject *args_unused)
 {
 #if COLLECT_STATS
     return Py_BuildValue(
-        "{sI,sI,sI,sI,sI,sI,sI,sI,si,sI,sI,sI}",
+        "{sI,sI,sI,sI,sI,sI,sI,sI,sI,sI,si,sI,sI}",
         "calls", self->stats.calls,
         "lines", self->stats.lines,
         "returns", self->stats.returns,
+        "files", self->stats.files,
+        "dynamic_calls", self->stats.dynamic_calls,
+        "start_context_calls", self->stats.start_context_calls,
         "exceptions", self->stats.exceptions,
         "others", self->stats.others,
-        "files", self->stats.files,
         "missed_returns", self->stats.missed_returns,
         "stack_reallocs", self->stats.stack_reallocs,
         "stack_alloc", self->pdata_stack->alloc,
         "errors", self->stats.errors,
-        "pycalls", self->stats.pycalls,
-        "start_context_calls", self->stats.start_context_calls
+        "pycalls", self->stats.pycalls
         );
 #else
-    Py_RETURN_NONE;
+    return Py_BuildValue(
+        "{sI,sI,sI,sI,sI,sI}",
+        "calls", self->stats.calls,
+        "lines", self->stats.lines,
+        "returns", self->stats.returns,
+        "files", self->stats.files,
+        "dynamic_calls", self->stats.dynamic_calls,
+        "start_context_calls", self->stats.start_context_calls
+        );
 #endif /* COLLECT_STATS */
 }
 
@@ -1114,12 +1236,21 @@ CTracer_members[] = {
     { "trace_arcs",         T_OBJECT, offsetof(CTracer, trace_arcs), 0,
             PyDoc_STR("Should we trace arcs, or just lines?") },
 
+    { "trace_functions",    T_OBJECT, offsetof(CTracer, trace_functions), 0,
+            PyDoc_STR("Should we only record function calls?") },
+
     { "should_start_context", T_OBJECT, offsetof(CTracer, should_start_context), 0,
             PyDoc_STR("Function for starting contexts.") },
 
     { "switch_context",     T_OBJECT, offsetof(CTracer, switch_context), 0,
             PyDoc_STR("Function for switching to a new context.") },
 
+    { "file_events",        T_OBJECT, offsetof(CTracer, file_events), 0,
+            PyDoc_STR("Dictionary counting events per file, or None.") },
+
+    { "check_memory",       T_OBJECT, offsetof(CTracer, check_memory), 0,
+            PyDoc_STR("Function to call every so often to limit the data size, or None.") },
+
     { NULL }
 };
 
@@ -11,6 +11,9 @@
 
 #include "datastack.h"
 
+/* How many calls between calls to check_memory. */
+#define MEMORY_CHECK_CALLS  100000
+
 /* The CTracer type. */
 
 typedef struct CTracer {
@@ -25,13 +28,18 @@ typedef struct CTracer {
     PyObject * file_tracers;
     PyObject * should_trace_cache;
     PyObject * trace_arcs;
+    PyObject * trace_functions;
     PyObject * should_start_context;
     PyObject * switch_context;
+    PyObject * file_events;
+    PyObject * check_memory;
 
     /* Has the tracer been started? */
     BOOL started;
     /* Are we tracing arcs, or just lines? */
     BOOL tracing_arcs;
+    /* Are we only recording function calls? */
+    BOOL tracing_functions;
     /* Have we had any activity? */
     BOOL activity;
     /* The current dynamic context. */
@@ -9,7 +9,7 @@
 /* Compile-time debugging helpers */
 #undef WHAT_LOG         /* Define to log the WHAT params in the trace function. */
 #undef TRACE_LOG        /* Define to log our bookkeeping. */
-#undef COLLECT_STATS    /* Collect counters: stats are printed when tracer is stopped. */
+#undef COLLECT_STATS    /* Collect more counters than the ones always in get_stats(). */
 #undef DO_NOTHING       /* Define this to make the tracer do nothing. */
 
 /* Py 2.x and 3.x compatibility */
@@ -25,6 +25,7 @@
 #define MyInt_FromInt(i)                PyLong_FromLong((long)i)
 #define MyInt_AsInt(o)                  (int)PyLong_AsLong(o)
 #define MyText_InternFromString(s)      PyUnicode_InternFromString(s)
+#define MyText_StartsWithChar(o, c)     (PyUnicode_GET_LENGTH(o) > 0 && PyUnicode_READ_CHAR(o, 0) == (c))
 
 #define MyType_HEAD_INIT                PyVarObject_HEAD_INIT(NULL, 0)
 
@@ -39,6 +40,7 @@
 #define MyInt_FromInt(i)                PyInt_FromLong((long)i)
 #define MyInt_AsInt(o)                  (int)PyInt_AsLong(o)
 #define MyText_InternFromString(s)      PyString_InternFromString(s)
+#define MyText_StartsWithChar(o, c)     (PyString_GET_SIZE(o) > 0 && PyString_AS_STRING(o)[0] == (c))
 
 #define MyType_HEAD_INIT                PyObject_HEAD_INIT(NULL)  0,
 
@@ -0,0 +1,195 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Answer analysis requests from a long-lived process, for editors and IDEs."""
+
+import errno
+import json
+import os
+import socket
+import stat
+import threading
+
+# SocketServer was renamed in Python 3.  It's imported here rather than in
+# coverage.backward, so that processes being measured don't import it.
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+from coverage.backward import iitems, string_class
+from coverage.files import abs_file
+from coverage.misc import CoverageException, isolate_module
+
+os = isolate_module(os)
+
+
+def file_stamp(filename):
+    """Get a value that changes when `filename` changes, or None if it's missing."""
+    try:
+        st = os.stat(filename)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+class WarmAnalyzer(object):
+    """Analyze files, keeping the data and the parsed sources in memory.
+
+    The data file is read again when it changes, and a source file is parsed
+    again when it changes.  Otherwise, the analysis of a file is kept, so
+    asking again is only a stat of the two files.
+
+    """
+
+    def __init__(self, cov):
+        self.coverage = cov
+        self.data_stamp = file_stamp(cov.config.data_file)
+
+        # Maps absolute file names to (source stamp, FileReporter) pairs.
+        self.reporters = {}
+
+        # Maps absolute file names to (source stamp, analysis dict) pairs,
+        # for the data as of `data_stamp`.
+        self.analyses = {}
+
+    def check_data(self):
+        """Read the data file again if it has changed."""
+        stamp = file_stamp(self.coverage.config.data_file)
+        if stamp != self.data_stamp:
+            # The file may have been replaced, so don't use the old data object.
+            self.coverage._data = None
+            self.coverage.load()
+            self.data_stamp = stamp
+            self.analyses = {}
+
+    def file_reporter(self, filename, stamp):
+        """Get the FileReporter for `filename`, a new one if the source changed."""
+        cached = self.reporters.get(filename)
+        if cached is None or cached[0] != stamp:
+            cached = (stamp, self.coverage._get_file_reporter(filename))
+            self.reporters[filename] = cached
+        return cached[1]
+
+    def analysis(self, filename):
+        """Analyze `filename` with the current data.
+
+        Returns a dict with the same information as
+        :meth:`coverage.Coverage.analysis2`, the percentage covered, and for
+        branch data, the missing branches.
+
+        """
+        self.check_data()
+        filename = abs_file(filename)
+        stamp = file_stamp(filename)
+        cached = self.analyses.get(filename)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+
+        analysis = self.coverage._analyze(self.file_reporter(filename, stamp))
+        result = {
+            'file': analysis.filename,
+            'statements': sorted(analysis.statements),
+            'excluded': sorted(analysis.excluded),
+            'missing': sorted(analysis.missing),
+            'missing_formatted': analysis.missing_formatted(),
+            'percent_covered': analysis.numbers.pc_covered,
+        }
+        if analysis.has_arcs():
+            result['missing_branches'] = dict(
+                (str(l1), sorted(l2s)) for l1, l2s in iitems(analysis.missing_branch_arcs())
+            )
+        self.analyses[filename] = (stamp, result)
+        return result
+
+
+class AnalysisRequestHandler(socketserver.StreamRequestHandler):
+    """Answer each line of JSON read from a connection with a line of JSON."""
+
+    def handle(self):
+        """Answer requests until the client closes the connection."""
+        for line in iter(self.rfile.readline, b""):
+            if not line.strip():
+                continue
+            response = self.server.answer(line.decode('utf-8'))
+            self.wfile.write(json.dumps(response, sort_keys=True).encode('utf-8') + b"\n")
+            self.wfile.flush()
+
+
+class AnalysisDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A server on a Unix socket for a `WarmAnalyzer`.
+
+    Each request is a line of JSON like ``{"command": "analysis", "file":
+    "path/to/file.py"}``, and the response is a line of JSON, the analysis
+    dict or ``{"error": "message"}``.  A client can send many requests on one
+    connection.  Connections are handled in threads, but requests are answered
+    one at a time, since they share the analyzer.
+
+    """
+
+    daemon_threads = True
+
+    def __init__(self, analyzer, socket_path):
+        self.analyzer = analyzer
+        self.socket_path = socket_path
+        self.lock = threading.Lock()
+        if is_socket(socket_path) and not socket_in_use(socket_path):
+            # Left over from a daemon that didn't stop cleanly.
+            os.remove(socket_path)
+        try:
+            socketserver.UnixStreamServer.__init__(self, socket_path, AnalysisRequestHandler)
+        except socket.error as err:
+            raise CoverageException("Couldn't listen on %r: %s" % (socket_path, err))
+
+    def answer(self, request):
+        """Make the response dict for `request`, a line of JSON."""
+        try:
+            request = json.loads(request)
+        except ValueError as err:
+            return {'error': "Couldn't parse request: %s" % err}
+        if not isinstance(request, dict):
+            return {'error': "Request should be a JSON object"}
+
+        command = request.get('command')
+        if command == 'analysis':
+            if 'file' not in request:
+                return {'error': "Need a file to analyze"}
+            if not isinstance(request['file'], string_class):
+                return {'error': "File should be a string: %r" % (request['file'],)}
+            with self.lock:
+                try:
+                    return self.analyzer.analysis(request['file'])
+                except CoverageException as err:
+                    return {'error': str(err)}
+                except Exception as err:        # pylint: disable=broad-except
+                    # One bad request shouldn't drop the connection.
+                    return {'error': "Couldn't analyze %r: %s" % (request['file'], err)}
+        return {'error': "Unknown command: %r" % (command,)}
+
+    def server_close(self):
+        """Stop listening, and remove the socket file."""
+        socketserver.UnixStreamServer.server_close(self)
+        if is_socket(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def is_socket(path):
+    """Is `path` a Unix socket?"""
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+def socket_in_use(socket_path):
+    """Is something listening on the Unix socket `socket_path`?"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except socket.error as err:
+        if err.errno in (errno.ECONNREFUSED, errno.ENOENT):
+            return False
+        raise
+    finally:
+        sock.close()
+    return True
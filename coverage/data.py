@@ -76,7 +76,10 @@ class CoverageJsonData(object):
     or :meth:`file_tracer`.  Run information is available with
     :meth:`run_infos`.
 
-    The :meth:`has_arcs` method indicates whether arc data is available.  You
+    The :meth:`has_arcs` method indicates whether arc data is available, and
+    :meth:`has_functions` whether the data was measured with function
+    granularity, in which case the lines are the first lines of the functions
+    that were called.  You
     can get a list of the files in the data with :meth:`measured_files`.
     A summary of the line data is available from :meth:`line_counts`.  As with
     most Python containers, you can determine if there is any data at all by
@@ -84,11 +87,13 @@ class CoverageJsonData(object):
 
     Most data files will be created by coverage.py itself, but you can use
     methods here to create data files if you like.  The :meth:`add_lines`,
-    :meth:`add_arcs`, and :meth:`add_file_tracers` methods add data, in ways
+    :meth:`add_arcs`, :meth:`add_functions`, and :meth:`add_file_tracers`
+    methods add data, in ways
     that are convenient for coverage.py.  The :meth:`add_run_info` method adds
     key-value pairs to the run information.
 
-    To add a source file without any measured data, use :meth:`touch_file`.
+    To add a source file without any measured data, use :meth:`touch_file`,
+    or :meth:`touch_files` for a list of them.
 
     Write the data to its file with :meth:`write`.
 
@@ -109,6 +114,9 @@ class CoverageJsonData(object):
     #
     #         { "file1": [[17,23], [17,25], [25,26]], ... }
     #
+    #     * functions: true if the "lines" are the first lines of functions
+    #       called, measured with function granularity.
+    #
     #     * file_tracers: a dict mapping file names to plugin names::
     #
     #         { "file1": "django.coverage", ... }
@@ -153,6 +161,10 @@ class CoverageJsonData(object):
         #
         self._arcs = None
 
+        # True if `_lines` holds function data: the first line numbers of the
+        # functions that were called.
+        self._functions = False
+
         # A map from canonical source file name to a plugin module name:
         #
         #   { 'filename1.py': 'django.coverage', ... }
@@ -186,6 +198,17 @@ class CoverageJsonData(object):
         """
         return self._has_arcs()
 
+    def has_functions(self):
+        """Does this data have function data?
+
+        Function data is only available if function granularity was used
+        during collection.  It's available from :meth:`lines`.
+
+        Returns a boolean.
+
+        """
+        return self._functions
+
     def lines(self, filename):
         """Get the list of lines executed for a file.
 
@@ -227,6 +250,51 @@ class CoverageJsonData(object):
                 return self._arcs[filename]
         return None
 
+    def measured_contexts(self):
+        """A set of all contexts that have been measured.
+
+        This data format doesn't record contexts, so everything was measured
+        in the empty context.
+
+        """
+        return set([""]) if self else set()
+
+    def contexts_by_lineno(self, filename):
+        """Get the contexts for each line executed in a file.
+
+        Returns a dict mapping line numbers to lists of context names.  Every
+        line is in the empty context.
+
+        """
+        return dict((lineno, [""]) for lineno in self.lines(filename) or [])
+
+    def changes_since(self, base):
+        """Find the lines and arcs that differ between `base` and this data.
+
+        `base` is another CoverageData.  Returns a dict mapping file names to
+        dicts of sorted lists: "lines_gained", "lines_lost", and if both have
+        arc data, "arcs_gained" and "arcs_lost".  Files without differences
+        aren't included.
+
+        """
+        compare_arcs = self.has_arcs() and base.has_arcs()
+        changes = {}
+        for filename in self.measured_files() | base.measured_files():
+            here_lines = set(self.lines(filename) or ())
+            base_lines = set(base.lines(filename) or ())
+            file_changes = {
+                'lines_gained': sorted(here_lines - base_lines),
+                'lines_lost': sorted(base_lines - here_lines),
+            }
+            if compare_arcs:
+                here_arcs = set(self.arcs(filename) or ())
+                base_arcs = set(base.arcs(filename) or ())
+                file_changes['arcs_gained'] = sorted(here_arcs - base_arcs)
+                file_changes['arcs_lost'] = sorted(base_arcs - here_arcs)
+            if any(file_changes.values()):
+                changes[filename] = file_changes
+        return changes
+
     def file_tracer(self, filename):
         """Get the plugin name of the file tracer for a file.
 
@@ -287,6 +355,7 @@ class CoverageJsonData(object):
                 (fname, [tuple(pair) for pair in arcs])
                 for fname, arcs in iitems(data['arcs'])
             )
+        self._functions = bool(data.get('functions', False))
         self._file_tracers = data.get('file_tracers', {})
         self._runs = data.get('runs', [])
 
@@ -345,7 +414,35 @@ class CoverageJsonData(object):
             ))
         if self._has_arcs():
             raise CoverageException("Can't add lines to existing arc data")
+        if self._functions:
+            raise CoverageException("Can't add lines to existing function data")
 
+        self._add_line_data(line_data)
+
+    def add_functions(self, function_data):
+        """Add measured function data.
+
+        `function_data` is a dictionary mapping file names to dictionaries::
+
+            { filename: { first_lineno: None, ... }, ...}
+
+        Each line number is the first line of a function that was called.
+
+        """
+        if self._debug.should('dataop'):
+            self._debug.write("Adding functions: %d files, %d functions total" % (
+                len(function_data), sum(len(lines) for lines in function_data.values())
+            ))
+        if self._has_arcs():
+            raise CoverageException("Can't add functions to existing arc data")
+        if self._has_lines() and not self._functions:
+            raise CoverageException("Can't add functions to existing line data")
+
+        self._functions = True
+        self._add_line_data(function_data)
+
+    def _add_line_data(self, line_data):
+        """Merge `line_data` into `_lines`."""
         if self._lines is None:
             self._lines = {}
         for filename, linenos in iitems(line_data):
@@ -430,8 +527,16 @@ class CoverageJsonData(object):
         `plugin_name` is the name of the plugin resposible for this file. It is used
         to associate the right filereporter, etc.
         """
+        self.touch_files([filename], plugin_name)
+
+    def touch_files(self, filenames, plugin_name=""):
+        """Ensure that `filenames` appear in the data, empty if needed.
+
+        `plugin_name` is the name of the plugin resposible for these files. It is used
+        to associate the right filereporter, etc.
+        """
         if self._debug.should('dataop'):
-            self._debug.write("Touching %r" % (filename,))
+            self._debug.write("Touching %r" % (filenames,))
         if not self._has_arcs() and not self._has_lines():
             raise CoverageException("Can't touch files in an empty CoverageData")
 
@@ -439,10 +544,11 @@ class CoverageJsonData(object):
             where = self._arcs
         else:
             where = self._lines
-        where.setdefault(filename, [])
-        if plugin_name:
-            # Set the tracer for this file
-            self._file_tracers[filename] = plugin_name
+        for filename in filenames:
+            where.setdefault(filename, [])
+            if plugin_name:
+                # Set the tracer for this file
+                self._file_tracers[filename] = plugin_name
 
         self._validate()
 
@@ -477,6 +583,8 @@ class CoverageJsonData(object):
 
         if self._has_lines():
             file_data['lines'] = self._lines
+            if self._functions:
+                file_data['functions'] = True
 
         if self._file_tracers:
             file_data['file_tracers'] = self._file_tracers
@@ -504,6 +612,7 @@ class CoverageJsonData(object):
         """
         self._lines = None
         self._arcs = None
+        self._functions = False
         self._file_tracers = {}
         self._runs = []
         self._validate()
@@ -531,15 +640,19 @@ class CoverageJsonData(object):
             raise CoverageException("Can't combine arc data with line data")
         if self._has_arcs() and other_data._has_lines():
             raise CoverageException("Can't combine line data with arc data")
+        if self._has_lines() and other_data._has_lines():
+            if self._functions != other_data._functions:
+                raise CoverageException("Can't combine function data with line data")
 
         aliases = aliases or PathAliases()
+        mapped = aliases.map_all(other_data.measured_files())
 
         # _file_tracers: only have a string, so they have to agree.
         # Have to do these first, so that our examination of self._arcs and
         # self._lines won't be confused by data updated from other_data.
         for filename in other_data.measured_files():
             other_plugin = other_data.file_tracer(filename)
-            filename = aliases.map(filename)
+            filename = mapped[filename]
             this_plugin = self.file_tracer(filename)
             if this_plugin is None:
                 if other_plugin:
@@ -556,10 +669,11 @@ class CoverageJsonData(object):
 
         # _lines: merge dicts.
         if other_data._has_lines():
+            self._functions = other_data._functions
             if self._lines is None:
                 self._lines = {}
             for filename, file_lines in iitems(other_data._lines):
-                filename = aliases.map(filename)
+                filename = mapped[filename]
                 if filename in self._lines:
                     lines = set(self._lines[filename])
                     lines.update(file_lines)
@@ -571,7 +685,7 @@ class CoverageJsonData(object):
             if self._arcs is None:
                 self._arcs = {}
             for filename, file_arcs in iitems(other_data._arcs):
-                filename = aliases.map(filename)
+                filename = mapped[filename]
                 if filename in self._arcs:
                     arcs = set(self._arcs[filename])
                     arcs.update(file_arcs)
@@ -640,6 +754,113 @@ class CoverageJsonData(object):
         return self._arcs is not None
 
 
+class InMemoryDataMixin(object):
+    """The reading methods of coverage data, for data kept in memory.
+
+    The stand-ins for a parallel-mode :class:`CoverageData` use this so that
+    :class:`Coverage` and the reporters can read what has been collected.  The
+    class using it has `_has_arcs`, `_has_functions` and `_run_info` attributes,
+    and provides two methods:
+
+    `_measured_data()` returns {context: {filename: set(lines or arcs)}}, with
+    an empty set for a file that was touched but not executed.
+
+    `_plugin_names()` returns {filename: plugin_name} for the files measured
+    by plugins.
+
+    """
+
+    def __nonzero__(self):
+        return any(self._measured_data().values())
+
+    __bool__ = __nonzero__
+
+    def has_arcs(self):
+        """Does this data have arcs?"""
+        return self._has_arcs
+
+    def has_functions(self):
+        """Was the data measured with function granularity?"""
+        return self._has_functions
+
+    def measured_files(self):
+        """A set of all files that had been measured."""
+        return set(f for context_data in self._measured_data().values() for f in context_data)
+
+    def measured_contexts(self):
+        """A set of all contexts that have been measured."""
+        return set(
+            context for context, context_data in iitems(self._measured_data())
+            if any(context_data.values())
+        )
+
+    def file_tracer(self, filename):
+        """Get the plugin name of the file tracer for a file.
+
+        Returns "" if the file was measured without a plugin, or None if the
+        file wasn't measured.
+
+        """
+        if filename not in self.measured_files():
+            return None
+        return self._plugin_names().get(filename, "")
+
+    def lines(self, filename, context=None):
+        """Get the list of lines executed for a file, or None if it wasn't measured.
+
+        If `context` is given, only the lines executed in that context are
+        included.
+
+        """
+        values = self._values(filename, context)
+        if values is None:
+            return None
+        if self._has_arcs:
+            values = set(l for arc in values for l in arc if l > 0)
+        return list(values)
+
+    def arcs(self, filename, context=None):
+        """Get the list of arcs executed for a file, or None if it wasn't measured.
+
+        If `context` is given, only the arcs executed in that context are
+        included.
+
+        """
+        if not self._has_arcs:
+            return None
+        values = self._values(filename, context)
+        return None if values is None else list(values)
+
+    def contexts_by_lineno(self, filename):
+        """Get a dict mapping line numbers to the sorted contexts that executed them."""
+        lineno_contexts = {}
+        for context, context_data in iitems(self._measured_data()):
+            for value in context_data.get(filename, ()):
+                for lineno in (value if self._has_arcs else (value,)):
+                    if lineno > 0:
+                        lineno_contexts.setdefault(lineno, set()).add(context)
+        return dict((lineno, sorted(contexts)) for lineno, contexts in iitems(lineno_contexts))
+
+    def run_infos(self):
+        """Return the list of dicts of run information."""
+        return [self._run_info] if self._run_info else []
+
+    def _values(self, filename, context):
+        """Get the set of lines or arcs for `filename` in `context`, or all contexts.
+
+        Returns None if the file wasn't measured at all.
+
+        """
+        values = None
+        for this_context, context_data in iitems(self._measured_data()):
+            if filename in context_data:
+                if values is None:
+                    values = set()
+                if context is None or this_context == context:
+                    values.update(context_data[filename])
+        return values
+
+
 STORAGE = os.environ.get("COVERAGE_STORAGE", "sql")
 if STORAGE == "json":
     CoverageData = CoverageJsonData
@@ -726,10 +947,29 @@ def combine_parallel_data(data, aliases=None, data_paths=None, strict=False):
     if strict and not files_to_combine:
         raise CoverageException("No data to combine")
 
+    from coverage.shard import Shard, is_shard
+
     files_combined = 0
+    # Shards are collected together, and added to `data` in one go.
+    shards = None
+    shard_files = []
     for f in files_to_combine:
         if data._debug.should('dataio'):
             data._debug.write("Combining data file %r" % (f,))
+        if is_shard(f):
+            try:
+                shard = Shard(f)
+                shard.read()
+            except CoverageException as exc:
+                if data._warn:
+                    data._warn(str(exc))
+            else:
+                if shards is None:
+                    shards = shard
+                else:
+                    shards.update(shard)
+                shard_files.append(f)
+            continue
         try:
             new_data = CoverageData(f, debug=data._debug)
             new_data.read()
@@ -745,6 +985,14 @@ def combine_parallel_data(data, aliases=None, data_paths=None, strict=False):
                 data._debug.write("Deleting combined data file %r" % (f,))
             file_be_gone(f)
 
+    if shards is not None:
+        shards.add_to(data, aliases=aliases)
+        for f in shard_files:
+            files_combined += 1
+            if data._debug.should('dataio'):
+                data._debug.write("Deleting combined shard %r" % (f,))
+            file_be_gone(f)
+
     if strict and not files_combined:
         raise CoverageException("No usable data files")
 
@@ -0,0 +1,107 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Reading unified diffs, to report on just the lines they change."""
+
+import io
+import os
+import re
+import subprocess
+import sys
+
+from coverage.backward import iitems
+from coverage.files import abs_file
+from coverage.misc import CoverageException, isolate_module
+
+os = isolate_module(os)
+
+# The start of a hunk: "@@ -12,7 +12,8 @@".  The counts default to 1.
+HUNK_RE = re.compile(r"^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def parse_unified_diff(lines):
+    """Find the lines added or changed by a unified diff.
+
+    `lines` is an iterable of the lines of the diff, as from ``git diff`` or
+    ``diff -u``.  Returns a dict mapping the names of the changed files, as
+    they appear in the diff, to sets of line numbers in the new version of the
+    file.  Files that the diff deletes, or only removes lines from, aren't
+    included.
+
+    """
+    changed = {}
+    old_name = new_lines = None
+    old_left = new_left = 0
+    lineno = 0
+    for line in lines:
+        line = line.rstrip("\r\n")
+        if old_left > 0 or new_left > 0:
+            # In a hunk: count the lines on each side until both are done.
+            if line.startswith("+"):
+                new_lines.add(lineno)
+                lineno += 1
+                new_left -= 1
+            elif line.startswith("-"):
+                old_left -= 1
+            elif line.startswith("\\"):
+                # "\ No newline at end of file"
+                pass
+            else:
+                # A context line, which some tools strip to nothing.
+                lineno += 1
+                old_left -= 1
+                new_left -= 1
+        elif line.startswith("--- "):
+            old_name = line[4:].split("\t")[0]
+        elif line.startswith("+++ "):
+            new_name = line[4:].split("\t")[0]
+            if new_name == "/dev/null":
+                # A deleted file: read its hunks, but don't keep anything.
+                new_lines = set()
+                continue
+            git_prefixes = old_name is None or old_name.startswith("a/") or old_name == "/dev/null"
+            if new_name.startswith("b/") and git_prefixes:
+                new_name = new_name[2:]
+            new_lines = changed.setdefault(new_name, set())
+        else:
+            match = HUNK_RE.match(line)
+            if match and new_lines is not None:
+                old_count, new_start, new_count = match.groups()
+                old_left = int(old_count or 1)
+                new_left = int(new_count or 1)
+                lineno = int(new_start)
+
+    return dict((name, lines) for name, lines in iitems(changed) if lines)
+
+
+def git_root():
+    """The top directory of the git work tree we're in, or None if we aren't in one."""
+    try:
+        with open(os.devnull, "w") as devnull:
+            root = subprocess.check_output(["git", "rev-parse", "--show-toplevel"], stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return root.decode(sys.getfilesystemencoding()).strip() or None
+
+
+def read_diff(filename):
+    """Read the unified diff in `filename`.
+
+    Returns a dict mapping the absolute file names of the changed files to the
+    sets of line numbers changed in them.  File names in a git diff are
+    relative to the top of the git work tree, and in other diffs, to the
+    current directory.
+
+    """
+    try:
+        with io.open(filename, encoding="utf-8", errors="replace") as fdiff:
+            diff_lines = fdiff.readlines()
+    except IOError as err:
+        raise CoverageException("Couldn't read diff file %r: %s" % (filename, err))
+    changed = parse_unified_diff(diff_lines)
+    root = None
+    if any(line.startswith("diff --git ") for line in diff_lines):
+        root = git_root()
+    if root:
+        changed = dict((os.path.join(root, name), lines) for name, lines in iitems(changed))
+    return dict((abs_file(name), lines) for name, lines in iitems(changed))
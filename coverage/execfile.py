@@ -13,6 +13,7 @@ from coverage import env
 from coverage.backward import BUILTINS
 from coverage.backward import PYC_MAGIC_NUMBER, imp, importlib_util_find_spec
 from coverage.misc import CoverageException, ExceptionDuringRun, NoCode, NoSource, isolate_module
+from coverage.instrument import instrumented_code
 from coverage.phystokens import compile_unicode
 from coverage.python import get_python_source
 
@@ -245,7 +246,11 @@ def make_code_from_py(filename):
     except (IOError, NoSource):
         raise NoSource("No file to run: '%s'" % filename)
 
-    code = compile_unicode(source, filename, "exec")
+    # If we're measuring by instrumenting code, the main program has to be
+    # instrumented here, since it isn't imported.
+    code = instrumented_code(source, filename)
+    if code is None:
+        code = compile_unicode(source, filename, "exec")
     return code
 
 
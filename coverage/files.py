@@ -11,9 +11,10 @@ import os.path
 import posixpath
 import re
 import sys
+import time
 
 from coverage import env
-from coverage.backward import unicode_class
+from coverage.backward import scandir, unicode_class
 from coverage.misc import contract, CoverageException, join_regex, isolate_module
 
 
@@ -200,6 +201,34 @@ def prep_patterns(patterns):
     return prepped
 
 
+def make_trie(names, separator):
+    """Make a trie of the components of `names`, split on `separator`.
+
+    The trie is nested dicts keyed by components.  A None key marks the end of
+    one of the names.
+
+    """
+    trie = {}
+    for name in names:
+        node = trie
+        for part in name.split(separator):
+            node = node.setdefault(part, {})
+        node[None] = True
+    return trie
+
+
+def trie_match(trie, name, separator):
+    """Is `name` one of the names in `trie`, or inside one of them?"""
+    node = trie
+    for part in name.split(separator):
+        node = node.get(part)
+        if node is None:
+            return False
+        if None in node:
+            return True
+    return False
+
+
 class TreeMatcher(object):
     """A matcher for files in a tree.
 
@@ -210,6 +239,9 @@ class TreeMatcher(object):
     """
     def __init__(self, paths):
         self.paths = list(paths)
+        # Matching walks a trie of path components, so the time doesn't
+        # depend on how many paths there are.
+        self.trie = make_trie(self.paths, os.sep)
 
     def __repr__(self):
         return "<TreeMatcher %r>" % self.paths
@@ -220,21 +252,14 @@ class TreeMatcher(object):
 
     def match(self, fpath):
         """Does `fpath` indicate a file in one of our trees?"""
-        for p in self.paths:
-            if fpath.startswith(p):
-                if fpath == p:
-                    # This is the same file!
-                    return True
-                if fpath[len(p)] == os.sep:
-                    # This is a file in the directory
-                    return True
-        return False
+        return trie_match(self.trie, fpath, os.sep)
 
 
 class ModuleMatcher(object):
     """A matcher for modules in a tree."""
     def __init__(self, module_names):
         self.modules = list(module_names)
+        self.trie = make_trie(self.modules, ".")
 
     def __repr__(self):
         return "<ModuleMatcher %r>" % (self.modules)
@@ -247,23 +272,21 @@ class ModuleMatcher(object):
         """Does `module_name` indicate a module in one of our packages?"""
         if not module_name:
             return False
-
-        for m in self.modules:
-            if module_name.startswith(m):
-                if module_name == m:
-                    return True
-                if module_name[len(m)] == '.':
-                    # This is a module in the package
-                    return True
-
-        return False
+        return trie_match(self.trie, module_name, ".")
 
 
 class FnmatchMatcher(object):
     """A matcher for files by file name pattern."""
+
+    # The most answers to remember before starting over.
+    MEMO_SIZE = 10000
+
     def __init__(self, pats):
         self.pats = list(pats)
         self.re = fnmatches_to_regex(self.pats, case_insensitive=env.WINDOWS)
+        # The regex has an alternative for every pattern, so remember the
+        # answers for file names we've seen.
+        self._memo = {}
 
     def __repr__(self):
         return "<FnmatchMatcher %r>" % self.pats
@@ -274,7 +297,13 @@ class FnmatchMatcher(object):
 
     def match(self, fpath):
         """Does `fpath` match one of our file name patterns?"""
-        return self.re.match(fpath) is not None
+        matched = self._memo.get(fpath)
+        if matched is None:
+            matched = self.re.match(fpath) is not None
+            if len(self._memo) >= self.MEMO_SIZE:
+                self._memo.clear()
+            self._memo[fpath] = matched
+        return matched
 
 
 def sep(s):
@@ -330,9 +359,17 @@ class PathAliases(object):
     A `PathAliases` object tracks a list of pattern/result pairs, and can
     map a path through those aliases to produce a unified path.
 
+    Combining many data files maps the same paths over and over, so the
+    patterns are compiled into one regex, and results are remembered.
+
     """
+    # The most results to remember before starting over.
+    MEMO_SIZE = 10000
+
     def __init__(self):
         self.aliases = []
+        self._regex = None
+        self._memo = {}
 
     def pprint(self):       # pragma: debugging
         """Dump the important parts of the PathAliases, for debugging."""
@@ -374,6 +411,30 @@ class PathAliases(object):
         result_sep = sep(result)
         result = result.rstrip(r"\/") + result_sep
         self.aliases.append((regex, result))
+        self._regex = None
+        self._memo = {}
+
+    def _combined_regex(self):
+        """Make one regex matching any of the aliases' patterns.
+
+        Each pattern is in a group named "alias<N>", so the match tells us
+        which alias matched.  Alternatives are tried in order, so the first
+        alias to match wins, just as if each was tried in turn.
+
+        """
+        if self._regex is None:
+            parts = []
+            for i, (regex, _) in enumerate(self.aliases):
+                pattern = regex.pattern
+                # Older Pythons put the flags at the end, where they can't be
+                # in an alternation.  We compile with the flags instead.
+                pattern = re.sub(r"(?<!\\)\(\?[a-zA-Z]+\)", "", pattern)
+                # Some Pythons use named groups for wildcards.  Keep them
+                # distinct between the aliases.
+                pattern = re.sub(r"\(\?P([<=])(\w+)", r"(?P\1a%d_\2" % i, pattern)
+                parts.append("(?P<alias%d>%s)" % (i, pattern))
+            self._regex = re.compile("|".join(parts), re.IGNORECASE | re.DOTALL)
+        return self._regex
 
     def map(self, path):
         """Map `path` through the aliases.
@@ -391,17 +452,87 @@ class PathAliases(object):
         of `path` unchanged.
 
         """
-        for regex, result in self.aliases:
-            m = regex.match(path)
+        try:
+            return self._memo[path]
+        except KeyError:
+            pass
+
+        new = path
+        if self.aliases:
+            m = self._combined_regex().match(path)
             if m:
+                result = self.aliases[int(m.lastgroup[len("alias"):])][1]
                 new = path.replace(m.group(0), result)
                 new = new.replace(sep(path), sep(result))
                 new = canonical_filename(new)
-                return new
-        return path
 
+        if len(self._memo) >= self.MEMO_SIZE:
+            self._memo.clear()
+        self._memo[path] = new
+        return new
+
+    def map_all(self, paths):
+        """Map each of `paths` through the aliases.
+
+        Returns a dict mapping each of `paths` to the result of `map`.  Use
+        this to map all of the file names from one data file at once.
 
-def find_python_files(dirname):
+        """
+        if not self.aliases:
+            return dict((path, path) for path in paths)
+        return dict((path, self.map(path)) for path in paths)
+
+
+# We're only interested in files that look like reasonable Python files: Must
+# end with .py or .pyw, and must not have certain funny characters that
+# probably mean they are editor junk.
+PYTHON_FILE_RE = re.compile(r"^[^.#~!$@%^&*()+=,]+\.pyw?$")
+
+# Directory listings changed this recently might change again within the
+# resolution of the modification time, so they aren't kept.
+RECENT_DIRECTORY_SECONDS = 2
+
+
+def _list_directory(dirpath):
+    """Read the directory `dirpath` for `find_python_files`.
+
+    Returns a list: the modification time of the directory, whether it has an
+    __init__.py, the names of the Python files in it, the names of those that
+    are symbolic links, and the names of its sub-directories that aren't.
+    Returns None if the directory can't be read.
+
+    """
+    try:
+        mtime = os.stat(dirpath).st_mtime
+        if scandir is not None:
+            entries = [
+                (entry.name, entry.is_dir(), entry.is_symlink())
+                for entry in scandir(dirpath)
+            ]
+        else:
+            entries = []
+            for name in os.listdir(dirpath):
+                path = os.path.join(dirpath, name)
+                entries.append((name, os.path.isdir(path), os.path.islink(path)))
+    except OSError:
+        return None
+
+    has_init = False
+    py_files, linked_files, subdirs = [], [], []
+    for name, is_dir, is_link in sorted(entries):
+        if is_dir:
+            # Like os.walk, don't follow symbolic links to directories.
+            if not is_link:
+                subdirs.append(name)
+            continue
+        if name == "__init__.py":
+            has_init = True
+        if PYTHON_FILE_RE.match(name):
+            (linked_files if is_link else py_files).append(name)
+    return [mtime, has_init, py_files, linked_files, subdirs]
+
+
+def find_python_files(dirname, dir_cache=None):
     """Yield all of the importable Python files in `dirname`, recursively.
 
     To be importable, the files have to be in a directory with a __init__.py,
@@ -410,16 +541,44 @@ def find_python_files(dirname):
     best, but sub-directories are checked for a __init__.py to be sure we only
     find the importable files.
 
+    Symbolic links to files are resolved, so if `dirname` is a canonical path,
+    so are all of the results.
+
+    `dir_cache` is an optional dict of directory listings from earlier calls.
+    Directories whose modification time hasn't changed aren't read again, and
+    new listings are added to the dict.
+
     """
-    for i, (dirpath, dirnames, filenames) in enumerate(os.walk(dirname)):
-        if i > 0 and '__init__.py' not in filenames:
+    dirs = [dirname]
+    while dirs:
+        dirpath = dirs.pop()
+        listing = None
+        if dir_cache is not None:
+            listing = dir_cache.get(dirpath)
+            if listing is not None:
+                try:
+                    if os.stat(dirpath).st_mtime != listing[0]:
+                        listing = None
+                except OSError:
+                    continue
+        if listing is None:
+            listing = _list_directory(dirpath)
+            if listing is None:
+                continue
+            if dir_cache is not None:
+                if time.time() - listing[0] > RECENT_DIRECTORY_SECONDS:
+                    dir_cache[dirpath] = listing
+                else:
+                    dir_cache.pop(dirpath, None)
+
+        _, has_init, py_files, linked_files, subdirs = listing
+        if dirpath != dirname and not has_init:
             # If a directory doesn't have __init__.py, then it isn't
             # importable and neither are its files
-            del dirnames[:]
             continue
-        for filename in filenames:
-            # We're only interested in files that look like reasonable Python
-            # files: Must end with .py or .pyw, and must not have certain funny
-            # characters that probably mean they are editor junk.
-            if re.match(r"^[^.#~!$@%^&*()+=,]+\.pyw?$", filename):
-                yield os.path.join(dirpath, filename)
+        for filename in py_files:
+            yield os.path.join(dirpath, filename)
+        for filename in linked_files:
+            yield canonical_filename(os.path.join(dirpath, filename))
+        # Reversed, so that directories are popped in order.
+        dirs.extend(os.path.join(dirpath, subdir) for subdir in reversed(subdirs))
@@ -16,7 +16,7 @@ from coverage.data import add_data_to_hash
 from coverage.files import flat_rootname
 from coverage.misc import CoverageException, file_be_gone, Hasher, isolate_module
 from coverage.report import Reporter
-from coverage.results import Numbers
+from coverage.results import Numbers, Rollup
 from coverage.templite import Templite
 
 os = isolate_module(os)
@@ -66,11 +66,16 @@ def read_data(fname):
         return data_file.read()
 
 
+def encode_html(html):
+    """Return the bytes for `html`, trimmed and properly encoded."""
+    html = re.sub(r"(\A\s+)|(\s+$)", "", html, flags=re.MULTILINE) + "\n"
+    return html.encode('ascii', 'xmlcharrefreplace')
+
+
 def write_html(fname, html):
     """Write `html` to `fname`, properly encoded."""
-    html = re.sub(r"(\A\s+)|(\s+$)", "", html, flags=re.MULTILINE) + "\n"
     with open(fname, "wb") as fout:
-        fout.write(html.encode('ascii', 'xmlcharrefreplace'))
+        fout.write(encode_html(html))
 
 
 class HtmlReporter(Reporter):
@@ -84,12 +89,21 @@ class HtmlReporter(Reporter):
         ("jquery.ba-throttle-debounce.min.js", "jquery-throttle-debounce"),
         ("jquery.hotkeys.js", "jquery-hotkeys"),
         ("jquery.isonscreen.js", "jquery-isonscreen"),
-        ("jquery.tablesorter.min.js", "jquery-tablesorter"),
         ("coverage_html.js", ""),
         ("keybd_closed.png", ""),
         ("keybd_open.png", ""),
     ]
 
+    # The rows of the index page are written here, as a script so that the
+    # report can be read from file: URLs.
+    INDEX_DATA_FILE = "index_data.js"
+
+    # With show_contexts, the names of the contexts are written to this file,
+    # and the contexts for the lines of each file to a file named with this
+    # suffix.  A page only loads them when a line's contexts are shown.
+    CONTEXT_NAMES_FILE = "contexts.js"
+    CONTEXTS_SUFFIX = "_ctx.js"
+
     def __init__(self, cov, config):
         super(HtmlReporter, self).__init__(cov, config)
         self.directory = None
@@ -108,8 +122,12 @@ class HtmlReporter(Reporter):
         self.data = cov.get_data()
 
         self.files = []
-        self.all_files_nums = []
+        self.rollup = Rollup(self.config.rollup_depth)
         self.has_arcs = self.data.has_arcs()
+        self.has_functions = self.data.has_functions()
+        self.context_names = []
+        self.context_ids = {}
+        self.statements_label = "functions" if self.has_functions else "statements"
         self.status = HtmlStatus()
         self.extra_css = None
         self.totals = Numbers()
@@ -126,9 +144,14 @@ class HtmlReporter(Reporter):
         # Read the status data.
         self.status.read(self.config.html_dir)
 
+        # Number the contexts.  The numbers are in the files for each source
+        # file, so they are part of the settings that must not change.
+        self.prepare_contexts()
+
         # Check that this run used the same settings as the last run.
         m = Hasher()
         m.update(self.config)
+        m.update(self.context_names)
         these_settings = m.hexdigest()
         if self.status.settings_hash() != these_settings:
             self.status.reset()
@@ -141,14 +164,14 @@ class HtmlReporter(Reporter):
         # Process all the files.
         self.report_files(self.html_file, morfs, self.config.html_dir)
 
-        if not self.all_files_nums:
+        if not self.rollup.total.n_files and self.diff_lines is None:
             raise CoverageException("No data to report.")
 
         # Write the index file.
         self.index_file()
 
         self.make_local_static_report_files()
-        return self.totals.n_statements and self.totals.pc_covered
+        return self.total_percent(self.totals)
 
     def make_local_static_report_files(self):
         """Make local instances of static files for HTML report."""
@@ -166,11 +189,27 @@ class HtmlReporter(Reporter):
                 os.path.join(self.directory, self.extra_css)
             )
 
-    def file_hash(self, source, fr):
+    def prepare_contexts(self):
+        """Number the measured contexts, if the report shows contexts."""
+        self.context_names = []
+        if self.config.show_contexts:
+            self.context_names = sorted(self.data.measured_contexts())
+        self.context_ids = dict((name, i) for i, name in enumerate(self.context_names))
+
+    def file_contexts(self, fr):
+        """Get the contexts for the lines of `fr`, or None if not shown."""
+        if not self.config.show_contexts:
+            return None
+        return self.data.contexts_by_lineno(fr.filename)
+
+    def file_hash(self, source, fr, contexts=None):
         """Compute a hash that changes if the file needs to be re-reported."""
         m = Hasher()
         m.update(source)
         add_data_to_hash(self.data, fr.filename, m)
+        m.update(contexts)
+        if self.diff_lines is not None:
+            m.update(sorted(self.changed_lines(fr)))
         return m.hexdigest()
 
     def html_file(self, fr, analysis):
@@ -178,10 +217,11 @@ class HtmlReporter(Reporter):
         rootname = flat_rootname(fr.relative_filename())
         html_filename = rootname + ".html"
         html_path = os.path.join(self.directory, html_filename)
+        contexts_path = os.path.join(self.directory, rootname + self.CONTEXTS_SUFFIX)
 
         # Get the numbers for this file.
         nums = analysis.numbers
-        self.all_files_nums.append(nums)
+        self.rollup.add(fr.relative_filename(), nums)
 
         if self.config.skip_covered:
             # Don't report on 100% files.
@@ -190,12 +230,14 @@ class HtmlReporter(Reporter):
             if no_missing_lines and no_missing_branches:
                 # If there's an existing file, remove it.
                 file_be_gone(html_path)
+                file_be_gone(contexts_path)
                 return
 
         source = fr.source()
+        contexts = self.file_contexts(fr)
 
         # Find out if the file on disk is already correct.
-        this_hash = self.file_hash(source.encode('utf-8'), fr)
+        this_hash = self.file_hash(source.encode('utf-8'), fr, contexts)
         that_hash = self.status.file_hash(rootname)
         if this_hash == that_hash:
             # Nothing has changed to require the file to be reported again.
@@ -204,6 +246,29 @@ class HtmlReporter(Reporter):
 
         self.status.set_file_hash(rootname, this_hash)
 
+        write_html(html_path, self.render_file(fr, analysis, contexts))
+        if contexts is None:
+            file_be_gone(contexts_path)
+        else:
+            with open(contexts_path, "w") as fout:
+                fout.write(self.contexts_data(contexts))
+
+        # Save this file's information for the index file.
+        index_info = {
+            'nums': nums,
+            'html_filename': html_filename,
+            'relative_filename': fr.relative_filename(),
+        }
+        self.files.append(index_info)
+        self.status.set_index_info(rootname, index_info)
+
+    def render_file(self, fr, analysis, contexts=None):
+        """Render the HTML page for one source file, returning the HTML.
+
+        `contexts` maps line numbers to the contexts that ran them, if the page
+        should let them be shown.
+
+        """
         if self.has_arcs:
             missing_branch_arcs = analysis.missing_branch_arcs()
             arcs_executed = analysis.arcs_executed()
@@ -227,6 +292,10 @@ class HtmlReporter(Reporter):
                 line_class.append(c_exc)
             elif lineno in analysis.missing:
                 line_class.append(c_mis)
+                if self.has_functions:
+                    func_name = analysis.functions[lineno]
+                    annotate_html = escape(func_name)
+                    annotate_long = escape("function %s was never called" % func_name)
             elif self.has_arcs and lineno in missing_branch_arcs:
                 line_class.append(c_par)
                 shorts = []
@@ -270,51 +339,103 @@ class HtmlReporter(Reporter):
                 'class': ' '.join(line_class) or "pln",
                 'annotate': annotate_html,
                 'annotate_long': annotate_long,
+                'contexts': len(contexts.get(lineno, ())) if contexts else 0,
             })
 
-        # Write the HTML page for this file.
-        html = self.source_tmpl.render({
+        contexts_file = None
+        if contexts is not None:
+            contexts_file = flat_rootname(fr.relative_filename()) + self.CONTEXTS_SUFFIX
+
+        return self.source_tmpl.render({
             'c_exc': c_exc,
             'c_mis': c_mis,
             'c_par': c_par,
             'c_run': c_run,
+            'contexts_file': contexts_file,
             'has_arcs': self.has_arcs,
+            'statements_label': self.statements_label,
             'extra_css': self.extra_css,
             'fr': fr,
-            'nums': nums,
+            'nums': analysis.numbers,
             'lines': lines,
             'time_stamp': self.time_stamp,
         })
 
-        write_html(html_path, html)
-
-        # Save this file's information for the index file.
-        index_info = {
-            'nums': nums,
-            'html_filename': html_filename,
-            'relative_filename': fr.relative_filename(),
-        }
-        self.files.append(index_info)
-        self.status.set_index_info(rootname, index_info)
-
     def index_file(self):
         """Write the index.html file for this report."""
+        write_html(os.path.join(self.directory, "index.html"), self.render_index())
+        with open(os.path.join(self.directory, self.INDEX_DATA_FILE), "w") as fout:
+            fout.write(self.index_data())
+        context_names_path = os.path.join(self.directory, self.CONTEXT_NAMES_FILE)
+        if self.config.show_contexts:
+            with open(context_names_path, "w") as fout:
+                fout.write(self.context_names_data())
+        else:
+            file_be_gone(context_names_path)
+
+        # Write the latest hashes for next time.
+        self.status.write(self.directory)
+
+    def render_index(self):
+        """Render the index page from the files seen so far, returning the HTML."""
         index_tmpl = Templite(read_data("index.html"), self.template_globals)
 
-        self.totals = sum(self.all_files_nums)
+        self.totals = self.rollup.total
+        directories = [
+            {'name': dirname + "/", 'nums': nums}
+            for dirname, nums in self.rollup.directory_totals()
+        ]
 
-        html = index_tmpl.render({
+        return index_tmpl.render({
             'has_arcs': self.has_arcs,
+            'statements_label': self.statements_label,
             'extra_css': self.extra_css,
             'files': self.files,
+            'directories': directories,
             'totals': self.totals,
             'time_stamp': self.time_stamp,
         })
 
-        write_html(os.path.join(self.directory, "index.html"), html)
+    def index_data(self):
+        """Make the contents of the index data file, for the files seen so far.
 
-        # Write the latest hashes for next time.
-        self.status.write(self.directory)
+        Each file is a compact row of values, rather than a row in the HTML,
+        so that the browser can sort, filter, and page through lots of them.
+
+        """
+        rows = []
+        for index_info in self.files:
+            nums = index_info['nums']
+            rows.append([
+                index_info['relative_filename'], index_info['html_filename'],
+                nums.n_statements, nums.n_missing, nums.n_excluded,
+                nums.n_branches, nums.n_partial_branches,
+            ] + list(nums.ratio_covered) + [nums.pc_covered_str])
+        data = {'has_arcs': self.has_arcs, 'files': rows}
+        return "coverage.index_data = %s;\n" % json.dumps(data, separators=(',', ':'))
+
+    def context_names_data(self):
+        """Make the contents of the context names file.
+
+        The names are a list, indexed by the numbers in the contexts files.
+
+        """
+        names = json.dumps(self.context_names, separators=(',', ':'))
+        return "coverage.context_names_loaded(%s);\n" % names
+
+    def contexts_data(self, contexts):
+        """Make the contents of the contexts file for one source file.
+
+        `contexts` maps line numbers to context names.  The file maps line
+        numbers to lists of context numbers.
+
+        """
+        line_ids = dict(
+            (lineno, [self.context_ids[name] for name in names])
+            for lineno, names in iitems(contexts)
+        )
+        line_ids = json.dumps(line_ids, separators=(',', ':'), sort_keys=True)
+        return "coverage.file_contexts_loaded(%s);\n" % line_ids
 
 
 class HtmlStatus(object):
@@ -38,192 +38,249 @@ coverage.wire_up_help_panel = function () {
     });
 };
 
-// Create the events for the filter box.
-coverage.wire_up_filter = function () {
-    // Cache elements.
+// -- index stuff --
+
+// How many file rows to show on each page of the index.
+coverage.INDEX_PAGE_SIZE = 100;
+
+// The positions of the values in each row of coverage.index_data.files.
+coverage.ROW = {
+    name: 0, url: 1, statements: 2, missing: 3, excluded: 4,
+    branches: 5, partial: 6, numer: 7, denom: 8, pc: 9
+};
+
+// The row values shown in the columns of the index table, in order.
+coverage.index_columns = function (has_arcs) {
+    var R = coverage.ROW;
+    var columns = [R.name, R.statements, R.missing, R.excluded];
+    if (has_arcs) {
+        columns.push(R.branches, R.partial);
+    }
+    columns.push(R.pc);
+    return columns;
+};
+
+// Sort an array of rows in place by the row value `col`.
+coverage.sort_rows = function (rows, col, descending) {
+    var R = coverage.ROW;
+    var sign = descending ? -1 : 1;
+    var key = function (row) {
+        if (col === R.pc) {
+            // Sort by the real ratio, not the rounded percentage.
+            return row[R.denom] ? row[R.numer] / row[R.denom] : 1;
+        }
+        return row[col];
+    };
+    rows.sort(function (a, b) {
+        var ka = key(a), kb = key(b);
+        if (ka < kb) {
+            return -sign;
+        }
+        if (ka > kb) {
+            return sign;
+        }
+        // Ties are ordered by name, so the order doesn't depend on the browser.
+        if (a[R.name] === b[R.name]) {
+            return 0;
+        }
+        return a[R.name] < b[R.name] ? -1 : 1;
+    });
+    return rows;
+};
+
+// Return the rows whose names contain `text`, in the same order.
+coverage.filter_rows = function (rows, text) {
+    if (text === "") {
+        return rows;
+    }
+    return $.grep(rows, function (row) {
+        return row[coverage.ROW.name].indexOf(text) !== -1;
+    });
+};
+
+// Sum the numbers in an array of rows, returning a row of the totals.
+coverage.total_row = function (rows) {
+    var R = coverage.ROW;
+    var total = ["Total", "", 0, 0, 0, 0, 0, 0, 0, ""];
+    var places = 0;
+    $.each(rows, function (i, row) {
+        for (var c = R.statements; c <= R.denom; c++) {
+            total[c] += row[c];
+        }
+    });
+    if (rows.length) {
+        // Use as many decimal places as the report does.
+        var match = /\.([0-9]+)/.exec(rows[0][R.pc]);
+        if (match) {
+            places = match[1].length;
+        }
+    }
+    var pct = total[R.denom] ? total[R.numer] * 100 / total[R.denom] : 100;
+    total[R.pc] = pct.toFixed(places);
+    return total;
+};
+
+coverage.escape = function (text) {
+    return String(text)
+        .replace(/&/g, "&amp;").replace(/</g, "&lt;")
+        .replace(/>/g, "&gt;").replace(/"/g, "&quot;");
+};
+
+// Make the HTML for one row of the index table.
+coverage.row_html = function (row, columns) {
+    var R = coverage.ROW;
+    var esc = coverage.escape;
+    var html = [
+        '<tr class="file"><td class="name left"><a href="' + esc(row[R.url]) + '">' +
+        esc(row[R.name]) + '</a></td>'
+    ];
+    for (var i = 1; i < columns.length - 1; i++) {
+        html.push('<td>' + row[columns[i]] + '</td>');
+    }
+    html.push(
+        '<td class="right" data-ratio="' + row[R.numer] + ' ' + row[R.denom] + '">' +
+        row[R.pc] + '%</td></tr>'
+    );
+    return html.join("");
+};
+
+// Show the index rows that match the filter box, sorted, a page at a time.
+// The rows are arrays from index_data.js, and only one page of them is ever
+// in the DOM, so large reports stay quick.
+coverage.wire_up_index = function (data) {
+    var R = coverage.ROW;
+    var storage_name = "COVERAGE_INDEX_SORT";
+    var columns = coverage.index_columns(data.has_arcs);
     var table = $("table.index");
-    var table_rows = table.find("tbody tr");
-    var table_row_names = table_rows.find("td.name a");
+    var headers = table.find("thead th");
+    var tbody = table.find("tbody");
     var no_rows = $("#no_rows");
 
     // Create a duplicate table footer that we can modify with dynamic summed values.
-    var table_footer = $("table.index tfoot tr");
+    var table_footer = table.find("tfoot tr");
     var table_dynamic_footer = table_footer.clone();
     table_dynamic_footer.attr('class', 'total_dynamic hidden');
     table_footer.after(table_dynamic_footer);
 
-    // Observe filter keyevents.
-    $("#filter").on("keyup change", $.debounce(150, function (event) {
-        var filter_value = $(this).val();
+    var state = {
+        rows: data.files.slice(),   // All the rows, sorted.
+        shown: [],                  // The rows that match the filter.
+        page: 0,
+        sort_column: 0,
+        descending: false
+    };
+
+    // The sort order is remembered as "column,direction", as tablesorter did.
+    var stored = localStorage.getItem(storage_name);
+    if (stored) {
+        var parts = stored.split(",");
+        var column = parseInt(parts[0], 10);
+        if (column >= 0 && column < columns.length) {
+            state.sort_column = column;
+            state.descending = (parts[1] === "1");
+        }
+    }
 
-        if (filter_value === "") {
-            // Filter box is empty, remove all filtering.
-            table_rows.removeClass("hidden");
+    var show_page = function () {
+        var size = coverage.INDEX_PAGE_SIZE;
+        var pages = Math.max(Math.ceil(state.shown.length / size), 1);
+        state.page = Math.min(Math.max(state.page, 0), pages - 1);
+        var start = state.page * size;
+        var end = Math.min(start + size, state.shown.length);
+
+        var html = [];
+        for (var i = start; i < end; i++) {
+            html.push(coverage.row_html(state.shown[i], columns));
+        }
+        tbody.html(html.join(""));
 
+        $("#page_info").text((start + 1) + "-" + end + " of " + state.shown.length);
+        $("#prev_page").prop("disabled", state.page === 0);
+        $("#next_page").prop("disabled", state.page === pages - 1);
+        $("#index_pages").toggle(pages > 1);
+    };
+
+    var show_rows = function () {
+        var filter_value = $("#filter").val();
+        state.shown = coverage.filter_rows(state.rows, filter_value);
+        state.page = 0;
+
+        if (filter_value === "") {
             // Show standard footer, hide dynamic footer.
             table_footer.removeClass("hidden");
             table_dynamic_footer.addClass("hidden");
-
-            // Hide placeholder, show table.
-            if (no_rows.length > 0) {
-                no_rows.hide();
-            }
-            table.show();
-
         }
         else {
-            // Filter table items by value.
-            var hidden = 0;
-            var shown = 0;
-
-            // Hide / show elements.
-            $.each(table_row_names, function () {
-                var element = $(this).parents("tr");
-
-                if ($(this).text().indexOf(filter_value) === -1) {
-                    // hide
-                    element.addClass("hidden");
-                    hidden++;
-                }
-                else {
-                    // show
-                    element.removeClass("hidden");
-                    shown++;
-                }
-            });
-
-            // Show placeholder if no rows will be displayed.
-            if (no_rows.length > 0) {
-                if (shown === 0) {
-                    // Show placeholder, hide table.
-                    no_rows.show();
-                    table.hide();
-                }
-                else {
-                    // Hide placeholder, show table.
-                    no_rows.hide();
-                    table.show();
-                }
+            // Sum the rows that are shown into the dynamic footer.
+            var total = coverage.total_row(state.shown);
+            var cells = table_dynamic_footer.find("td");
+            for (var i = 1; i < columns.length - 1; i++) {
+                cells.eq(i).text(total[columns[i]]);
             }
+            cells.eq(columns.length - 1).text(total[R.pc] + "%");
 
-            // Manage dynamic header:
-            if (hidden > 0) {
-                // Calculate new dynamic sum values based on visible rows.
-                for (var column = 2; column < 20; column++) {
-                    // Calculate summed value.
-                    var cells = table_rows.find('td:nth-child(' + column + ')');
-                    if (!cells.length) {
-                        // No more columns...!
-                        break;
-                    }
-
-                    var sum = 0, numer = 0, denom = 0;
-                    $.each(cells.filter(':visible'), function () {
-                        var ratio = $(this).data("ratio");
-                        if (ratio) {
-                            var splitted = ratio.split(" ");
-                            numer += parseInt(splitted[0], 10);
-                            denom += parseInt(splitted[1], 10);
-                        }
-                        else {
-                            sum += parseInt(this.innerHTML, 10);
-                        }
-                    });
-
-                    // Get footer cell element.
-                    var footer_cell = table_dynamic_footer.find('td:nth-child(' + column + ')');
-
-                    // Set value into dynamic footer cell element.
-                    if (cells[0].innerHTML.indexOf('%') > -1) {
-                        // Percentage columns use the numerator and denominator,
-                        // and adapt to the number of decimal places.
-                        var match = /\.([0-9]+)/.exec(cells[0].innerHTML);
-                        var places = 0;
-                        if (match) {
-                            places = match[1].length;
-                        }
-                        var pct = numer * 100 / denom;
-                        footer_cell.text(pct.toFixed(places) + '%');
-                    }
-                    else {
-                        footer_cell.text(sum);
-                    }
-                }
-
-                // Hide standard footer, show dynamic footer.
-                table_footer.addClass("hidden");
-                table_dynamic_footer.removeClass("hidden");
-            }
-            else {
-                // Show standard footer, hide dynamic footer.
-                table_footer.removeClass("hidden");
-                table_dynamic_footer.addClass("hidden");
-            }
+            // Hide standard footer, show dynamic footer.
+            table_footer.addClass("hidden");
+            table_dynamic_footer.removeClass("hidden");
         }
-    }));
 
-    // Trigger change event on setup, to force filter on page refresh
-    // (filter value may still be present).
-    $("#filter").trigger("change");
-};
+        // Show placeholder if no rows will be displayed.
+        if (state.shown.length === 0) {
+            no_rows.show();
+            table.hide();
+        }
+        else {
+            no_rows.hide();
+            table.show();
+        }
 
-// Loaded on index.html
-coverage.index_ready = function ($) {
-    // Look for a localStorage item containing previous sort settings:
-    var sort_list = [];
-    var storage_name = "COVERAGE_INDEX_SORT";
-    var stored_list = localStorage.getItem(storage_name);
+        show_page();
+    };
 
-    if (stored_list) {
-        sort_list = JSON.parse('[[' + stored_list + ']]');
-    }
+    var sort_rows = function () {
+        coverage.sort_rows(state.rows, columns[state.sort_column], state.descending);
+        headers.removeClass("headerSortDown headerSortUp");
+        headers.eq(state.sort_column).addClass(state.descending ? "headerSortUp" : "headerSortDown");
+    };
 
-    // Create a new widget which exists only to save and restore
-    // the sort order:
-    $.tablesorter.addWidget({
-        id: "persistentSort",
-
-        // Format is called by the widget before displaying:
-        format: function (table) {
-            if (table.config.sortList.length === 0 && sort_list.length > 0) {
-                // This table hasn't been sorted before - we'll use
-                // our stored settings:
-                $(table).trigger('sorton', [sort_list]);
+    headers.each(function (i) {
+        $(this).click(function () {
+            if (i === state.sort_column) {
+                state.descending = !state.descending;
             }
             else {
-                // This is not the first load - something has
-                // already defined sorting so we'll just update
-                // our stored value to match:
-                sort_list = table.config.sortList;
+                state.sort_column = i;
+                state.descending = false;
             }
-        }
+            localStorage.setItem(storage_name, state.sort_column + "," + (state.descending ? 1 : 0));
+            sort_rows();
+            show_rows();
+        });
     });
 
-    // Configure our tablesorter to handle the variable number of
-    // columns produced depending on report options:
-    var headers = [];
-    var col_count = $("table.index > thead > tr > th").length;
+    $("#prev_page").click(function () {
+        state.page--;
+        show_page();
+    });
+    $("#next_page").click(function () {
+        state.page++;
+        show_page();
+    });
 
-    headers[0] = { sorter: 'text' };
-    for (i = 1; i < col_count-1; i++) {
-        headers[i] = { sorter: 'digit' };
-    }
-    headers[col_count-1] = { sorter: 'percent' };
+    // Observe filter keyevents.
+    $("#filter").on("keyup change", $.debounce(150, show_rows));
 
-    // Enable the table sorter:
-    $("table.index").tablesorter({
-        widgets: ['persistentSort'],
-        headers: headers
-    });
+    // Show the rows now, using the filter value that may still be present
+    // after a page refresh.
+    sort_rows();
+    show_rows();
+};
 
+// Loaded on index.html
+coverage.index_ready = function ($) {
     coverage.assign_shortkeys();
     coverage.wire_up_help_panel();
-    coverage.wire_up_filter();
-
-    // Watch for page unload events so we can save the final sort settings:
-    $(window).unload(function () {
-        localStorage.setItem(storage_name, sort_list.toString())
-    });
+    coverage.wire_up_index(coverage.index_data || {has_arcs: false, files: []});
 };
 
 // -- pyfile stuff --
@@ -253,6 +310,7 @@ coverage.pyfile_ready = function ($) {
 
     coverage.assign_shortkeys();
     coverage.wire_up_help_panel();
+    coverage.wire_up_contexts();
 
     coverage.init_scroll_markers();
 
@@ -273,6 +331,73 @@ coverage.toggle_lines = function (btn, cls) {
     }
 };
 
+// The contexts that ran each line are in two scripts, which are only loaded
+// when the contexts of a line are first shown: a list of context names, and a
+// map of this file's line numbers to lists of indexes into the names.
+coverage.contexts_file = null;
+coverage.context_names = null;
+coverage.line_contexts = null;
+coverage.contexts_requested = false;
+coverage.contexts_waiting = [];
+
+coverage.wire_up_contexts = function () {
+    $("#source").on("click", ".ctx_toggle", function () {
+        var line_id = $(this).closest("p").attr("id");
+        coverage.toggle_contexts(parseInt(line_id.substr(1), 10));
+    });
+};
+
+coverage.load_script = function (src) {
+    var script = document.createElement("script");
+    script.type = "text/javascript";
+    script.src = src;
+    document.body.appendChild(script);
+};
+
+coverage.toggle_contexts = function (lineno) {
+    var shown = coverage.line_elt(lineno).find(".ctxs");
+    if (shown.length) {
+        shown.toggle();
+        return;
+    }
+    coverage.contexts_waiting.push(lineno);
+    if (!coverage.contexts_requested) {
+        coverage.contexts_requested = true;
+        coverage.load_script("contexts.js");
+        coverage.load_script(coverage.contexts_file);
+    }
+    coverage.show_waiting_contexts();
+};
+
+// Called by the context names script.
+coverage.context_names_loaded = function (names) {
+    coverage.context_names = names;
+    coverage.show_waiting_contexts();
+};
+
+// Called by the script with this file's contexts.
+coverage.file_contexts_loaded = function (line_contexts) {
+    coverage.line_contexts = line_contexts;
+    coverage.show_waiting_contexts();
+};
+
+// Show the contexts of the lines that asked for them, once both scripts have
+// loaded.
+coverage.show_waiting_contexts = function () {
+    if (coverage.context_names === null || coverage.line_contexts === null) {
+        return;
+    }
+    $.each(coverage.contexts_waiting, function (i, lineno) {
+        var ctxs = $("<span class='ctxs'></span>");
+        $.each(coverage.line_contexts[lineno] || [], function (j, id) {
+            var name = coverage.context_names[id];
+            ctxs.append($("<span></span>").text(name || "(empty context)"));
+        });
+        coverage.line_elt(lineno).append(ctxs);
+    });
+    coverage.contexts_waiting = [];
+};
+
 // Return the nth line div.
 coverage.line_elt = function (n) {
     return $("#t" + n);
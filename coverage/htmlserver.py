@@ -0,0 +1,213 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Serve an HTML report, rendering the pages as they are requested."""
+
+import collections
+import os
+
+# The HTTP server modules were renamed in Python 3.  They are imported here
+# rather than in coverage.backward, so that processes being measured don't
+# import them.
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+
+from coverage.files import flat_rootname
+from coverage.html import HtmlReporter, data_filename, encode_html
+from coverage.misc import CoverageException, isolate_module
+from coverage.results import Rollup
+
+os = isolate_module(os)
+
+
+# How many rendered pages to keep in memory.
+PAGE_CACHE_SIZE = 100
+
+# The content types of the files we serve, by extension.
+CONTENT_TYPES = {
+    ".css": "text/css",
+    ".html": "text/html; charset=utf-8",
+    ".js": "application/javascript",
+    ".png": "image/png",
+}
+
+
+class LazyHtmlReporter(HtmlReporter):
+    """An HTML report whose file pages are only rendered when asked for.
+
+    `prepare` analyzes the files to make the index page, then `page` returns
+    the content of any page in the report.  File pages are rendered on demand,
+    and the most recently used `cache_size` of them are kept.  A kept page is
+    rendered again if its source or its data has changed, and the data file is
+    re-read if it changes.
+
+    """
+
+    def __init__(self, cov, config, cache_size=PAGE_CACHE_SIZE):
+        super(LazyHtmlReporter, self).__init__(cov, config)
+        self.cache_size = cache_size
+        self.morfs = None
+
+        # Maps page names to (hash, content) pairs, least recently used first.
+        self.pages = collections.OrderedDict()
+
+        # Maps page names to the FileReporters they show.
+        self.page_reporters = {}
+
+        self.index_html = None
+        self.index_data_js = None
+        self.data_stamp = None
+
+        # The static files, by the names they are served as.
+        self.static_files = dict(
+            (static, data_filename(static, pkgdir)) for static, pkgdir in self.STATIC_FILES
+        )
+        if self.config.extra_css:
+            self.extra_css = os.path.basename(self.config.extra_css)
+            self.static_files[self.extra_css] = self.config.extra_css
+
+    def prepare(self, morfs):
+        """Analyze the files in `morfs`, and render the index page."""
+        self.morfs = morfs
+        self.data_stamp = self.data_file_stamp()
+        self.files = []
+        self.rollup = Rollup(self.config.rollup_depth)
+        self.page_reporters = {}
+        self.prepare_contexts()
+
+        self.report_files(self.index_entry, morfs)
+        if not self.rollup.total.n_files and self.diff_lines is None:
+            raise CoverageException("No data to report.")
+
+        self.index_html = encode_html(self.render_index())
+        self.index_data_js = self.index_data().encode('ascii')
+        return self.total_percent(self.totals)
+
+    def index_entry(self, fr, analysis):
+        """Record the index information for one source file."""
+        nums = analysis.numbers
+        self.rollup.add(fr.relative_filename(), nums)
+
+        if self.config.skip_covered:
+            # Don't report on 100% files.
+            if nums.n_missing == 0 and nums.n_partial_branches == 0:
+                return
+
+        html_filename = flat_rootname(fr.relative_filename()) + ".html"
+        self.page_reporters[html_filename] = fr
+        self.files.append({
+            'nums': nums,
+            'html_filename': html_filename,
+            'relative_filename': fr.relative_filename(),
+        })
+
+    def data_file_stamp(self):
+        """Get a value that changes when the data file changes, or None."""
+        try:
+            st = os.stat(self.coverage.config.data_file)
+        except OSError:
+            return None
+        return (st.st_mtime, st.st_size)
+
+    def page(self, name):
+        """Get the page `name` from the report.
+
+        Returns a pair: the content type and the content as bytes, or None if
+        there is no such page.
+
+        """
+        if self.data_file_stamp() != self.data_stamp:
+            # New data: read it and start the index again.  The page hashes
+            # include the data, so changed pages will be rendered again.  The
+            # file may have been replaced, so don't use the old data object.
+            self.coverage._data = None
+            self.coverage.load()
+            self.data = self.coverage.get_data()
+            self.prepare(self.morfs)
+
+        if name in ("", "index.html"):
+            return CONTENT_TYPES[".html"], self.index_html
+        if name == self.INDEX_DATA_FILE:
+            return CONTENT_TYPES[".js"], self.index_data_js
+        if self.config.show_contexts:
+            if name == self.CONTEXT_NAMES_FILE:
+                return CONTENT_TYPES[".js"], self.context_names_data().encode('ascii')
+            if name.endswith(self.CONTEXTS_SUFFIX):
+                html_name = name[:-len(self.CONTEXTS_SUFFIX)] + ".html"
+                fr = self.page_reporters.get(html_name)
+                if fr is not None:
+                    contexts = self.file_contexts(fr)
+                    return CONTENT_TYPES[".js"], self.contexts_data(contexts).encode('ascii')
+
+        fr = self.page_reporters.get(name)
+        if fr is not None:
+            return CONTENT_TYPES[".html"], self.file_page(name, fr)
+
+        static_path = self.static_files.get(name)
+        if static_path is not None:
+            with open(static_path, "rb") as fstatic:
+                content = fstatic.read()
+            ext = os.path.splitext(name)[1]
+            return CONTENT_TYPES.get(ext, "application/octet-stream"), content
+
+        return None
+
+    def file_page(self, name, fr):
+        """Get the content of the page `name`, for the FileReporter `fr`."""
+        # FileReporters keep the source they read, so get a new one.
+        fr = self.coverage._get_file_reporter(fr.filename)
+        source = fr.source()
+        contexts = self.file_contexts(fr)
+        this_hash = self.file_hash(source.encode('utf-8'), fr, contexts)
+        cached = self.pages.pop(name, None)
+        if cached is None or cached[0] != this_hash:
+            html = self.render_file(fr, self.analyze(fr), contexts)
+            cached = (this_hash, encode_html(html))
+
+        self.pages[name] = cached
+        while len(self.pages) > self.cache_size:
+            self.pages.popitem(last=False)
+        return cached[1]
+
+
+class HtmlRequestHandler(BaseHTTPRequestHandler):
+    """Answer GET requests with pages from the server's reporter."""
+
+    def do_GET(self):
+        """Serve a page from the report."""
+        name = self.path.split("?", 1)[0].lstrip("/")
+        page = self.server.reporter.page(name)
+        if page is None:
+            self.send_error(404, "No such page")
+            return
+        content_type, content = page
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):     # pylint: disable=redefined-builtin
+        """Don't log every request."""
+        pass
+
+
+class HtmlServer(HTTPServer):
+    """A local HTTP server for a `LazyHtmlReporter`.
+
+    Requests are handled one at a time, since the reporter reads the data file
+    and renders pages as it goes.
+
+    """
+
+    def __init__(self, reporter, host, port):
+        HTTPServer.__init__(self, (host, port), HtmlRequestHandler)
+        self.reporter = reporter
+
+    @property
+    def url(self):
+        """The URL of the index page."""
+        host, port = self.server_address[:2]
+        return "http://%s:%d/" % (host, port)
@@ -5,8 +5,10 @@
 
 # For finding the stdlib
 import atexit
+import hashlib
 import inspect
 import itertools
+import json
 import os
 import platform
 import re
@@ -17,7 +19,7 @@ from coverage import env
 from coverage.disposition import FileDisposition, disposition_init
 from coverage.files import TreeMatcher, FnmatchMatcher, ModuleMatcher
 from coverage.files import prep_patterns, find_python_files, canonical_filename
-from coverage.misc import CoverageException
+from coverage.misc import CoverageException, private_temp_dir, write_private_file
 from coverage.python import source_for_file, source_for_morf
 
 
@@ -122,6 +124,9 @@ class InOrOut(object):
         self.plugins = []
         self.disp_class = FileDisposition
 
+        # A DirectoryCache for finding unexecuted files, if wanted.
+        self.dir_cache = None
+
         # The source argument can be directories or package names.
         self.source = []
         self.source_pkgs = []
@@ -398,36 +403,45 @@ class InOrOut(object):
 
         Yields pairs: file path, and responsible plug-in name.
         """
+        listings = self.dir_cache.load() if self.dir_cache else None
+
         for pkg in self.source_pkgs:
             if (not pkg in sys.modules or
                 not module_has_file(sys.modules[pkg])):
                 continue
             pkg_file = source_for_file(sys.modules[pkg].__file__)
-            for ret in self._find_unexecuted_files(canonical_path(pkg_file)):
+            for ret in self._find_unexecuted_files(canonical_path(pkg_file), listings):
                 yield ret
 
         for src in self.source:
-            for ret in self._find_unexecuted_files(src):
+            for ret in self._find_unexecuted_files(src, listings):
                 yield ret
 
+        if self.dir_cache:
+            self.dir_cache.save()
+
     def _find_plugin_files(self, src_dir):
         """Get executable files from the plugins."""
         for plugin in self.plugins.file_tracers:
             for x_file in plugin.find_executable_files(src_dir):
                 yield x_file, plugin._coverage_plugin_name
 
-    def _find_unexecuted_files(self, src_dir):
+    def _find_unexecuted_files(self, src_dir, listings=None):
         """Find unexecuted files in `src_dir`.
 
         Search for files in `src_dir` that are probably importable,
-        and add them as unexecuted files in `self.data`.
+        and add them as unexecuted files in `self.data`.  `listings` is a
+        dict of directory listings for `find_python_files` to reuse.
 
         """
-        py_files = ((py_file, None) for py_file in find_python_files(src_dir))
-        plugin_files = self._find_plugin_files(src_dir)
+        # src_dir is canonical, so the Python files found in it are too.
+        py_files = ((py_file, None) for py_file in find_python_files(src_dir, listings))
+        plugin_files = (
+            (canonical_filename(x_file), plugin_name)
+            for x_file, plugin_name in self._find_plugin_files(src_dir)
+        )
 
         for file_path, plugin_name in itertools.chain(py_files, plugin_files):
-            file_path = canonical_filename(file_path)
             if self.omit_match and self.omit_match.match(file_path):
                 # Turns out this file was omitted, so don't pull it back
                 # in as unexecuted.
@@ -459,3 +473,136 @@ class InOrOut(object):
             info.append((matcher_name, matcher_info))
 
         return info
+
+
+class DispositionCache(object):
+    """should_trace decisions saved on disk, for later processes to reuse.
+
+    The decisions are kept in the private temp directory, in a file named for
+    everything that could change them: the interpreter, the current directory,
+    sys.path, and the settings in an `InOrOut`.  Only decisions that depend on
+    nothing but the file name are kept: files handled by plugins are decided
+    again each time.
+
+    """
+
+    def __init__(self, inorout, disp_class):
+        self.disp_class = disp_class
+        plugins = getattr(inorout.plugins, "file_tracers", [])
+        settings = [
+            sys.executable, sys.version, os.getcwd(), sys.path,
+            inorout.source, inorout.include, inorout.omit,
+            sorted(inorout.pylib_paths or ()), inorout.cover_paths,
+            [plugin._coverage_plugin_name for plugin in plugins],
+        ]
+        self.filename = temp_json_path("trace", settings)
+        # With source packages, the decision depends on the module name too.
+        self.usable = self.filename is not None and not inorout.source_pkgs
+        self.loaded = 0
+
+    def _read(self):
+        """Read the saved decisions: {filename: [trace, reason, canonical, source]}."""
+        return read_temp_json(self.filename)
+
+    def load(self):
+        """Get the saved decisions, as a dict mapping file names to dispositions."""
+        if not self.usable:
+            return {}
+        dispositions = {}
+        for filename, (trace, reason, canonical, source) in self._read().items():
+            disp = disposition_init(self.disp_class, filename)
+            disp.trace = trace
+            disp.reason = reason
+            disp.canonical_filename = canonical
+            disp.source_filename = source
+            dispositions[filename] = disp
+        self.loaded = len(dispositions)
+        return dispositions
+
+    def save(self, should_trace_cache):
+        """Save the decisions in `should_trace_cache`, a collector's cache."""
+        if not self.usable or len(should_trace_cache) <= self.loaded:
+            # Nothing new was decided.
+            return
+        saved = self._read()
+        for filename, disp in list(should_trace_cache.items()):
+            if disp is None or disp.file_tracer or disp.has_dynamic_filename:
+                continue
+            saved[filename] = [
+                disp.trace, disp.reason, disp.canonical_filename, disp.source_filename,
+            ]
+        write_temp_json(self.filename, saved)
+        self.loaded = len(should_trace_cache)
+
+
+class DirectoryCache(object):
+    """Listings of source directories saved on disk, for later processes.
+
+    `find_unexecuted_files` walks all of the source directories after every
+    run.  Directories that haven't changed since they were saved here aren't
+    read again.  The listings are kept in the private temp directory, in a file
+    named for the source settings of an `InOrOut`.
+
+    """
+
+    def __init__(self, inorout):
+        settings = [inorout.source, inorout.source_pkgs]
+        self.filename = temp_json_path("dirs", settings)
+        self.listings = None
+        self.saved = None
+
+    def load(self):
+        """Get the saved listings, a dict for `find_python_files`."""
+        if self.listings is None:
+            self.listings = read_temp_json(self.filename)
+            self.saved = dict(self.listings)
+        return self.listings
+
+    def save(self):
+        """Save the listings, if they have changed."""
+        if self.listings is not None and self.listings != self.saved:
+            write_temp_json(self.filename, self.listings)
+            self.saved = dict(self.listings)
+
+
+def temp_json_path(kind, settings):
+    """The JSON cache file of `kind` for `settings`, in the private temp directory.
+
+    Returns None if there's no safe directory to keep it in.
+
+    """
+    digest = hashlib.md5(json.dumps(settings).encode("utf8")).hexdigest()[:16]
+    try:
+        temp_dir = private_temp_dir()
+    except CoverageException:
+        return None
+    return os.path.join(temp_dir, "coverage-{}-{}.json".format(kind, digest))
+
+
+def read_temp_json(filename):
+    """Read a JSON cache file from the private temp directory.
+
+    Returns an empty dict if there is no file name, or the file is missing,
+    unreadable, or owned by someone else.
+
+    """
+    if filename is None:
+        return {}
+    try:
+        if hasattr(os, "getuid") and os.stat(filename).st_uid != os.getuid():
+            # Someone else's file: don't trust it.
+            return {}
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def write_temp_json(filename, data):
+    """Write `data` to a JSON cache file, ignoring any errors."""
+    if filename is None:
+        return
+    try:
+        write_private_file(filename, json.dumps(data))
+    except (IOError, OSError):
+        pass
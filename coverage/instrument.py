@@ -0,0 +1,527 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Measurement by rewriting code at import time, instead of tracing it."""
+
+import ast
+import sys
+
+from coverage import env
+from coverage.disposition import FileDisposition
+from coverage.files import abs_file
+from coverage.misc import CoverageException
+from coverage.phystokens import neuter_encoding_declaration
+from coverage.python import get_python_source
+
+if env.PY3:
+    import importlib.machinery
+
+
+# The global name the instrumented code uses for its array of line flags.
+ARRAY_NAME = "__coverage_lines__"
+
+# The global name the instrumented code uses for its dict of arcs, when
+# measuring branches.
+ARCS_NAME = "__coverage_arcs__"
+
+# The variable that holds the last line run in each module, class body, and
+# function, when measuring branches.
+LAST_NAME = "__coverage_last__"
+
+# The arrays of line flags, one per measured source file:
+#
+#   { '/path/to/file.py': bytearray(b'\x00\x01\x01...'), ... }
+#
+# Each byte is set to 1 the first time its line runs.  The instrumented code
+# finds its array here, so it is shared by everything that measures the file.
+ARRAYS = {}
+
+# The arcs run, one dict per measured source file, when measuring branches:
+#
+#   { '/path/to/file.py': { (-1, 1): 1, (1, 2): 2, ... }, ... }
+#
+# The keys are the arcs, the values don't matter.
+ARCS = {}
+
+# The statement that binds ARRAY_NAME in an instrumented module.
+PRELUDE = "{0} = __import__('coverage.instrument').instrument.ARRAYS[{1!r}]"
+
+# The statement that binds ARCS_NAME in an instrumented module.
+ARC_PRELUDE = "{0} = __import__('coverage.instrument').instrument.ARCS[{1!r}]"
+
+# The statement that records one line, the first time it runs.
+PROBE = "if not {0}[{1}]: {0}[{1}] = 1"
+
+# The statement that records the arc from the last line to this one.  The key
+# is evaluated before the last line is changed.
+ARC_PROBE = "{0}[{1}, {2}] = {1} = {2}"
+
+# The statement at the top of a loop body and of its else clause, recording
+# the return to the loop line from the end of the body.
+LOOP_PROBE = "if {1} != {2}: {0}[{1}, {2}] = {1} = {2}"
+
+# The statement that records leaving a scope.
+EXIT_PROBE = "{0}[{1}, {2}] = None"
+
+# An expression recording the entry and exit arcs of a lambda or comprehension,
+# which can't have statements added.  The None is replaced by the expression
+# the lambda returns, or the comprehension's first iterable.
+ONELINE_PROBE = "(({1}, {2}) in {0} or {0}.update(((({1}, {2}), 1), (({2}, {1}), 1))), None)[1]"
+
+# An expression recording the arc to an except clause, as its exception type is
+# checked.  The None is replaced by the type.
+HANDLER_PROBE = "({0}.__setitem__(({1}, {2}), 1), ({1} := {2}), None)[2]"
+
+# Nodes that can have a docstring as the first statement of their body.
+DOCSTRING_OWNERS = ("Module", "ClassDef", "FunctionDef", "AsyncFunctionDef")
+
+# Nodes that define functions.
+FUNCTION_DEFS = ("FunctionDef", "AsyncFunctionDef")
+
+# Nodes that are scopes of their own.
+SCOPES = FUNCTION_DEFS + ("ClassDef", "Module")
+
+# Nodes that loop back to their first line.
+LOOPS = ("For", "AsyncFor", "While")
+
+# Expression nodes that are code objects of their own.
+COMPREHENSIONS = ("ListComp", "SetComp", "DictComp", "GeneratorExp")
+
+
+def _is_docstring(node):
+    """Is `node` a statement that is only a string?"""
+    if node.__class__.__name__ != "Expr":
+        return False
+    value_class = node.value.__class__.__name__
+    if value_class == "Str":
+        return True
+    return value_class == "Constant" and isinstance(node.value.value, str)
+
+
+def _is_future_import(node):
+    """Is `node` a `from __future__ import ...` statement?"""
+    return node.__class__.__name__ == "ImportFrom" and node.module == "__future__"
+
+
+class Instrumenter(object):
+    """Measures code by rewriting it as it is imported.
+
+    This has the parts of the :class:`Collector` interface that
+    :class:`Coverage` uses, so it can stand in for one when ``[run] core =
+    instrument`` is configured.  Measured modules are rewritten so that each
+    statement first sets a flag for its line in a preallocated array, the
+    first time it runs.  When measuring branches, each statement instead
+    records the arc from the last line run in its scope.  Modules that aren't
+    measured are imported normally, and run at full speed.
+
+    """
+
+    # The Coverage object only needs Python FileDispositions from us.
+    file_disposition_class = FileDisposition
+
+    # Plugins need a trace function to hook into.
+    supports_plugins = False
+
+    def __init__(self, should_trace, warn, granularity="line", branch=False):
+        """Create an Instrumenter.
+
+        `should_trace` is a function, taking a file name and a frame, and
+        returning a `coverage.FileDisposition object`.  The frame will always
+        be None.
+
+        `warn` is a warning function, taking a single string message argument
+        and an optional slug argument.
+
+        `granularity` is "line" (the default) to record executed lines, or
+        "function" to record only the functions that run, keyed by their first
+        line like the tracers do.
+
+        `branch` is true to record arcs instead of lines.
+
+        """
+        if env.PY2:
+            raise CoverageException("core = instrument requires Python 3")
+        self.should_trace = should_trace
+        self.warn = warn
+        self.functions = (granularity == "function")
+        self.arcs = branch
+        self.covdata = None
+        self.static_context = None
+        self.finder = InstrumentingFinder(self)
+
+        # The source file names we have instrumented.
+        self.filenames = set()
+
+        self.abs_file_cache = {}
+
+    def __repr__(self):
+        return "<Instrumenter at 0x%x: %d files>" % (id(self), len(self.filenames))
+
+    def use_data(self, covdata, context):
+        """Use `covdata` for recording data."""
+        self.covdata = covdata
+        self.static_context = context
+        self.covdata.set_context(self.static_context)
+
+    def tracer_name(self):
+        """Return the name of the measurement engine we're using."""
+        return self.__class__.__name__
+
+    def reset(self):
+        """Clear collected data, and prepare to collect more."""
+        for filename in self.filenames:
+            array = ARRAYS[filename]
+            array[:] = bytearray(len(array))
+            ARCS[filename].clear()
+
+    def start(self):
+        """Start instrumenting modules as they are imported."""
+        if self.finder not in sys.meta_path:
+            sys.meta_path.insert(0, self.finder)
+
+    def stop(self):
+        """Stop instrumenting modules as they are imported.
+
+        Code that has already been instrumented can't be un-instrumented, so it
+        continues to record lines until the data is saved.
+
+        """
+        if self.finder in sys.meta_path:
+            sys.meta_path.remove(self.finder)
+
+    pause = stop
+    resume = start
+
+    def should_instrument(self, filename):
+        """Decide whether to instrument `filename`.
+
+        Returns the source file name to record the data under, or None.
+
+        """
+        disp = self.should_trace(filename, None)
+        if disp.trace and not disp.file_tracer:
+            return disp.source_filename
+        return None
+
+    def compile_source(self, source, filename, source_filename):
+        """Compile `source` from `filename`, instrumented.
+
+        `source_filename` is the file name to record the data under.
+
+        Returns a code object.
+
+        """
+        tree = ast.parse(neuter_encoding_declaration(source), filename)
+        n_lines = len(source.splitlines()) + 1
+        array = ARRAYS.get(source_filename)
+        if array is None or len(array) < n_lines:
+            ARRAYS[source_filename] = array = bytearray(n_lines)
+        ARCS.setdefault(source_filename, {})
+        self.filenames.add(source_filename)
+        self._instrument_tree(tree, source_filename)
+        return compile(tree, filename, "exec", dont_inherit=True)
+
+    def _instrument_tree(self, tree, source_filename):
+        """Add the probes and the prelude to `tree`, in place."""
+        # For each `case` of a match statement, the case lines that must have
+        # been tried for its body to run: its own and those before it.
+        case_lines = {}
+        for node in list(ast.walk(tree)):
+            node_name = node.__class__.__name__
+            if self.functions:
+                if node_name in FUNCTION_DEFS:
+                    start = node.lineno
+                    for dec_node in node.decorator_list:
+                        start = min(start, dec_node.lineno)
+                    node.body = self._add_probes(node, node.body, [(start, node.body[0])])
+                continue
+
+            if self.arcs:
+                if node_name == "Lambda":
+                    node.body = self._oneline_probe(node.lineno, node.body)
+                elif node_name in COMPREHENSIONS:
+                    generator = node.generators[0]
+                    generator.iter = self._oneline_probe(node.lineno, generator.iter)
+
+            if node_name == "Match":
+                tried = []
+                for case in node.cases:
+                    tried.append(case.pattern.lineno)
+                    case_lines[id(case)] = list(tried)
+
+            # A case has no line number of its own: its pattern has it.
+            node_line = getattr(node, "lineno", None)
+            if node_name == "match_case":
+                node_line = node.pattern.lineno
+
+            for field in ("body", "orelse", "finalbody"):
+                stmts = getattr(node, field, None)
+                if not isinstance(stmts, list) or not stmts:
+                    continue
+                if not isinstance(stmts[0], ast.stmt):
+                    continue
+                probes = []
+                if field == "body" and node_name == "ExceptHandler":
+                    # The except clause itself is a line that runs.
+                    if not self._add_handler_probe(node):
+                        probes.append((node.lineno, stmts[0]))
+                if field == "body" and node_name == "match_case":
+                    # Patterns can't hold probes, so the case lines tried are
+                    # recorded when a case's body runs.
+                    probes.extend((lineno, stmts[0]) for lineno in case_lines[id(node)])
+                for stmt in stmts:
+                    lines = self._stmt_lines(stmt)
+                    if self.arcs and node_name not in SCOPES and lines[0] == node_line:
+                        # On the same line as its compound statement, like
+                        # `if x: y()`, so there's no arc to record.
+                        lines = lines[1:]
+                    probes.extend((lineno, stmt) for lineno in lines)
+                stmts = self._add_probes(node, stmts, probes)
+                if self.arcs and node_name in LOOPS:
+                    stmts.insert(0, self._make_probe(LOOP_PROBE, node.lineno, stmts[0]))
+                setattr(node, field, stmts)
+
+            if self.arcs:
+                if node_name in LOOPS and not node.orelse:
+                    node.orelse = [self._make_probe(LOOP_PROBE, node.lineno, node)]
+                if node_name in FUNCTION_DEFS:
+                    node.body = self._wrap_scope(node, node.body, node.lineno)
+                elif node_name == "ClassDef":
+                    node.body = self._wrap_scope(
+                        node, node.body, node.lineno, class_line=node.lineno,
+                    )
+
+        body = tree.body
+        first = self._count_kept(tree, body)
+        if body:
+            if self.arcs:
+                body = self._wrap_scope(tree, body, body[0].lineno)
+                prelude = ARC_PRELUDE.format(ARCS_NAME, source_filename)
+            else:
+                prelude = PRELUDE.format(ARRAY_NAME, source_filename)
+            prelude = ast.parse(prelude).body
+            for stmt in prelude:
+                ast.copy_location(stmt, body[min(first, len(body) - 1)])
+            tree.body = body[:first] + prelude + body[first:]
+        ast.fix_missing_locations(tree)
+
+    def _stmt_lines(self, stmt):
+        """The lines to record before running `stmt`, in order."""
+        dec_lines = [dec_node.lineno for dec_node in getattr(stmt, "decorator_list", ())]
+        if not dec_lines:
+            return [stmt.lineno]
+        if not self.arcs:
+            return dec_lines + [stmt.lineno]
+        # The definition line runs, then the decorators, then the definition
+        # line again as the decorators are applied, as the parser expects.
+        lines = [stmt.lineno]
+        for lineno in dec_lines + [stmt.lineno]:
+            if lineno != lines[-1]:
+                lines.append(lineno)
+        return lines
+
+    def _make_probe(self, template, lineno, location):
+        """Make a probe statement for `lineno` from `template`."""
+        if template == PROBE:
+            source = PROBE.format(ARRAY_NAME, lineno)
+        else:
+            source = template.format(ARCS_NAME, LAST_NAME, lineno)
+        return ast.copy_location(ast.parse(source).body[0], location)
+
+    def _oneline_probe(self, lineno, expr):
+        """Wrap `expr` to record running the lambda or comprehension at `lineno`."""
+        probe = ast.parse(ONELINE_PROBE.format(ARCS_NAME, -lineno, lineno), mode="eval").body
+        probe.value.elts[1] = expr
+        return ast.copy_location(probe, expr)
+
+    def _add_handler_probe(self, handler):
+        """Record the arc to `handler` as its exception type is checked.
+
+        This needs assignment expressions, so it's only done when measuring
+        branches on Python 3.8 or later.  Returns True if the probe was added.
+
+        """
+        if not self.arcs or handler.type is None or env.PYVERSION < (3, 8):
+            return False
+        probe = ast.parse(HANDLER_PROBE.format(ARCS_NAME, LAST_NAME, handler.lineno)).body[0]
+        probe.value.value.elts[2] = handler.type
+        handler.type = ast.copy_location(probe.value, handler.type)
+        return True
+
+    def _count_kept(self, node, stmts):
+        """How many of `stmts` have to stay first: docstrings and future imports."""
+        keep = 0
+        if not stmts:
+            return keep
+        if node.__class__.__name__ in DOCSTRING_OWNERS and _is_docstring(stmts[0]):
+            keep = 1
+        if node.__class__.__name__ == "Module":
+            while keep < len(stmts) and _is_future_import(stmts[keep]):
+                keep += 1
+        return keep
+
+    def _add_probes(self, node, stmts, probes):
+        """Make a new statement list from `stmts` with `probes` added.
+
+        `probes` is a list of (lineno, stmt) pairs: a probe for `lineno` is
+        added before `stmt`.  Docstrings and future imports stay first.
+
+        """
+        keep = self._count_kept(node, stmts)
+        kept = set(id(stmt) for stmt in stmts[:keep])
+
+        before = {}
+        for lineno, stmt in probes:
+            if id(stmt) in kept:
+                stmt = stmts[keep] if keep < len(stmts) else None
+            before.setdefault(id(stmt), []).append(lineno)
+
+        template = ARC_PROBE if self.arcs else PROBE
+        new_stmts = stmts[:keep]
+        for stmt in stmts[keep:] + [None]:
+            for lineno in before.get(id(stmt), ()):
+                new_stmts.append(self._make_probe(template, lineno, stmt or stmts[-1]))
+            if stmt is not None:
+                new_stmts.append(stmt)
+        return new_stmts
+
+    def _wrap_scope(self, node, stmts, start, class_line=None):
+        """Record entering and leaving the scope of `node`, with body `stmts`.
+
+        The last line starts as `-start`, and the arc to `-start` is recorded
+        however the scope is left.  A class body also records its `class_line`
+        first, and doesn't keep the last line as an attribute.
+
+        Returns the new statement list.
+
+        """
+        keep = self._count_kept(node, stmts)
+        body = stmts[keep:]
+        location = body[0] if body else stmts[-1]
+        if class_line is not None:
+            body.insert(0, self._make_probe(ARC_PROBE, class_line, location))
+        if not body:
+            body = [ast.copy_location(ast.Pass(), location)]
+        init = ast.parse("{0} = {1}".format(LAST_NAME, -start)).body
+        final = ast.parse(EXIT_PROBE.format(ARCS_NAME, LAST_NAME, -start)).body
+        if class_line is not None:
+            final += ast.parse("del {0}".format(LAST_NAME)).body
+        for stmt in init + final:
+            ast.copy_location(stmt, location)
+        try_node = ast.copy_location(
+            ast.Try(body=body, handlers=[], orelse=[], finalbody=final), location,
+        )
+        return stmts[:keep] + init + [try_node]
+
+    def cached_abs_file(self, filename):
+        """A locally cached version of `abs_file`."""
+        try:
+            return self.abs_file_cache[filename]
+        except KeyError:
+            return self.abs_file_cache.setdefault(filename, abs_file(filename))
+
+    def flush_data(self):
+        """Save the collected data to our associated `CoverageData`.
+
+        Returns True if there was data to save, False if not.
+
+        """
+        if self.arcs:
+            arc_data = {}
+            for filename in self.filenames:
+                arcs = ARCS[filename]
+                if arcs:
+                    arc_data[self.cached_abs_file(filename)] = dict.fromkeys(arcs)
+                    arcs.clear()
+            if not arc_data:
+                return False
+            self.covdata.add_arcs(arc_data)
+            return True
+
+        line_data = {}
+        for filename in self.filenames:
+            array = ARRAYS[filename]
+            lines = dict((lineno, None) for lineno, hit in enumerate(array) if hit)
+            if lines:
+                line_data[self.cached_abs_file(filename)] = lines
+                array[:] = bytearray(len(array))
+        if not line_data:
+            return False
+
+        if self.functions:
+            self.covdata.add_functions(line_data)
+        else:
+            self.covdata.add_lines(line_data)
+        return True
+
+
+class InstrumentingFinder(object):
+    """A `sys.meta_path` finder that instruments measured source files.
+
+    The other finders on `sys.meta_path` do the actual finding.  If they find a
+    source file that should be measured, its loader is replaced with an
+    :class:`InstrumentingLoader`.
+
+    """
+
+    def __init__(self, instrumenter):
+        self.instrumenter = instrumenter
+
+    def find_spec(self, fullname, path=None, target=None):
+        """Find the spec for module `fullname`, as the other finders would."""
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        if isinstance(spec.loader, importlib.machinery.SourceFileLoader):
+            source_filename = self.instrumenter.should_instrument(spec.origin)
+            if source_filename is not None:
+                spec.loader = InstrumentingLoader(
+                    fullname, spec.origin, self.instrumenter, source_filename,
+                )
+        return spec
+
+
+if env.PY3:
+    class InstrumentingLoader(importlib.machinery.SourceFileLoader):
+        """A source file loader that compiles instrumented code.
+
+        Bytecode caches are neither read nor written, since they would hold
+        either uninstrumented code or code that only works under coverage.py.
+
+        """
+
+        def __init__(self, fullname, path, instrumenter, source_filename):
+            super(InstrumentingLoader, self).__init__(fullname, path)
+            self.instrumenter = instrumenter
+            self.source_filename = source_filename
+
+        def get_code(self, fullname):
+            path = self.get_filename(fullname)
+            return self.instrumenter.compile_source(
+                get_python_source(path), path, self.source_filename,
+            )
+
+
+def instrumented_code(source, filename):
+    """Compile `source` instrumented, if an instrumenter is measuring `filename`.
+
+    This is for code that is run without being imported, like the main
+    program.  Returns a code object, or None if no instrumenter wants it.
+
+    """
+    for finder in sys.meta_path:
+        if isinstance(finder, InstrumentingFinder):
+            instrumenter = finder.instrumenter
+            source_filename = instrumenter.should_instrument(filename)
+            if source_filename is not None:
+                return instrumenter.compile_source(source, filename, source_filename)
+    return None
@@ -0,0 +1,130 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""JSON reporting for coverage.py."""
+
+import datetime
+import json
+import sys
+
+from coverage import __version__
+from coverage.backward import iitems
+from coverage.report import Reporter
+from coverage.results import Rollup
+
+
+class JsonReporter(Reporter):
+    """A reporter for writing JSON coverage results.
+
+    The report is written as each file is analyzed, so only the totals are
+    kept from one file to the next.  It looks like this::
+
+        {
+            "meta": {"version": "5.0", "timestamp": "...", ...},
+            "files": {
+                "a.py": {
+                    "executed_lines": [1, 2],
+                    "missing_lines": [4],
+                    "excluded_lines": [],
+                    "missing_branches": [[2, 4]],
+                    "contexts": {"1": ["test_one"], ...},
+                    "summary": {"covered_lines": 2, ...}
+                },
+                ...
+            },
+            "directories": {"pkg": {"covered_lines": 80, ...}, ...},
+            "totals": {"covered_lines": 120, ...}
+        }
+
+    "missing_branches" is only present for branch data, "contexts" only if
+    contexts were asked for, and "directories" only with a rollup depth.
+
+    """
+
+    def __init__(self, coverage, config):
+        super(JsonReporter, self).__init__(coverage, config)
+        self.data = coverage.get_data()
+        self.has_arcs = self.data.has_arcs()
+        self.outfile = None
+        self.n_files_written = 0
+        self.rollup = Rollup(config.rollup_depth)
+
+    def report(self, morfs, outfile=None):
+        """Generate a JSON report for `morfs`.
+
+        `morfs` is a list of modules or file names.
+
+        `outfile` is a file object to write the JSON to.
+
+        Returns the total percentage covered.
+
+        """
+        self.outfile = outfile or sys.stdout
+        self.n_files_written = 0
+        self.rollup = Rollup(self.config.rollup_depth)
+
+        meta = {
+            'version': __version__,
+            'timestamp': datetime.datetime.now().isoformat(),
+            'branch_coverage': self.has_arcs,
+            'show_contexts': self.config.json_show_contexts,
+        }
+        self.outfile.write('{"meta": %s, "files": {' % json.dumps(meta, sort_keys=True))
+        self.report_files(self.json_file, morfs)
+        self.outfile.write('}, ')
+        if self.config.rollup_depth:
+            directories = dict(
+                (dirname, self.summary(nums)) for dirname, nums in self.rollup.directory_totals()
+            )
+            self.outfile.write('"directories": %s, ' % self.dumps(directories))
+        totals = self.rollup.total
+        self.outfile.write('"totals": %s}\n' % self.dumps(self.summary(totals)))
+
+        return self.total_percent(totals)
+
+    def json_file(self, fr, analysis):
+        """Write the JSON for a single file."""
+        nums = analysis.numbers
+        self.rollup.add(fr.relative_filename(), nums)
+
+        report = {
+            'executed_lines': sorted(analysis.statements - analysis.missing),
+            'missing_lines': sorted(analysis.missing),
+            'excluded_lines': sorted(analysis.excluded),
+            'summary': self.summary(nums),
+        }
+        if self.has_arcs:
+            report['missing_branches'] = [
+                [lineno, dest]
+                for lineno, dests in sorted(iitems(analysis.missing_branch_arcs()))
+                for dest in sorted(dests)
+            ]
+        if self.config.json_show_contexts:
+            report['contexts'] = self.data.contexts_by_lineno(fr.filename)
+
+        if self.n_files_written:
+            self.outfile.write(", ")
+        self.outfile.write("%s: %s" % (json.dumps(fr.relative_filename()), self.dumps(report)))
+        self.n_files_written += 1
+
+    def summary(self, nums):
+        """Make the summary dict for the Numbers `nums`."""
+        summary = {
+            'covered_lines': nums.n_executed,
+            'num_statements': nums.n_statements,
+            'percent_covered': nums.pc_covered,
+            'missing_lines': nums.n_missing,
+            'excluded_lines': nums.n_excluded,
+        }
+        if self.has_arcs:
+            summary.update({
+                'num_branches': nums.n_branches,
+                'num_partial_branches': nums.n_partial_branches,
+                'covered_branches': nums.n_executed_branches,
+                'missing_branches': nums.n_missing_branches,
+            })
+        return summary
+
+    def dumps(self, value):
+        """Make the JSON for `value`, in a stable order."""
+        return json.dumps(value, sort_keys=True)
@@ -0,0 +1,98 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""LCOV reporting for coverage.py."""
+
+import sys
+
+from coverage.report import Reporter
+from coverage.results import Numbers
+
+
+class LcovReporter(Reporter):
+    """A reporter for writing LCOV tracefiles.
+
+    Each file is a record of SF, DA, LF and LH lines, with FN lines for
+    function data and BRDA lines for branch data, written as soon as the file
+    is analyzed.
+
+    """
+
+    def __init__(self, coverage, config):
+        super(LcovReporter, self).__init__(coverage, config)
+        self.data = coverage.get_data()
+        self.has_arcs = self.data.has_arcs()
+        self.has_functions = self.data.has_functions()
+        self.outfile = None
+        self.totals = Numbers()
+
+    def report(self, morfs, outfile=None):
+        """Generate an LCOV tracefile for `morfs`.
+
+        `morfs` is a list of modules or file names.
+
+        `outfile` is a file object to write the tracefile to.
+
+        Returns the total percentage covered.
+
+        """
+        self.outfile = outfile or sys.stdout
+        self.totals = Numbers()
+        self.report_files(self.lcov_file, morfs)
+        return self.total_percent(self.totals)
+
+    def lcov_file(self, fr, analysis):
+        """Write the LCOV record for a single file."""
+        self.totals += analysis.numbers
+        lines = ["SF:%s" % fr.relative_filename()]
+
+        if self.has_functions:
+            names = [(lineno, analysis.functions[lineno]) for lineno in sorted(analysis.statements)]
+            for lineno, name in names:
+                lines.append("FN:%d,%s" % (lineno, name))
+            for lineno, name in names:
+                lines.append("FNDA:%d,%s" % (int(lineno not in analysis.missing), name))
+            lines.append("FNF:%d" % len(names))
+            lines.append("FNH:%d" % (len(names) - len(analysis.missing)))
+
+        for lineno in sorted(analysis.statements):
+            lines.append("DA:%d,%d" % (lineno, int(lineno not in analysis.missing)))
+
+        if self.has_arcs:
+            lines.extend(self.branch_lines(analysis))
+
+        lines.append("LF:%d" % len(analysis.statements))
+        lines.append("LH:%d" % (len(analysis.statements) - len(analysis.missing)))
+        lines.append("end_of_record")
+        self.outfile.write("\n".join(lines) + "\n")
+
+    def branch_lines(self, analysis):
+        """Make the BRDA, BRF and BRH lines for a file's branches.
+
+        Each branch line is one block, with a branch for each of its possible
+        exits.  The exits of a line that never ran are marked "-".
+
+        """
+        branch_lines = set(analysis.branch_lines())
+        exits = {}
+        for l1, l2 in analysis.arc_possibilities():
+            if l1 in branch_lines:
+                exits.setdefault(l1, []).append(l2)
+        missing_arcs = analysis.missing_branch_arcs()
+
+        lines = []
+        n_branches = n_taken = 0
+        for l1 in sorted(exits):
+            for branch, l2 in enumerate(sorted(exits[l1])):
+                if l1 in analysis.missing:
+                    taken = "-"
+                elif l2 in missing_arcs.get(l1, ()):
+                    taken = "0"
+                else:
+                    taken = "1"
+                    n_taken += 1
+                n_branches += 1
+                lines.append("BRDA:%d,0,%d,%s" % (l1, branch, taken))
+        lines.append("BRF:%d" % n_branches)
+        lines.append("BRH:%d" % n_taken)
+        return lines
@@ -9,6 +9,7 @@ import inspect
 import locale
 import os
 import re
+import stat
 import sys
 import types
 
@@ -181,6 +182,53 @@ def file_be_gone(path):
             raise
 
 
+def private_temp_dir():
+    """A directory in the temp directory that only the current user can use.
+
+    It's created if it doesn't exist.  Other users can't read or write files
+    in it, or plant their own files there.  Raises CoverageException if it
+    exists but isn't safe: not a directory, owned by another user, or open to
+    others.
+
+    """
+    import tempfile
+    has_uids = hasattr(os, "getuid")
+    name = "coverage-{}".format(os.getuid()) if has_uids else "coverage"
+    path = os.path.join(tempfile.gettempdir(), name)
+    try:
+        os.mkdir(path, 0o700)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise CoverageException("Couldn't make temp directory {!r}: {}".format(path, e))
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode):
+        raise CoverageException("Temp directory {!r} isn't a directory".format(path))
+    if has_uids and (st.st_uid != os.getuid() or st.st_mode & 0o077):
+        raise CoverageException("Temp directory {!r} isn't private".format(path))
+    return path
+
+
+def write_private_file(path, text):
+    """Write `text` to the file `path`, readable only by the current user.
+
+    The text goes to a new temporary file in the same directory, created
+    exclusively so that nothing already there is followed or overwritten, and
+    is then renamed to `path`, so that other processes never read a partial
+    file.
+
+    """
+    import tempfile
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            f.write(text)
+        # Python 2 has no os.replace, but its os.rename replaces on POSIX.
+        getattr(os, "replace", os.rename)(temp_path, path)
+    except Exception:
+        file_be_gone(temp_path)
+        raise
+
+
 def output_encoding(outfile=None):
     """Determine the encoding to use for output written to `outfile` or stdout."""
     if outfile is None:
@@ -28,7 +28,7 @@ class ProcessWithCoverage(OriginalProcess):
     def _bootstrap(self):
         """Wrapper around _bootstrap to start coverage."""
         from coverage import Coverage       # avoid circular import
-        cov = Coverage(data_suffix=True)
+        cov = Coverage(data_suffix=True, _cache_config=True)
         cov._warn_preimported_source = False
         cov.start()
         debug = cov._debug
@@ -89,6 +89,9 @@ class PythonParser(object):
         self._all_arcs = None
         self._missing_arc_fragments = None
 
+        # Lazily-created map of function first lines to function names.
+        self._functions = None
+
     @property
     def byte_parser(self):
         """Create a ByteParser on demand."""
@@ -281,6 +284,27 @@ class PythonParser(object):
 
         self._missing_arc_fragments = aaa.missing_arc_fragments
 
+    def functions(self):
+        """Get information about the functions defined in the code.
+
+        Returns a dict mapping the first line of each function to the function's
+        name.  The first line is the first line of the function's code object:
+        its first decorator if it has any, otherwise its `def` line.  This is
+        the line recorded when measuring with function granularity.  Line
+        numbers have been normalized to the first line of multi-line
+        statements, and excluded functions are not included.
+
+        """
+        if self._functions is None:
+            aaa = AstArcAnalyzer(self.text, self.raw_statements, self._multiline)
+            self._functions = {}
+            for start, body_start, name in aaa.find_functions():
+                header = range(start, max(start + 1, body_start))
+                if any(lineno in self.raw_excluded for lineno in header):
+                    continue
+                self._functions[self.first_line(start)] = name
+        return self._functions
+
     def exit_counts(self):
         """Get a count of exits from that each line.
 
@@ -550,6 +574,37 @@ class AstArcAnalyzer(object):
             if code_object_handler is not None:
                 code_object_handler(node)
 
+    def find_functions(self, node=None, prefix=""):
+        """Find the function definitions in the AST tree from `root_node`.
+
+        Yields (start, body_start, name) triples for each `def` or `async def`.
+        `start` is the first line of the function's code object, `body_start`
+        is the first line of its body, and `name` is a dotted name including
+        the enclosing classes and functions, like "Class.method".
+
+        """
+        if node is None:
+            node = self.root_node
+        for child in ast.iter_child_nodes(node):
+            node_name = child.__class__.__name__
+            if node_name in ("FunctionDef", "AsyncFunctionDef"):
+                # Like _code_object__FunctionDef, but a decorated function's
+                # code object starts at its first decorator.
+                start = self.line_for_node(child)
+                for dec_node in child.decorator_list:
+                    start = min(start, self.line_for_node(dec_node))
+                body_start = self.line_for_node(child.body[0])
+                name = prefix + child.name
+                yield start, body_start, name
+                for triple in self.find_functions(child, name + "."):
+                    yield triple
+            elif node_name == "ClassDef":
+                for triple in self.find_functions(child, prefix + child.name + "."):
+                    yield triple
+            else:
+                for triple in self.find_functions(child, prefix):
+                    yield triple
+
     @contract(start=int, end=int)
     def add_arc(self, start, end, smsg=None, emsg=None):
         """Add an arc, including message fragments to use if it is missing."""
@@ -401,6 +401,19 @@ class FileReporter(object):
         """
         return arcs
 
+    def functions(self):
+        """Get the functions in this file, for function granularity.
+
+        Returns a dict mapping line numbers to function names.  Each line
+        number is the line recorded when the function is called, the first
+        line of its code object.  These are the "statements" reported when
+        coverage is measured with ``[run] granularity = function``.
+
+        The default implementation returns an empty dict.
+
+        """
+        return {}
+
     def exit_counts(self):
         """Get a count of exits from that each line.
 
@@ -459,6 +472,18 @@ class FileReporter(object):
         for line in self.source().splitlines():
             yield [('txt', line)]
 
+    def release(self):
+        """Free the memory used for this file's source and analysis.
+
+        Reports call this when they are done with a file, so that memory
+        doesn't grow with the number of files reported.  Anything freed should
+        be recomputed if it's needed again.
+
+        The default implementation does nothing.
+
+        """
+        pass
+
     # Annoying comparison operators. Py3k wants __lt__ etc, and Py2k needs all
     # of them defined.
 
@@ -0,0 +1,60 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Installing a .pth file to measure sub-processes.
+
+Python runs the import lines in .pth files at every start-up, whether or not
+coverage is wanted.  The line installed here checks COVERAGE_PROCESS_START
+itself, and only imports coverage.py if measurement was asked for, so that
+processes that aren't measured don't pay for importing it.
+
+"""
+
+import os
+import os.path
+import sysconfig
+
+from coverage.misc import file_be_gone, isolate_module
+
+os = isolate_module(os)
+
+
+PTH_NAME = "coverage-process-start.pth"
+
+# The os module is always imported by the time .pth files are processed, so
+# this costs almost nothing when COVERAGE_PROCESS_START isn't set.
+PTH_LINE = (
+    "import os; "
+    "os.environ.get('COVERAGE_PROCESS_START') and "
+    "__import__('coverage').process_startup()\n"
+)
+
+
+def pth_directory():
+    """The directory to install the .pth file in: the site-packages."""
+    return sysconfig.get_paths()["purelib"]
+
+
+def install_pth(directory=None):
+    """Write the .pth file into `directory`, or site-packages.
+
+    Returns the path of the file written.
+
+    """
+    pth_path = os.path.join(directory or pth_directory(), PTH_NAME)
+    with open(pth_path, "w") as pth:
+        pth.write(PTH_LINE)
+    return pth_path
+
+
+def remove_pth(directory=None):
+    """Remove the .pth file from `directory`, or site-packages.
+
+    Returns the path of the file removed, or None if there wasn't one.
+
+    """
+    pth_path = os.path.join(directory or pth_directory(), PTH_NAME)
+    if not os.path.exists(pth_path):
+        return None
+    file_be_gone(pth_path)
+    return pth_path
@@ -10,7 +10,6 @@ import zipimport
 from coverage import env, files
 from coverage.misc import contract, expensive, isolate_module, join_regex
 from coverage.misc import CoverageException, NoSource
-from coverage.parser import PythonParser
 from coverage.phystokens import source_token_lines, source_encoding
 from coverage.plugin import FileReporter
 
@@ -172,6 +171,16 @@ class PythonFileReporter(FileReporter):
     def __repr__(self):
         return "<PythonFileReporter {0!r}>".format(self.filename)
 
+    def release(self):
+        """Forget the source and the parsing of it, to free their memory.
+
+        Reports call this when they are done with a file.  The source is read
+        and parsed again if it's needed again.
+
+        """
+        self._source = None
+        self._parser = None
+
     @contract(returns='unicode')
     def relative_filename(self):
         return self.relname
@@ -180,6 +189,9 @@ class PythonFileReporter(FileReporter):
     def parser(self):
         """Lazily create a :class:`PythonParser`."""
         if self._parser is None:
+            # Measuring only needs this module for finding source, so the
+            # parser is imported when it's first needed for reporting.
+            from coverage.parser import PythonParser
             self._parser = PythonParser(
                 filename=self.filename,
                 exclude=self.coverage._exclude_regex('exclude'),
@@ -217,6 +229,10 @@ class PythonFileReporter(FileReporter):
     def exit_counts(self):
         return self.parser.exit_counts()
 
+    @expensive
+    def functions(self):
+        return self.parser.functions()
+
     def missing_arc_description(self, start, end, executed_arcs=None):
         return self.parser.missing_arc_description(start, end, executed_arcs)
 
@@ -14,6 +14,9 @@ YIELD_VALUE = dis.opmap['YIELD_VALUE']
 if env.PY2:
     YIELD_VALUE = chr(YIELD_VALUE)
 
+# How many calls between calls to check_memory.
+MEMORY_CHECK_CALLS = 100000
+
 
 class PyTracer(object):
     """Python implementation of the raw data tracer."""
@@ -33,16 +36,28 @@ class PyTracer(object):
     # Systems that use DecoratorTools (or similar trace manipulations) must use
     # PyTracer to get accurate results.  The command-line --timid argument is
     # used to force the use of this tracer.
+    #
+    # The one exception is measuring with function granularity: there we only
+    # need call events, so returning None from the call event is the whole
+    # point.  That mode is opt-in, and trades this robustness for speed.
 
     def __init__(self):
         # Attributes set from the collector:
         self.data = None
         self.trace_arcs = False
+        self.trace_functions = False
         self.should_trace = None
         self.should_trace_cache = None
         self.warn = None
         # The threading module to use, if any.
         self.threading = None
+        # A dict to count events per file in, or None.
+        self.file_events = None
+        # A function to call every so often to limit the data size, or None.
+        self.check_memory = None
+
+        # Counters for get_stats.
+        self.calls = self.lines = self.returns = self.files = 0
 
         self.cur_file_dict = None
         self.last_line = 0          # int, but uninitialized.
@@ -90,6 +105,36 @@ class PyTracer(object):
             sys.settrace(None)
             return None
 
+        if self.file_events is not None:
+            filename = frame.f_code.co_filename
+            self.file_events[filename] = self.file_events.get(filename, 0) + 1
+
+        if self.trace_functions:
+            # Only function calls are recorded.  Returning None means the new
+            # frame gets no local trace function, so no line, return, or
+            # exception events will be delivered for it.  Re-entering a
+            # generator is also a call event, but simply records the same
+            # function again.
+            if event == 'call':
+                self.calls += 1
+                if self.check_memory and self.calls % MEMORY_CHECK_CALLS == 0:
+                    self.check_memory()
+                code = frame.f_code
+                if code.co_name[0] != '<':
+                    self._activity = True
+                    filename = code.co_filename
+                    disp = self.should_trace_cache.get(filename)
+                    if disp is None:
+                        self.files += 1
+                        disp = self.should_trace(filename, frame)
+                        self.should_trace_cache[filename] = disp
+                    if disp.trace:
+                        tracename = disp.source_filename
+                        if tracename not in self.data:
+                            self.data[tracename] = {}
+                        self.data[tracename][code.co_firstlineno] = None
+            return None
+
         if self.last_exc_back:
             if frame == self.last_exc_back:
                 # Someone forgot a return event.
@@ -102,12 +147,16 @@ class PyTracer(object):
         if event == 'call':
             # Entering a new function context.  Decide if we should trace
             # in this file.
+            self.calls += 1
+            if self.check_memory and self.calls % MEMORY_CHECK_CALLS == 0:
+                self.check_memory()
             self._activity = True
             self.data_stack.append((self.cur_file_dict, self.cur_file_name, self.last_line))
             filename = frame.f_code.co_filename
             self.cur_file_name = filename
             disp = self.should_trace_cache.get(filename)
             if disp is None:
+                self.files += 1
                 disp = self.should_trace(filename, frame)
                 self.should_trace_cache[filename] = disp
 
@@ -127,6 +176,7 @@ class PyTracer(object):
                 self.last_line = frame.f_lineno
         elif event == 'line':
             # Record an executed line.
+            self.lines += 1
             if self.cur_file_dict is not None:
                 lineno = frame.f_lineno
                 #if frame.f_code.co_filename != self.cur_file_name:
@@ -137,6 +187,7 @@ class PyTracer(object):
                     self.cur_file_dict[lineno] = None
                 self.last_line = lineno
         elif event == 'return':
+            self.returns += 1
             if self.trace_arcs and self.cur_file_dict:
                 # Record an arc leaving the function, but beware that a
                 # "return" event might just mean yielding from a generator.
@@ -211,5 +262,13 @@ class PyTracer(object):
         self._activity = False
 
     def get_stats(self):
-        """Return a dictionary of statistics, or None."""
-        return None
+        """Return a dictionary of statistics."""
+        return {
+            "calls": self.calls,
+            "lines": self.lines,
+            "returns": self.returns,
+            "files": self.files,
+            # This tracer doesn't support plugins or dynamic contexts.
+            "dynamic_calls": 0,
+            "start_context_calls": 0,
+        }
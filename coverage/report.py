@@ -4,14 +4,56 @@
 """Reporter foundation for coverage.py."""
 
 import os
+import sys
 import warnings
 
-from coverage.files import prep_patterns, FnmatchMatcher
-from coverage.misc import CoverageException, NoSource, NotPython, isolate_module
+from coverage import env
+from coverage.diff import read_diff
+from coverage.files import abs_file, prep_patterns, FnmatchMatcher
+from coverage.misc import CoverageException, NoSource, NotPython, file_be_gone, isolate_module
 
 os = isolate_module(os)
 
 
+def render_report(output_path, reporter, morfs):
+    """Run a one-file report, managing the output file.
+
+    `output_path` is the file to write, or "-" or empty for stdout.  The
+    directory for the file is made if needed, and the file is removed if the
+    report fails.
+
+    Returns what `reporter.report` returns.
+
+    """
+    file_to_close = None
+    delete_file = False
+    if not output_path or output_path == '-':
+        outfile = sys.stdout
+    else:
+        # Ensure that the output directory is created; done here because this
+        # report pre-opens the output file.  HTMLReport does this using the
+        # Report plumbing because its task is more complex, being multiple
+        # files.
+        output_dir = os.path.dirname(output_path)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        open_kwargs = {}
+        if env.PY3:
+            open_kwargs['encoding'] = 'utf8'
+        outfile = open(output_path, "w", **open_kwargs)
+        file_to_close = outfile
+    try:
+        return reporter.report(morfs, outfile=outfile)
+    except CoverageException:
+        delete_file = True
+        raise
+    finally:
+        if file_to_close:
+            file_to_close.close()
+            if delete_file:
+                file_be_gone(output_path)
+
+
 class Reporter(object):
     """A base class for all reporters."""
 
@@ -29,6 +71,10 @@ class Reporter(object):
         # classes.
         self.directory = None
 
+        # With a diff, maps the absolute names of the changed files to the
+        # sets of changed line numbers.  Only those are reported.
+        self.diff_lines = None
+
         # Our method find_file_reporters used to set an attribute that other
         # code could read.  That's been refactored away, but some third parties
         # were using that attribute.  We'll continue to support it in a noisy
@@ -52,7 +98,21 @@ class Reporter(object):
         Returns a list of FileReporters.
 
         """
-        reporters = self.coverage._get_file_reporters(morfs)
+        if self.config.report_diff:
+            self.diff_lines = read_diff(self.config.report_diff)
+
+        if self.diff_lines is not None and not morfs:
+            # Only make FileReporters for the measured files in the diff.
+            measured = self.coverage.get_data().measured_files()
+            reporters = [
+                self.coverage._get_file_reporter(filename) for filename in measured
+                if abs_file(filename) in self.diff_lines
+            ]
+        else:
+            reporters = self.coverage._get_file_reporters(morfs)
+
+        if self.diff_lines is not None:
+            reporters = [fr for fr in reporters if self.changed_lines(fr) is not None]
 
         if self.config.report_include:
             matcher = FnmatchMatcher(prep_patterns(self.config.report_include))
@@ -65,6 +125,40 @@ class Reporter(object):
         self._file_reporters = sorted(reporters)
         return self._file_reporters
 
+    def total_percent(self, total):
+        """The percentage to return from a report whose totals are `total`.
+
+        A report with no statements returns 0, unless it's of a diff: a diff
+        that changes no statements leaves none of them missing.
+
+        """
+        if not total.n_statements and self.diff_lines is None:
+            return 0
+        return total.pc_covered
+
+    def changed_lines(self, fr):
+        """The set of lines the diff changed in `fr`, or None if unchanged."""
+        return self.diff_lines.get(abs_file(fr.filename))
+
+    def analyze(self, fr):
+        """Get the `Analysis` for `fr`, only of the changed lines if there's a diff."""
+        analysis = self.coverage._analyze(fr)
+        if self.diff_lines is not None:
+            # Changing any line of a multi-line statement changes the
+            # statement, which is known by its first line.
+            changed = set(self.changed_lines(fr))
+            analysis.narrow(changed | set(fr.translate_lines(changed)))
+        return analysis
+
+    def release(self, fr):
+        """Free the memory used by `fr` for its source, once it's reported.
+
+        Reporters keep only what they need from each file, such as its
+        `Numbers`, so memory doesn't grow with the number of files reported.
+
+        """
+        fr.release()
+
     def report_files(self, report_fn, morfs, directory=None):
         """Run a reporting function on a number of morfs.
 
@@ -74,12 +168,15 @@ class Reporter(object):
             report_fn(file_reporter, analysis)
 
         where `file_reporter` is the `FileReporter` for the morf, and
-        `analysis` is the `Analysis` for the morf.
+        `analysis` is the `Analysis` for the morf.  The files are reported
+        one at a time, so `report_fn` should keep only what it needs from them.
+        The source and parsing of the file are released once it returns.
 
         """
         file_reporters = self.find_file_reporters(morfs)
 
-        if not file_reporters:
+        # A diff that changes no measured files gives an empty report.
+        if not file_reporters and self.diff_lines is None:
             raise CoverageException("No data to report.")
 
         self.directory = directory
@@ -88,7 +185,7 @@ class Reporter(object):
 
         for fr in file_reporters:
             try:
-                report_fn(fr, self.coverage._analyze(fr))
+                report_fn(fr, self.analyze(fr))
             except NoSource:
                 if not self.config.ignore_errors:
                     raise
@@ -102,3 +199,5 @@ class Reporter(object):
                         self.coverage._warn("Could not parse Python file {0}".format(fr.filename))
                     else:
                         raise
+            finally:
+                self.release(fr)
@@ -17,7 +17,14 @@ class Analysis(object):
         self.data = data
         self.file_reporter = file_reporter
         self.filename = self.file_reporter.filename
-        self.statements = self.file_reporter.lines()
+        if self.has_functions():
+            # With function granularity, the "statements" are the first lines
+            # of the functions, which is what the tracer recorded.
+            self.functions = self.file_reporter.functions()
+            self.statements = set(self.functions)
+        else:
+            self.functions = {}
+            self.statements = self.file_reporter.lines()
         self.excluded = self.file_reporter.excluded_lines()
 
         # Identify missing statements.
@@ -29,17 +36,24 @@ class Analysis(object):
             self._arc_possibilities = sorted(self.file_reporter.arcs())
             self.exit_counts = self.file_reporter.exit_counts()
             self.no_branch = self.file_reporter.no_branch_lines()
+        else:
+            self._arc_possibilities = []
+            self.exit_counts = {}
+            self.no_branch = set()
+
+        self.numbers = self._count_numbers()
+
+    def _count_numbers(self):
+        """Make the Numbers for this analysis."""
+        if self.data.has_arcs():
             n_branches = self.total_branches()
             mba = self.missing_branch_arcs()
             n_partial_branches = sum(len(v) for k,v in iitems(mba) if k not in self.missing)
             n_missing_branches = sum(len(v) for k,v in iitems(mba))
         else:
-            self._arc_possibilities = []
-            self.exit_counts = {}
-            self.no_branch = set()
             n_branches = n_partial_branches = n_missing_branches = 0
 
-        self.numbers = Numbers(
+        return Numbers(
             n_files=1,
             n_statements=len(self.statements),
             n_excluded=len(self.excluded),
@@ -49,6 +63,22 @@ class Analysis(object):
             n_missing_branches=n_missing_branches,
         )
 
+    def narrow(self, lines):
+        """Limit this analysis to the line numbers in `lines`.
+
+        Only the statements, excluded lines, and branches on those lines are
+        kept, and the numbers are counted again.  This is how a report covers
+        just the lines changed by a diff.
+
+        """
+        lines = set(lines)
+        self.statements = self.statements & lines
+        self.excluded = self.excluded & lines
+        self.missing = self.missing & lines
+        self._arc_possibilities = [a for a in self._arc_possibilities if a[0] in lines]
+        self.exit_counts = dict((l, n) for l, n in iitems(self.exit_counts) if l in lines)
+        self.numbers = self._count_numbers()
+
     def missing_formatted(self):
         """The missing line numbers, formatted nicely.
 
@@ -61,6 +91,10 @@ class Analysis(object):
         """Were arcs measured in this result?"""
         return self.data.has_arcs()
 
+    def has_functions(self):
+        """Were functions measured in this result, rather than lines?"""
+        return self.data.has_functions()
+
     def arc_possibilities(self):
         """Returns a sorted list of the arcs in the code."""
         return self._arc_possibilities
@@ -272,6 +306,54 @@ class Numbers(SimpleReprMixin):
         return NotImplemented
 
 
+class Rollup(object):
+    """Totals of `Numbers` for the directories of the files reported.
+
+    Files are added one at a time with `add`.  Each file's numbers are added to
+    the total, to its group, and to every directory above it, so the whole tree
+    is built in one pass over the files.
+
+    `depth` is how many levels of directories are totaled.  A file's group is
+    its directory, cut to `depth` levels, or "" for a file at the top.
+
+    """
+
+    def __init__(self, depth):
+        self.depth = depth
+        self.total = Numbers()
+
+        # Maps "/"-separated directory names to the Numbers for all the files
+        # below them, down to `depth` levels.
+        self.directories = {}
+
+        # Maps group names to the Numbers for the files in the group.
+        self.groups = {}
+
+    def group_name(self, filename):
+        """The group for `filename`, a relative file name."""
+        parts = filename.replace("\\", "/").split("/")[:-1]
+        return "/".join(parts[:self.depth])
+
+    def add(self, filename, nums):
+        """Add the Numbers `nums` for `filename`, a relative file name.
+
+        Returns the name of the group the file is in.
+
+        """
+        group = self.group_name(filename)
+        self.total += nums
+        self.groups[group] = self.groups.get(group, Numbers()) + nums
+        parts = group.split("/") if group else []
+        for i in range(1, len(parts) + 1):
+            dirname = "/".join(parts[:i])
+            self.directories[dirname] = self.directories.get(dirname, Numbers()) + nums
+        return group
+
+    def directory_totals(self):
+        """A list of (directory name, Numbers) pairs, sorted by name."""
+        return sorted(iitems(self.directories))
+
+
 @contract(total='number', fail_under='number', precision=int, returns=bool)
 def should_fail_under(total, fail_under, precision):
     """Determine if a total should fail due to fail-under.
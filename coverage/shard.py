@@ -0,0 +1,407 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Compact append-only data files for parallel-mode processes.
+
+A shard is cheap to write: it's one buffered write of packed binary records,
+with none of the set-up of a SQLite data file.  ``coverage combine`` adds
+shards to the combined data file in bulk.
+
+A shard starts with a header::
+
+    magic "COVSHARD", version (uint16), flags (uint16)
+
+followed by any number of records, each a type (uint8) and a payload length
+(uint32) followed by the payload.  Numbers are big-endian.  Each time data is
+written, more records are appended, so the file never needs to be rewritten.
+
+"""
+
+import json
+import os
+import struct
+
+from coverage.backward import iitems
+from coverage.data import CoverageData, CoverageJsonData, InMemoryDataMixin, filename_suffix
+from coverage.debug import NoDebugging, SimpleReprMixin
+from coverage.files import PathAliases
+from coverage.misc import CoverageException, isolate_module
+
+os = isolate_module(os)
+
+
+# Shard versions:
+# 1: Released in 5.0
+SHARD_VERSION = 1
+
+MAGIC = b"COVSHARD"
+HEADER = struct.Struct("!8sHH")
+
+# Header flags.
+FLAG_ARCS = 0x1
+FLAG_FUNCTIONS = 0x2
+
+RECORD = struct.Struct("!BI")
+ID = struct.Struct("!I")
+TWO_IDS = struct.Struct("!II")
+
+# Record types, and their payloads:
+REC_FILE = 1        # file id, UTF-8 path.
+REC_CONTEXT = 2     # context id, UTF-8 context name.
+REC_TRACER = 3      # file id, UTF-8 plugin name.
+REC_LINES = 4       # context id, file id, int32 line numbers.
+REC_ARCS = 5        # context id, file id, int32 pairs of line numbers.
+REC_RUN_INFO = 6    # JSON object of run information.
+
+
+def is_shard(filename):
+    """Is `filename` a shard file?"""
+    try:
+        with open(filename, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except IOError:
+        return False
+
+
+class ShardData(InMemoryDataMixin, SimpleReprMixin):
+    """Coverage data that is written as a shard.
+
+    This stands in for a parallel-mode :class:`CoverageData`.  Data is kept in
+    memory until :meth:`write` appends it to the shard file.  Reading gets the
+    data collected since the last write.
+
+    """
+
+    def __init__(self, basename=None, suffix=None, warn=None, debug=None):
+        self._basename = os.path.abspath(basename or ".coverage")
+        self._suffix = suffix
+        self._warn = warn
+        self._debug = debug or NoDebugging()
+        self.filename = None
+
+        self._has_arcs = False
+        self._has_functions = False
+        self._current_context = ""
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        """Forget the data we have, because it has been written or erased."""
+        if self._pid != os.getpid():
+            # A new process (or we forked): use a new file, and new ids in it.
+            self._pid = os.getpid()
+            self.filename = None
+            self._file_ids = {}
+            self._context_ids = {}
+        # {context: {filename: set(lines or arcs)}}
+        self._data = {}
+        self._file_tracers = {}
+        self._run_info = {}
+
+    def _start_using(self):
+        """Start a new shard if we've forked from the process that made ours."""
+        if self._pid != os.getpid():
+            self._reset()
+
+    def set_context(self, context):
+        """Set the current context for future `add_lines` etc."""
+        self._current_context = context or ""
+
+    def _add(self, data):
+        """Add the lines or arcs in `data` to the current context."""
+        self._start_using()
+        context_data = self._data.setdefault(self._current_context, {})
+        for filename, values in iitems(data):
+            context_data.setdefault(filename, set()).update(values)
+
+    def _choose_lines_or_arcs(self, arcs=False, functions=False):
+        """Check that the kind of data being added is the kind we have."""
+        if self._data or self._file_ids:
+            if arcs != self._has_arcs:
+                raise CoverageException("Can't mix line and arc data in a shard")
+            if functions != self._has_functions:
+                raise CoverageException("Can't mix line and function data in a shard")
+        self._has_arcs = arcs
+        self._has_functions = functions
+
+    def add_lines(self, line_data):
+        """Add measured line data."""
+        self._choose_lines_or_arcs()
+        self._add(line_data)
+
+    def add_functions(self, function_data):
+        """Add measured function data."""
+        self._choose_lines_or_arcs(functions=True)
+        self._add(function_data)
+
+    def add_arcs(self, arc_data):
+        """Add measured arc data."""
+        self._choose_lines_or_arcs(arcs=True)
+        self._add(arc_data)
+
+    def add_file_tracers(self, file_tracers):
+        """Add per-file plugin information."""
+        self._start_using()
+        for filename, plugin_name in iitems(file_tracers):
+            if plugin_name:
+                self._file_tracers[filename] = plugin_name
+
+    def touch_file(self, filename, plugin_name=""):
+        """Ensure that `filename` appears in the data, empty if needed."""
+        self.touch_files([filename], plugin_name)
+
+    def touch_files(self, filenames, plugin_name=""):
+        """Ensure that `filenames` appear in the data, empty if needed."""
+        self._add(dict((filename, ()) for filename in filenames))
+        if plugin_name:
+            for filename in filenames:
+                self._file_tracers[filename] = plugin_name
+
+    def add_run_info(self, **kwargs):
+        """Add information about the run."""
+        self._start_using()
+        self._run_info.update(kwargs)
+
+    def _measured_data(self):
+        """Get the data not written yet: {context: {filename: set(lines or arcs)}}."""
+        self._start_using()
+        return self._data
+
+    def _plugin_names(self):
+        """Get the plugin names of the files measured by plugins."""
+        return self._file_tracers
+
+    def read(self):
+        """Shards are only written by the process that measures."""
+        pass
+
+    def erase(self, parallel=False):
+        """Forget the data collected so far."""
+        self._reset()
+        if parallel:
+            CoverageData(self._basename, debug=self._debug).erase(parallel=True)
+
+    def write(self):
+        """Append the data collected since the last write to the shard."""
+        self._start_using()
+        if not self._data and (self.filename is None or not self._run_info):
+            # The header says whether the shard has lines or arcs, so a new
+            # shard isn't started until there's data to say which.
+            return
+        if self.filename is None:
+            self.filename = self._basename
+            suffix = filename_suffix(self._suffix or True)
+            if suffix:
+                self.filename += "." + suffix
+
+        chunks = []
+        if not os.path.exists(self.filename):
+            flags = (FLAG_ARCS if self._has_arcs else 0)
+            flags |= (FLAG_FUNCTIONS if self._has_functions else 0)
+            chunks.append(HEADER.pack(MAGIC, SHARD_VERSION, flags))
+
+        def record(rec_type, payload):
+            """Add one record to `chunks`."""
+            chunks.append(RECORD.pack(rec_type, len(payload)))
+            chunks.append(payload)
+
+        def new_id(ids, name, rec_type):
+            """Get the id for `name`, adding a record if it's new."""
+            if name not in ids:
+                ids[name] = len(ids)
+                record(rec_type, ID.pack(ids[name]) + name.encode("utf8"))
+            return ids[name]
+
+        for context, context_data in sorted(iitems(self._data)):
+            context_id = new_id(self._context_ids, context, REC_CONTEXT)
+            for filename, values in sorted(iitems(context_data)):
+                file_id = new_id(self._file_ids, filename, REC_FILE)
+                ids = TWO_IDS.pack(context_id, file_id)
+                if self._has_arcs:
+                    numbers = [l for arc in sorted(values) for l in arc]
+                    rec_type = REC_ARCS
+                else:
+                    numbers = sorted(values)
+                    rec_type = REC_LINES
+                record(rec_type, ids + struct.pack("!%di" % len(numbers), *numbers))
+
+        for filename, plugin_name in sorted(iitems(self._file_tracers)):
+            file_id = new_id(self._file_ids, filename, REC_FILE)
+            record(REC_TRACER, ID.pack(file_id) + plugin_name.encode("utf8"))
+
+        if self._run_info:
+            record(REC_RUN_INFO, json.dumps(self._run_info).encode("utf8"))
+
+        if self._debug.should('dataio'):
+            self._debug.write("Writing shard {!r}".format(self.filename))
+        with open(self.filename, "ab") as f:
+            f.write(b"".join(chunks))
+        self._reset()
+
+
+class Shard(SimpleReprMixin):
+    """The data read from a shard file."""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.version = None
+        self.has_arcs = False
+        self.has_functions = False
+        # {context: {filename: set(lines or arcs)}}
+        self.data = {}
+        self.file_tracers = {}
+        # One dict of run information for each process.
+        self.run_infos = []
+
+    def read(self):
+        """Read the shard file."""
+        with open(self.filename, "rb") as f:
+            contents = f.read()
+
+        if len(contents) < HEADER.size:
+            raise self._error("too short")
+        magic, self.version, flags = HEADER.unpack_from(contents)
+        if magic != MAGIC:
+            raise self._error("not a shard")
+        if self.version != SHARD_VERSION:
+            raise self._error("wrong version: {} instead of {}".format(self.version, SHARD_VERSION))
+        self.has_arcs = bool(flags & FLAG_ARCS)
+        self.has_functions = bool(flags & FLAG_FUNCTIONS)
+
+        # A damaged record can refer to ids that were never defined, or be too
+        # short for its fields.
+        try:
+            self._read_records(contents)
+        except KeyError as exc:
+            raise self._error("undefined id {}".format(exc))
+        except (struct.error, ValueError) as exc:
+            raise self._error("bad record: {}".format(exc))
+
+    def _read_records(self, contents):
+        """Read the records that follow the header in `contents`."""
+        files = {}
+        contexts = {}
+        pos = HEADER.size
+        while pos < len(contents):
+            if pos + RECORD.size > len(contents):
+                raise self._error("truncated record")
+            rec_type, length = RECORD.unpack_from(contents, pos)
+            pos += RECORD.size
+            payload = contents[pos:pos+length]
+            if len(payload) != length:
+                raise self._error("truncated record")
+            pos += length
+
+            if rec_type in (REC_FILE, REC_CONTEXT, REC_TRACER):
+                id_num, = ID.unpack_from(payload)
+                text = payload[ID.size:].decode("utf8")
+                if rec_type == REC_FILE:
+                    files[id_num] = text
+                elif rec_type == REC_CONTEXT:
+                    contexts[id_num] = text
+                else:
+                    self.file_tracers[files[id_num]] = text
+            elif rec_type in (REC_LINES, REC_ARCS):
+                context_id, file_id = TWO_IDS.unpack_from(payload)
+                numbers = struct.unpack_from(
+                    "!%di" % ((length - TWO_IDS.size) // 4), payload, TWO_IDS.size
+                )
+                if rec_type == REC_ARCS:
+                    values = zip(numbers[0::2], numbers[1::2])
+                else:
+                    values = numbers
+                context_data = self.data.setdefault(contexts[context_id], {})
+                context_data.setdefault(files[file_id], set()).update(values)
+            elif rec_type == REC_RUN_INFO:
+                # One process writes a shard, so its run information is merged.
+                if not self.run_infos:
+                    self.run_infos.append({})
+                self.run_infos[0].update(json.loads(payload.decode("utf8")))
+            else:
+                raise self._error("unknown record type {}".format(rec_type))
+
+    def _error(self, problem):
+        """Make an exception for a problem reading the file."""
+        return CoverageException(
+            "Couldn't read shard {!r}: {}".format(self.filename, problem)
+        )
+
+    def measured_files(self):
+        """The set of files measured in the shard."""
+        return set(f for context_data in self.data.values() for f in context_data)
+
+    def line_counts(self):
+        """Return {filename: number of executed lines} across all contexts."""
+        lines = {}
+        for context_data in self.data.values():
+            for filename, values in iitems(context_data):
+                if self.has_arcs:
+                    values = (l for arc in values for l in arc if l > 0)
+                lines.setdefault(filename, set()).update(values)
+        return dict((filename, len(linenos)) for filename, linenos in iitems(lines))
+
+    def update(self, other):
+        """Merge the data from the Shard `other` into this one."""
+        if self.data and other.data:
+            if self.has_arcs != other.has_arcs:
+                raise CoverageException("Can't combine arc data with line data")
+            if self.has_functions != other.has_functions:
+                raise CoverageException("Can't combine function data with line data")
+        if other.data:
+            self.has_arcs = other.has_arcs
+            self.has_functions = other.has_functions
+        for context, context_data in iitems(other.data):
+            our_data = self.data.setdefault(context, {})
+            for filename, values in iitems(context_data):
+                our_data.setdefault(filename, set()).update(values)
+        for filename, plugin_name in iitems(other.file_tracers):
+            our_plugin = self.file_tracers.setdefault(filename, plugin_name)
+            if our_plugin != plugin_name:
+                raise CoverageException(
+                    "Conflicting file tracer name for '%s': %r vs %r" % (
+                        filename, our_plugin, plugin_name,
+                    )
+                )
+        self.run_infos.extend(other.run_infos)
+
+    def add_to(self, data, aliases=None):
+        """Add the data from this shard to the CoverageData `data`.
+
+        If `aliases` is provided, it's a `PathAliases` object that is used to
+        re-map paths to match the local machine's.
+
+        """
+        aliases = aliases or PathAliases()
+        if self.has_arcs:
+            add = data.add_arcs
+        elif self.has_functions:
+            add = data.add_functions
+        else:
+            add = data.add_lines
+
+        filenames = set(self.file_tracers)
+        for context_data in self.data.values():
+            filenames.update(context_data)
+        mapped_names = aliases.map_all(filenames)
+
+        for context, context_data in sorted(iitems(self.data)):
+            data.set_context(context)
+            mapped = {}
+            for filename, values in iitems(context_data):
+                mapped.setdefault(mapped_names[filename], set()).update(values)
+            add(mapped)
+        data.set_context(None)
+
+        file_tracers = {}
+        for filename, plugin_name in iitems(self.file_tracers):
+            file_tracers[mapped_names[filename]] = plugin_name
+        if file_tracers:
+            data.add_file_tracers(file_tracers)
+
+        if hasattr(data, "add_run_info"):
+            # Updating keeps each process's run information separate, where
+            # `add_run_info` would merge them.
+            for run_info in self.run_infos:
+                run_data = CoverageJsonData()
+                run_data.add_run_info(**run_info)
+                data.update(run_data)
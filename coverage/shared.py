@@ -0,0 +1,468 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Collecting data in memory shared by forked processes.
+
+With ``[run] shared_memory = True``, the process that starts coverage finds
+the source files it will measure, and makes a map of flags for their lines (or
+arcs) in anonymous shared memory.  Processes forked from it inherit the map,
+so when any of them saves its data, it only sets flags in the map.  The
+starting process writes one data file for all of them when it saves.  A
+process that saves after that writes only the flags that are new since then,
+to a small data file of its own for `combine` to merge, so the big data file
+isn't rewritten by every process.
+
+If the starting process never saves, the last process to save writes the
+flags that no process has written yet.
+
+Data that doesn't fit in the map, like lines in files that weren't found at
+the start, or data in other contexts, is written to a separate per-process
+data file as usual.
+
+"""
+
+import fcntl
+import mmap
+import os
+import tempfile
+
+from coverage.backward import iitems
+from coverage.data import CoverageData, InMemoryDataMixin, filename_suffix
+from coverage.debug import NoDebugging, SimpleReprMixin
+from coverage.misc import CoverageException, NotPython, isolate_module
+from coverage.parser import PythonParser
+
+os = isolate_module(os)
+
+
+# The first byte of the map is set once the starting process has written the
+# data file.  The flags for files follow it, and then a second copy of the
+# flags, set once each flag has been written to a data file.
+HEADER_SIZE = 1
+
+
+def can_share():
+    """Can this platform share memory with forked processes?"""
+    return hasattr(os, "fork")
+
+
+class SharedFile(object):
+    """Where one measured file's flags are in the map."""
+
+    def __init__(self, offset, size, arc_index=None, multiline=None):
+        # The flags are the `size` bytes at `offset`.
+        self.offset = offset
+        self.size = size
+        # For arcs, maps each (from, to) arc to its flag number.
+        self.arc_index = arc_index
+        # For arcs, maps lines to the first lines of their statements.
+        self.multiline = multiline or {}
+        # For arcs, the arcs in flag order.
+        self.arcs = None
+        if arc_index is not None:
+            self.arcs = sorted(arc_index, key=arc_index.get)
+
+    def first_line(self, line):
+        """Return the first line of the statement including `line`."""
+        return self.multiline.get(line, line)
+
+
+class SharedData(InMemoryDataMixin, SimpleReprMixin):
+    """Coverage data kept in memory shared with forked processes.
+
+    This stands in for a parallel-mode :class:`CoverageData` in the process
+    that starts coverage.  Call :meth:`share` with the files to measure before
+    forking.
+
+    """
+
+    def __init__(self, basename=None, suffix=None, warn=None, debug=None):
+        self._basename = os.path.abspath(basename or ".coverage")
+        self._warn = warn
+        self._debug = debug or NoDebugging()
+
+        # Every process writes the same data file.
+        self.filename = self._basename
+        suffix = filename_suffix(suffix or True)
+        if suffix:
+            self.filename += "." + suffix
+
+        self._master_pid = os.getpid()
+        self._map = None
+        # Every process using the map holds a shared lock on this file
+        # descriptor until it saves, so the last one to save can tell that
+        # it's the last.
+        self._lock_fd = None
+        self._lock_pid = None
+        # Where the written flags start in the map.
+        self._written_offset = None
+        self._files = {}
+        self._has_arcs = False
+        self._has_functions = False
+        self._context = None
+        self._current_context = None
+
+        self._overflow = None
+        self._touched = {}
+        self._run_info = {}
+        self._pid = os.getpid()
+
+    def share(self, filenames, branch=False, exclude=None, granularity="line"):
+        """Make the shared map for measuring `filenames`.
+
+        `branch` is true if arcs will be measured.  `exclude` is the regex of
+        excluded lines, needed to find the possible arcs.  `granularity` is
+        the ``[run] granularity`` setting.
+
+        """
+        offset = HEADER_SIZE
+        for filename in filenames:
+            try:
+                parser = PythonParser(filename=filename, exclude=exclude)
+                parser.parse_source()
+            except (EnvironmentError, NotPython, SyntaxError):
+                # The file can still be measured, it just won't be shared.
+                continue
+            if branch:
+                arc_index = dict((arc, i) for i, arc in enumerate(sorted(parser.arcs())))
+                shared = SharedFile(offset, len(arc_index), arc_index, parser._multiline)
+            else:
+                # Python reports line 1 for an empty module, so there's always
+                # at least one line.  Lines inside multi-line statements are
+                # reported too, so every line of the file gets a flag.
+                n_lines = max([len(parser.lines)] + list(parser.raw_statements))
+                shared = SharedFile(offset, n_lines + 1)
+            self._files[filename] = shared
+            offset += shared.size
+
+        self._has_arcs = branch
+        self._has_functions = (granularity == "function")
+        self._written_offset = offset
+        self._map = mmap.mmap(-1, 2 * offset)
+        self._lock_fd, lock_name = tempfile.mkstemp(prefix="coverage-", suffix=".lock")
+        os.remove(lock_name)
+        self._take_share_lock()
+        if self._debug.should('dataio'):
+            self._debug.write("Sharing {} bytes for {} files".format(offset, len(self._files)))
+
+    def _start_using(self):
+        """Forget the per-process data if we've forked from its process."""
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._overflow = None
+            self._touched = {}
+            self._run_info = {}
+        self._take_share_lock()
+
+    def _take_share_lock(self):
+        """Note that this process is using the map, if it hasn't already.
+
+        Locks aren't inherited when forking, and are released when a process
+        ends, so a lock is held by each process that hasn't saved yet.
+
+        """
+        if self._lock_fd is not None and self._lock_pid != os.getpid():
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_SH)
+            self._lock_pid = os.getpid()
+
+    def _release_share_lock(self):
+        """Release our lock, returning True if we were the last process using the map.
+
+        If we were the last, the file is left locked so that no other process
+        starts using the map until :meth:`_unlock` is called.
+
+        """
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_UN)
+        self._lock_pid = None
+        try:
+            fcntl.lockf(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except EnvironmentError:
+            return False
+        return True
+
+    def _unlock(self):
+        """Release the lock taken by :meth:`_release_share_lock`."""
+        fcntl.lockf(self._lock_fd, fcntl.LOCK_UN)
+
+    def _get_overflow(self):
+        """Get the per-process data for what doesn't fit in the map."""
+        self._start_using()
+        if self._overflow is None:
+            self._overflow = CoverageData(
+                basename=self._basename, suffix=True, warn=self._warn, debug=self._debug,
+            )
+            self._overflow.set_context(self._current_context)
+        return self._overflow
+
+    def set_context(self, context):
+        """Set the current context for future `add_lines` etc.
+
+        The first context set is the one recorded in the shared map.
+
+        """
+        self._start_using()
+        if self._context is None:
+            self._context = context or ""
+        self._current_context = context
+        if self._overflow is not None:
+            self._overflow.set_context(context)
+
+    def _add_to_map(self, data, get_index):
+        """Set the flags for the values in `data`.
+
+        `get_index` is a function taking a SharedFile and a value, returning the
+        flag number for the value, or None.
+
+        Returns the data that couldn't be put in the map.
+
+        """
+        if self._map is None or (self._current_context or "") != (self._context or ""):
+            return data
+        self._start_using()
+        leftovers = {}
+        the_map = self._map
+        for filename, values in iitems(data):
+            shared = self._files.get(filename)
+            if shared is None:
+                leftovers[filename] = values
+                continue
+            for value in values:
+                index = get_index(shared, value)
+                if index is None:
+                    leftovers.setdefault(filename, []).append(value)
+                else:
+                    pos = shared.offset + index
+                    the_map[pos:pos+1] = b"\1"
+        return leftovers
+
+    def add_lines(self, line_data):
+        """Add measured line data."""
+        leftovers = self._add_to_map(line_data, self._line_index)
+        if leftovers:
+            self._get_overflow().add_lines(leftovers)
+
+    def add_functions(self, function_data):
+        """Add measured function data."""
+        self._has_functions = True
+        leftovers = self._add_to_map(function_data, self._line_index)
+        if leftovers:
+            self._get_overflow().add_functions(leftovers)
+
+    def add_arcs(self, arc_data):
+        """Add measured arc data."""
+        leftovers = self._add_to_map(arc_data, self._arc_index)
+        if leftovers:
+            self._get_overflow().add_arcs(leftovers)
+
+    @staticmethod
+    def _line_index(shared, lineno):
+        """The flag number for line `lineno` in `shared`."""
+        if 0 <= lineno < shared.size:
+            return lineno
+        return None
+
+    @staticmethod
+    def _arc_index(shared, arc):
+        """The flag number for `arc` in `shared`."""
+        return shared.arc_index.get((shared.first_line(arc[0]), shared.first_line(arc[1])))
+
+    def add_file_tracers(self, file_tracers):
+        """Add per-file plugin information.
+
+        Only Python files are shared, so this is for the per-process data.
+
+        """
+        file_tracers = dict((f, p) for f, p in iitems(file_tracers) if p)
+        if file_tracers:
+            self._get_overflow().add_file_tracers(file_tracers)
+
+    def touch_file(self, filename, plugin_name=""):
+        """Ensure that `filename` appears in the data, empty if needed."""
+        self.touch_files([filename], plugin_name)
+
+    def touch_files(self, filenames, plugin_name=""):
+        """Ensure that `filenames` appear in the data, empty if needed."""
+        self._start_using()
+        for filename in filenames:
+            self._touched[filename] = plugin_name
+
+    def add_run_info(self, **kwargs):
+        """Add information about the run."""
+        self._start_using()
+        self._run_info.update(kwargs)
+
+    def _shared_flags(self, unwritten=False):
+        """Get the flags set in the map: {filename: [flag numbers]}.
+
+        If `unwritten` is true, only the flags not yet written to a data file
+        are included.
+
+        """
+        if self._map is None:
+            return {}
+        flags_set = {}
+        the_map = self._map
+        for filename, shared in iitems(self._files):
+            flags = the_map[shared.offset:shared.offset + shared.size]
+            if not flags.strip(b"\0"):
+                continue
+            indexes = [i for i, flag in enumerate(bytearray(flags)) if flag]
+            if unwritten:
+                start = self._written_offset + shared.offset
+                written = bytearray(the_map[start:start + shared.size])
+                indexes = [i for i in indexes if not written[i]]
+            if indexes:
+                flags_set[filename] = indexes
+        return flags_set
+
+    def _mark_written(self, flags_set):
+        """Record that the flags in `flags_set` have been written."""
+        the_map = self._map
+        for filename, indexes in iitems(flags_set):
+            start = self._written_offset + self._files[filename].offset
+            for i in indexes:
+                the_map[start + i:start + i + 1] = b"\1"
+
+    def _flag_values(self, flags_set):
+        """Convert `flags_set` to data: {filename: [lines or arcs]}."""
+        data = {}
+        for filename, indexes in iitems(flags_set):
+            arcs = self._files[filename].arcs
+            if arcs is not None:
+                data[filename] = [arcs[i] for i in indexes]
+            else:
+                data[filename] = indexes
+        return data
+
+    def _shared_data(self):
+        """Get the data in the map: {filename: [lines or arcs]}."""
+        return self._flag_values(self._shared_flags())
+
+    def _measured_data(self):
+        """Get the shared and per-process data: {context: {filename: set(lines or arcs)}}."""
+        self._start_using()
+        measured = {}
+        shared_data = measured.setdefault(self._context or "", {})
+        for filename in self._touched:
+            shared_data[filename] = set()
+        for filename, values in iitems(self._shared_data()):
+            shared_data.setdefault(filename, set()).update(values)
+        overflow = self._overflow
+        if overflow is not None:
+            get_values = overflow.arcs if self._has_arcs else overflow.lines
+            contexts = overflow.measured_contexts()
+            for context in contexts:
+                context_data = measured.setdefault(context, {})
+                for filename in overflow.measured_files():
+                    if len(contexts) == 1:
+                        # Not every storage can get the data for a context.
+                        values = get_values(filename)
+                    else:
+                        values = get_values(filename, context=context)
+                    if values:
+                        context_data.setdefault(filename, set()).update(values)
+        return dict((context, data) for context, data in iitems(measured) if data)
+
+    def _plugin_names(self):
+        """Get the plugin names of the files measured by plugins."""
+        plugin_names = dict((f, p) for f, p in iitems(self._touched) if p)
+        if self._overflow is not None:
+            for filename in self._overflow.measured_files():
+                plugin_name = self._overflow.file_tracer(filename)
+                if plugin_name:
+                    plugin_names[filename] = plugin_name
+        return plugin_names
+
+    def read(self):
+        """There's nothing to read: the data is all in memory."""
+        pass
+
+    def erase(self, parallel=False):
+        """Forget the data collected so far, including in the shared map."""
+        if self._map is not None:
+            self._map[:] = b"\0" * len(self._map)
+        self._overflow = None
+        self._touched = {}
+        self._run_info = {}
+        if parallel:
+            CoverageData(self._basename, debug=self._debug).erase(parallel=True)
+
+    def write(self):
+        """Write the data.
+
+        The per-process data is written to its own file.  The starting process
+        writes the shared data.  Processes that save after it, or that are the
+        last to save, write the flags that are new since then to a per-process
+        file.
+
+        """
+        self._start_using()
+        if self._overflow:
+            self._overflow.write()
+
+        if self._map is None:
+            return
+        last = self._release_share_lock()
+        try:
+            if os.getpid() == self._master_pid:
+                self._write_shared()
+                self._map[0:1] = b"\1"
+            elif last or self._map[0:1] == b"\1":
+                self._write_unwritten()
+        finally:
+            if last:
+                self._unlock()
+
+    def _write_shared(self):
+        """Write everything in the shared map to our data file.
+
+        The data is written to a temporary file, then renamed, so that readers
+        never see a partial file, and concurrent writers don't collide.
+
+        """
+        flags_set = self._shared_flags()
+        if not flags_set:
+            return
+
+        data_dir, local = os.path.split(self.filename)
+        temp_name = os.path.join(data_dir, "%s-shared-%d.tmp" % (local, os.getpid()))
+        if self._debug.should('dataio'):
+            self._debug.write("Writing shared data to {!r}".format(self.filename))
+        data = CoverageData(basename=temp_name, debug=self._debug)
+        self._fill_data(data, self._flag_values(flags_set))
+        data.write()
+        if not os.path.exists(temp_name):
+            raise CoverageException("Couldn't write shared data to {!r}".format(temp_name))
+        os.rename(temp_name, self.filename)
+        self._mark_written(flags_set)
+
+    def _write_unwritten(self):
+        """Write the flags not in a data file yet to a per-process data file."""
+        flags_set = self._shared_flags(unwritten=True)
+        if not flags_set:
+            return
+        data = CoverageData(
+            basename=self._basename, suffix=True, warn=self._warn, debug=self._debug,
+        )
+        if self._debug.should('dataio'):
+            self._debug.write("Writing new shared data to {!r}".format(data.filename))
+        self._fill_data(data, self._flag_values(flags_set))
+        data.write()
+        self._mark_written(flags_set)
+
+    def _fill_data(self, data, shared_data):
+        """Add `shared_data` and our other information to the CoverageData `data`."""
+        data.set_context(self._context)
+        if self._has_arcs:
+            data.add_arcs(shared_data)
+        elif self._has_functions:
+            data.add_functions(shared_data)
+        else:
+            data.add_lines(shared_data)
+        touched = {}
+        for filename, plugin_name in iitems(self._touched):
+            touched.setdefault(plugin_name, []).append(filename)
+        for plugin_name, filenames in iitems(touched):
+            data.touch_files(filenames, plugin_name)
+        if self._run_info and hasattr(data, "add_run_info"):
+            data.add_run_info(**self._run_info)
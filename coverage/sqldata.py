@@ -27,8 +27,9 @@ from coverage.misc import CoverageException, file_be_gone
 # Schema versions:
 # 1: Released in 5.0a2
 # 2: Added contexts
+# 3: Added meta.has_functions
 
-SCHEMA_VERSION = 2
+SCHEMA_VERSION = 3
 
 SCHEMA = """
 create table coverage_schema (
@@ -38,6 +39,7 @@ create table coverage_schema (
 create table meta (
     has_lines boolean,
     has_arcs boolean,
+    has_functions boolean,
     sys_argv text
 );
 
@@ -92,6 +94,7 @@ class CoverageSqliteData(SimpleReprMixin):
 
         self._has_lines = False
         self._has_arcs = False
+        self._has_functions = False
 
         self._current_context = None
         self._current_context_id = None
@@ -121,8 +124,12 @@ class CoverageSqliteData(SimpleReprMixin):
                     self._db.execute(stmt)
             self._db.execute("insert into coverage_schema (version) values (?)", (SCHEMA_VERSION,))
             self._db.execute(
-                "insert into meta (has_lines, has_arcs, sys_argv) values (?, ?, ?)",
-                (self._has_lines, self._has_arcs, str(getattr(sys, 'argv', None)))
+                "insert into meta (has_lines, has_arcs, has_functions, sys_argv) "
+                "values (?, ?, ?, ?)",
+                (
+                    self._has_lines, self._has_arcs, self._has_functions,
+                    str(getattr(sys, 'argv', None)),
+                )
             )
 
     def _open_db(self):
@@ -146,8 +153,8 @@ class CoverageSqliteData(SimpleReprMixin):
                         )
                     )
 
-            for row in self._db.execute("select has_lines, has_arcs from meta"):
-                self._has_lines, self._has_arcs = row
+            for row in self._db.execute("select has_lines, has_arcs, has_functions from meta"):
+                self._has_lines, self._has_arcs, self._has_functions = row
 
             for path, id in self._db.execute("select path, id from file"):
                 self._file_map[path] = id
@@ -234,6 +241,29 @@ class CoverageSqliteData(SimpleReprMixin):
             ))
         self._start_using()
         self._choose_lines_or_arcs(lines=True)
+        self._insert_lines(line_data)
+
+    def add_functions(self, function_data):
+        """Add measured function data.
+
+        `function_data` is a dictionary mapping file names to dictionaries::
+
+            { filename: { first_lineno: None, ... }, ...}
+
+        Each line number is the first line of a function that was called.  The
+        data is stored as lines, and reported with function granularity.
+
+        """
+        if self._debug.should('dataop'):
+            self._debug.write("Adding functions: %d files, %d functions total" % (
+                len(function_data), sum(len(lines) for lines in function_data.values())
+            ))
+        self._start_using()
+        self._choose_lines_or_arcs(lines=True, functions=True)
+        self._insert_lines(function_data)
+
+    def _insert_lines(self, line_data):
+        """Write `line_data` into the line table, in the current context."""
         self._set_context_id()
         with self._connect() as con:
             for filename, linenos in iitems(line_data):
@@ -268,16 +298,25 @@ class CoverageSqliteData(SimpleReprMixin):
                     data,
                 )
 
-    def _choose_lines_or_arcs(self, lines=False, arcs=False):
+    def _choose_lines_or_arcs(self, lines=False, arcs=False, functions=False):
         if lines and self._has_arcs:
             raise CoverageException("Can't add lines to existing arc data")
         if arcs and self._has_lines:
             raise CoverageException("Can't add arcs to existing line data")
+        if self._has_lines and bool(functions) != bool(self._has_functions):
+            if functions:
+                raise CoverageException("Can't add functions to existing line data")
+            else:
+                raise CoverageException("Can't add lines to existing function data")
         if not self._has_arcs and not self._has_lines:
             self._has_lines = lines
             self._has_arcs = arcs
+            self._has_functions = functions
             with self._connect() as con:
-                con.execute("update meta set has_lines = ?, has_arcs = ?", (lines, arcs))
+                con.execute(
+                    "update meta set has_lines = ?, has_arcs = ?, has_functions = ?",
+                    (lines, arcs, functions)
+                )
 
     def add_file_tracers(self, file_tracers):
         """Add per-file plugin information.
@@ -314,24 +353,39 @@ class CoverageSqliteData(SimpleReprMixin):
         `plugin_name` is the name of the plugin resposible for this file. It is used
         to associate the right filereporter, etc.
         """
+        self.touch_files([filename], plugin_name)
+
+    def touch_files(self, filenames, plugin_name=""):
+        """Ensure that `filenames` appear in the data, empty if needed.
+
+        `plugin_name` is the name of the plugin resposible for these files. It is used
+        to associate the right filereporter, etc.  All of the files are added in
+        one transaction.
+        """
         self._start_using()
         if self._debug.should('dataop'):
-            self._debug.write("Touching %r" % (filename,))
+            self._debug.write("Touching %r" % (filenames,))
         if not self._has_arcs and not self._has_lines:
             raise CoverageException("Can't touch files in an empty CoverageSqliteData")
 
-        self._file_id(filename, add=True)
-        if plugin_name:
-            # Set the tracer for this file
-            self.add_file_tracers({filename: plugin_name})
+        with self._connect():
+            for filename in filenames:
+                self._file_id(filename, add=True)
+            if plugin_name:
+                # Set the tracer for these files
+                self.add_file_tracers(dict((filename, plugin_name) for filename in filenames))
 
     def update(self, other_data, aliases=None):
         if self._has_lines and other_data._has_arcs:
             raise CoverageException("Can't combine arc data with line data")
         if self._has_arcs and other_data._has_lines:
             raise CoverageException("Can't combine line data with arc data")
+        if self._has_lines and other_data._has_lines:
+            if bool(self._has_functions) != bool(other_data._has_functions):
+                raise CoverageException("Can't combine function data with line data")
 
         aliases = aliases or PathAliases()
+        mapped = aliases.map_all(other_data.measured_files())
 
         # See what we had already measured, for accurate conflict reporting.
         this_measured = self.measured_files()
@@ -352,9 +406,12 @@ class CoverageSqliteData(SimpleReprMixin):
                         lines = set(other_data.lines(filename, context=context))
                         if lines:
                             other_files.add(filename)
-                            filename = aliases.map(filename)
+                            filename = mapped[filename]
                             lines.update(self.lines(filename, context=context) or ())
-                            self.add_lines({filename: lines})
+                            if other_data._has_functions:
+                                self.add_functions({filename: lines})
+                            else:
+                                self.add_lines({filename: lines})
 
             # arcs
             if other_data._has_arcs:
@@ -364,14 +421,14 @@ class CoverageSqliteData(SimpleReprMixin):
                         arcs = set(other_data.arcs(filename, context=context))
                         if arcs:
                             other_files.add(filename)
-                            filename = aliases.map(filename)
+                            filename = mapped[filename]
                             arcs.update(self.arcs(filename, context=context) or ())
                             self.add_arcs({filename: arcs})
 
             # file_tracers
             for filename in other_files:
                 other_plugin = other_data.file_tracer(filename)
-                filename = aliases.map(filename)
+                filename = mapped[filename]
                 if filename in this_measured:
                     this_plugin = self.file_tracer(filename)
                 else:
@@ -426,6 +483,10 @@ class CoverageSqliteData(SimpleReprMixin):
     def has_arcs(self):
         return bool(self._has_arcs)
 
+    def has_functions(self):
+        """Was the data measured with function granularity?"""
+        return bool(self._has_functions)
+
     def measured_files(self):
         """A set of all files that had been measured."""
         return set(self._file_map)
@@ -491,10 +552,123 @@ class CoverageSqliteData(SimpleReprMixin):
                 arcs = con.execute(query, data)
                 return list(arcs)
 
+    def contexts_by_lineno(self, filename):
+        """Get the contexts for each line executed in a file.
+
+        Returns a dict mapping line numbers to sorted lists of the names of the
+        contexts that executed them.  All the lines come from one query, rather
+        than one query for each context.
+
+        """
+        lineno_contexts = {}
+        self._start_using()
+        with self._connect() as con:
+            file_id = self._file_id(filename)
+            if file_id is None:
+                return {}
+            if self.has_arcs():
+                query = (
+                    "select arc.fromno, arc.tono, context.context "
+                    "from arc, context "
+                    "where arc.file_id = ? and arc.context_id = context.id"
+                )
+                for fromno, tono, context in con.execute(query, (file_id,)):
+                    for lineno in (fromno, tono):
+                        if lineno > 0:
+                            lineno_contexts.setdefault(lineno, set()).add(context)
+            else:
+                query = (
+                    "select line.lineno, context.context "
+                    "from line, context "
+                    "where line.file_id = ? and line.context_id = context.id"
+                )
+                for lineno, context in con.execute(query, (file_id,)):
+                    lineno_contexts.setdefault(lineno, set()).add(context)
+        return dict((lineno, sorted(contexts)) for lineno, contexts in iitems(lineno_contexts))
+
+    def changes_since(self, base):
+        """Find the lines and arcs that differ between `base` and this data.
+
+        `base` is another CoverageSqliteData, usually from an earlier run.  Its
+        file is attached to this database, and the differences are found with
+        ``except`` queries, so neither file's data is read into memory.
+
+        Returns a dict mapping file names to dicts with sorted lists:
+        "lines_gained" of lines measured here but not in `base`, and
+        "lines_lost" of lines measured in `base` but not here.  If both have
+        arc data, "arcs_gained" and "arcs_lost" are the same for arcs.  Files
+        without differences aren't included.
+
+        """
+        self._start_using()
+        base._start_using()
+        compare_arcs = self.has_arcs() and base.has_arcs()
+        here_lines = _lines_query("main", self.has_arcs())
+        base_lines = _lines_query("base", base.has_arcs())
+        queries = [
+            ('lines_gained', here_lines, base_lines),
+            ('lines_lost', base_lines, here_lines),
+        ]
+        if compare_arcs:
+            queries += [
+                ('arcs_gained', _arcs_query("main"), _arcs_query("base")),
+                ('arcs_lost', _arcs_query("base"), _arcs_query("main")),
+            ]
+
+        changes = {}
+        with self._connect() as con:
+            con.execute("attach database ? as base", (os.path.abspath(base.filename),))
+            try:
+                for key, query, except_query in queries:
+                    query = "select * from ({}) except select * from ({})".format(
+                        query, except_query
+                    )
+                    for row in con.execute(query):
+                        file_changes = changes.get(row[0])
+                        if file_changes is None:
+                            file_changes = changes[row[0]] = dict((k, []) for k, _, _ in queries)
+                        file_changes[key].append(row[1] if len(row) == 2 else tuple(row[1:]))
+            finally:
+                con.execute("detach database base")
+
+        for file_changes in changes.values():
+            for found in file_changes.values():
+                found.sort()
+        return changes
+
     def run_infos(self):
         return []   # TODO
 
 
+def _lines_query(schema, has_arcs):
+    """A query for the (path, lineno) pairs measured in the database `schema`.
+
+    Arc data is turned into the lines at either end of the arcs.
+
+    """
+    if has_arcs:
+        return (
+            "select file.path, arc.fromno from {0}.arc as arc, {0}.file as file "
+            "where arc.file_id = file.id and arc.fromno > 0 "
+            "union "
+            "select file.path, arc.tono from {0}.arc as arc, {0}.file as file "
+            "where arc.file_id = file.id and arc.tono > 0"
+        ).format(schema)
+    else:
+        return (
+            "select file.path, line.lineno from {0}.line as line, {0}.file as file "
+            "where line.file_id = file.id"
+        ).format(schema)
+
+
+def _arcs_query(schema):
+    """A query for the (path, fromno, tono) triples measured in the database `schema`."""
+    return (
+        "select file.path, arc.fromno, arc.tono from {0}.arc as arc, {0}.file as file "
+        "where arc.file_id = file.id"
+    ).format(schema)
+
+
 class Sqlite(SimpleReprMixin):
     def __init__(self, filename, debug):
         self.debug = debug if debug.should('sql') else None
@@ -3,11 +3,12 @@
 
 """Summary reporting"""
 
+import os
 import sys
 
 from coverage import env
 from coverage.report import Reporter
-from coverage.results import Numbers
+from coverage.results import Numbers, Rollup
 from coverage.misc import NotPython, CoverageException, output_encoding, StopEverything
 
 
@@ -18,6 +19,7 @@ class SummaryReporter(Reporter):
         super(SummaryReporter, self).__init__(coverage, config)
         data = coverage.get_data()
         self.branches = data.has_arcs()
+        self.functions = data.has_functions()
 
     def report(self, morfs, outfile=None):
         """Writes a report summarizing coverage statistics per module.
@@ -36,17 +38,24 @@ class SummaryReporter(Reporter):
             outfile.write(line.rstrip())
             outfile.write("\n")
 
-        fr_analysis = []
+        # Only the values for each file's line are kept, not its analysis, so
+        # that memory doesn't grow with the number of files.
+        file_rows = []
         skipped_count = 0
-        total = Numbers()
+        rollup = Rollup(self.config.rollup_depth)
 
         fmt_err = u"%s   %s: %s"
 
-        for fr in self.find_file_reporters(morfs):
+        file_reporters = self.find_file_reporters(morfs)
+        if not file_reporters and self.diff_lines is not None:
+            writeout(u"No measured files were changed by the diff.")
+            return self.total_percent(rollup.total)
+
+        for fr in file_reporters:
             try:
-                analysis = self.coverage._analyze(fr)
+                analysis = self.analyze(fr)
                 nums = analysis.numbers
-                total += nums
+                rollup.add(fr.relative_filename(), nums)
 
                 if self.config.skip_covered:
                     # Don't report on 100% files.
@@ -55,7 +64,17 @@ class SummaryReporter(Reporter):
                     if no_missing_lines and no_missing_branches:
                         skipped_count += 1
                         continue
-                fr_analysis.append((fr, analysis))
+
+                missing_fmtd = None
+                if self.config.show_missing:
+                    missing_fmtd = analysis.missing_formatted()
+                    if self.branches:
+                        branches_fmtd = analysis.arcs_missing_formatted()
+                        if branches_fmtd:
+                            if missing_fmtd:
+                                missing_fmtd += ", "
+                            missing_fmtd += branches_fmtd
+                file_rows.append((fr.relative_filename(), nums, missing_fmtd))
             except StopEverything:
                 # Don't report this on single files, it's a systemic problem.
                 raise
@@ -69,13 +88,25 @@ class SummaryReporter(Reporter):
                         report_it = False
                 if report_it:
                     writeout(fmt_err % (fr.relative_filename(), typ.__name__, msg))
+            finally:
+                self.release(fr)
+
+        total = rollup.total
+        dir_rows = [
+            (dirname.replace("/", os.sep) + os.sep, nums)
+            for dirname, nums in rollup.directory_totals()
+        ]
 
         # Prepare the formatting strings, header, and column sorting.
-        max_name = max([len(fr.relative_filename()) for (fr, analysis) in fr_analysis] + [5])
+        names = [name for (name, _, _) in file_rows] + [name for (name, _) in dir_rows]
+        max_name = max([len(name) for name in names] + [5])
         fmt_name = u"%%- %ds  " % max_name
         fmt_skip_covered = u"\n%s file%s skipped due to complete coverage."
 
-        header = (fmt_name % "Name") + u" Stmts   Miss"
+        if self.functions:
+            header = (fmt_name % "Name") + u" Funcs   Miss"
+        else:
+            header = (fmt_name % "Name") + u" Stmts   Miss"
         fmt_coverage = fmt_name + u"%6d %6d"
         if self.branches:
             header += u" Branch BrPart"
@@ -96,42 +127,27 @@ class SummaryReporter(Reporter):
         writeout(header)
         writeout(rule)
 
+        def row_args(name, nums, missing_fmtd=""):
+            """Make the values for the line showing `nums`."""
+            args = (name, nums.n_statements, nums.n_missing)
+            if self.branches:
+                args += (nums.n_branches, nums.n_partial_branches)
+            args += (nums.pc_covered_str,)
+            if self.config.show_missing:
+                args += (missing_fmtd,)
+            return args
+
         # `lines` is a list of pairs, (line text, line values).  The line text
         # is a string that will be printed, and line values is a tuple of
         # sortable values.
         lines = []
 
-        for (fr, analysis) in fr_analysis:
-            try:
-                nums = analysis.numbers
-
-                args = (fr.relative_filename(), nums.n_statements, nums.n_missing)
-                if self.branches:
-                    args += (nums.n_branches, nums.n_partial_branches)
-                args += (nums.pc_covered_str,)
-                if self.config.show_missing:
-                    missing_fmtd = analysis.missing_formatted()
-                    if self.branches:
-                        branches_fmtd = analysis.arcs_missing_formatted()
-                        if branches_fmtd:
-                            if missing_fmtd:
-                                missing_fmtd += ", "
-                            missing_fmtd += branches_fmtd
-                    args += (missing_fmtd,)
-                text = fmt_coverage % args
-                # Add numeric percent coverage so that sorting makes sense.
-                args += (nums.pc_covered,)
-                lines.append((text, args))
-            except Exception:
-                report_it = not self.config.ignore_errors
-                if report_it:
-                    typ, msg = sys.exc_info()[:2]
-                    # NotPython is only raised by PythonFileReporter, which has a
-                    # should_be_python() method.
-                    if typ is NotPython and not fr.should_be_python():
-                        report_it = False
-                if report_it:
-                    writeout(fmt_err % (fr.relative_filename(), typ.__name__, msg))
+        for (name, nums, missing_fmtd) in file_rows:
+            args = row_args(name, nums, missing_fmtd)
+            text = fmt_coverage % args
+            # Add numeric percent coverage so that sorting makes sense.
+            args += (nums.pc_covered,)
+            lines.append((text, args))
 
         # Sort the lines and write them out.
         if getattr(self.config, 'sort', None):
@@ -143,16 +159,16 @@ class SummaryReporter(Reporter):
         for line in lines:
             writeout(line[0])
 
+        # Write the directory totals, if they were asked for.
+        if dir_rows:
+            writeout(rule)
+            for name, nums in dir_rows:
+                writeout(fmt_coverage % row_args(name, nums))
+
         # Write a TOTAl line if we had more than one file.
         if total.n_files > 1:
             writeout(rule)
-            args = ("TOTAL", total.n_statements, total.n_missing)
-            if self.branches:
-                args += (total.n_branches, total.n_partial_branches)
-            args += (total.pc_covered_str,)
-            if self.config.show_missing:
-                args += ("",)
-            writeout(fmt_coverage % args)
+            writeout(fmt_coverage % row_args("TOTAL", total))
 
         # Write other final lines.
         if not total.n_files and not skipped_count:
@@ -161,4 +177,4 @@ class SummaryReporter(Reporter):
         if self.config.skip_covered and skipped_count:
             writeout(fmt_skip_covered % (skipped_count, 's' if skipped_count > 1 else ''))
 
-        return total.n_statements and total.pc_covered
+        return self.total_percent(total)
@@ -14,6 +14,7 @@ from coverage import __url__, __version__, files
 from coverage.backward import iitems
 from coverage.misc import isolate_module
 from coverage.report import Reporter
+from coverage.results import Rollup
 
 os = isolate_module(os)
 
@@ -40,10 +41,14 @@ class XmlReporter(Reporter):
             for src in config.source:
                 if os.path.exists(src):
                     self.source_paths.add(files.canonical_filename(src))
+        # The packages are the groups of the rollup: directories cut to the
+        # package depth.  This maps their names to the class elements in them.
+        self.rollup = Rollup(config.xml_package_depth)
         self.packages = {}
         self.xml_out = None
         self.data = coverage.get_data()
         self.has_arcs = self.data.has_arcs()
+        self.has_functions = self.data.has_functions()
 
     def report(self, morfs, outfile=None):
         """Generate a Cobertura-compatible XML report for `morfs`.
@@ -82,42 +87,41 @@ class XmlReporter(Reporter):
             txt = self.xml_out.createTextNode(path)
             xsource.appendChild(txt)
 
-        lnum_tot, lhits_tot = 0, 0
-        bnum_tot, bhits_tot = 0, 0
-
         xpackages = self.xml_out.createElement("packages")
         xcoverage.appendChild(xpackages)
 
         # Populate the XML DOM with the package info.
-        for pkg_name, pkg_data in sorted(iitems(self.packages)):
-            class_elts, lhits, lnum, bhits, bnum = pkg_data
+        # Files at the top are in the "." package, unless the depth is zero.
+        top_name = "." if self.rollup.depth else ""
+        packages = sorted((group.replace("/", ".") or top_name, group) for group in self.packages)
+        for pkg_name, group in packages:
+            nums = self.rollup.groups[group]
+            class_elts = self.packages[group]
             xpackage = self.xml_out.createElement("package")
             xpackages.appendChild(xpackage)
             xclasses = self.xml_out.createElement("classes")
             xpackage.appendChild(xclasses)
             for _, class_elt in sorted(iitems(class_elts)):
                 xclasses.appendChild(class_elt)
-            xpackage.setAttribute("name", pkg_name.replace(os.sep, '.'))
-            xpackage.setAttribute("line-rate", rate(lhits, lnum))
+            xpackage.setAttribute("name", pkg_name)
+            xpackage.setAttribute("line-rate", rate(nums.n_executed, nums.n_statements))
             if self.has_arcs:
-                branch_rate = rate(bhits, bnum)
+                branch_rate = rate(nums.n_executed_branches, nums.n_branches)
             else:
                 branch_rate = "0"
             xpackage.setAttribute("branch-rate", branch_rate)
             xpackage.setAttribute("complexity", "0")
 
-            lnum_tot += lnum
-            lhits_tot += lhits
-            bnum_tot += bnum
-            bhits_tot += bhits
-
-        xcoverage.setAttribute("lines-valid", str(lnum_tot))
-        xcoverage.setAttribute("lines-covered", str(lhits_tot))
-        xcoverage.setAttribute("line-rate", rate(lhits_tot, lnum_tot))
+        total = self.rollup.total
+        xcoverage.setAttribute("lines-valid", str(total.n_statements))
+        xcoverage.setAttribute("lines-covered", str(total.n_executed))
+        xcoverage.setAttribute("line-rate", rate(total.n_executed, total.n_statements))
         if self.has_arcs:
-            xcoverage.setAttribute("branches-valid", str(bnum_tot))
-            xcoverage.setAttribute("branches-covered", str(bhits_tot))
-            xcoverage.setAttribute("branch-rate", rate(bhits_tot, bnum_tot))
+            xcoverage.setAttribute("branches-valid", str(total.n_branches))
+            xcoverage.setAttribute("branches-covered", str(total.n_executed_branches))
+            xcoverage.setAttribute(
+                "branch-rate", rate(total.n_executed_branches, total.n_branches)
+            )
         else:
             xcoverage.setAttribute("branches-covered", "0")
             xcoverage.setAttribute("branches-valid", "0")
@@ -131,12 +135,7 @@ class XmlReporter(Reporter):
         outfile.write(out)
 
         # Return the total percentage.
-        denom = lnum_tot + bnum_tot
-        if denom == 0:
-            pct = 0.0
-        else:
-            pct = 100.0 * (lhits_tot + bhits_tot) / denom
-        return pct
+        return self.total_percent(total)
 
     def xml_file(self, fr, analysis):
         """Add to the XML report for a single file."""
@@ -151,17 +150,17 @@ class XmlReporter(Reporter):
         else:
             rel_name = fr.relative_filename()
 
-        dirname = os.path.dirname(rel_name) or u"."
-        dirname = "/".join(dirname.split("/")[:self.config.xml_package_depth])
-        package_name = dirname.replace("/", ".")
+        nums = analysis.numbers
+        group = self.rollup.add(rel_name, nums)
+        dirname = group or u"."
 
         if rel_name != fr.filename:
             self.source_paths.add(fr.filename[:-len(rel_name)].rstrip(r"\/"))
-        package = self.packages.setdefault(package_name, [{}, 0, 0, 0, 0])
 
         xclass = self.xml_out.createElement("class")
 
-        xclass.appendChild(self.xml_out.createElement("methods"))
+        xmethods = self.xml_out.createElement("methods")
+        xclass.appendChild(xmethods)
 
         xlines = self.xml_out.createElement("lines")
         xclass.appendChild(xlines)
@@ -195,27 +194,30 @@ class XmlReporter(Reporter):
                     xline.setAttribute("missing-branches", ",".join(annlines))
             xlines.appendChild(xline)
 
-        class_lines = len(analysis.statements)
-        class_hits = class_lines - len(analysis.missing)
-
-        if self.has_arcs:
-            class_branches = sum(t for t, k in branch_stats.values())
-            missing_branches = sum(t - k for t, k in branch_stats.values())
-            class_br_hits = class_branches - missing_branches
-        else:
-            class_branches = 0.0
-            class_br_hits = 0.0
+        if self.has_functions:
+            # With function granularity, each function is a 'method' element
+            # with its single line.
+            for line in sorted(analysis.statements):
+                hit = int(line not in analysis.missing)
+                xmethod = self.xml_out.createElement("method")
+                xmethod.setAttribute("name", analysis.functions[line])
+                xmethod.setAttribute("signature", "")
+                xmethod.setAttribute("line-rate", str(hit))
+                xmethod.setAttribute("branch-rate", "0")
+                xmethod_lines = self.xml_out.createElement("lines")
+                xline = self.xml_out.createElement("line")
+                xline.setAttribute("number", str(line))
+                xline.setAttribute("hits", str(hit))
+                xmethod_lines.appendChild(xline)
+                xmethod.appendChild(xmethod_lines)
+                xmethods.appendChild(xmethod)
 
         # Finalize the statistics that are collected in the XML DOM.
-        xclass.setAttribute("line-rate", rate(class_hits, class_lines))
+        xclass.setAttribute("line-rate", rate(nums.n_executed, nums.n_statements))
         if self.has_arcs:
-            branch_rate = rate(class_br_hits, class_branches)
+            branch_rate = rate(nums.n_executed_branches, nums.n_branches)
         else:
             branch_rate = "0"
         xclass.setAttribute("branch-rate", branch_rate)
 
-        package[0][rel_name] = xclass
-        package[1] += class_hits
-        package[2] += class_lines
-        package[3] += class_br_hits
-        package[4] += class_branches
+        self.packages.setdefault(group, {})[rel_name] = xclass
@@ -0,0 +1,81 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+# Measure how the file matchers scale with the number of configured paths,
+# packages and patterns.  The tries should take about the same time no matter
+# how many there are; the linear scans they replaced are shown to compare.
+#
+# Run like this:
+#   .tox/py36/bin/python perf/perf_matchers.py
+
+import os
+import sys
+import timeit
+
+from coverage.files import TreeMatcher, ModuleMatcher, FnmatchMatcher
+
+COUNTS = [10, 100, 1000, 3000]
+MATCHES = 2000
+
+
+def linear_tree_match(paths, fpath):
+    """The old TreeMatcher.match, for comparison."""
+    for p in paths:
+        if fpath.startswith(p):
+            if fpath == p or fpath[len(p)] == os.sep:
+                return True
+    return False
+
+
+def linear_module_match(modules, module_name):
+    """The old ModuleMatcher.match, for comparison."""
+    for m in modules:
+        if module_name.startswith(m):
+            if module_name == m or module_name[len(m)] == '.':
+                return True
+    return False
+
+
+def time_per_match(match, names):
+    """Microseconds for calling `match` on each of `names`, on average."""
+    def run():
+        for name in names:
+            match(name)
+    return min(timeit.repeat(run, number=1, repeat=5)) / len(names) * 1e6
+
+
+def main():
+    print("{:>6} {:>12} {:>12} {:>12} {:>12} {:>12} {:>12}".format(
+        "count", "tree", "tree (old)", "module", "module (old)", "fnmatch", "fn (unseen)",
+    ))
+    for count in COUNTS:
+        paths = [os.path.join(os.sep, "src", "pkg%05d" % i) for i in range(count)]
+        modules = ["company.pkg%05d" % i for i in range(count)]
+        patterns = ["*/pkg%05d/*" % i for i in range(count)]
+
+        # Half the names match something, half don't, spread over the range.
+        step = max(count // MATCHES, 1)
+        files = [
+            os.path.join(os.sep, "src", "pkg%05d" % (i * step % (count * 2)), "mod.py")
+            for i in range(MATCHES)
+        ]
+        module_names = [
+            "company.pkg%05d.mod" % (i * step % (count * 2)) for i in range(MATCHES)
+        ]
+
+        tree = TreeMatcher(paths)
+        module = ModuleMatcher(modules)
+        fnmatch = FnmatchMatcher(patterns)
+        print("{:>6}{}".format(count, " {:>10.2f}us" * 6).format(
+            time_per_match(tree.match, files),
+            time_per_match(lambda f: linear_tree_match(paths, f), files),
+            time_per_match(module.match, module_names),
+            time_per_match(lambda m: linear_module_match(modules, m), module_names),
+            time_per_match(fnmatch.match, files),
+            # The regex alone is the cost for file names not seen before.
+            time_per_match(fnmatch.re.match, files),
+        ))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,174 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+# Measure how long it takes to start coverage.py in a new process, and fail if
+# it takes longer than a budget.  Every subprocess measured with
+# COVERAGE_PROCESS_START pays this cost, so it should stay small.
+#
+# It also measures what the .pth file from "coverage install-pth" costs every
+# Python process that isn't being measured, compared to the old recommended
+# .pth line, "import coverage; coverage.process_startup()".
+#
+# Run like this:
+#   .tox/py36/bin/python perf/perf_startup.py [--runs=N] [--import-budget=MS]
+#
+# The times reported are the median extra time over starting a bare Python
+# interpreter, in milliseconds.  The exit status is 1 if any is over budget,
+# if starting coverage imported any of the reporting modules, or if the .pth
+# file imported coverage with measurement off.
+
+import optparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import coverage
+from coverage.pth import PTH_LINE, PTH_NAME
+
+
+# Milliseconds over a bare interpreter that starting coverage may take.  These
+# are generous enough for slow CI machines: the import check below is the
+# precise test, these catch gross regressions.
+IMPORT_BUDGET = 150
+START_BUDGET = 200
+PTH_BUDGET = 5
+
+# Modules that measuring shouldn't need.
+REPORTING_MODULES = [
+    "coverage.annotate",
+    "coverage.html",
+    "coverage.parser",
+    "coverage.results",
+    "coverage.summary",
+    "coverage.xmlreport",
+    "xml.dom.minidom",
+]
+
+SCENARIOS = [
+    ("bare", "pass"),
+    ("import", "import coverage"),
+    ("start", "import coverage; cov = coverage.Coverage(); cov.start(); cov.stop()"),
+]
+
+OLD_PTH_LINE = "import coverage; coverage.process_startup()\n"
+
+# Process the .pth files in a directory, as site.py does for site-packages.
+PTH_CODE = "import site; site.addsitedir({!r})"
+PTH_IMPORTS_CODE = PTH_CODE + "; import sys; print('coverage' in sys.modules)"
+
+MODULES_CODE = """\
+import sys, coverage
+cov = coverage.Coverage()
+cov.start()
+cov.stop()
+print("\\n".join(sorted(sys.modules)))
+"""
+
+
+def time_code(code, runs, python_args=()):
+    """Run `code` in `runs` new processes, returning the median seconds."""
+    env = dict(os.environ)
+    env.pop("COVERAGE_PROCESS_START", None)
+    # Be sure this coverage.py is importable, even with -S.
+    coverage_dir = os.path.dirname(os.path.dirname(os.path.abspath(coverage.__file__)))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [coverage_dir, env.get("PYTHONPATH")]))
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.check_call([sys.executable] + list(python_args) + ["-c", code], env=env)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+
+def imported_reporting_modules():
+    """Which reporting modules are imported by starting coverage?"""
+    out = subprocess.check_output([sys.executable, "-c", MODULES_CODE])
+    modules = set(out.decode("ascii").split())
+    return [m for m in REPORTING_MODULES if m in modules]
+
+
+def make_pth_dir(name, line):
+    """Make a directory named `name` with a .pth file containing `line`."""
+    os.mkdir(name)
+    if line:
+        with open(os.path.join(name, PTH_NAME), "w") as pth:
+            pth.write(line)
+    return os.path.abspath(name)
+
+
+def time_pth(runs):
+    """Time processing no .pth file, the old .pth line, and the new one.
+
+    Returns the dict of median times, and whether the new line imported
+    coverage.
+
+    """
+    dirs = {
+        "none": make_pth_dir("no_pth", None),
+        "old": make_pth_dir("old_pth", OLD_PTH_LINE),
+        "new": make_pth_dir("new_pth", PTH_LINE),
+    }
+    # -S keeps the .pth files already in site-packages out of it.
+    times = dict(
+        (name, time_code(PTH_CODE.format(d), runs, ["-S"])) for name, d in dirs.items()
+    )
+    out = subprocess.check_output(
+        [sys.executable, "-S", "-c", PTH_IMPORTS_CODE.format(dirs["new"])]
+    )
+    return times, out.strip() == b"True"
+
+
+def main(args):
+    parser = optparse.OptionParser()
+    parser.add_option("--runs", type="int", default=21, help="Processes to run for each time")
+    parser.add_option("--import-budget", type="float", default=IMPORT_BUDGET)
+    parser.add_option("--start-budget", type="float", default=START_BUDGET)
+    parser.add_option("--pth-budget", type="float", default=PTH_BUDGET)
+    options, _ = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory(prefix="coverage_startup_") as tempdir:
+        # Run in an empty directory so no .coveragerc or source is found.
+        os.chdir(tempdir)
+
+        ok = True
+        bad_modules = imported_reporting_modules()
+        if bad_modules:
+            print("Starting coverage imported: {}".format(", ".join(bad_modules)))
+            ok = False
+
+        times = dict((name, time_code(code, options.runs)) for name, code in SCENARIOS)
+        budgets = {"import": options.import_budget, "start": options.start_budget}
+        for name in ["import", "start"]:
+            extra = (times[name] - times["bare"]) * 1000
+            over = extra > budgets[name]
+            print("{:>6}: {:6.1f}ms (budget {:.0f}ms){}".format(
+                name, extra, budgets[name], "  ** OVER BUDGET **" if over else "",
+            ))
+            if over:
+                ok = False
+
+        # With measurement off, only the .pth file's own cost should be paid.
+        os.environ.pop("COVERAGE_PROCESS_START", None)
+        pth_times, imported = time_pth(options.runs)
+        if imported:
+            print("The .pth file imported coverage with measurement off")
+            ok = False
+        extra = (pth_times["new"] - pth_times["none"]) * 1000
+        over = extra > options.pth_budget
+        print("{:>6}: {:6.1f}ms (budget {:.0f}ms){}".format(
+            "pth", extra, options.pth_budget, "  ** OVER BUDGET **" if over else "",
+        ))
+        print("   (the old .pth line costs {:.1f}ms)".format(
+            (pth_times["old"] - pth_times["none"]) * 1000,
+        ))
+        if over:
+            ok = False
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
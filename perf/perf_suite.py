@@ -0,0 +1,476 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+# A benchmark suite for coverage.py: named scenarios for the tracer, the data
+# files, combining, and reporting, with results written as JSON so that two
+# runs can be compared.
+#
+# Run like this:
+#   .tox/py36/bin/python perf/perf_suite.py list
+#   .tox/py36/bin/python perf/perf_suite.py run [--runs=N] [--scale=X] [--out=FILE] [PATTERN ...]
+#   .tox/py36/bin/python perf/perf_suite.py compare OLD.json NEW.json [--threshold=PCT]
+#
+# "run" runs the scenarios whose names match any of the fnmatch PATTERNs, or
+# all of them, and prints a table.  With --out, the results are also written
+# as JSON.  "compare" prints the change in each scenario's best time between
+# two result files, and its exit status is 1 if any scenario got slower by
+# more than the threshold.
+#
+# perf/perf_measure.py has a more detailed look at the tracer's overhead per
+# file, call, and line.
+
+import fnmatch
+import json
+import optparse
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import coverage
+from coverage.backward import import_local_file
+from coverage.collector import CTracer
+from coverage.data import CoverageData
+from coverage.misc import file_be_gone
+
+# The format of the JSON results, in case it has to change.
+RESULTS_VERSION = 1
+
+# A slowdown of more than this percent is a regression.
+THRESHOLD = 10
+
+
+SCENARIOS = []
+
+def scenario(name):
+    """Register a scenario function under `name`.
+
+    The function is called with the options, in a fresh temporary directory
+    that is also the current directory.  It returns a function to time, and
+    optionally a function doing the same work without coverage, to time for
+    a baseline.
+
+    """
+    def _decorator(func):
+        SCENARIOS.append((name, func))
+        return func
+    return _decorator
+
+
+def size(options, n):
+    """Scale a problem size `n` by the --scale option."""
+    return max(int(n * options.scale), 1)
+
+
+def make_file(filename, text):
+    """Write `text` to `filename`, making directories as needed."""
+    dirname = os.path.dirname(filename)
+    if dirname and not os.path.exists(dirname):
+        os.makedirs(dirname)
+    with open(filename, "w") as f:
+        f.write(text)
+
+
+def measured(options, func, **kwargs):
+    """Make a function that runs `func` while measuring with a new Coverage."""
+    def run():
+        cov = coverage.Coverage(data_file=None, timid=options.timid, **kwargs)
+        cov.start()
+        try:
+            func()
+        finally:
+            cov.stop()
+    return run
+
+
+# Tracer scenarios: running code under measurement.
+
+CALLS_PY = """\
+def f(x):
+    return x + 1
+
+def main(n):
+    total = 0
+    for _ in range(n):
+        total = f(total)
+    return total
+"""
+
+LINES_PY = """\
+def main(n):
+    total = 0
+    for i in range(n):
+        a = i
+        b = a + 1
+        c = b * 2
+        d = c - a
+        e = d % 7
+        f = e + b
+        g = f // 3
+        total += g
+    return total
+"""
+
+OMITTED_PY = """\
+def work(n):
+    total = 0
+    for i in range(n):
+        total += i
+    return total
+"""
+
+GREENLETS_PY = """\
+import greenlet
+
+def main(n):
+    def pong():
+        while True:
+            ping_let.switch()
+
+    def ping():
+        for _ in range(n):
+            pong_let.switch()
+
+    ping_let = greenlet.greenlet(ping)
+    pong_let = greenlet.greenlet(pong)
+    ping_let.switch()
+"""
+
+@scenario("tracer.calls")
+def tracer_calls(options):
+    make_file("calls.py", CALLS_PY)
+    mod = import_local_file("calls")
+    n = size(options, 200000)
+    work = lambda: mod.main(n)
+    return measured(options, work), work
+
+@scenario("tracer.lines")
+def tracer_lines(options):
+    make_file("lines.py", LINES_PY)
+    mod = import_local_file("lines")
+    n = size(options, 50000)
+    work = lambda: mod.main(n)
+    return measured(options, work), work
+
+@scenario("tracer.omit")
+def tracer_omit(options):
+    # Most of the calls are into files that are omitted, with many patterns.
+    make_file("lines.py", LINES_PY)
+    main = import_local_file("lines")
+    mods = []
+    for i in range(50):
+        make_file("omitted/mod{:02d}.py".format(i), OMITTED_PY)
+        mods.append(import_local_file("mod{:02d}".format(i), "omitted/mod{:02d}.py".format(i)))
+    omit = ["*/skipped{}/*".format(i) for i in range(200)] + ["*/omitted/*"]
+    n = size(options, 100)
+
+    def work():
+        for _ in range(n):
+            main.main(10)
+            for mod in mods:
+                mod.work(10)
+    return measured(options, work, omit=omit), work
+
+@scenario("tracer.threads")
+def tracer_threads(options):
+    make_file("calls.py", CALLS_PY)
+    mod = import_local_file("calls")
+    n = size(options, 25000)
+
+    def work():
+        threads = [threading.Thread(target=mod.main, args=(n,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return measured(options, work), work
+
+@scenario("tracer.greenlets")
+def tracer_greenlets(options):
+    try:
+        import greenlet                     # pylint: disable=unused-variable
+    except ImportError:
+        return None
+    make_file("greenlets.py", GREENLETS_PY)
+    mod = import_local_file("greenlets")
+    n = size(options, 50000)
+    work = lambda: mod.main(n)
+    return measured(options, work, concurrency="greenlet"), work
+
+
+# Data scenarios: recording and combining measurements.
+
+def random_lines(rand, num_lines, prob=0.6):
+    """Pick line numbers up to `num_lines`, each with probability `prob`."""
+    return [n for n in range(1, num_lines + 1) if rand.random() < prob]
+
+def make_line_data(num_files, num_lines, prefix="/src/project"):
+    """Make add_lines data like lab/gendata.py does."""
+    rand = random.Random(17)
+    return dict(
+        ("{}/file{}.py".format(prefix, i), random_lines(rand, num_lines))
+        for i in range(num_files)
+    )
+
+@scenario("data.add_lines")
+def data_add_lines(options):
+    line_data = make_line_data(size(options, 1000), 200)
+
+    def run():
+        file_be_gone("add_lines.dat")
+        data = CoverageData("add_lines.dat")
+        for filename, lines in line_data.items():
+            data.add_lines({filename: lines})
+        data.write()
+    return run, None
+
+@scenario("data.contexts")
+def data_contexts(options):
+    # Like dynamic contexts: the context changes constantly, with a little
+    # data each time.
+    line_data = make_line_data(50, 100)
+    num_contexts = size(options, 200)
+
+    def run():
+        file_be_gone("contexts.dat")
+        data = CoverageData("contexts.dat")
+        for i in range(num_contexts):
+            data.set_context("test_{}".format(i))
+            data.add_lines(line_data)
+        data.write()
+    return run, None
+
+@scenario("data.combine")
+def data_combine(options):
+    num_shards = size(options, 20)
+    os.mkdir("shards")
+    for i in range(num_shards):
+        line_data = make_line_data(200, 200, prefix="/ci/build{}/project".format(i))
+        data = CoverageData("shards/combined.dat", suffix="shard{}".format(i))
+        data.add_lines(line_data)
+        data.write()
+    make_file("combine.ini", """\
+[paths]
+source =
+    /src/project
+    /ci/*/project
+""")
+
+    def run():
+        # Combining deletes the shards, so combine copies of them.
+        if os.path.exists("copies"):
+            shutil.rmtree("copies")
+        shutil.copytree("shards", "copies")
+        file_be_gone("combined.dat")
+        cov = coverage.Coverage(data_file="combined.dat", config_file="combine.ini")
+        cov.combine(["copies"])
+        cov.save()
+    return run, None
+
+
+# Reporting scenarios: a project made by lab/genpy.py, with data like
+# lab/gendata.py makes.
+
+def make_project(options):
+    """Make a project to report on, and its data file.  Returns a loaded Coverage."""
+    sys.path.insert(0, os.path.join(os.path.dirname(HERE), "lab"))
+    try:
+        from genpy import PythonSpinner, RandomAstMaker
+    finally:
+        del sys.path[0]
+
+    rand = random.Random(17)
+    line_data = {}
+    num_files = size(options, 100)
+    seed = 0
+    while len(line_data) < num_files:
+        seed += 1
+        source = PythonSpinner.generate_python(RandomAstMaker(seed).make_body("def"))
+        try:
+            compile(source, "<genpy>", "exec")
+        except SyntaxError:
+            continue
+        filename = os.path.abspath("project/mod{:03d}.py".format(len(line_data)))
+        make_file(filename, source + "\n")
+        line_data[filename] = random_lines(rand, source.count("\n") + 1)
+
+    data = CoverageData(".coverage")
+    data.add_lines(line_data)
+    data.write()
+    cov = coverage.Coverage()
+    cov.load()
+    return cov
+
+@scenario("report.text")
+def report_text(options):
+    cov = make_project(options)
+    def run():
+        with open(os.devnull, "w") as devnull:
+            cov.report(file=devnull)
+    return run, None
+
+@scenario("report.html")
+def report_html(options):
+    cov = make_project(options)
+    def run():
+        cov.html_report(directory="htmlcov")
+    return run, None
+
+@scenario("report.xml")
+def report_xml(options):
+    cov = make_project(options)
+    def run():
+        cov.xml_report(outfile="coverage.xml")
+    return run, None
+
+
+def time_runs(func, runs):
+    """Call `func` `runs` times, and return the times in seconds."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_scenario(name, func, options):
+    """Run one scenario in a temporary directory.  Returns its results dict."""
+    old_dir = os.getcwd()
+    old_modules = set(sys.modules)
+    tempdir = tempfile.mkdtemp(prefix="coverage_perf_")
+    try:
+        os.chdir(tempdir)
+        sys.path.insert(0, tempdir)
+        funcs = func(options)
+        if funcs is None:
+            return None
+        run, baseline = funcs
+        # Once to warm up the disk caches.
+        run()
+        times = time_runs(run, options.runs)
+        result = {
+            "min": min(times),
+            "median": statistics.median(times),
+            "times": times,
+        }
+        if baseline is not None:
+            result["baseline"] = min(time_runs(baseline, options.runs))
+            result["overhead"] = result["min"] / result["baseline"]
+        return result
+    finally:
+        sys.path.remove(tempdir)
+        for modname in set(sys.modules) - old_modules:
+            del sys.modules[modname]
+        os.chdir(old_dir)
+        shutil.rmtree(tempdir, ignore_errors=True)
+
+
+def do_list(options, args):
+    """List the scenarios."""
+    for name, _ in SCENARIOS:
+        print(name)
+    return 0
+
+
+def do_run(options, args):
+    """Run the scenarios matching `args`, or all of them."""
+    patterns = args or ["*"]
+    results = {
+        "version": RESULTS_VERSION,
+        "coverage": coverage.__version__,
+        "python": sys.version.split()[0],
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "tracer": "CTracer" if CTracer and not options.timid else "PyTracer",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "runs": options.runs,
+        "scale": options.scale,
+        "scenarios": {},
+    }
+    print("{:<20} {:>10} {:>10} {:>9}".format("scenario", "min", "median", "overhead"))
+    for name, func in SCENARIOS:
+        if not any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+            continue
+        result = run_scenario(name, func, options)
+        if result is None:
+            print("{:<20} {:>10}".format(name, "skipped"))
+            continue
+        results["scenarios"][name] = result
+        overhead = "{:8.2f}x".format(result["overhead"]) if "overhead" in result else ""
+        print("{:<20} {:>9.3f}s {:>9.3f}s {:>9}".format(
+            name, result["min"], result["median"], overhead,
+        ).rstrip())
+
+    if options.out:
+        with open(options.out, "w") as f:
+            json.dump(results, f, indent=4, sort_keys=True)
+    return 0
+
+
+def do_compare(options, args):
+    """Compare two result files, and flag regressions."""
+    if len(args) != 2:
+        print("compare needs two result files")
+        return 2
+    with open(args[0]) as f:
+        old = json.load(f)
+    with open(args[1]) as f:
+        new = json.load(f)
+
+    regressions = 0
+    print("{:<20} {:>10} {:>10} {:>8}".format("scenario", "old", "new", "change"))
+    for name in sorted(set(old["scenarios"]) | set(new["scenarios"])):
+        if name not in old["scenarios"] or name not in new["scenarios"]:
+            which = "new" if name in new["scenarios"] else "old"
+            print("{:<20} only in {} results".format(name, which))
+            continue
+        old_min = old["scenarios"][name]["min"]
+        new_min = new["scenarios"][name]["min"]
+        change = (new_min / old_min - 1) * 100
+        flag = ""
+        if change > options.threshold:
+            flag = "REGRESSION"
+            regressions += 1
+        elif change < -options.threshold:
+            flag = "faster"
+        print("{:<20} {:>9.3f}s {:>9.3f}s {:>+7.1f}% {}".format(
+            name, old_min, new_min, change, flag,
+        ).rstrip())
+    return 1 if regressions else 0
+
+
+COMMANDS = {
+    "list": do_list,
+    "run": do_run,
+    "compare": do_compare,
+}
+
+
+def main():
+    parser = optparse.OptionParser(usage="%prog list|run|compare [args]")
+    parser.add_option("--runs", type="int", default=5, help="How many timed runs of each scenario")
+    parser.add_option("--scale", type="float", default=1.0, help="Multiply the problem sizes")
+    parser.add_option("--out", help="Write the results as JSON to this file")
+    parser.add_option("--timid", action="store_true", help="Use the Python tracer")
+    parser.add_option(
+        "--threshold", type="float", default=THRESHOLD,
+        help="Percent slower that counts as a regression",
+    )
+    options, args = parser.parse_args()
+    if not args or args[0] not in COMMANDS:
+        parser.print_usage()
+        return 2
+    return COMMANDS[args[0]](options, args[1:])
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -206,3 +206,84 @@ $.each([
         });
     });
 });
+
+// Index rows tests
+
+QUnit.module("Index rows", {
+    beforeEach: function () {
+        this.rows = [
+            ["b.py", "b_py.html", 10, 5, 0, 0, 0, 5, 10, "50.0"],
+            ["a.py", "a_py.html", 4, 0, 1, 0, 0, 4, 4, "100.0"],
+            ["c&<.py", "c_py.html", 0, 0, 0, 0, 0, 0, 0, "100.0"]
+        ];
+    }
+});
+
+function names(rows) {
+    return $.map(rows, function (row) { return row[0]; });
+}
+
+QUnit.test("Sort by name", function (assert) {
+    assert.deepEqual(names(coverage.sort_rows(this.rows, coverage.ROW.name)), ["a.py", "b.py", "c&<.py"]);
+    assert.deepEqual(names(coverage.sort_rows(this.rows, coverage.ROW.name, true)), ["c&<.py", "b.py", "a.py"]);
+});
+
+QUnit.test("Sort by coverage uses the ratio, then the name", function (assert) {
+    assert.deepEqual(names(coverage.sort_rows(this.rows, coverage.ROW.pc)), ["b.py", "a.py", "c&<.py"]);
+});
+
+QUnit.test("Filter by name", function (assert) {
+    assert.deepEqual(names(coverage.filter_rows(this.rows, ".p")), ["b.py", "a.py", "c&<.py"]);
+    assert.deepEqual(names(coverage.filter_rows(this.rows, "a")), ["a.py"]);
+    assert.deepEqual(names(coverage.filter_rows(this.rows, "xyzzy")), []);
+});
+
+QUnit.test("Total of rows", function (assert) {
+    var total = coverage.total_row(this.rows);
+    assert.deepEqual(total.slice(2), [14, 5, 1, 0, 0, 9, 14, "64.3"]);
+    assert.equal(coverage.total_row([])[coverage.ROW.pc], "100");
+});
+
+QUnit.test("Row HTML is escaped", function (assert) {
+    var html = coverage.row_html(this.rows[2], coverage.index_columns(false));
+    assert.ok(html.indexOf('<a href="c_py.html">c&amp;&lt;.py</a>') !== -1);
+    assert.ok(html.indexOf('data-ratio="0 0">100.0%') !== -1);
+});
+
+// Line contexts tests
+
+QUnit.module("Line contexts", {
+    beforeEach: function () {
+        build_fixture("rrr");
+        coverage.context_names = null;
+        coverage.line_contexts = null;
+        coverage.contexts_waiting = [];
+        // Don't load the scripts, the tests provide their data.
+        coverage.contexts_requested = true;
+    }
+});
+
+function shown_contexts(lineno) {
+    return $.map(coverage.line_elt(lineno).find(".ctxs span"), function (span) {
+        return $(span).text();
+    });
+}
+
+QUnit.test("Contexts are shown once both scripts load", function (assert) {
+    coverage.toggle_contexts(2);
+    coverage.context_names_loaded(["", "test_one", "test_two"]);
+    assert.deepEqual(shown_contexts(2), []);
+    coverage.file_contexts_loaded({"1": [1], "2": [0, 2]});
+    assert.deepEqual(shown_contexts(2), ["(empty context)", "test_two"]);
+    assert.deepEqual(shown_contexts(1), []);
+});
+
+QUnit.test("Showing contexts again toggles them", function (assert) {
+    coverage.context_names_loaded(["test_one"]);
+    coverage.file_contexts_loaded({"3": [0]});
+    coverage.toggle_contexts(3);
+    assert.equal(coverage.line_elt(3).find(".ctxs").length, 1);
+    coverage.toggle_contexts(3);
+    assert.equal(coverage.line_elt(3).find(".ctxs").length, 1);
+    assert.deepEqual(shown_contexts(3), ["test_one"]);
+});
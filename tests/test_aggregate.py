@@ -0,0 +1,197 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for coverage/aggregate.py"""
+
+import glob
+import os.path
+import stat
+import threading
+
+import mock
+
+from coverage import aggregate
+from coverage.aggregate import AggregatingData, Aggregator
+from coverage.data import CoverageData
+
+from tests.coveragetest import CoverageTest
+
+
+LINES_1 = {
+    'a.py': {1: None, 2: None},
+    'b.py': {3: None},
+}
+LINES_2 = {
+    'a.py': {1: None, 5: None},
+    'c.py': {17: None},
+}
+ARCS_3 = {
+    'x.py': {(-1, 1): None, (1, 2): None, (2, -1): None},
+}
+
+
+class AggregateTest(CoverageTest):
+    """Tests of the aggregating daemon and its clients."""
+
+    def setUp(self):
+        if not aggregate.can_aggregate():
+            self.skipTest("Aggregating needs Unix sockets")
+        super(AggregateTest, self).setUp()
+
+    def start_aggregator(self):
+        """Run an Aggregator for ".coverage" in a thread."""
+        aggregator = Aggregator(
+            os.path.abspath(".coverage"),
+            aggregate.socket_path(".coverage"),
+            idle_timeout=0.5,
+        )
+        self.assertTrue(aggregator.listen())
+        thread = threading.Thread(target=aggregator.serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        return aggregator
+
+    def data_files(self):
+        """The parallel data files in the current directory."""
+        return glob.glob(".coverage.*")
+
+    def read_data(self, filename):
+        """Read a CoverageData from `filename`."""
+        covdata = CoverageData(filename)
+        covdata.read()
+        return covdata
+
+    def test_reading_before_writing(self):
+        covdata = AggregatingData(suffix=True)
+        covdata.set_context("ctx")
+        covdata.add_lines(LINES_1)
+        covdata.add_file_tracers({'b.py': "my.plugin"})
+        covdata.touch_file('d.py')
+        self.assertTrue(covdata)
+        self.assertFalse(covdata.has_arcs())
+        self.assertEqual(covdata.measured_files(), set(['a.py', 'b.py', 'd.py']))
+        self.assertCountEqual(covdata.lines('a.py'), [1, 2])
+        self.assertEqual(covdata.lines('d.py'), [])
+        self.assertIsNone(covdata.lines('zzz.py'))
+        self.assertEqual(covdata.file_tracer('b.py'), "my.plugin")
+        self.assertEqual(covdata.file_tracer('a.py'), "")
+        self.assertEqual(covdata.measured_contexts(), set(["ctx"]))
+        self.assertEqual(covdata.contexts_by_lineno('a.py'), {1: ["ctx"], 2: ["ctx"]})
+
+    def test_processes_share_one_data_file(self):
+        self.start_aggregator()
+        covdata1 = AggregatingData(suffix=True)
+        covdata1.add_lines(LINES_1)
+        covdata1.write()
+        covdata2 = AggregatingData(suffix=True)
+        covdata2.add_lines(LINES_2)
+        covdata2.add_run_info(note="hello")
+        covdata2.write()
+
+        # The clients have nothing left after writing.
+        self.assertFalse(covdata1)
+        data_files = self.data_files()
+        self.assertEqual(len(data_files), 1)
+        covdata = self.read_data(data_files[0])
+        self.assertEqual(covdata.measured_files(), set(['a.py', 'b.py', 'c.py']))
+        self.assertCountEqual(covdata.lines('a.py'), [1, 2, 5])
+
+    def test_contexts_are_kept(self):
+        self.skip_unless_data_storage_is("sql")
+        self.start_aggregator()
+        covdata = AggregatingData(suffix=True)
+        covdata.set_context("first")
+        covdata.add_lines(LINES_1)
+        covdata.set_context("second")
+        covdata.add_lines(LINES_2)
+        covdata.write()
+
+        covdata = self.read_data(self.data_files()[0])
+        self.assertCountEqual(covdata.measured_contexts(), ["first", "second"])
+        self.assertCountEqual(covdata.lines('a.py', context="first"), [1, 2])
+        self.assertCountEqual(covdata.lines('a.py', context="second"), [1, 5])
+
+    def test_combined_away_data_file_is_replaced(self):
+        self.start_aggregator()
+        covdata = AggregatingData(suffix=True)
+        covdata.add_lines(LINES_1)
+        covdata.write()
+        first_file, = self.data_files()
+        os.remove(first_file)
+
+        covdata.add_lines(LINES_2)
+        covdata.write()
+        second_file, = self.data_files()
+        self.assertNotEqual(first_file, second_file)
+        self.assertCountEqual(self.read_data(second_file).lines('a.py'), [1, 5])
+
+    def test_mismatched_data_is_written_separately(self):
+        self.start_aggregator()
+        covdata1 = AggregatingData(suffix=True)
+        covdata1.add_lines(LINES_1)
+        covdata1.write()
+        covdata2 = AggregatingData(suffix=True)
+        covdata2.add_arcs(ARCS_3)
+        covdata2.write()
+
+        data_files = [self.read_data(f) for f in self.data_files()]
+        self.assertEqual(len(data_files), 2)
+        arc_data, = [d for d in data_files if d.has_arcs()]
+        self.assertCountEqual(arc_data.arcs('x.py'), [(-1, 1), (1, 2), (2, -1)])
+
+    def test_no_daemon_falls_back_to_own_file(self):
+        covdata = AggregatingData(suffix="mine")
+        covdata.add_lines(LINES_1)
+        with mock.patch.object(aggregate, "start_daemon") as start_daemon:
+            with mock.patch.object(aggregate, "START_TIMEOUT", 0.1):
+                covdata.write()
+        self.assertEqual(start_daemon.call_count, 1)
+        self.assertEqual(self.data_files(), [".coverage.mine"])
+        self.assertCountEqual(self.read_data(".coverage.mine").lines('a.py'), [1, 2])
+
+    def test_socket_is_private(self):
+        self.start_aggregator()
+        path = aggregate.socket_path(".coverage")
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(path)).st_mode), 0o700)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o600)
+        self.assertEqual(os.stat(path).st_uid, os.getuid())
+
+    def test_other_users_are_refused(self):
+        # Pretend every peer is someone else: the daemon won't read their data,
+        # and processes won't send theirs to the daemon.
+        self.start_aggregator()
+        covdata = AggregatingData(suffix="mine")
+        covdata.add_lines(LINES_1)
+        with mock.patch.object(aggregate, "peer_is_us", return_value=False):
+            with mock.patch.object(aggregate, "start_daemon"):
+                with mock.patch.object(aggregate, "START_TIMEOUT", 0.1):
+                    covdata.write()
+        self.assertEqual(self.data_files(), [".coverage.mine"])
+
+    def test_only_one_aggregator_listens(self):
+        self.start_aggregator()
+        second = Aggregator(
+            os.path.abspath(".coverage"), aggregate.socket_path(".coverage"),
+        )
+        self.assertFalse(second.listen())
+
+    def test_coverage_run_uses_the_daemon(self):
+        self.make_file("prog.py", """\
+            import sys
+            if sys.argv[1] == "a":
+                x = 1
+            else:
+                x = 2
+            """)
+        self.make_file(".coveragerc", """\
+            [run]
+            parallel = True
+            aggregate = True
+            """)
+        self.run_command("coverage run prog.py a")
+        self.run_command("coverage run prog.py b")
+        self.assert_file_count(".coverage.*", 1)
+
+        self.run_command("coverage combine")
+        covdata = self.read_data(".coverage")
+        self.assertCountEqual(covdata.lines(os.path.abspath("prog.py")), [1, 2, 3, 5])
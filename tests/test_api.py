@@ -9,6 +9,7 @@ import os.path
 import sys
 import textwrap
 import warnings
+import xml.dom.minidom
 
 import coverage
 from coverage import env
@@ -695,6 +696,77 @@ class AnalysisTest(CoverageTest):
         self.assertEqual(nums.n_missing_branches, 2)
 
 
+class FunctionGranularityTest(CoverageTest):
+    """Tests of measuring with `[run] granularity = function`."""
+
+    def make_and_measure(self):
+        """Make and measure a module, returning the Coverage object."""
+        self.make_file("funcs.py", """\
+            def decorator(func):
+                return func
+
+            def called():
+                return [x for x in range(3)]
+
+            @decorator
+            def never_called():
+                return 1
+
+            def excluded():         # pragma: no cover
+                return 2
+
+            called()
+            """)
+        cov = coverage.Coverage()
+        cov.set_option("run:granularity", "function")
+        self.start_import_stop(cov, "funcs")
+        return cov
+
+    def test_function_analysis(self):
+        cov = self.make_and_measure()
+        self.assertTrue(cov.get_data().has_functions())
+        analysis = cov._analyze("funcs.py")
+        self.assertEqual(analysis.statements, set([1, 4, 7]))
+        self.assertEqual(analysis.missing, set([7]))
+        self.assertEqual(analysis.functions[7], "never_called")
+        self.assertEqual(analysis.numbers.n_statements, 3)
+        self.assertEqual(analysis.numbers.n_missing, 1)
+
+    def test_function_report(self):
+        cov = self.make_and_measure()
+        repout = StringIO()
+        cov.report(file=repout, show_missing=True)
+        report = repout.getvalue().replace('\\', '/')
+        self.assertIn("Funcs   Miss", report)
+        self.assertRegex(report, r"funcs.py\s+3\s+1\s+67%\s+7")
+
+    def test_function_xml_report(self):
+        cov = self.make_and_measure()
+        cov.xml_report(outfile="coverage.xml")
+        dom = xml.dom.minidom.parse("coverage.xml")
+        rates = dict(
+            (method.getAttribute("name"), method.getAttribute("line-rate"))
+            for method in dom.getElementsByTagName("method")
+        )
+        self.assertEqual(rates, {"decorator": "1", "called": "1", "never_called": "0"})
+
+    def test_no_branches_with_functions(self):
+        self.make_file("nothing.py", "a = 1\n")
+        cov = coverage.Coverage(branch=True)
+        cov.set_option("run:granularity", "function")
+        msg = r"Can't measure branches with function granularity"
+        with self.assertRaisesRegex(CoverageException, msg):
+            self.start_import_stop(cov, "nothing")
+
+    def test_bad_granularity(self):
+        self.make_file("nothing.py", "a = 1\n")
+        cov = coverage.Coverage()
+        cov.set_option("run:granularity", "statement")
+        msg = r"Don't understand granularity setting: 'statement'"
+        with self.assertRaisesRegex(CoverageException, msg):
+            self.start_import_stop(cov, "nothing")
+
+
 class TestRunnerPluginTest(CoverageTest):
     """Test that the API works properly the way various third-party plugins call it.
 
@@ -785,3 +857,23 @@ class ReporterDeprecatedAttributeTest(CoverageTest):
 
         self.assertEqual(len(warns), 1)
         self.assertTrue(issubclass(warns[0].category, DeprecationWarning))
+
+
+class ReportFilesTest(CoverageTest):
+    """Tests of Reporter.report_files."""
+
+    def test_file_reporters_are_released(self):
+        self.make_file("one.py", "a = 1\n")
+        self.make_file("two.py", "import one\nb = 2\n")
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "two")
+        cov.get_data()
+
+        # Each file is parsed while it's reported, and released afterward.
+        parsed = []
+        rep = Reporter(cov, cov.config)
+        rep.report_files(lambda fr, analysis: parsed.append(fr._parser is not None), None)
+        self.assertEqual(parsed, [True, True])
+        for fr in rep._file_reporters:
+            self.assertIsNone(fr._parser)
+            self.assertIsNone(fr._source)
@@ -38,16 +38,31 @@ class BaseCmdLineTest(CoverageTest):
     defaults.annotate(
         directory=None, ignore_errors=None, include=None, omit=None, morfs=[],
     )
+    defaults.compare(with_statements=None)
+    defaults.analysis_daemon(socket_path=None)
     defaults.html_report(
         directory=None, ignore_errors=None, include=None, omit=None, morfs=[],
-        skip_covered=None, title=None
+        skip_covered=None, title=None, diff=None, rollup_depth=None,
+    )
+    defaults.html_server(
+        host="localhost", port=8000, ignore_errors=None, include=None, omit=None,
+        morfs=[], skip_covered=None, title=None,
+    )
+    defaults.json_report(
+        contexts=None, ignore_errors=None, include=None, omit=None, morfs=[],
+        outfile=None, diff=None, rollup_depth=None,
+    )
+    defaults.lcov_report(
+        ignore_errors=None, include=None, omit=None, morfs=[], outfile=None,
+        diff=None,
     )
     defaults.report(
         ignore_errors=None, include=None, omit=None, morfs=[],
-        show_missing=None, skip_covered=None
+        show_missing=None, skip_covered=None, diff=None, rollup_depth=None,
     )
     defaults.xml_report(
         ignore_errors=None, include=None, omit=None, morfs=[], outfile=None,
+        diff=None,
     )
 
     DEFAULT_KWARGS = dict((name, kw) for name, _, kw in defaults.mock_calls)
@@ -67,6 +82,9 @@ class BaseCmdLineTest(CoverageTest):
         mk.report.return_value = 50.0
         mk.html_report.return_value = 50.0
         mk.xml_report.return_value = 50.0
+        mk.json_report.return_value = 50.0
+        mk.lcov_report.return_value = 50.0
+        mk.compare.return_value = {}
 
         return mk
 
@@ -224,6 +242,35 @@ class CmdLineTest(BaseCmdLineTest):
             .save()
             """)
 
+    def test_compare(self):
+        # coverage compare [--format=FORMAT] [--with-statements] BEFORE AFTER
+        self.cmd_executes("compare before.dat after.dat", """\
+            .Coverage()
+            .compare("before.dat", "after.dat")
+            """)
+        self.cmd_executes("compare --with-statements --format=json before.dat after.dat", """\
+            .Coverage()
+            .compare("before.dat", "after.dat", with_statements=True)
+            """)
+        self.cmd_help("compare before.dat", "Need two data files to compare.")
+        self.cmd_help(
+            "compare --format=xml a b",
+            "option --format: invalid choice: 'xml' (choose from 'text', 'json')",
+        )
+
+    def test_daemon(self):
+        # coverage daemon [--socket PATH]
+        self.cmd_executes("daemon", """\
+            .Coverage()
+            .load()
+            .analysis_daemon()
+            """)
+        self.cmd_executes("daemon --socket /tmp/cov.sock", """\
+            .Coverage()
+            .load()
+            .analysis_daemon(socket_path="/tmp/cov.sock")
+            """)
+
     def test_debug(self):
         self.cmd_help("debug", "What information would you like: config, data, sys?")
         self.cmd_help("debug foo", "Don't know what you mean by 'foo'")
@@ -306,6 +353,79 @@ class CmdLineTest(BaseCmdLineTest):
             .html_report(title='Hello_there')
             """)
 
+    def test_serve(self):
+        # coverage serve [--host HOST] [--port PORT] [-i] [--omit DIR,...] [FILE1 FILE2 ...]
+        self.cmd_executes("serve", """\
+            .Coverage()
+            .load()
+            .html_server()
+            """)
+        self.cmd_executes("serve --host 0.0.0.0 --port 8765", """\
+            .Coverage()
+            .load()
+            .html_server(host="0.0.0.0", port=8765)
+            """)
+        self.cmd_executes("serve -i --skip-covered mod1", """\
+            .Coverage()
+            .load()
+            .html_server(ignore_errors=True, skip_covered=True, morfs=["mod1"])
+            """)
+
+    def test_diff(self):
+        # coverage report|html|xml|json|lcov --diff FILE
+        self.cmd_executes("report --diff changes.diff", """\
+            .Coverage()
+            .load()
+            .report(diff="changes.diff")
+            """)
+        self.cmd_executes("html --diff changes.diff", """\
+            .Coverage()
+            .load()
+            .html_report(diff="changes.diff")
+            """)
+        for cmd in ["xml", "json", "lcov"]:
+            self.cmd_executes("%s --diff changes.diff -o -" % cmd, """\
+                .Coverage()
+                .load()
+                .%s_report(diff="changes.diff", outfile="-")
+                """ % cmd)
+
+    def test_json(self):
+        # coverage json [-i] [--omit DIR,...] [--show-contexts] [FILE1 FILE2 ...]
+        self.cmd_executes("json", """\
+            .Coverage()
+            .load()
+            .json_report()
+            """)
+        self.cmd_executes("json -i -o out.json", """\
+            .Coverage()
+            .load()
+            .json_report(ignore_errors=True, outfile="out.json")
+            """)
+        self.cmd_executes("json --show-contexts --omit fooey mod1", """\
+            .Coverage(omit=["fooey"])
+            .load()
+            .json_report(contexts=True, omit=["fooey"], morfs=["mod1"])
+            """)
+
+    def test_lcov(self):
+        # coverage lcov [-i] [--omit DIR,...] [-o OUTFILE] [FILE1 FILE2 ...]
+        self.cmd_executes("lcov", """\
+            .Coverage()
+            .load()
+            .lcov_report()
+            """)
+        self.cmd_executes("lcov -i -o out.lcov", """\
+            .Coverage()
+            .load()
+            .lcov_report(ignore_errors=True, outfile="out.lcov")
+            """)
+        self.cmd_executes("lcov --omit fooey mod1 mod2", """\
+            .Coverage(omit=["fooey"])
+            .load()
+            .lcov_report(omit=["fooey"], morfs=["mod1", "mod2"])
+            """)
+
     def test_report(self):
         # coverage report [-m] [-i] [-o DIR,...] [FILE1 FILE2 ...]
         self.cmd_executes("report", """\
@@ -349,6 +469,28 @@ class CmdLineTest(BaseCmdLineTest):
             .report(skip_covered=True)
             """)
 
+    def test_rollup_depth(self):
+        # coverage report|html|json --rollup-depth DEPTH
+        self.cmd_executes("report --rollup-depth 2", """\
+            .Coverage()
+            .load()
+            .report(rollup_depth=2)
+            """)
+        self.cmd_executes("html --rollup-depth 1", """\
+            .Coverage()
+            .load()
+            .html_report(rollup_depth=1)
+            """)
+        self.cmd_executes("json --rollup-depth 3", """\
+            .Coverage()
+            .load()
+            .json_report(rollup_depth=3)
+            """)
+        self.cmd_help(
+            "report --rollup-depth=deep",
+            "option --rollup-depth: invalid integer value: 'deep'",
+        )
+
     def test_run(self):
         # coverage run [-p] [-L] [--timid] MODULE.py [ARG1 ARG2 ...]
 
@@ -742,11 +884,13 @@ class CmdMainTest(CoverageTest):
 class CoverageReportingFake(object):
     """A fake Coverage and Coverage.coverage test double."""
     # pylint: disable=missing-docstring
-    def __init__(self, report_result, html_result, xml_result):
+    def __init__(self, report_result, html_result, xml_result, json_result, lcov_result):
         self.config = CoverageConfig()
         self.report_result = report_result
         self.html_result = html_result
         self.xml_result = xml_result
+        self.json_result = json_result
+        self.lcov_result = lcov_result
 
     def Coverage(self, *args_unused, **kwargs_unused):
         return self
@@ -769,24 +913,38 @@ class CoverageReportingFake(object):
     def xml_report(self, *args_unused, **kwargs_unused):
         return self.xml_result
 
+    def json_report(self, *args_unused, **kwargs_unused):
+        return self.json_result
+
+    def lcov_report(self, *args_unused, **kwargs_unused):
+        return self.lcov_result
+
 
 @pytest.mark.parametrize("results, fail_under, cmd, ret", [
     # Command-line switch properly checks the result of reporting functions.
-    ((20, 30, 40), None, "report --fail-under=19", 0),
-    ((20, 30, 40), None, "report --fail-under=21", 2),
-    ((20, 30, 40), None, "html --fail-under=29", 0),
-    ((20, 30, 40), None, "html --fail-under=31", 2),
-    ((20, 30, 40), None, "xml --fail-under=39", 0),
-    ((20, 30, 40), None, "xml --fail-under=41", 2),
+    ((20, 30, 40, 50, 60), None, "report --fail-under=19", 0),
+    ((20, 30, 40, 50, 60), None, "report --fail-under=21", 2),
+    ((20, 30, 40, 50, 60), None, "html --fail-under=29", 0),
+    ((20, 30, 40, 50, 60), None, "html --fail-under=31", 2),
+    ((20, 30, 40, 50, 60), None, "xml --fail-under=39", 0),
+    ((20, 30, 40, 50, 60), None, "xml --fail-under=41", 2),
+    ((20, 30, 40, 50, 60), None, "json --fail-under=49", 0),
+    ((20, 30, 40, 50, 60), None, "json --fail-under=51", 2),
+    ((20, 30, 40, 50, 60), None, "lcov --fail-under=59", 0),
+    ((20, 30, 40, 50, 60), None, "lcov --fail-under=61", 2),
     # Configuration file setting properly checks the result of reporting.
-    ((20, 30, 40), 19, "report", 0),
-    ((20, 30, 40), 21, "report", 2),
-    ((20, 30, 40), 29, "html", 0),
-    ((20, 30, 40), 31, "html", 2),
-    ((20, 30, 40), 39, "xml", 0),
-    ((20, 30, 40), 41, "xml", 2),
+    ((20, 30, 40, 50, 60), 19, "report", 0),
+    ((20, 30, 40, 50, 60), 21, "report", 2),
+    ((20, 30, 40, 50, 60), 29, "html", 0),
+    ((20, 30, 40, 50, 60), 31, "html", 2),
+    ((20, 30, 40, 50, 60), 39, "xml", 0),
+    ((20, 30, 40, 50, 60), 41, "xml", 2),
+    ((20, 30, 40, 50, 60), 49, "json", 0),
+    ((20, 30, 40, 50, 60), 51, "json", 2),
+    ((20, 30, 40, 50, 60), 59, "lcov", 0),
+    ((20, 30, 40, 50, 60), 61, "lcov", 2),
     # Command-line overrides configuration.
-    ((20, 30, 40), 19, "report --fail-under=21", 2),
+    ((20, 30, 40, 50, 60), 19, "report --fail-under=21", 2),
 ])
 def test_fail_under(results, fail_under, cmd, ret):
     cov = CoverageReportingFake(*results)
@@ -5,7 +5,12 @@
 
 import os.path
 
+import mock
+
 import coverage
+from coverage.backward import StringIO
+from coverage.collector import Collector
+from coverage.misc import CoverageException
 
 from tests.coveragetest import CoverageTest
 from tests.helpers import CheckUniqueFilenames
@@ -48,3 +53,108 @@ class CollectorTest(CoverageTest):
         abs_files = set(os.path.abspath(f) for f in should_trace_hook.filenames)
         self.assertIn(os.path.abspath("f1.py"), abs_files)
         self.assertIn(os.path.abspath("f2.py"), abs_files)
+
+    def test_tracer_stats(self):
+        self.make_file("f1.py", """\
+            def f1(x):
+                return x + 1
+
+            for i in range(10):
+                f1(i)
+            """)
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "f1")
+        stats = cov._collector.get_stats()
+        self.assertGreaterEqual(stats["calls"], 11)
+        self.assertGreaterEqual(stats["lines"], 20)
+        self.assertGreaterEqual(stats["returns"], 10)
+        self.assertGreaterEqual(stats["files"], 1)
+        self.assertEqual(stats["dynamic_calls"], 0)
+
+        # The counts from earlier tracers are kept when starting again.
+        self.clean_local_file_imports()
+        self.start_import_stop(cov, "f1")
+        more_stats = cov._collector.get_stats()
+        self.assertGreaterEqual(more_stats["calls"], stats["calls"] + 11)
+
+    def test_file_events(self):
+        self.make_file("f1.py", """\
+            def f1(x):
+                return x + 1
+
+            for i in range(10):
+                f1(i)
+            """)
+        cov = coverage.Coverage(debug=["tracestats"])
+        cov._debug_file = StringIO()
+        self.start_import_stop(cov, "f1")
+        file_events = cov._collector.file_events
+        f1_events = [n for f, n in file_events.items() if f.endswith("f1.py")]
+        # Each call to f1 has call, line, and return events.
+        self.assertGreaterEqual(sum(f1_events), 30)
+
+    def test_memory_estimate(self):
+        self.make_file("f1.py", """\
+            def f1(x):
+                return x + 1
+
+            for i in range(10):
+                f1(i)
+            """)
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "f1")
+        collected = cov._collector.memory_estimate()
+
+        # Once the data is flushed, it's not counted any more.
+        cov.get_data()
+        flushed = cov._collector.memory_estimate()
+        self.assertGreater(collected, flushed + 5 * Collector.LINE_ENTRY_BYTES)
+
+    def test_max_memory_spills(self):
+        self.make_file("f1.py", """\
+            def f1(x):
+                return x + 1
+
+            for i in range(150000):
+                f1(i)
+            b = 2
+            """)
+        cov = coverage.Coverage()
+        cov.set_option("run:max_memory", 1)
+        # Make every line look like a megabyte, so that any data is too much.
+        with mock.patch.object(Collector, "LINE_ENTRY_BYTES", 1024 * 1024):
+            self.start_import_stop(cov, "f1")
+        self.assertGreaterEqual(cov._collector.memory_spills, 1)
+        data = cov.get_data()
+        self.assertCountEqual(data.lines(os.path.abspath("f1.py")), [1, 2, 4, 5, 6])
+
+    def test_overhead_doesnt_spill_again(self):
+        self.make_file("f1.py", """\
+            def f1(x):
+                return x + 1
+
+            for i in range(350000):
+                f1(i)
+            """)
+        mb = 1024 * 1024
+
+        def memory_estimate(collector):
+            """A fixed overhead over the limit, and 100Kb for each line."""
+            lines = sum(len(d) for d in collector.data.values())
+            return 2 * mb + lines * 100 * 1024
+
+        cov = coverage.Coverage()
+        cov.set_option("run:max_memory", 1)
+        with mock.patch.object(Collector, "memory_estimate", autospec=True) as estimate:
+            estimate.side_effect = memory_estimate
+            self.start_import_stop(cov, "f1")
+        # Only the first check spilled: after that, the few lines collected
+        # between checks are under the limit, even with the overhead.
+        self.assertEqual(cov._collector.memory_spills, 1)
+        self.assertGreaterEqual(estimate.call_count, 3)
+
+    def test_max_memory_must_be_positive(self):
+        cov = coverage.Coverage()
+        cov.set_option("run:max_memory", -1)
+        with self.assertRaisesRegex(CoverageException, "max_memory can't be negative"):
+            cov.start()
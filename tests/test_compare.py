@@ -0,0 +1,159 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for 'coverage compare'."""
+
+import json
+
+import coverage
+from coverage.backward import StringIO
+from coverage.compare import format_changes, json_report, text_report
+from coverage.data import CoverageData
+from coverage.files import abs_file, set_relative_directory
+from coverage.misc import CoverageException
+
+from tests.coveragetest import CoverageTest
+
+
+class CompareTest(CoverageTest):
+    """Tests of Coverage.compare."""
+
+    def setUp(self):
+        super(CompareTest, self).setUp()
+        self.a_py = abs_file("a.py")
+        self.b_py = abs_file("b.py")
+        self.c_py = abs_file("c.py")
+
+    def make_data_file(self, filename, lines=None, arcs=None, context=None):
+        """Write a data file with `lines` or `arcs`, dicts mapping file names to lists."""
+        data = CoverageData(basename=filename)
+        if context is not None:
+            data.set_context(context)
+        if lines is not None:
+            data.add_lines(dict((f, dict.fromkeys(l)) for f, l in lines.items()))
+        if arcs is not None:
+            data.add_arcs(dict((f, dict.fromkeys(a)) for f, a in arcs.items()))
+        data.write()
+
+    def test_lines(self):
+        self.make_data_file("before.dat", lines={self.a_py: [1, 2, 3], self.b_py: [1]})
+        self.make_data_file(
+            "after.dat", lines={self.a_py: [1, 3, 4], self.b_py: [1], self.c_py: [5]},
+        )
+        changes = coverage.Coverage().compare("before.dat", "after.dat")
+        self.assertEqual(changes, {
+            self.a_py: {'lines_gained': [4], 'lines_lost': [2]},
+            self.c_py: {'lines_gained': [5], 'lines_lost': []},
+        })
+
+    def test_no_changes(self):
+        self.make_data_file("before.dat", lines={self.a_py: [1, 2, 3]})
+        self.make_data_file("after.dat", lines={self.a_py: [1, 2, 3]})
+        self.assertEqual(coverage.Coverage().compare("before.dat", "after.dat"), {})
+
+    def test_arcs(self):
+        self.make_data_file("before.dat", arcs={self.a_py: [(-1, 1), (1, 2), (2, -1)]})
+        self.make_data_file("after.dat", arcs={self.a_py: [(-1, 1), (1, 3), (3, -1)]})
+        changes = coverage.Coverage().compare("before.dat", "after.dat")
+        self.assertEqual(changes, {
+            self.a_py: {
+                'lines_gained': [3], 'lines_lost': [2],
+                'arcs_gained': [(1, 3), (3, -1)], 'arcs_lost': [(1, 2), (2, -1)],
+            },
+        })
+
+    def test_lines_against_arcs(self):
+        # Arc data is compared as lines if the other file only has lines.
+        self.make_data_file("before.dat", lines={self.a_py: [1, 2]})
+        self.make_data_file("after.dat", arcs={self.a_py: [(-1, 1), (1, 3), (3, -1)]})
+        changes = coverage.Coverage().compare("before.dat", "after.dat")
+        self.assertEqual(changes, {self.a_py: {'lines_gained': [3], 'lines_lost': [2]}})
+
+    def test_contexts_are_combined(self):
+        self.skip_unless_data_storage_is("sql")
+        self.make_data_file("before.dat", lines={self.a_py: [1, 2]}, context="test_one")
+        data = CoverageData(basename="before.dat")
+        data.read()
+        data.set_context("test_two")
+        data.add_lines({self.a_py: dict.fromkeys([2, 3])})
+        self.make_data_file("after.dat", lines={self.a_py: [1, 2, 3]}, context="test_three")
+        self.assertEqual(coverage.Coverage().compare("before.dat", "after.dat"), {})
+
+    def test_missing_data_file(self):
+        self.make_data_file("before.dat", lines={self.a_py: [1]})
+        msg = r"Couldn't compare data file 'after.dat': no such file"
+        with self.assertRaisesRegex(CoverageException, msg):
+            coverage.Coverage().compare("before.dat", "after.dat")
+
+    def test_with_statements(self):
+        self.make_file("a.py", """\
+            a = 1
+            if a:
+                b = 3
+            c = 4
+            """)
+        # Line 5 isn't in the file any more, and line 2 is still covered.
+        self.make_data_file("before.dat", lines={self.a_py: [1, 2, 3, 5]})
+        self.make_data_file("after.dat", lines={self.a_py: [1, 2, 4]})
+        cov = coverage.Coverage()
+        changes = cov.compare("before.dat", "after.dat")
+        self.assertEqual(changes[self.a_py]['lines_lost'], [3, 5])
+
+        changes = cov.compare("before.dat", "after.dat", with_statements=True)
+        _, statements, _, _, _ = cov.analysis2("a.py")
+        self.assertEqual(changes, {
+            self.a_py: {'lines_gained': [4], 'lines_lost': [3], 'num_statements': len(statements)},
+        })
+
+    def test_with_statements_and_no_source(self):
+        self.make_data_file("before.dat", lines={self.a_py: [1, 2]})
+        self.make_data_file("after.dat", lines={self.a_py: [1]})
+        changes = coverage.Coverage().compare("before.dat", "after.dat", with_statements=True)
+        self.assertEqual(changes, {self.a_py: {'lines_gained': [], 'lines_lost': [2]}})
+
+
+class CompareOutputTest(CoverageTest):
+    """Tests of the text and JSON output of 'coverage compare'."""
+
+    run_in_temp_dir = False
+
+    def setUp(self):
+        super(CompareOutputTest, self).setUp()
+        set_relative_directory()
+        self.changes = {
+            abs_file("a.py"): {
+                'lines_gained': [7], 'lines_lost': [2, 3, 4, 9],
+                'arcs_gained': [(5, 7), (7, -1)], 'arcs_lost': [(1, 2), (5, 6), (6, -1)],
+            },
+            abs_file("b.py"): {
+                'lines_gained': [], 'lines_lost': [], 'arcs_gained': [(3, -1)], 'arcs_lost': [],
+            },
+        }
+
+    def test_format_changes(self):
+        self.assertEqual(
+            format_changes([2, 3, 4, 9], [(1, 2), (5, 6), (6, -1)]),
+            "2-4, 9, 5->6, 6->exit",
+        )
+        self.assertEqual(format_changes([], [(-1, 1), (3, -1)]), "3->exit")
+        self.assertEqual(format_changes([], []), "")
+
+    def test_text_report(self):
+        out = StringIO()
+        text_report(self.changes, out)
+        self.assertEqual(out.getvalue(), (
+            "Name    Lost                    Gained\n"
+            "---------------------------------------\n"
+            "a.py    2-4, 9, 5->6, 6->exit   7\n"
+            "b.py                            3->exit\n"
+            "---------------------------------------\n"
+            "TOTAL   4                       1\n"
+        ))
+
+    def test_json_report(self):
+        out = StringIO()
+        json_report(self.changes, out)
+        report = json.loads(out.getvalue())
+        self.assertEqual(report['totals'], {'lines_gained': 1, 'lines_lost': 4})
+        self.assertEqual(sorted(report['files']), ["a.py", "b.py"])
+        self.assertEqual(report['files']['a.py']['arcs_lost'], [[1, 2], [5, 6], [6, -1]])
@@ -4,9 +4,14 @@
 
 """Test the config file handling for coverage.py"""
 
+import glob
+import os
+import stat
+
 import mock
 
 import coverage
+from coverage.config import CoverageConfig, read_coverage_config
 from coverage.misc import CoverageException
 
 from tests.coveragetest import CoverageTest, UsingModulesMixin
@@ -302,6 +307,7 @@ class ConfigFileTest(UsingModulesMixin, CoverageTest):
                 yet_more
         include = thirty
         precision = 3
+        rollup_depth = 2
 
         partial_branches =
             pragma:?\\s+no branch
@@ -316,6 +322,7 @@ class ConfigFileTest(UsingModulesMixin, CoverageTest):
 
         directory    =     c:\\tricky\\dir.somewhere
         extra_css=something/extra.css
+        show_contexts = yes
         title = Title & nums # nums!
         [{section}xml]
         output=mycov.xml
@@ -376,6 +383,7 @@ class ConfigFileTest(UsingModulesMixin, CoverageTest):
         self.assertEqual(cov.config.report_omit, ["one", "another", "some_more", "yet_more"])
         self.assertEqual(cov.config.report_include, ["thirty"])
         self.assertEqual(cov.config.precision, 3)
+        self.assertEqual(cov.config.rollup_depth, 2)
 
         self.assertEqual(cov.config.partial_list, [r"pragma:?\s+no branch"])
         self.assertEqual(cov.config.partial_always_list, ["if 0:", "while True:"])
@@ -385,6 +393,7 @@ class ConfigFileTest(UsingModulesMixin, CoverageTest):
         self.assertEqual(cov.config.html_dir, r"c:\tricky\dir.somewhere")
         self.assertEqual(cov.config.extra_css, "something/extra.css")
         self.assertEqual(cov.config.html_title, "Title & nums # nums!")
+        self.assertTrue(cov.config.show_contexts)
 
         self.assertEqual(cov.config.xml_output, "mycov.xml")
         self.assertEqual(cov.config.xml_package_depth, 17)
@@ -519,3 +528,119 @@ class ConfigFileTest(UsingModulesMixin, CoverageTest):
         self.assertFalse(cov.config.timid)
         self.assertFalse(cov.config.branch)
         self.assertEqual(cov.config.data_file, ".coverage")
+
+
+class ConfigCacheTest(CoverageTest):
+    """Tests of caching the configuration read from files."""
+
+    def setUp(self):
+        super(ConfigCacheTest, self).setUp()
+        # Keep the cache files in the test's own directory.
+        os.mkdir("tmp")
+        patcher = mock.patch("tempfile.gettempdir", return_value=os.path.abspath("tmp"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def cache_files(self):
+        """The config cache files written so far."""
+        return glob.glob("tmp/*/coverage-config-*")
+
+    def test_cached_config_is_used(self):
+        self.make_file(".coveragerc", """\
+            [run]
+            timid = True
+            [paths]
+            source =
+                src/
+                /ci/src/
+            [report]
+            exclude_lines =
+                never
+            """)
+        config = read_coverage_config(config_file=True, cache=True)
+        self.assertEqual(len(self.cache_files()), 1)
+
+        with mock.patch.object(CoverageConfig, "from_file") as from_file:
+            cached = read_coverage_config(config_file=True, cache=True)
+        self.assertEqual(from_file.call_count, 0)
+        self.assertEqual(cached.__dict__, config.__dict__)
+        self.assertTrue(cached.timid)
+        self.assertEqual(cached.paths, {"source": ["src/", "/ci/src/"]})
+
+    def test_cached_values_keep_their_types(self):
+        self.make_file(".coveragerc", """\
+            [report]
+            fail_under = 90
+            precision = 2
+            [paths]
+            zzz =
+                src/
+                /zzz/src/
+            aaa =
+                lib/
+                /aaa/lib/
+            [my_plugin]
+            option = value
+            [run]
+            plugins = my_plugin
+            """)
+        config = read_coverage_config(config_file=True, cache=True)
+        cached = read_coverage_config(config_file=True, cache=True)
+        self.assertEqual(cached.fail_under, 90.0)
+        self.assertIsInstance(cached.fail_under, float)
+        self.assertIsInstance(cached.precision, int)
+        self.assertEqual(list(cached.paths), list(config.paths))
+        self.assertEqual(list(cached.paths), ["zzz", "aaa"])
+        self.assertEqual(cached.get_plugin_options("my_plugin"), {"option": "value"})
+        self.assertEqual(cached.__dict__, config.__dict__)
+
+    def test_cache_file_is_private(self):
+        if not hasattr(os, "getuid"):
+            self.skipTest("Private files need Unix permissions")
+        self.make_file(".coveragerc", "[run]\ntimid = True\n")
+        read_coverage_config(config_file=True, cache=True)
+        cache_file, = self.cache_files()
+        self.assertEqual(stat.S_IMODE(os.stat(cache_file).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(cache_file)).st_mode), 0o700)
+        self.assertEqual(glob.glob("tmp/*/*.tmp"), [])
+
+    def test_no_cache_in_unsafe_directory(self):
+        if not hasattr(os, "getuid"):
+            self.skipTest("Private directories need Unix permissions")
+        self.make_file(".coveragerc", "[run]\ntimid = True\n")
+        os.mkdir("tmp/coverage-{}".format(os.getuid()), 0o700)
+        os.chmod("tmp/coverage-{}".format(os.getuid()), 0o777)
+        self.assertTrue(read_coverage_config(config_file=True, cache=True).timid)
+        self.assertEqual(self.cache_files(), [])
+
+    def test_changed_file_isnt_cached(self):
+        self.make_file(".coveragerc", "[run]\ntimid = True\n")
+        self.assertTrue(read_coverage_config(config_file=True, cache=True).timid)
+        self.make_file(".coveragerc", "[run]\ntimid = False\n")
+        self.assertFalse(read_coverage_config(config_file=True, cache=True).timid)
+
+    def test_changed_environment_variables_arent_cached(self):
+        self.make_file(".coveragerc", "[run]\ndata_file = $DATA_NAME.dat\n")
+        self.set_environ("DATA_NAME", "first")
+        config = read_coverage_config(config_file=True, cache=True)
+        self.assertEqual(config.data_file, "first.dat")
+        self.set_environ("DATA_NAME", "second")
+        config = read_coverage_config(config_file=True, cache=True)
+        self.assertEqual(config.data_file, "second.dat")
+
+    def test_arguments_arent_cached(self):
+        self.make_file(".coveragerc", "[run]\ntimid = True\n")
+        config = read_coverage_config(config_file=True, cache=True, branch=True)
+        self.assertTrue(config.branch)
+        config = read_coverage_config(config_file=True, cache=True)
+        self.assertFalse(config.branch)
+        self.assertTrue(config.timid)
+
+    def test_no_cache_by_default(self):
+        self.make_file(".coveragerc", "[run]\ntimid = True\n")
+        cov = coverage.Coverage()
+        self.assertTrue(cov.config.timid)
+        self.assertEqual(self.cache_files(), [])
+        cov = coverage.Coverage(_cache_config=True)
+        self.assertTrue(cov.config.timid)
+        self.assertEqual(len(self.cache_files()), 1)
@@ -107,6 +107,27 @@ class StaticContextTest(CoverageTest):
             self.assertEqual(combined.arcs(fblue, context='red'), [])
             self.assertEqual(combined.arcs(fblue, context='blue'), self.ARCS)
 
+    def test_line_contexts_by_lineno(self):
+        red_data, _ = self.run_red_blue()
+        fred = os.path.abspath("red.py")
+        red_data.set_context("blue")
+        red_data.add_lines({fred: {2: None, 3: None}})
+        self.assertEqual(
+            red_data.contexts_by_lineno(fred),
+            {1: ['red'], 2: ['blue', 'red'], 3: ['blue'], 4: ['red']}
+        )
+        self.assertEqual(red_data.contexts_by_lineno("nothere.py"), {})
+
+    def test_arc_contexts_by_lineno(self):
+        red_data, _ = self.run_red_blue(branch=True)
+        fred = os.path.abspath("red.py")
+        red_data.set_context("blue")
+        red_data.add_arcs({fred: {(2, 3): None}})
+        self.assertEqual(
+            red_data.contexts_by_lineno(fred),
+            {1: ['red'], 2: ['blue', 'red'], 3: ['blue'], 4: ['red']}
+        )
+
 
 class DynamicContextTest(CoverageTest):
     """Tests of dynamically changing contexts."""
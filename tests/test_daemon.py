@@ -0,0 +1,213 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for coverage/daemon.py"""
+
+import json
+import os
+import socket
+import threading
+import time
+
+import mock
+
+import coverage
+from coverage.backward import import_local_file
+from coverage.misc import CoverageException
+
+from tests.coveragetest import CoverageTest
+
+
+class WarmAnalyzerTest(CoverageTest):
+    """Tests of the analysis kept in memory by the daemon."""
+
+    def setUp(self):
+        super(WarmAnalyzerTest, self).setUp()
+        if not hasattr(socket, "AF_UNIX"):
+            self.skipTest("Unix sockets aren't available on this platform")
+        self.make_file("main_file.py", """\
+            import helper
+            helper.func(12)
+            """)
+        self.make_file("helper.py", """\
+            def func(x):
+                if x % 2:
+                    print("odd")
+            """)
+        self.cov = coverage.Coverage()
+        self.start_import_stop(self.cov, "main_file")
+        self.cov.save()
+
+    def make_analyzer(self, **kwargs):
+        """Make a WarmAnalyzer for the measured data."""
+        from coverage.daemon import WarmAnalyzer
+        cov = coverage.Coverage(**kwargs)
+        cov.load()
+        return WarmAnalyzer(cov)
+
+    def test_analysis_matches_analysis2(self):
+        analysis = self.make_analyzer().analysis("helper.py")
+        filename, statements, excluded, missing, missing_formatted = self.cov.analysis2("helper.py")
+        self.assertEqual(analysis['file'], filename)
+        self.assertEqual(analysis['statements'], statements)
+        self.assertEqual(analysis['excluded'], excluded)
+        self.assertEqual(analysis['missing'], missing)
+        self.assertEqual(analysis['missing_formatted'], missing_formatted)
+        self.assertNotIn('missing_branches', analysis)
+
+    def test_analysis_is_kept(self):
+        analyzer = self.make_analyzer()
+        analysis = analyzer.analysis("helper.py")
+        self.assertIs(analyzer.analysis("helper.py"), analysis)
+        self.assertIs(analyzer.analysis(os.path.abspath("helper.py")), analysis)
+        self.assertEqual(len(analyzer.reporters), 1)
+
+    def test_changed_source_is_parsed_again(self):
+        analyzer = self.make_analyzer()
+        before = analyzer.analysis("helper.py")
+        fr = analyzer.reporters[os.path.abspath("helper.py")][1]
+
+        self.make_file("helper.py", """\
+            def func(x):
+                if x % 2:
+                    print("odd")
+                print("a new line")
+            """)
+        after = analyzer.analysis("helper.py")
+        self.assertIsNot(analyzer.reporters[os.path.abspath("helper.py")][1], fr)
+        self.assertEqual(len(after['statements']), len(before['statements']) + 1)
+
+    def test_changed_data_is_read_again(self):
+        analyzer = self.make_analyzer()
+        before = analyzer.analysis("helper.py")
+        fr = analyzer.reporters[os.path.abspath("helper.py")][1]
+
+        # Make sure the data file looks different, then run the odd branch.
+        time.sleep(0.01)
+        cov = coverage.Coverage()
+        cov.start()
+        helper = import_local_file("helper")       # pragma: nested
+        helper.func(13)                             # pragma: nested
+        cov.stop()                                  # pragma: nested
+        cov.save()
+
+        after = analyzer.analysis("helper.py")
+        self.assertEqual(len(after['missing']), len(before['missing']) - 1)
+        # The source didn't change, so it wasn't parsed again.
+        self.assertIs(analyzer.reporters[os.path.abspath("helper.py")][1], fr)
+
+    def test_missing_branches(self):
+        cov = coverage.Coverage(branch=True)
+        self.start_import_stop(cov, "main_file")
+        cov.save()
+        analysis = self.make_analyzer().analysis("helper.py")
+        self.assertEqual(analysis['missing_branches'], {"2": [3]})
+
+    def test_no_source(self):
+        with self.assertRaisesRegex(CoverageException, "No source for code"):
+            self.make_analyzer().analysis("nothere.py")
+
+
+class AnalysisDaemonTest(CoverageTest):
+    """Tests of answering requests on a Unix socket."""
+
+    def setUp(self):
+        super(AnalysisDaemonTest, self).setUp()
+        if not hasattr(socket, "AF_UNIX"):
+            self.skipTest("Unix sockets aren't available on this platform")
+        self.make_file("helper.py", """\
+            def func(x):
+                return x + 1
+            """)
+        self.cov = coverage.Coverage()
+        self.start_import_stop(self.cov, "helper")
+        self.cov.save()
+
+    def make_daemon(self):
+        """Start a daemon in a thread, and return it."""
+        daemon = self.cov.analysis_daemon()
+        thread = threading.Thread(target=daemon.serve_forever)
+        thread.start()
+
+        def stop():
+            """Stop the daemon and its thread."""
+            daemon.shutdown()
+            thread.join()
+            daemon.server_close()
+        self.addCleanup(stop)
+        return daemon
+
+    def ask(self, daemon, *requests):
+        """Send `requests` on one connection, and return the list of responses."""
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(daemon.socket_path)
+            sock_file = sock.makefile("rwb")
+            responses = []
+            for request in requests:
+                sock_file.write(request.encode('utf-8') + b"\n")
+                sock_file.flush()
+                responses.append(json.loads(sock_file.readline().decode('utf-8')))
+            sock_file.close()
+        finally:
+            sock.close()
+        return responses
+
+    def test_answering_requests(self):
+        daemon = self.make_daemon()
+        self.assertEqual(daemon.socket_path, ".coverage.sock")
+        responses = self.ask(
+            daemon,
+            '{"command": "analysis", "file": "helper.py"}',
+            '{"command": "analysis", "file": "nothere.py"}',
+            '{"command": "analysis"}',
+        )
+        self.assertEqual(responses[0]['file'], self.cov.analysis2("helper.py")[0])
+        self.assertIn("No source for code", responses[1]['error'])
+        self.assertEqual(responses[2], {'error': "Need a file to analyze"})
+
+    def test_bad_requests(self):
+        daemon = self.make_daemon()
+        responses = self.ask(
+            daemon, 'analysis helper.py', '["analysis"]', '{"command": "stop"}',
+            '{"command": "analysis", "file": 5}',
+        )
+        self.assertIn("Couldn't parse request", responses[0]['error'])
+        self.assertEqual(responses[1], {'error': "Request should be a JSON object"})
+        self.assertIn("Unknown command", responses[2]['error'])
+        self.assertEqual(responses[3], {'error': "File should be a string: 5"})
+
+    def test_unexpected_errors_are_answered(self):
+        daemon = self.make_daemon()
+        results = [ValueError("Boom!"), {'file': "helper.py"}]
+        request = '{"command": "analysis", "file": "helper.py"}'
+        with mock.patch.object(daemon.analyzer, "analysis", side_effect=results):
+            responses = self.ask(daemon, request, request)
+        self.assertRegex(responses[0]['error'], r"^Couldn't analyze u?'helper.py': Boom!$")
+        # The connection was still open for the next request.
+        self.assertEqual(responses[1], {'file': "helper.py"})
+
+    def test_socket_is_removed(self):
+        daemon = self.cov.analysis_daemon(socket_path="my.sock")
+        self.assertTrue(os.path.exists("my.sock"))
+        daemon.server_close()
+        self.assertFalse(os.path.exists("my.sock"))
+
+    def test_stale_socket_is_replaced(self):
+        stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale.bind("my.sock")
+        stale.close()
+        daemon = self.cov.analysis_daemon(socket_path="my.sock")
+        daemon.server_close()
+
+    def test_socket_in_use(self):
+        daemon = self.cov.analysis_daemon(socket_path="my.sock")
+        self.addCleanup(daemon.server_close)
+        with self.assertRaisesRegex(CoverageException, "Couldn't listen on 'my.sock'"):
+            self.cov.analysis_daemon(socket_path="my.sock")
+
+    def test_other_files_are_not_removed(self):
+        self.make_file("my.sock", "Not a socket")
+        with self.assertRaisesRegex(CoverageException, "Couldn't listen on 'my.sock'"):
+            self.cov.analysis_daemon(socket_path="my.sock")
+        self.assertTrue(os.path.exists("my.sock"))
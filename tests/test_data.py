@@ -183,6 +183,15 @@ class CoverageDataTest(DataTestHelpers, CoverageTest):
         covdata.touch_file('zzz.py')
         self.assert_measured_files(covdata, MEASURED_FILES_3 + ['zzz.py'])
 
+    def test_touch_files(self):
+        covdata = CoverageData()
+        covdata.add_lines(LINES_1)
+        covdata.touch_files(['zzz.py', 'yyy.py'], "zzz.Plugin")
+        self.assert_measured_files(covdata, MEASURED_FILES_1 + ['zzz.py', 'yyy.py'])
+        self.assertEqual(covdata.lines('yyy.py'), [])
+        self.assertEqual(covdata.file_tracer('zzz.py'), "zzz.Plugin")
+        self.assertEqual(covdata.file_tracer('yyy.py'), "zzz.Plugin")
+
     def test_no_lines_vs_unmeasured_file(self):
         covdata = CoverageData()
         covdata.add_lines(LINES_1)
@@ -190,6 +199,17 @@ class CoverageDataTest(DataTestHelpers, CoverageTest):
         self.assertEqual(covdata.lines('zzz.py'), [])
         self.assertIsNone(covdata.lines('no_such_file.py'))
 
+    def test_contexts_by_lineno_without_contexts(self):
+        covdata = CoverageData()
+        covdata.add_lines(LINES_1)
+        self.assertEqual(covdata.measured_contexts(), set([""]))
+        self.assertEqual(covdata.contexts_by_lineno('a.py'), {1: [""], 2: [""]})
+        self.assertEqual(covdata.contexts_by_lineno('no_such_file.py'), {})
+
+        covdata = CoverageData()
+        covdata.add_arcs(ARCS_3)
+        self.assertEqual(covdata.contexts_by_lineno('x.py'), {1: [""], 2: [""], 3: [""]})
+
     def test_run_info(self):
         self.skip_unless_data_storage_is("json")
         covdata = CoverageData()
@@ -301,6 +321,34 @@ class CoverageDataTest(DataTestHelpers, CoverageTest):
         with self.assertRaisesRegex(CoverageException, "Can't combine line data with arc data"):
             covdata2.update(covdata1)
 
+    def test_adding_functions(self):
+        covdata = CoverageData()
+        covdata.add_functions(LINES_1)
+        self.assertTrue(covdata.has_functions())
+        self.assertFalse(covdata.has_arcs())
+        self.assert_line_counts(covdata, SUMMARY_1)
+        self.assertCountEqual(covdata.lines("a.py"), A_PY_LINES_1)
+
+    def test_cant_add_lines_to_functions(self):
+        covdata = CoverageData()
+        covdata.add_functions(LINES_1)
+        with self.assertRaisesRegex(CoverageException, "Can't add lines to existing function data"):
+            covdata.add_lines(LINES_2)
+
+    def test_update_cant_mix_lines_and_functions(self):
+        covdata1 = CoverageData(suffix='1')
+        covdata1.add_lines(LINES_1)
+
+        covdata2 = CoverageData(suffix='2')
+        covdata2.add_functions(LINES_2)
+
+        msg = "Can't combine function data with line data"
+        with self.assertRaisesRegex(CoverageException, msg):
+            covdata1.update(covdata2)
+
+        with self.assertRaisesRegex(CoverageException, msg):
+            covdata2.update(covdata1)
+
     def test_update_file_tracers(self):
         covdata1 = CoverageData(suffix='1')
         covdata1.add_lines({
@@ -172,6 +172,7 @@ class DebugTraceTest(CoverageTest):
             version coverage cover_paths pylib_paths tracer configs_attempted config_file
             configs_read data_file python platform implementation executable
             pid cwd path environment command_line cover_match pylib_match
+            tracer_stats collector_memory memory_spills
             """.split()
         for label in labels:
             label_pat = r"^\s*%s: " % label
@@ -181,6 +182,15 @@ class DebugTraceTest(CoverageTest):
                 msg="Incorrect lines for %r" % label,
             )
 
+    def test_debug_tracestats(self):
+        out_lines = self.f1_debug_output(["tracestats"])
+        self.assertIn("-- tracestats --", out_lines)
+        calls = int(re_line(out_lines, r"tracer_stats: calls = ").split()[-1])
+        self.assertGreaterEqual(calls, 6)
+        # f1.py has a call and a line event for each call to f1, at least.
+        f1_events = re_line(out_lines, r"\d+ .*f1\.py$").split()
+        self.assertGreaterEqual(int(f1_events[-2]), 10)
+
     def test_debug_sys_ctracer(self):
         out_lines = self.f1_debug_output(["sys"])
         tracer_line = re_line(out_lines, r"CTracer:").strip()
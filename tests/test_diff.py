@@ -0,0 +1,268 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for reporting on the lines changed by a diff."""
+
+import json
+import os
+import subprocess
+
+import mock
+
+import coverage
+from coverage.diff import git_root, parse_unified_diff, read_diff
+from coverage.misc import CoverageException
+
+from tests.coveragetest import CoverageTest
+from tests.helpers import re_lines
+
+
+GIT_DIFF = """\
+diff --git a/a.py b/a.py
+index 3f4e1b2..8c1d2e3 100644
+--- a/a.py
++++ b/a.py
+@@ -2,4 +2,4 @@ def f(x):
+     if x:
+-        y = 30
++        y = 3
+     else:
+-        y = 50
++        y = 5
+diff --git a/README.rst b/README.rst
+new file mode 100644
+index 0000000..e69de29
+--- /dev/null
++++ b/README.rst
+@@ -0,0 +1,2 @@
++Hello
++there
+"""
+
+
+class ParseDiffTest(CoverageTest):
+    """Tests of coverage.diff.parse_unified_diff."""
+
+    run_in_temp_dir = False
+
+    def test_git_diff(self):
+        self.assertEqual(
+            parse_unified_diff(GIT_DIFF.splitlines(True)),
+            {"a.py": set([3, 5]), "README.rst": set([1, 2])}
+        )
+
+    def test_plain_diff(self):
+        diff = [
+            "--- old/prog.py\t2018-10-01 12:00:00\n",
+            "+++ new/prog.py\t2018-10-02 12:00:00\n",
+            "@@ -1 +1,3 @@\n",
+            " a = 1\n",
+            "+b = 2\n",
+            "+c = 3\n",
+            "@@ -10,3 +12,3 @@\n",
+            " x = 10\n",
+            "\n",
+            "-y = 12\n",
+            "\\ No newline at end of file\n",
+            "+y = 14\n",
+            "\\ No newline at end of file\n",
+        ]
+        self.assertEqual(parse_unified_diff(diff), {"new/prog.py": set([2, 3, 14])})
+
+    def test_removed_lines_that_look_like_headers(self):
+        diff = [
+            "--- a/a.py\n",
+            "+++ b/a.py\n",
+            "@@ -1,2 +1,3 @@\n",
+            "--- this was a comment\n",
+            "+++ so was this\n",
+            " x = 1\n",
+            "+y = 2\n",
+            "--- a/gone.py\n",
+            "+++ /dev/null\n",
+            "@@ -1,1 +0,0 @@\n",
+            "--- b/a.py\n",
+        ]
+        self.assertEqual(parse_unified_diff(diff), {"a.py": set([1, 3])})
+
+    def test_only_removed_lines(self):
+        diff = [
+            "--- a/a.py\n",
+            "+++ b/a.py\n",
+            "@@ -1,2 +1,1 @@\n",
+            " x = 1\n",
+            "-y = 2\n",
+            "--- a/old.py\n",
+            "+++ b/new.py\n",
+            "@@ -5,1 +5,1 @@\n",
+            "-z = 5\n",
+            "+z = 50\n",
+        ]
+        self.assertEqual(parse_unified_diff(diff), {"new.py": set([5])})
+
+
+class DiffReportTest(CoverageTest):
+    """Tests of the reports limited to the lines changed by a diff."""
+
+    def setUp(self):
+        super(DiffReportTest, self).setUp()
+        self.make_file("a.py", """\
+            def f(x):
+                if x:
+                    y = 3
+                else:
+                    y = 5
+                return y
+
+            f(1)
+            """)
+        self.make_file("b.py", """\
+            import a
+            c = 2
+            """)
+        self.make_file("changes.diff", GIT_DIFF)
+
+    def test_read_diff(self):
+        with mock.patch("coverage.diff.git_root", return_value=None):
+            self.assertEqual(
+                read_diff("changes.diff"),
+                {os.path.abspath("a.py"): set([3, 5]), os.path.abspath("README.rst"): set([1, 2])}
+            )
+        with self.assertRaisesRegex(CoverageException, "Couldn't read diff file 'nothere.diff'"):
+            read_diff("nothere.diff")
+
+    def test_git_diff_is_relative_to_the_work_tree(self):
+        root = os.path.abspath("proj")
+        with mock.patch("coverage.diff.git_root", return_value=root):
+            self.assertEqual(read_diff("changes.diff"), {
+                os.path.join(root, "a.py"): set([3, 5]),
+                os.path.join(root, "README.rst"): set([1, 2]),
+            })
+            # Other diffs are relative to the current directory.
+            self.make_file("plain.diff", """\
+                --- a.py
+                +++ a.py
+                @@ -3 +3 @@
+                -        y = 30
+                +        y = 3
+                """)
+            self.assertEqual(read_diff("plain.diff"), {os.path.abspath("a.py"): set([3])})
+
+    def test_git_root(self):
+        try:
+            subprocess.check_output(["git", "init", "-q", "proj"], stderr=subprocess.STDOUT)
+        except (OSError, subprocess.CalledProcessError):
+            self.skipTest("Needs git")
+        self.make_file("proj/sub/x.py", "")
+        self.chdir("proj/sub")
+        self.assertEqual(os.path.realpath(git_root()), os.path.realpath(".."))
+
+    def test_report_only_changed_lines(self):
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "b")
+        self.assertEqual(cov.report(diff="changes.diff", show_missing=True), 50.0)
+        report = self.stdout()
+        self.assertEqual(re_lines(report, "b.py"), "")
+        self.assertIn("a.py 2 1 50% 5", " ".join(report.split()))
+
+    def test_only_changed_files_get_file_reporters(self):
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "b")
+        real_gfr = cov._get_file_reporter
+        with mock.patch.object(cov, "_get_file_reporter", side_effect=real_gfr) as gfr:
+            cov.report(diff="changes.diff")
+        self.assertEqual([call[0][0] for call in gfr.call_args_list], [os.path.abspath("a.py")])
+
+    def test_changed_continuation_line(self):
+        self.make_file("m.py", """\
+            x = (
+                1,
+                2)
+            if not x:
+                y = 4
+            """)
+        self.make_file("changes.diff", """\
+            --- a/m.py
+            +++ b/m.py
+            @@ -2 +2 @@
+            -    10,
+            +    1,
+            """)
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "m")
+        self.assertEqual(cov.report(diff="changes.diff"), 100.0)
+        self.assertIn("m.py 1 0 100%", " ".join(self.stdout().split()))
+
+    def test_branches_on_changed_lines(self):
+        self.make_file("changes.diff", """\
+            --- a/a.py
+            +++ b/a.py
+            @@ -2 +2 @@
+            -    if not x:
+            +    if x:
+            """)
+        cov = coverage.Coverage(branch=True)
+        self.start_import_stop(cov, "b")
+        cov.json_report(diff="changes.diff")
+        with open("coverage.json") as f:
+            report = json.load(f)
+        self.assertEqual(list(report['files']), ["a.py"])
+        summary = report['files']['a.py']['summary']
+        self.assertEqual(summary['num_statements'], 1)
+        self.assertEqual(summary['missing_lines'], 0)
+        self.assertEqual(summary['num_branches'], 2)
+        self.assertEqual(summary['missing_branches'], 1)
+        self.assertEqual(report['files']['a.py']['missing_branches'], [[2, 5]])
+
+    def test_no_measured_files_changed(self):
+        self.make_file("changes.diff", """\
+            --- a/README.rst
+            +++ b/README.rst
+            @@ -1 +1 @@
+            -Hi
+            +Hello
+            """)
+        self.run_command("coverage run b.py")
+        out = self.run_command("coverage report --diff changes.diff --fail-under=90")
+        self.assertEqual(out, "No measured files were changed by the diff.\n")
+        self.assertEqual(self.last_command_status, 0)
+
+        # The other reports are empty.
+        cov = coverage.Coverage()
+        cov.load()
+        self.assertEqual(cov.json_report(diff="changes.diff"), 100.0)
+        with open("coverage.json") as f:
+            self.assertEqual(json.load(f)['files'], {})
+        self.assertEqual(cov.xml_report(diff="changes.diff"), 100.0)
+        self.assertEqual(cov.html_report(diff="changes.diff"), 100.0)
+
+    def test_fail_under_changed_lines(self):
+        self.run_command("coverage run b.py")
+        self.run_command("coverage report --diff changes.diff --fail-under=50")
+        self.assertEqual(self.last_command_status, 0)
+        self.run_command("coverage report --diff changes.diff --fail-under=51")
+        self.assertEqual(self.last_command_status, 2)
+        # Without the diff, the total is higher.
+        self.run_command("coverage report --fail-under=51")
+        self.assertEqual(self.last_command_status, 0)
+
+    def test_html_pages_change_with_the_diff(self):
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "b")
+        cov.html_report(diff="changes.diff")
+        with open("htmlcov/a_py.html") as f:
+            first = f.read()
+        self.assert_doesnt_exist("htmlcov/b_py.html")
+
+        self.make_file("changes.diff", """\
+            --- a/a.py
+            +++ b/a.py
+            @@ -3 +3 @@
+            -        y = 30
+            +        y = 3
+            """)
+        cov.html_report(diff="changes.diff")
+        with open("htmlcov/a_py.html") as f:
+            second = f.read()
+        self.assertNotEqual(first, second)
+        self.assertIn("100%", second)
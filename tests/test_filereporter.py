@@ -5,6 +5,7 @@
 
 import os
 
+import coverage
 from coverage.plugin import FileReporter
 from coverage.python import PythonFileReporter
 
@@ -87,6 +88,19 @@ class FileReporterTest(UsingModulesMixin, CoverageTest):
         assert acu < bcu and acu <= bcu and acu != bcu
         assert bcu > acu and bcu >= acu and bcu != acu
 
+    def test_release(self):
+        cov = coverage.Coverage()
+        acu = PythonFileReporter("aa/afile.py", cov)
+        lines = cov._analyze(acu).statements
+        self.assertIsNotNone(acu._parser)
+        self.assertEqual(acu.source(), u"# afile.py\n")
+        acu.release()
+        self.assertIsNone(acu._parser)
+        self.assertIsNone(acu._source)
+        # The source is read and parsed again if needed.
+        self.assertEqual(acu.lines(), lines)
+        self.assertEqual(acu.source(), u"# afile.py\n")
+
     def test_egg(self):
         # Test that we can get files out of eggs, and read their source files.
         # The egg1 module is installed by an action in igor.py.
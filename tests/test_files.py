@@ -6,7 +6,9 @@
 
 import os
 import os.path
+import time
 
+import mock
 import pytest
 
 from coverage import files
@@ -158,6 +160,25 @@ class MatcherTest(CoverageTest):
         for filepath, matches in matches_to_try:
             self.assertMatches(tm, filepath, matches)
 
+    def test_tree_matcher_needs_whole_components(self):
+        trees = [
+            files.canonical_filename("sub"),
+            files.canonical_filename("sub/deeper/file.py"),
+            ]
+        tm = TreeMatcher(trees)
+        self.assertMatches(tm, "sub", True)
+        self.assertMatches(tm, "sub/deeper/other.py", True)
+        self.assertMatches(tm, "subway/file.py", False)
+        self.assertMatches(tm, "su", False)
+
+    def test_tree_matcher_with_many_trees(self):
+        trees = [files.canonical_filename("pkg%04d" % i) for i in range(3000)]
+        tm = TreeMatcher(trees)
+        self.assertMatches(tm, "pkg0000/a.py", True)
+        self.assertMatches(tm, "pkg2999/sub/a.py", True)
+        self.assertMatches(tm, "pkg3000/a.py", False)
+        self.assertMatches(tm, "pkg/a.py", False)
+
     def test_module_matcher(self):
         matches_to_try = [
             ('test', True),
@@ -207,6 +228,15 @@ class MatcherTest(CoverageTest):
         self.assertMatches(fnm, "x123foo.txt", True)
         self.assertMatches(fnm, "x798bar.txt", False)
 
+    def test_fnmatch_matcher_answers_are_bounded(self):
+        fnm = FnmatchMatcher(["*.py"])
+        fnm.MEMO_SIZE = 3
+        for _ in range(2):
+            for i in range(10):
+                self.assertMatches(fnm, "a%d.py" % i, True)
+                self.assertMatches(fnm, "a%d.txt" % i, False)
+                self.assertLessEqual(len(fnm._memo), 3)
+
     def test_fnmatch_windows_paths(self):
         # We should be able to match Windows paths even if we are running on
         # a non-Windows OS.
@@ -267,6 +297,36 @@ class PathAliasesTest(CoverageTest):
         self.assert_mapped(aliases, '/home/foo/src/a.py', './mysrc/a.py')
         self.assert_mapped(aliases, '/lib/foo/libsrc/a.py', './mylib/a.py')
 
+    def test_first_pattern_wins(self):
+        aliases = PathAliases()
+        aliases.add('/home/*/src', './mysrc')
+        aliases.add('/home/ned/src', './nedsrc')
+        self.assert_mapped(aliases, '/home/ned/src/a.py', './mysrc/a.py')
+
+    def test_adding_forgets_results(self):
+        aliases = PathAliases()
+        self.assert_unchanged(aliases, '/home/foo/src/a.py')
+        aliases.add('/home/*/src', './mysrc')
+        self.assert_mapped(aliases, '/home/foo/src/a.py', './mysrc/a.py')
+
+    def test_results_are_bounded(self):
+        aliases = PathAliases()
+        aliases.MEMO_SIZE = 3
+        aliases.add('/home/*/src', './mysrc')
+        for i in range(10):
+            self.assert_mapped(aliases, '/home/foo/src/a%d.py' % i, './mysrc/a%d.py' % i)
+            self.assertLessEqual(len(aliases._memo), 3)
+
+    def test_map_all(self):
+        aliases = PathAliases()
+        aliases.add('/home/*/src', './mysrc')
+        paths = ['/home/foo/src/a.py', '/lib/b.py']
+        self.assertEqual(aliases.map_all(paths), {
+            '/home/foo/src/a.py': files.canonical_filename('./mysrc/a.py'),
+            '/lib/b.py': '/lib/b.py',
+        })
+        self.assertEqual(PathAliases().map_all(paths), dict(zip(paths, paths)))
+
     def test_cant_have_wildcard_at_end(self):
         aliases = PathAliases()
         msg = "Pattern must not end with wildcards."
@@ -379,6 +439,42 @@ class FindPythonFilesTest(CoverageTest):
             "sub/windows.pyw",
             ])
 
+    def test_symlinks_are_resolved(self):
+        if not hasattr(os, "symlink"):
+            self.skipTest("No symlinks here.")
+        self.make_file("real/a.py")
+        self.make_file("sub/b.py")
+        os.symlink(os.path.abspath("real/a.py"), "sub/a.py")
+        os.symlink(os.path.abspath("real"), "sub/real")     # nope: links to dirs
+        py_files = set(find_python_files("sub"))
+        self.assertEqual(py_files, set([
+            files.canonical_filename("real/a.py"), os.path.join("sub", "b.py"),
+        ]))
+
+    def test_directory_listings_are_reused(self):
+        self.make_file("sub/a.py")
+        self.make_file("sub/ssub/__init__.py")
+        self.make_file("sub/ssub/s.py")
+        old = time.time() - 60
+        for dirname in ["sub", "sub/ssub"]:
+            os.utime(dirname, (old, old))
+
+        dir_cache = {}
+        py_files = set(find_python_files("sub", dir_cache))
+        self.assertEqual(sorted(dir_cache), ["sub", os.path.join("sub", "ssub")])
+
+        # Unchanged directories aren't read again.
+        with mock.patch("coverage.files._list_directory") as list_directory:
+            self.assertEqual(set(find_python_files("sub", dir_cache)), py_files)
+        self.assertEqual(list_directory.call_count, 0)
+
+        # A changed directory is.
+        self.make_file("sub/ssub/t.py")
+        py_files = set(find_python_files("sub", dir_cache))
+        self.assert_same_files(py_files, [
+            "sub/a.py", "sub/ssub/__init__.py", "sub/ssub/s.py", "sub/ssub/t.py",
+            ])
+
 
 class WindowsFileTest(CoverageTest):
     """Windows-specific tests of file name handling."""
@@ -12,12 +12,15 @@ import os.path
 import re
 import sys
 
+import mock
+
 import coverage
 from coverage.backward import unicode_class
 from coverage import env
 from coverage.files import flat_rootname
 import coverage.html
 from coverage.misc import CoverageException, NotPython, NoSource
+from coverage.sqldata import CoverageSqliteData
 
 from tests.coveragetest import CoverageTest, TESTS_DIR
 from tests.goldtest import gold_path
@@ -66,13 +69,15 @@ class HtmlTestHelpers(CoverageTest):
             return f.read()
 
     def get_html_index_content(self):
-        """Return the content of index.html.
+        """Return the content of index.html, and the index data it shows.
 
         Timestamps are replaced with a placeholder so that clocks don't matter.
 
         """
         with open("htmlcov/index.html") as f:
             index = f.read()
+        with open("htmlcov/index_data.js") as f:
+            index += f.read()
         index = re.sub(
             r"created at \d{4}-\d{2}-\d{2} \d{2}:\d{2}",
             r"created at YYYY-MM-DD HH:MM",
@@ -118,12 +123,37 @@ class HtmlDeltaTest(HtmlTestHelpers, CoverageTest):
         self.run_coverage()
 
         self.assert_exists("htmlcov/index.html")
+        self.assert_exists("htmlcov/index_data.js")
         self.assert_exists("htmlcov/main_file_py.html")
         self.assert_exists("htmlcov/helper1_py.html")
         self.assert_exists("htmlcov/helper2_py.html")
         self.assert_exists("htmlcov/style.css")
         self.assert_exists("htmlcov/coverage_html.js")
 
+    def test_index_data(self):
+        # The index rows are written as JSON for the page to show.
+        self.create_initial_files()
+        self.run_coverage()
+        with open("htmlcov/index_data.js") as f:
+            index_data = f.read()
+        prefix = "coverage.index_data = "
+        self.assertTrue(index_data.startswith(prefix))
+        data = json.loads(index_data[len(prefix):].rstrip().rstrip(";"))
+        self.assertFalse(data['has_arcs'])
+        names = [row[:2] for row in data['files']]
+        self.assertEqual(names, [
+            ["helper1.py", "helper1_py.html"],
+            ["helper2.py", "helper2_py.html"],
+            ["main_file.py", "main_file_py.html"],
+        ])
+        # Each row has the numbers, the covered ratio, and the percentage.
+        helper1 = data['files'][0]
+        self.assertEqual(len(helper1), 10)
+        self.assertEqual(helper1[3], helper1[8] - helper1[7])
+        # The rows aren't in the HTML.
+        index = self.get_html_index_content()
+        self.assertNotIn('<tr class="file">', index)
+
     def test_html_delta_from_source_change(self):
         # HTML generation can create only the files that have changed.
         # In this case, helper1 changes because its source is different.
@@ -514,6 +544,75 @@ class HtmlTest(HtmlTestHelpers, CoverageTest):
         self.assert_doesnt_exist("htmlcov/main_file_py.html")
         self.assert_exists("htmlcov/not_covered_py.html")
 
+    def test_rollup_depth(self):
+        self.make_file("main_file.py", """\
+            import pkg.sub.mod
+            """)
+        self.make_file("pkg/__init__.py", "")
+        self.make_file("pkg/sub/__init__.py", "")
+        self.make_file("pkg/sub/mod.py", "a = 1\n")
+        self.run_coverage()
+        with open("htmlcov/index.html") as f:
+            self.assertNotIn('class="directories"', f.read())
+
+        self.run_coverage(htmlargs=dict(rollup_depth=1))
+        with open("htmlcov/index.html") as f:
+            index = f.read()
+        self.assertIn('class="directories"', index)
+        self.assertIn(">pkg/</td>", index)
+        self.assertNotIn(">pkg/sub/</td>", index)
+
+
+class HtmlContextsTest(HtmlTestHelpers, CoverageTest):
+    """Tests of showing the contexts that ran each line."""
+
+    def setUp(self):
+        super(HtmlContextsTest, self).setUp()
+        self.skip_unless_data_storage_is("sql")
+        self.create_initial_files()
+
+    def test_contexts_are_in_separate_files(self):
+        self.make_file(".coveragerc", """\
+            [html]
+            show_contexts = True
+            """)
+        self.run_coverage(covargs=dict(context="red"))
+
+        with open("htmlcov/contexts.js") as f:
+            self.assertEqual(f.read(), 'coverage.context_names_loaded(["red"]);\n')
+        with open("htmlcov/helper1_py_ctx.js") as f:
+            self.assertEqual(f.read(), 'coverage.file_contexts_loaded({"1":[0],"2":[0]});\n')
+
+        helper1 = self.get_html_report_content("helper1.py")
+        self.assertIn('coverage.contexts_file = "helper1_py_ctx.js";', helper1)
+        self.assertIn('<span class="ctx_toggle"', helper1)
+        # The page doesn't have the context names.
+        self.assertNotIn("red", helper1)
+
+    def test_no_contexts_by_default(self):
+        self.run_coverage(covargs=dict(context="red"))
+        self.assert_doesnt_exist("htmlcov/contexts.js")
+        self.assert_doesnt_exist("htmlcov/helper1_py_ctx.js")
+        self.assertNotIn("ctx_toggle", self.get_html_report_content("helper1.py"))
+
+    def test_contexts_use_bulk_queries(self):
+        self.make_file(".coveragerc", """\
+            [html]
+            show_contexts = True
+            """)
+        cov = coverage.Coverage(context="red")
+        self.start_import_stop(cov, "main_file")
+        cov.save()
+
+        # Asking for the lines of each context one at a time would look up the
+        # context ids.
+        cov = coverage.Coverage()
+        cov.load()
+        with mock.patch.object(CoverageSqliteData, "_context_id") as context_id:
+            cov.html_report()
+        self.assertEqual(context_id.call_count, 0)
+        self.assert_exists("htmlcov/main_file_py_ctx.js")
+
 
 class HtmlStaticFileTest(CoverageTest):
     """Tests of the static file copying for the HTML report."""
@@ -543,7 +642,7 @@ class HtmlStaticFileTest(CoverageTest):
             "jquery/jquery.min.js",
             "jquery-hotkeys/jquery.hotkeys.js",
             "jquery-isonscreen/jquery.isonscreen.js",
-            "jquery-tablesorter/jquery.tablesorter.min.js",
+            "jquery-throttle-debounce/jquery.ba-throttle-debounce.min.js",
         ]
         for fpath in INSTALLED:
             self.make_file(os.path.join("static_here", fpath), "Not real.")
@@ -635,10 +734,14 @@ class HtmlGoldTests(CoverageTest):
         )
         contains(
             "out/index.html",
-            '<a href="a_py.html">a.py</a>',
             '<span class="pc_cov">67%</span>',
             '<td class="right" data-ratio="2 3">67%</td>',
         )
+        contains(
+            "out/index_data.js",
+            '"has_arcs":false',
+            '["a.py","a_py.html",3,1,0,0,0,2,3,"67"]',
+        )
 
     def test_b_branch(self):
         self.make_file("b.py", """\
@@ -702,10 +805,14 @@ class HtmlGoldTests(CoverageTest):
         )
         contains(
             "out/index.html",
-            '<a href="b_py.html">b.py</a>',
             '<span class="pc_cov">70%</span>',
             '<td class="right" data-ratio="16 23">70%</td>',
         )
+        contains(
+            "out/index_data.js",
+            '"has_arcs":true',
+            '["b.py","b_py.html",17,3,0,6,4,16,23,"70"]',
+        )
 
     def test_bom(self):
         self.make_file("bom.py", bytes=b"""\
@@ -889,9 +996,9 @@ assert len(math) == 18
 
         compare_html("out", gold_path("html/gold_other"))
         contains(
-            "out/index.html",
-            '<a href="here_py.html">here.py</a>',
-            'other_py.html">', 'other.py</a>',
+            "out/index_data.js",
+            '["here.py","here_py.html",',
+            'other_py.html",', 'other.py",',
         )
 
     def test_partial(self):
@@ -944,8 +1051,8 @@ assert len(math) == 18
             '<p id="t20" class="exc">',
         )
         contains(
-            "out/index.html",
-            '<a href="partial_py.html">partial.py</a>',
+            "out/index_data.js",
+            '["partial.py","partial_py.html",',
         )
         contains(
             "out/index.html",
@@ -983,9 +1090,12 @@ assert len(math) == 18
         contains(
             "out/index.html",
             '<link rel="stylesheet" href="extra.css" type="text/css">',
-            '<a href="a_py.html">a.py</a>',
             '<span class="pc_cov">67%</span>'
         )
+        contains(
+            "out/index_data.js",
+            '["a.py","a_py.html",',
+        )
 
     def test_tabbed(self):
         # The file contents would look like this with 8-space tabs:
@@ -0,0 +1,150 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for coverage/htmlserver.py"""
+
+import os
+import threading
+import time
+
+try:
+    from urllib.error import HTTPError
+    from urllib.request import urlopen
+except ImportError:
+    from urllib2 import HTTPError, urlopen
+
+import coverage
+from coverage.backward import import_local_file
+from coverage.htmlserver import LazyHtmlReporter
+
+from tests.coveragetest import CoverageTest
+
+
+class LazyHtmlReporterTest(CoverageTest):
+    """Tests of rendering HTML pages when they are asked for."""
+
+    def setUp(self):
+        super(LazyHtmlReporterTest, self).setUp()
+        self.make_file("main_file.py", """\
+            import helper1, helper2
+            helper1.func1(12)
+            helper2.func2(12)
+            """)
+        self.make_file("helper1.py", """\
+            def func1(x):
+                if x % 2:
+                    print("odd")
+            """)
+        self.make_file("helper2.py", """\
+            def func2(x):
+                print("x is %d" % x)
+            """)
+        self.cov = coverage.Coverage()
+        self.start_import_stop(self.cov, "main_file")
+        self.cov.save()
+
+    def make_reporter(self, **kwargs):
+        """Make a prepared LazyHtmlReporter for the measured files."""
+        reporter = LazyHtmlReporter(self.cov, self.cov.config, **kwargs)
+        reporter.prepare(None)
+        return reporter
+
+    def test_pages_match_html_report(self):
+        reporter = self.make_reporter()
+        self.cov.html_report()
+        self.assertEqual(reporter.pages, {})
+        for name in ["helper1_py.html", "index.html"]:
+            content_type, content = reporter.page(name)
+            self.assertEqual(content_type, "text/html; charset=utf-8")
+            with open(os.path.join("htmlcov", name), "rb") as fhtml:
+                expected = fhtml.read()
+            # The time stamps might be different.
+            self.assertEqual(len(content), len(expected))
+        self.assertEqual(list(reporter.pages), ["helper1_py.html"])
+
+    def test_static_files(self):
+        reporter = self.make_reporter()
+        content_type, content = reporter.page("style.css")
+        self.assertEqual(content_type, "text/css")
+        self.assertIn(b"{", content)
+        self.assertIsNone(reporter.page("nothere.html"))
+        self.assertIsNone(reporter.page("../main_file.py"))
+
+    def test_context_files(self):
+        self.assertIsNone(self.make_reporter().page("contexts.js"))
+
+        self.cov.set_option("html:show_contexts", True)
+        reporter = self.make_reporter()
+        content_type, content = reporter.page("contexts.js")
+        self.assertEqual(content_type, "application/javascript")
+        self.assertEqual(content, b'coverage.context_names_loaded([""]);\n')
+        _, content = reporter.page("helper2_py_ctx.js")
+        self.assertEqual(content, b'coverage.file_contexts_loaded({"1":[0],"2":[0]});\n')
+        self.assertIsNone(reporter.page("nothere_py_ctx.js"))
+
+    def test_cache_is_bounded(self):
+        reporter = self.make_reporter(cache_size=2)
+        for name in ["main_file_py.html", "helper1_py.html", "helper2_py.html"]:
+            reporter.page(name)
+        self.assertEqual(list(reporter.pages), ["helper1_py.html", "helper2_py.html"])
+        # Using a page makes it the most recent.
+        reporter.page("helper1_py.html")
+        reporter.page("main_file_py.html")
+        self.assertEqual(list(reporter.pages), ["helper1_py.html", "main_file_py.html"])
+
+    def test_changed_source_is_rendered_again(self):
+        reporter = self.make_reporter()
+        _, before = reporter.page("helper2_py.html")
+        self.assertIs(reporter.page("helper2_py.html")[1], before)
+
+        self.make_file("helper2.py", """\
+            def func2(x):
+                print("x is %d" % x)
+                print("a new line")
+            """)
+        _, after = reporter.page("helper2_py.html")
+        self.assertNotEqual(after, before)
+        self.assertIn(b"a new line", after)
+
+    def test_changed_data_is_read_again(self):
+        def helper1_missing():
+            """How many lines the index says are missing from helper1.py."""
+            nums, = [f['nums'] for f in reporter.files if f['relative_filename'] == "helper1.py"]
+            return nums.n_missing
+
+        reporter = self.make_reporter()
+        _, before = reporter.page("helper1_py.html")
+        missing_before = helper1_missing()
+
+        # Make sure the data file looks different, then run the odd branch.
+        time.sleep(0.01)
+        cov = coverage.Coverage()
+        cov.start()
+        helper1 = import_local_file("helper1")      # pragma: nested
+        helper1.func1(13)                           # pragma: nested
+        cov.stop()                                  # pragma: nested
+        cov.save()
+
+        _, after = reporter.page("helper1_py.html")
+        self.assertNotEqual(after, before)
+        self.assertEqual(helper1_missing(), missing_before - 1)
+
+    def test_serving_pages(self):
+        server = self.cov.html_server(port=0)
+        self.addCleanup(server.server_close)
+
+        def get(name):
+            """Fetch `name` from the server, handling the one request."""
+            thread = threading.Thread(target=server.handle_request)
+            thread.start()
+            try:
+                return urlopen(server.url + name).read()
+            except HTTPError as err:
+                return err.code
+            finally:
+                thread.join()
+
+        self.assertIn(b"index_data.js", get(""))
+        self.assertIn(b"helper1_py.html", get("index_data.js"))
+        self.assertIn(b"func1", get("helper1_py.html"))
+        self.assertEqual(get("nothere.html"), 404)
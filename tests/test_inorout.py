@@ -0,0 +1,177 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for coverage/inorout.py"""
+
+import glob
+import json
+import os
+import os.path
+import stat
+import time
+
+import mock
+
+import coverage
+from coverage.disposition import FileDisposition, disposition_init
+from coverage.inorout import DirectoryCache, DispositionCache, InOrOut
+
+from tests.coveragetest import CoverageTest
+
+
+class DispositionCacheTest(CoverageTest):
+    """Tests of saving should_trace decisions for later processes."""
+
+    def setUp(self):
+        super(DispositionCacheTest, self).setUp()
+        # Keep the cache files in the test's own directory.
+        os.mkdir("tmp")
+        patcher = mock.patch("tempfile.gettempdir", return_value=os.path.abspath("tmp"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.make_file("main.py", """\
+            import helper
+            helper.help()
+            """)
+        self.make_file("helper.py", """\
+            def help():
+                return 1
+            """)
+
+    def make_coverage(self, **kwargs):
+        """Make a Coverage object using the disposition cache."""
+        cov = coverage.Coverage(**kwargs)
+        cov.set_option("run:trace_cache", True)
+        return cov
+
+    def make_cache(self, **config):
+        """Make a DispositionCache for an InOrOut with `config` settings."""
+        cov_config = coverage.Coverage(**config).config
+        inorout = InOrOut(warn=None)
+        inorout.configure(cov_config)
+        return DispositionCache(inorout, FileDisposition)
+
+    def test_decisions_are_reused(self):
+        cov = self.make_coverage()
+        self.start_import_stop(cov, "main")
+        cov.save()
+        cache_file, = glob.glob("tmp/*/coverage-trace-*.json")
+        with open(cache_file) as f:
+            saved = json.load(f)
+        helper_py = os.path.abspath("helper.py")
+        trace, reason, _, source = saved[helper_py]
+        self.assertEqual((trace, reason, source), (True, "", helper_py))
+
+        # A new process with the same settings doesn't decide again.
+        self.clean_local_file_imports()
+        cov = self.make_coverage()
+        real_should_trace = InOrOut.should_trace
+        with mock.patch.object(
+            InOrOut, "should_trace", autospec=True, side_effect=real_should_trace,
+        ) as should_trace:
+            self.start_import_stop(cov, "main")
+        traced = [call[0][1] for call in should_trace.call_args_list]
+        self.assertNotIn(helper_py, traced)
+        self.assertCountEqual(cov.get_data().lines(helper_py), [1, 2])
+
+    def test_settings_choose_the_cache_file(self):
+        plain = self.make_cache()
+        omitting = self.make_cache(omit=["helper.py"])
+        self.assertNotEqual(plain.filename, omitting.filename)
+        self.assertEqual(plain.filename, self.make_cache().filename)
+
+    def test_plugin_decisions_arent_saved(self):
+        cache = self.make_cache()
+        plain = disposition_init(FileDisposition, "plain.py")
+        plain.trace = True
+        plain.source_filename = "plain.py"
+        plugged = disposition_init(FileDisposition, "plugged.html")
+        plugged.trace = True
+        plugged.file_tracer = object()
+        dynamic = disposition_init(FileDisposition, "dynamic.html")
+        dynamic.has_dynamic_filename = True
+        cache.save({"plain.py": plain, "plugged.html": plugged, "dynamic.html": dynamic})
+
+        loaded = cache.load()
+        self.assertEqual(list(loaded), ["plain.py"])
+        self.assertTrue(loaded["plain.py"].trace)
+
+    def test_source_packages_arent_cached(self):
+        cache = self.make_cache(source=["some.package"])
+        plain = disposition_init(FileDisposition, "plain.py")
+        cache.save({"plain.py": plain})
+        self.assertEqual(cache.load(), {})
+        self.assertEqual(glob.glob("tmp/*/*.json"), [])
+
+    def test_cache_file_is_private(self):
+        if not hasattr(os, "getuid"):
+            self.skipTest("Private files need Unix permissions")
+        cache = self.make_cache()
+        plain = disposition_init(FileDisposition, "plain.py")
+        cache.save({"plain.py": plain})
+        self.assertEqual(stat.S_IMODE(os.stat(cache.filename).st_mode), 0o600)
+        self.assertEqual(stat.S_IMODE(os.stat(os.path.dirname(cache.filename)).st_mode), 0o700)
+
+    def test_no_cache_in_unsafe_directory(self):
+        if not hasattr(os, "getuid"):
+            self.skipTest("Private directories need Unix permissions")
+        os.mkdir("tmp/coverage-{}".format(os.getuid()), 0o700)
+        os.chmod("tmp/coverage-{}".format(os.getuid()), 0o777)
+        cache = self.make_cache()
+        plain = disposition_init(FileDisposition, "plain.py")
+        cache.save({"plain.py": plain})
+        self.assertEqual(cache.load(), {})
+        self.assertEqual(glob.glob("tmp/*/*.json"), [])
+
+
+class DirectoryCacheTest(CoverageTest):
+    """Tests of saving source directory listings for later processes."""
+
+    def setUp(self):
+        super(DirectoryCacheTest, self).setUp()
+        # Keep the cache files in the test's own directory.
+        os.mkdir("tmp")
+        patcher = mock.patch("tempfile.gettempdir", return_value=os.path.abspath("tmp"))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_listings_are_saved(self):
+        self.make_file("src/main.py", "a = 1\n")
+        self.make_file("src/pkg/__init__.py", "")
+        self.make_file("src/pkg/unused.py", "a = 1\n")
+        old = time.time() - 60
+        for dirname in ["src", "src/pkg"]:
+            os.utime(dirname, (old, old))
+
+        def unexecuted():
+            """Measure main.py, and return the files never executed."""
+            cov = coverage.Coverage(source=["src"])
+            cov.set_option("run:trace_cache", True)
+            self.start_import_stop(cov, "main", modfile="src/main.py")
+            data = cov.get_data()
+            return sorted(f for f in data.measured_files() if not data.lines(f))
+
+        expected = [os.path.abspath("src/pkg/__init__.py"), os.path.abspath("src/pkg/unused.py")]
+        self.assertEqual(unexecuted(), expected)
+        cache_file, = glob.glob("tmp/*/coverage-dirs-*.json")
+        with open(cache_file) as f:
+            saved = json.load(f)
+        self.assertEqual(sorted(saved), [os.path.abspath("src"), os.path.abspath("src/pkg")])
+
+        self.clean_local_file_imports()
+        with mock.patch("coverage.files._list_directory") as list_directory:
+            self.assertEqual(unexecuted(), expected)
+        self.assertEqual(list_directory.call_count, 0)
+
+    def test_save_only_changes(self):
+        cov_config = coverage.Coverage(source=["src"]).config
+        inorout = InOrOut(warn=None)
+        inorout.configure(cov_config)
+        cache = DirectoryCache(inorout)
+        self.assertEqual(cache.load(), {})
+        cache.save()
+        self.assertEqual(glob.glob("tmp/*/*.json"), [])
+        cache.load()["/some/dir"] = [0, True, ["a.py"], [], []]
+        cache.save()
+        self.assertEqual(DirectoryCache(inorout).load(), {"/some/dir": [0, True, ["a.py"], [], []]})
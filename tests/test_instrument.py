@@ -0,0 +1,195 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests of coverage/instrument.py, measuring with core = instrument."""
+
+import importlib
+import os.path
+import sys
+
+import coverage
+from coverage import env
+from coverage.misc import CoverageException
+
+from tests.coveragetest import CoverageTest
+
+
+class InstrumentTest(CoverageTest):
+    """Tests of measuring by instrumenting code as it is imported."""
+
+    def setUp(self):
+        if env.PY2:
+            self.skipTest("core = instrument requires Python 3")
+        super(InstrumentTest, self).setUp()
+        # The parent class saves and restores sys.path.
+        sys.path.insert(0, ".")
+
+    def measure(self, modname, **options):
+        """Import `modname` while measuring with `options`, return the Coverage."""
+        cov = coverage.Coverage()
+        for name, value in options.items():
+            cov.set_option("run:" + name, value)
+        cov.start()
+        try:                                    # pragma: nested
+            mod = importlib.import_module(modname)
+        finally:                                # pragma: nested
+            cov.stop()
+        self.assertIsNotNone(mod)
+        return cov
+
+    def test_same_as_tracing(self):
+        self.make_file("instrumented.py", '''\
+            """A docstring."""
+            from __future__ import print_function
+
+            import sys
+
+            def decorator(func):
+                return func
+
+            @decorator
+            def func(x):
+                """Docstring."""
+                if x:
+                    return 1
+                elif x is None:
+                    return 2
+                else:
+                    return 3
+
+            class Thing(object):
+                """Another docstring."""
+                def method(self):
+                    try:
+                        raise ValueError
+                    except ValueError:
+                        return func(1)
+                    finally:
+                        sys.stdout.flush()
+
+            Thing().method()
+            ''')
+        traced = self.measure("instrumented")
+        del sys.modules["instrumented"]
+        instrumented = self.measure("instrumented", core="instrument")
+
+        self.assertEqual(instrumented._collector.tracer_name(), "Instrumenter")
+        traced_analysis = traced.analysis2("instrumented.py")
+        instrumented_analysis = instrumented.analysis2("instrumented.py")
+        self.assertEqual(instrumented_analysis, traced_analysis)
+
+        mod = sys.modules["instrumented"]
+        self.assertEqual(mod.__doc__, "A docstring.")
+        self.assertEqual(mod.func.__doc__, "Docstring.")
+
+    def test_unmeasured_modules_are_not_instrumented(self):
+        self.make_file("measured.py", "import notmeasured\n")
+        self.make_file("notmeasured.py", "a = 1\n")
+        cov = self.measure("measured", core="instrument", include=["measured.py"])
+        measured = [os.path.basename(f) for f in cov.get_data().measured_files()]
+        self.assertEqual(measured, ["measured.py"])
+        self.assertFalse(hasattr(sys.modules["notmeasured"], "__coverage_lines__"))
+
+    def test_function_granularity(self):
+        self.make_file("funcs.py", """\
+            def called():
+                '''Only a docstring.'''
+
+            def never_called():
+                return 1
+
+            called()
+            """)
+        cov = self.measure("funcs", core="instrument", granularity="function")
+        analysis = cov._analyze("funcs.py")
+        self.assertEqual(analysis.statements, set([1, 4]))
+        self.assertEqual(analysis.missing, set([4]))
+
+    def test_branches_same_as_tracing(self):
+        self.make_file("branches.py", """\
+            import sys
+
+            def classify(nums):
+                evens = odds = 0
+                for n in nums:
+                    if n % 2:
+                        odds += 1
+                    elif n < 0:
+                        break
+                    else:
+                        evens += 1
+                else:
+                    evens = -evens
+                while odds > 10:
+                    odds -= 1
+                try:
+                    square = lambda x: x * x
+                    squares = [square(n) for n in nums if n]
+                except TypeError:
+                    squares = None
+                return evens, odds, squares
+
+            class Thing(object):
+                if len(sys.argv) > 100:
+                    big = True
+                size = 1
+
+            classify([1, 2, 3])
+            classify([])
+            """)
+        traced = self.measure("branches", branch=True)
+        del sys.modules["branches"]
+        instrumented = self.measure("branches", core="instrument", branch=True)
+
+        traced_analysis = traced._analyze("branches.py")
+        instrumented_analysis = instrumented._analyze("branches.py")
+        self.assertEqual(instrumented_analysis.missing, traced_analysis.missing)
+        self.assertEqual(
+            instrumented_analysis.missing_branch_arcs(),
+            traced_analysis.missing_branch_arcs(),
+        )
+        self.assertEqual(instrumented_analysis.missing_branch_arcs(), {
+            8: [9], 14: [15], 24: [25],
+        })
+        self.assertFalse(hasattr(sys.modules["branches"].Thing, "__coverage_last__"))
+
+    def test_match_statements(self):
+        if env.PYVERSION < (3, 10):
+            self.skipTest("Match statements are new in 3.10")
+        self.make_file("matching.py", """\
+            def f(x):
+                match x:
+                    case 1:
+                        return "one"
+                    case [a, b] if a > b:
+                        return "pair"
+                    case str():
+                        return "str"
+                    case {"k": v}: return v
+                return None
+
+            for v in [1, [3, 2], [1, 2], {"k": 5}]:
+                f(v)
+            """)
+        for branch in [False, True]:
+            traced = self.measure("matching", branch=branch)
+            del sys.modules["matching"]
+            instrumented = self.measure("matching", core="instrument", branch=branch)
+            del sys.modules["matching"]
+
+            traced_analysis = traced._analyze("matching.py")
+            instrumented_analysis = instrumented._analyze("matching.py")
+            self.assertEqual(instrumented_analysis.missing, traced_analysis.missing)
+            self.assertNotIn(5, instrumented_analysis.missing)
+            self.assertIn(8, instrumented_analysis.missing)
+            if branch:
+                self.assertEqual(
+                    instrumented_analysis.missing_branch_arcs(),
+                    traced_analysis.missing_branch_arcs(),
+                )
+
+    def test_bad_core(self):
+        self.make_file("nothing.py", "a = 1\n")
+        msg = r"Don't understand core setting: 'magic'"
+        with self.assertRaisesRegex(CoverageException, msg):
+            self.measure("nothing", core="magic")
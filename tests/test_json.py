@@ -0,0 +1,155 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for JSON reports from coverage.py."""
+
+import json
+import os
+
+import mock
+
+import coverage
+from coverage.misc import CoverageException
+
+from tests.coveragetest import CoverageTest
+
+
+class JsonReportTest(CoverageTest):
+    """Tests of the JSON reports from coverage.py."""
+
+    def setUp(self):
+        super(JsonReportTest, self).setUp()
+        self.make_file("a.py", """\
+            a = 1
+            if a < 2:
+                b = 3
+            else:
+                c = 5
+            d = 6   # pragma: no cover
+            """)
+        self.make_file("b.py", """\
+            import a
+            """)
+
+    def run_json_report(self, covargs=None, **kwargs):
+        """Measure b.py, and return the Coverage and the JSON report as a dict."""
+        cov = coverage.Coverage(**(covargs or {}))
+        self.start_import_stop(cov, "b")
+        total = cov.json_report(**kwargs)
+        with open(kwargs.get("outfile", "coverage.json")) as f:
+            report = json.load(f)
+        self.assertAlmostEqual(total, report['totals']['percent_covered'])
+        return cov, report
+
+    def test_line_report(self):
+        cov, report = self.run_json_report()
+        self.assertEqual(report['meta']['version'], coverage.__version__)
+        self.assertFalse(report['meta']['branch_coverage'])
+        self.assertCountEqual(report['files'], ["a.py", "b.py"])
+
+        _, statements, excluded, missing, _ = cov.analysis2("a.py")
+        a_py = report['files']['a.py']
+        self.assertEqual(a_py['executed_lines'], sorted(set(statements) - set(missing)))
+        self.assertEqual(a_py['missing_lines'], sorted(missing))
+        self.assertEqual(a_py['excluded_lines'], excluded)
+        self.assertIn(5, a_py['missing_lines'])
+        self.assertEqual(excluded, [6])
+        self.assertNotIn('missing_branches', a_py)
+        self.assertNotIn('contexts', a_py)
+        self.assertEqual(a_py['summary'], {
+            'covered_lines': len(statements) - len(missing),
+            'num_statements': len(statements),
+            'percent_covered': 100.0 * (len(statements) - len(missing)) / len(statements),
+            'missing_lines': len(missing),
+            'excluded_lines': 1,
+        })
+        b_py = report['files']['b.py']
+        self.assertEqual(
+            report['totals']['num_statements'],
+            a_py['summary']['num_statements'] + b_py['summary']['num_statements']
+        )
+
+    def test_branch_report(self):
+        _, report = self.run_json_report(covargs=dict(branch=True))
+        self.assertTrue(report['meta']['branch_coverage'])
+        a_py = report['files']['a.py']
+        self.assertEqual(a_py['missing_branches'], [[2, 5]])
+        self.assertEqual(a_py['summary']['num_branches'], 2)
+        self.assertEqual(a_py['summary']['num_partial_branches'], 1)
+        self.assertEqual(a_py['summary']['covered_branches'], 1)
+        self.assertEqual(a_py['summary']['missing_branches'], 1)
+        self.assertEqual(report['totals']['missing_branches'], 1)
+
+    def test_contexts(self):
+        self.skip_unless_data_storage_is("sql")
+        _, report = self.run_json_report(covargs=dict(context="red"), contexts=True)
+        self.assertTrue(report['meta']['show_contexts'])
+        # Excluded lines that ran have contexts too.
+        self.assertEqual(
+            report['files']['a.py']['contexts'],
+            {"1": ["red"], "2": ["red"], "3": ["red"], "6": ["red"]}
+        )
+
+    def test_files_are_written_as_they_are_reported(self):
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "b")
+        from coverage.jsonreport import JsonReporter
+
+        written = []
+        real_json_file = JsonReporter.json_file
+
+        def json_file(reporter, fr, analysis):
+            """Note what has been written before each file is reported."""
+            written.append(reporter.outfile.tell())
+            real_json_file(reporter, fr, analysis)
+
+        with open("out.json", "w") as outfile:
+            with mock.patch.object(JsonReporter, "json_file", json_file):
+                JsonReporter(cov, cov.config).report(None, outfile=outfile)
+            written.append(outfile.tell())
+        self.assertEqual(len(written), 3)
+        self.assertLess(written[0], written[1])
+        self.assertLess(written[1], written[2])
+        with open("out.json") as f:
+            self.assertCountEqual(json.load(f)['files'], ["a.py", "b.py"])
+
+    def test_output_file_placement(self):
+        self.run_json_report(outfile="reports/cov.json")
+        self.assert_exists("reports/cov.json")
+        self.assert_doesnt_exist("coverage.json")
+
+    def test_no_data_removes_the_file(self):
+        cov = coverage.Coverage(include=["nothing.py"])
+        self.start_import_stop(cov, "b")
+        with self.assertRaisesRegex(CoverageException, "No data to report."):
+            cov.json_report()
+        self.assert_doesnt_exist("coverage.json")
+
+    def test_rollup_depth(self):
+        self.make_file("pkg/__init__.py", "")
+        self.make_file("pkg/c.py", "c = 1\n")
+        self.make_file("b.py", """\
+            import a
+            import pkg.c
+            """)
+        cov, report = self.run_json_report(rollup_depth=1)
+        self.assertEqual(list(report['directories']), ["pkg"])
+        pkg = report['directories']['pkg']
+        files = [report['files'][name]['summary'] for name in report['files']]
+        pkg_files = [report['files'][name]['summary'] for name in report['files'] if 'pkg' in name]
+        self.assertEqual(len(pkg_files), 2)
+        self.assertEqual(pkg['num_statements'], sum(f['num_statements'] for f in pkg_files))
+        self.assertEqual(
+            report['totals']['num_statements'], sum(f['num_statements'] for f in files),
+        )
+
+        cov.json_report(rollup_depth=0)
+        with open("coverage.json") as f:
+            self.assertNotIn('directories', json.load(f))
+
+    def test_report_from_command_line(self):
+        self.run_command("coverage run b.py")
+        out = self.run_command("coverage json -o -")
+        report = json.loads(out)
+        self.assertIn(5, report['files']['a.py']['missing_lines'])
+        self.assertFalse(os.path.exists("coverage.json"))
@@ -0,0 +1,106 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for LCOV reports from coverage.py."""
+
+import coverage
+from coverage.misc import CoverageException
+
+from tests.coveragetest import CoverageTest
+
+
+class LcovReportTest(CoverageTest):
+    """Tests of the LCOV reports from coverage.py."""
+
+    def setUp(self):
+        super(LcovReportTest, self).setUp()
+        self.make_file("main.py", """\
+            def f(x):
+                if x:
+                    return 1
+                return 2
+
+            def g(x):
+                if x:
+                    return 1
+                return 2
+
+            f(1)
+            """)
+
+    def run_lcov_report(self, **covargs):
+        """Measure main.py, and return the Coverage and the LCOV report lines."""
+        cov = coverage.Coverage(**covargs)
+        self.start_import_stop(cov, "main")
+        total = cov.lcov_report()
+        self.assertAlmostEqual(total, cov.report())
+        with open("coverage.lcov") as f:
+            return cov, f.read().splitlines()
+
+    def test_line_report(self):
+        cov, lines = self.run_lcov_report()
+        _, statements, _, missing, _ = cov.analysis2("main.py")
+        self.assertEqual(lines[0], "SF:main.py")
+        self.assertEqual(lines[-1], "end_of_record")
+        self.assertEqual(lines.count("end_of_record"), 1)
+        da_lines = ["DA:%d,%d" % (l, int(l not in missing)) for l in statements]
+        self.assertEqual([l for l in lines if l.startswith("DA:")], da_lines)
+        self.assertIn("DA:3,1", lines)
+        self.assertIn("DA:4,0", lines)
+        self.assertIn("DA:8,0", lines)
+        self.assertIn("LF:%d" % len(statements), lines)
+        self.assertIn("LH:%d" % (len(statements) - len(missing)), lines)
+        self.assertFalse(any(l.startswith(("BRDA:", "BRF:", "BRH:")) for l in lines))
+
+    def test_branch_report(self):
+        _, lines = self.run_lcov_report(branch=True)
+        brda_lines = [l for l in lines if l.startswith("BRDA:")]
+        self.assertIn("BRDA:2,0,0,1", brda_lines)
+        self.assertIn("BRDA:2,0,1,0", brda_lines)
+        # The branches of a line that never ran are marked "-".
+        self.assertIn("BRDA:7,0,0,-", brda_lines)
+        self.assertIn("BRDA:7,0,1,-", brda_lines)
+        self.assertIn("BRF:%d" % len(brda_lines), lines)
+        n_taken = len([l for l in brda_lines if l.endswith(",1")])
+        self.assertIn("BRH:%d" % n_taken, lines)
+        # The branch lines come before the line totals.
+        self.assertLess(lines.index("BRF:%d" % len(brda_lines)), lines.index(
+            [l for l in lines if l.startswith("LF:")][0]
+        ))
+
+    def test_function_report(self):
+        self.make_file(".coveragerc", """\
+            [run]
+            granularity = function
+            """)
+        _, lines = self.run_lcov_report()
+        self.assertIn("FN:1,f", lines)
+        self.assertIn("FN:6,g", lines)
+        self.assertIn("FNDA:1,f", lines)
+        self.assertIn("FNDA:0,g", lines)
+        self.assertIn("FNF:2", lines)
+        self.assertIn("FNH:1", lines)
+
+    def test_one_record_per_file(self):
+        self.make_file("other.py", "import main\n")
+        cov = coverage.Coverage()
+        self.start_import_stop(cov, "other")
+        cov.lcov_report(outfile="reports/out.lcov")
+        with open("reports/out.lcov") as f:
+            lines = f.read().splitlines()
+        self.assertEqual([l for l in lines if l.startswith("SF:")], ["SF:main.py", "SF:other.py"])
+        self.assertEqual(lines.count("end_of_record"), 2)
+
+    def test_no_data_removes_the_file(self):
+        cov = coverage.Coverage(include=["nothing.py"])
+        self.start_import_stop(cov, "main")
+        with self.assertRaisesRegex(CoverageException, "No data to report."):
+            cov.lcov_report()
+        self.assert_doesnt_exist("coverage.lcov")
+
+    def test_report_from_command_line(self):
+        self.run_command("coverage run main.py")
+        out = self.run_command("coverage lcov -o -")
+        self.assertIn("SF:main.py\n", out)
+        self.assertIn("DA:4,0\n", out)
+        self.assert_doesnt_exist("coverage.lcov")
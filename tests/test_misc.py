@@ -3,10 +3,14 @@
 
 """Tests of miscellaneous stuff."""
 
+import os
+import stat
+
+import mock
 import pytest
 
 from coverage.misc import contract, dummy_decorator_with_args, file_be_gone
-from coverage.misc import format_lines, Hasher, one_of, substitute_variables
+from coverage.misc import format_lines, Hasher, one_of, private_temp_dir, substitute_variables
 from coverage.misc import CoverageException
 
 from tests.coveragetest import CoverageTest
@@ -76,6 +80,34 @@ class RemoveFileTest(CoverageTest):
             file_be_gone(".")
 
 
+class PrivateTempDirTest(CoverageTest):
+    """Tests of private_temp_dir."""
+
+    def setUp(self):
+        if not hasattr(os, "getuid"):
+            self.skipTest("Private temp directories need Unix permissions")
+        super(PrivateTempDirTest, self).setUp()
+        patcher = mock.patch("tempfile.gettempdir", return_value=os.getcwd())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_private_temp_dir(self):
+        path = private_temp_dir()
+        self.assertEqual(os.path.dirname(path), os.getcwd())
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o700)
+        self.assertEqual(private_temp_dir(), path)
+
+    def test_shared_dir_is_refused(self):
+        os.chmod(private_temp_dir(), 0o777)
+        with self.assertRaisesRegex(CoverageException, "isn't private"):
+            private_temp_dir()
+
+    def test_file_is_refused(self):
+        self.make_file("coverage-{}".format(os.getuid()), "Not a directory")
+        with self.assertRaisesRegex(CoverageException, "isn't a directory"):
+            private_temp_dir()
+
+
 class ContractTest(CoverageTest):
     """Tests of our contract decorators."""
 
@@ -206,6 +206,40 @@ class PythonParserTest(CoverageTest):
         self.assertEqual(parser.arcs(), expected_arcs)
         self.assertEqual(parser.exit_counts(), expected_exits)
 
+    def test_functions(self):
+        parser = self.parse_source("""\
+            def decorator(func):
+                def wrapper(*args):
+                    return func(*args)
+                return wrapper
+
+            class Foo(object):
+                @decorator
+                def method(self):
+                    return lambda: [x for x in self]
+
+                def skipped(self):  # nocover
+                    pass
+            """)
+        self.assertEqual(parser.functions(), {
+            1: "decorator",
+            2: "decorator.wrapper",
+            7: "Foo.method",
+        })
+
+    def test_async_functions(self):
+        if env.PYVERSION < (3, 5):
+            self.skipTest("Async functions are new in 3.5")
+        parser = self.parse_source("""\
+            async def coro():
+                pass
+
+            class Foo(object):
+                async def method(self):
+                    pass
+            """)
+        self.assertEqual(parser.functions(), {1: "coro", 5: "Foo.method"})
+
 
 class ParserMissingArcDescriptionTest(CoverageTest):
     """Tests for PythonParser.missing_arc_description."""
@@ -772,6 +772,26 @@ class ProcessTest(CoverageTest):
         out = self.run_command("python -m coverage")
         self.assertIn("Use 'coverage help' for help", out)
 
+    def test_starting_doesnt_import_reporting(self):
+        # Every measured subprocess pays for what starting coverage imports.
+        self.make_file("start.py", """\
+            import sys
+            import coverage
+
+            cov = coverage.Coverage()
+            cov.start()
+            cov.stop()
+            print("\\n".join(sorted(sys.modules)))
+            """)
+        modules = self.run_command("python start.py").split()
+        self.assertIn("coverage.control", modules)
+        reporting_modules = [
+            "coverage.html", "coverage.parser", "coverage.xmlreport", "http.server",
+            "socketserver",
+        ]
+        for reporting in reporting_modules:
+            self.assertNotIn(reporting, modules)
+
 
 TRY_EXECFILE = os.path.join(os.path.dirname(__file__), "modules/process_test/try_execfile.py")
 
@@ -1112,13 +1132,13 @@ class UnicodeFilePathsTest(CoverageTest):
         out = self.run_command(u"coverage run --source=. h\xe2t.py")
         self.assertEqual(out, "accented\n")
 
-        # The HTML report uses ascii-encoded HTML entities.
+        # The HTML index rows are ascii-encoded JSON.
         out = self.run_command("coverage html")
         self.assertEqual(out, "")
         self.assert_exists(u"htmlcov/h\xe2t_py.html")
-        with open("htmlcov/index.html") as indexf:
+        with open("htmlcov/index_data.js") as indexf:
             index = indexf.read()
-        self.assertIn('<a href="h&#226;t_py.html">h&#226;t.py</a>', index)
+        self.assertIn('["h\\u00e2t.py","h\\u00e2t_py.html",', index)
 
         # The XML report is always UTF8-encoded.
         out = self.run_command("coverage xml")
@@ -1146,13 +1166,14 @@ class UnicodeFilePathsTest(CoverageTest):
         out = self.run_command(u"coverage run --source=. \xe2/accented.py")
         self.assertEqual(out, "accented\n")
 
-        # The HTML report uses ascii-encoded HTML entities.
+        # The HTML index rows are ascii-encoded JSON.
         out = self.run_command("coverage html")
         self.assertEqual(out, "")
         self.assert_exists(u"htmlcov/\xe2_accented_py.html")
-        with open("htmlcov/index.html") as indexf:
+        with open("htmlcov/index_data.js") as indexf:
             index = indexf.read()
-        self.assertIn('<a href="&#226;_accented_py.html">&#226;%saccented.py</a>' % os.sep, index)
+        json_sep = os.sep.replace("\\", "\\\\")
+        self.assertIn('["\\u00e2%saccented.py","\\u00e2_accented_py.html",' % json_sep, index)
 
         # The XML report is always UTF8-encoded.
         out = self.run_command("coverage xml")
@@ -0,0 +1,73 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for coverage/pth.py"""
+
+import os.path
+
+import coverage
+from coverage.pth import PTH_LINE, PTH_NAME, install_pth, remove_pth
+
+from tests.coveragetest import CoverageTest
+
+
+class PthTest(CoverageTest):
+    """Tests of installing the .pth file, and of what it does."""
+
+    def setUp(self):
+        super(PthTest, self).setUp()
+        # Programs that process the .pth file in the "pth" directory.
+        self.make_file("pth/README", "The .pth file goes here.\n")
+        self.make_file("check_imports.py", """\
+            import site, sys
+            site.addsitedir("pth")
+            print("coverage" in sys.modules)
+            """)
+        self.make_file("run_sub.py", """\
+            import site
+            site.addsitedir("pth")
+            import sub
+            """)
+        self.make_file("sub.py", """\
+            a = 1
+            b = 2
+            """)
+
+    def test_install_and_remove(self):
+        pth_path = install_pth("pth")
+        self.assertEqual(pth_path, os.path.join("pth", PTH_NAME))
+        with open(pth_path) as f:
+            self.assertEqual(f.read(), PTH_LINE)
+
+        self.assertEqual(remove_pth("pth"), pth_path)
+        self.assert_doesnt_exist(pth_path)
+        self.assertIsNone(remove_pth("pth"))
+
+    def test_command_line(self):
+        out = self.run_command("coverage install-pth -d pth")
+        self.assertEqual(out, "Wrote %s\n" % os.path.join("pth", PTH_NAME))
+        self.assert_exists(os.path.join("pth", PTH_NAME))
+
+        out = self.run_command("coverage install-pth -d pth --remove")
+        self.assertEqual(out, "Removed %s\n" % os.path.join("pth", PTH_NAME))
+        out = self.run_command("coverage install-pth -d pth --remove")
+        self.assertEqual(out, "No .pth file to remove\n")
+
+    def test_unmeasured_processes_dont_import_coverage(self):
+        install_pth("pth")
+        self.del_environ("COVERAGE_PROCESS_START")
+        # -S, so that other .pth files in site-packages can't import coverage.
+        self.assertEqual(self.run_command("python -S check_imports.py"), "False\n")
+
+    def test_measured_processes_start_coverage(self):
+        install_pth("pth")
+        self.make_file("coverage.ini", """\
+            [run]
+            data_file = .mycovdata
+            """)
+        self.set_environ("COVERAGE_PROCESS_START", "coverage.ini")
+        self.run_command("python run_sub.py")
+
+        data = coverage.CoverageData(".mycovdata")
+        data.read()
+        self.assertCountEqual(data.lines(os.path.abspath("sub.py")), [1, 2])
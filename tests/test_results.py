@@ -5,7 +5,7 @@
 
 import pytest
 
-from coverage.results import Numbers, should_fail_under
+from coverage.results import Numbers, Rollup, should_fail_under
 
 from tests.coveragetest import CoverageTest
 
@@ -78,6 +78,41 @@ class NumbersTest(CoverageTest):
         self.assertEqual(n.ratio_covered, (160, 210))
 
 
+class RollupTest(CoverageTest):
+    """Tests for the directory totals in Rollup."""
+
+    run_in_temp_dir = False
+
+    def add_files(self, rollup):
+        """Add some files to `rollup`, returning the groups they were put in."""
+        return [
+            rollup.add("top.py", Numbers(n_files=1, n_statements=10, n_missing=1)),
+            rollup.add("a/one.py", Numbers(n_files=1, n_statements=20, n_missing=2)),
+            rollup.add("a/b/two.py", Numbers(n_files=1, n_statements=30, n_missing=3)),
+            rollup.add("a\\b\\c\\three.py", Numbers(n_files=1, n_statements=40, n_missing=4)),
+        ]
+
+    def test_depth_zero(self):
+        rollup = Rollup(0)
+        self.assertEqual(self.add_files(rollup), ["", "", "", ""])
+        self.assertEqual(rollup.directory_totals(), [])
+        self.assertEqual(rollup.total.n_files, 4)
+        self.assertEqual(rollup.total.n_statements, 100)
+        self.assertEqual(rollup.groups[""].n_missing, 10)
+
+    def test_depth_two(self):
+        rollup = Rollup(2)
+        self.assertEqual(self.add_files(rollup), ["", "a", "a/b", "a/b"])
+        totals = [
+            (name, nums.n_files, nums.n_statements, nums.n_missing)
+            for name, nums in rollup.directory_totals()
+        ]
+        self.assertEqual(totals, [("a", 3, 90, 9), ("a/b", 2, 70, 7)])
+        self.assertEqual(rollup.total.n_statements, 100)
+        self.assertEqual(sorted(rollup.groups), ["", "a", "a/b"])
+        self.assertEqual(rollup.groups["a"].n_statements, 20)
+
+
 @pytest.mark.parametrize("total, fail_under, precision, result", [
     # fail_under==0 means anything is fine!
     (0, 0, 0, False),
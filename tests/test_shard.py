@@ -0,0 +1,254 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for coverage/shard.py"""
+
+import glob
+import json
+import os.path
+import struct
+
+import coverage
+from coverage.data import CoverageData, combine_parallel_data
+from coverage.files import PathAliases, canonical_filename
+from coverage.misc import CoverageException
+from coverage.shard import Shard, ShardData, is_shard, HEADER, MAGIC, RECORD, TWO_IDS
+from coverage.shard import REC_FILE, REC_LINES
+
+from tests.coveragetest import CoverageTest
+from tests.test_data import DataTestHelpers
+from tests.test_data import LINES_1, LINES_2, ARCS_3, SUMMARY_1_2, MEASURED_FILES_1_2
+
+
+class ShardTest(DataTestHelpers, CoverageTest):
+    """Tests of writing, reading, and combining shards."""
+
+    def read_shard(self, filename):
+        """Read the Shard in `filename`."""
+        shard = Shard(filename)
+        shard.read()
+        return shard
+
+    def test_writing_and_reading(self):
+        covdata = ShardData(suffix="1")
+        covdata.set_context("ctx")
+        covdata.add_lines(LINES_1)
+        covdata.add_file_tracers({"b.py": "my.plugin"})
+        covdata.add_run_info(note="hello")
+        self.assertTrue(covdata)
+        self.assertCountEqual(covdata.lines("a.py"), [1, 2])
+        self.assert_file_count(".coverage.*", 0)
+        covdata.write()
+
+        # Once written, the data is in the shard, not in memory.
+        self.assertFalse(covdata)
+        self.assertTrue(is_shard(".coverage.1"))
+        shard = self.read_shard(".coverage.1")
+        self.assertEqual(shard.version, 1)
+        self.assertFalse(shard.has_arcs)
+        self.assertEqual(shard.data, {"ctx": {"a.py": set([1, 2]), "b.py": set([3])}})
+        self.assertEqual(shard.file_tracers, {"b.py": "my.plugin"})
+        self.assertEqual(shard.run_infos, [{"note": "hello"}])
+
+    def test_reading_contexts(self):
+        covdata = ShardData(suffix="1")
+        covdata.set_context("one")
+        covdata.add_arcs(ARCS_3)
+        covdata.set_context("two")
+        covdata.add_arcs({"x.py": {(-1, 5): None, (5, -1): None}})
+        self.assertEqual(covdata.measured_contexts(), set(["one", "two"]))
+        self.assertCountEqual(covdata.lines("x.py"), [1, 2, 3, 5])
+        self.assertCountEqual(covdata.lines("x.py", context="two"), [5])
+        self.assertEqual(covdata.lines("y.py", context="two"), [])
+        self.assertIsNone(covdata.lines("z.py"))
+        self.assertCountEqual(covdata.arcs("x.py", context="two"), [(-1, 5), (5, -1)])
+        self.assertEqual(
+            covdata.contexts_by_lineno("x.py"),
+            {1: ["one"], 2: ["one"], 3: ["one"], 5: ["two"]}
+        )
+
+    def test_run_info_waits_for_data(self):
+        # The header of a shard says whether it has arcs, so a write with only
+        # run information doesn't start the shard.
+        covdata = ShardData(suffix="1")
+        covdata.add_run_info(note="hello")
+        covdata.write()
+        self.assert_file_count(".coverage.*", 0)
+        covdata.add_arcs(ARCS_3)
+        covdata.write()
+        shard = self.read_shard(".coverage.1")
+        self.assertTrue(shard.has_arcs)
+        self.assertEqual(shard.run_infos, [{"note": "hello"}])
+
+    def test_arcs(self):
+        covdata = ShardData(suffix="1")
+        covdata.add_arcs(ARCS_3)
+        covdata.write()
+        shard = self.read_shard(".coverage.1")
+        self.assertTrue(shard.has_arcs)
+        self.assertCountEqual(shard.data[""]["x.py"], [(-1, 1), (1, 2), (2, 3), (3, -1)])
+        self.assertEqual(shard.line_counts(), {"x.py": 3, "y.py": 2})
+
+    def test_writes_are_appended(self):
+        covdata = ShardData(suffix="1")
+        covdata.add_lines(LINES_1)
+        covdata.write()
+        covdata.add_lines(LINES_2)
+        covdata.touch_file("d.py")
+        covdata.write()
+        self.assert_file_count(".coverage.*", 1)
+        shard = self.read_shard(".coverage.1")
+        self.assertEqual(shard.line_counts(), {"a.py": 3, "b.py": 1, "c.py": 1, "d.py": 0})
+
+    def test_cant_mix_lines_and_arcs(self):
+        covdata = ShardData(suffix="1")
+        covdata.add_lines(LINES_1)
+        with self.assertRaisesRegex(CoverageException, "Can't mix line and arc data"):
+            covdata.add_arcs(ARCS_3)
+
+    def test_combining(self):
+        covdata1 = ShardData(suffix="1")
+        covdata1.add_lines(LINES_1)
+        covdata1.write()
+        covdata2 = CoverageData(suffix="2")
+        covdata2.add_lines(LINES_2)
+        covdata2.write()
+        self.assertTrue(is_shard(".coverage.1"))
+        self.assertFalse(is_shard(".coverage.2"))
+
+        covdata3 = CoverageData()
+        combine_parallel_data(covdata3)
+        self.assert_line_counts(covdata3, SUMMARY_1_2)
+        self.assert_measured_files(covdata3, MEASURED_FILES_1_2)
+        self.assert_file_count(".coverage.*", 0)
+
+    def test_combining_with_aliases_and_contexts(self):
+        self.skip_unless_data_storage_is("sql")
+        covdata1 = ShardData(suffix="1")
+        covdata1.set_context("one")
+        covdata1.add_lines({
+            '/home/ned/proj/src/a.py': {1: None, 2: None},
+            '/home/ned/proj/src/template.html': {10: None},
+        })
+        covdata1.add_file_tracers({'/home/ned/proj/src/template.html': 'html.plugin'})
+        covdata1.write()
+        covdata2 = ShardData(suffix="2")
+        covdata2.set_context("two")
+        covdata2.add_lines({r'c:\ned\test\a.py': {4: None, 5: None}})
+        covdata2.write()
+
+        covdata3 = CoverageData()
+        aliases = PathAliases()
+        aliases.add("/home/ned/proj/src/", "./")
+        aliases.add(r"c:\ned\test", "./")
+        combine_parallel_data(covdata3, aliases=aliases)
+
+        apy = canonical_filename('./a.py')
+        template_html = canonical_filename('./template.html')
+        self.assert_line_counts(covdata3, {apy: 4, template_html: 1}, fullpath=True)
+        self.assertEqual(covdata3.file_tracer(template_html), 'html.plugin')
+        self.assertCountEqual(covdata3.measured_contexts(), ["one", "two"])
+        self.assertCountEqual(covdata3.lines(apy, context="two"), [4, 5])
+
+        # The context of the last shard isn't left set for later data.
+        covdata3.add_lines({apy: {6: None}})
+        self.assertCountEqual(covdata3.lines(apy, context=""), [6])
+
+    def test_combining_keeps_run_info_for_each_process(self):
+        self.skip_unless_data_storage_is("json")
+        for suffix, note in [("1", "one"), ("2", "two")]:
+            covdata = ShardData(suffix=suffix)
+            covdata.add_lines(LINES_1)
+            covdata.add_run_info(note=note)
+            covdata.write()
+
+        covdata3 = CoverageData()
+        combine_parallel_data(covdata3)
+        run_infos = sorted(covdata3.run_infos(), key=lambda run_info: run_info["note"])
+        self.assertEqual(run_infos, [{"note": "one"}, {"note": "two"}])
+
+    def test_combining_lines_and_arcs_fails(self):
+        covdata1 = ShardData(suffix="1")
+        covdata1.add_lines(LINES_1)
+        covdata1.write()
+        covdata2 = ShardData(suffix="2")
+        covdata2.add_arcs(ARCS_3)
+        covdata2.write()
+
+        covdata3 = CoverageData()
+        with self.assertRaisesRegex(CoverageException, "Can't combine arc data with line data"):
+            combine_parallel_data(covdata3)
+
+    def test_bad_shards_are_not_combined(self):
+        with open(".coverage.1", "wb") as f:
+            f.write(HEADER.pack(MAGIC, 99, 0))
+        with open(".coverage.2", "wb") as f:
+            f.write(HEADER.pack(MAGIC, 1, 0) + struct.pack("!BI", 4, 100))
+        covdata = ShardData(suffix="3")
+        covdata.add_lines(LINES_1)
+        covdata.write()
+
+        warnings = []
+        covdata = CoverageData(warn=warnings.append)
+        combine_parallel_data(covdata)
+        self.assertCountEqual(covdata.measured_files(), ["a.py", "b.py"])
+        self.assertEqual(sorted(glob.glob(".coverage.*")), [".coverage.1", ".coverage.2"])
+        self.assertRegex(warnings[0], r"Couldn't read shard '.*\.coverage\.1': wrong version: 99")
+        self.assertRegex(warnings[1], r"Couldn't read shard '.*\.coverage\.2': truncated record")
+
+    def test_damaged_records(self):
+        header = HEADER.pack(MAGIC, 1, 0)
+        lines = TWO_IDS.pack(1, 1) + struct.pack("!i", 17)
+        with open("undefined", "wb") as f:
+            f.write(header + RECORD.pack(REC_LINES, len(lines)) + lines)
+        with open("short", "wb") as f:
+            f.write(header + RECORD.pack(REC_FILE, 2) + b"ab")
+
+        msg = r"Couldn't read shard 'undefined': undefined id"
+        with self.assertRaisesRegex(CoverageException, msg):
+            Shard("undefined").read()
+        msg = r"Couldn't read shard 'short': bad record"
+        with self.assertRaisesRegex(CoverageException, msg):
+            Shard("short").read()
+
+    def test_coverage_run_writes_shards(self):
+        self.make_file("prog.py", """\
+            import sys
+            if sys.argv[1] == "a":
+                x = 1
+            else:
+                x = 2
+            """)
+        self.make_file(".coveragerc", """\
+            [run]
+            parallel = True
+            shard = True
+            """)
+        self.run_command("coverage run prog.py a")
+        self.run_command("coverage run prog.py b")
+        shards = glob.glob(".coverage.*")
+        self.assertEqual(len(shards), 2)
+        self.assertTrue(all(is_shard(f) for f in shards))
+
+        out = self.run_command("coverage debug data")
+        self.assertEqual(out.count("\nshard: "), 2)
+        self.assertIn("prog.py: 3 lines", out)
+
+        self.run_command("coverage combine")
+        covdata = CoverageData()
+        covdata.read()
+        self.assertCountEqual(covdata.lines(os.path.abspath("prog.py")), [1, 2, 3, 5])
+
+    def test_reporting_contexts_before_saving(self):
+        self.make_file("prog.py", """\
+            a = 1
+            b = 2
+            """)
+        cov = coverage.Coverage(data_suffix=True)
+        cov.set_option("run:shard", True)
+        cov.set_option("run:context", "ctx")
+        self.start_import_stop(cov, "prog")
+        cov.json_report(contexts=True, outfile="out.json")
+        with open("out.json") as f:
+            report = json.load(f)
+        self.assertEqual(report["files"]["prog.py"]["contexts"], {"1": ["ctx"], "2": ["ctx"]})
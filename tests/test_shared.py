@@ -0,0 +1,247 @@
+# Licensed under the Apache License: http://www.apache.org/licenses/LICENSE-2.0
+# For details: https://github.com/nedbat/coveragepy/blob/master/NOTICE.txt
+
+"""Tests for coverage/shared.py"""
+
+import glob
+import os
+import os.path
+
+from coverage.data import CoverageData, combine_parallel_data
+from coverage.shared import SharedData, can_share
+
+from tests.coveragetest import CoverageTest
+
+
+class SharedDataTest(CoverageTest):
+    """Tests of SharedData, sharing collected data with forked processes."""
+
+    def setUp(self):
+        if not can_share():
+            self.skipTest("Sharing memory needs fork")
+        super(SharedDataTest, self).setUp()
+        self.make_file("a.py", "a = 1\nb = 2\nc = 3\n")
+        self.make_file("b.py", "x = 1\n")
+        self.a_py = os.path.abspath("a.py")
+        self.b_py = os.path.abspath("b.py")
+
+    def read_data(self, filename):
+        """Read a CoverageData from `filename`."""
+        covdata = CoverageData(filename)
+        covdata.read()
+        return covdata
+
+    def fork(self, function):
+        """Run `function` in a forked process, and wait for it."""
+        pid = os.fork()
+        if pid == 0:                                # pragma: not covered
+            try:
+                function()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+
+    def test_lines_are_shared_with_forked_processes(self):
+        covdata = SharedData(suffix=True)
+        covdata.share([self.a_py])
+        covdata.set_context("")
+
+        def child():
+            """Measure some lines, and save them."""
+            covdata.add_lines({self.a_py: {2: None}})
+            covdata.write()
+        self.fork(child)
+
+        # The child didn't write a data file.
+        self.assertEqual(glob.glob(".coverage.*"), [])
+        self.assertCountEqual(covdata.lines(self.a_py), [2])
+
+        covdata.add_lines({self.a_py: {1: None}})
+        covdata.write()
+        data_file, = glob.glob(".coverage.*")
+        self.assertEqual(os.path.abspath(data_file), covdata.filename)
+        self.assertCountEqual(self.read_data(data_file).lines(self.a_py), [1, 2])
+
+    def test_processes_saving_later_write_only_new_data(self):
+        covdata = SharedData(suffix=True)
+        covdata.share([self.a_py])
+        covdata.add_lines({self.a_py: {1: None}})
+        covdata.write()
+        shared_file = covdata.filename
+        shared_mtime = os.path.getmtime(shared_file)
+
+        def child():
+            """Measure some lines, and save them."""
+            covdata.add_lines({self.a_py: {1: None, 3: None}})
+            covdata.write()
+        self.fork(child)
+        # A second child has nothing new to write.
+        self.fork(child)
+
+        # The shared data file wasn't written again: the child wrote its own
+        # file with only the new line.
+        self.assertEqual(os.path.getmtime(shared_file), shared_mtime)
+        data_files = [os.path.abspath(f) for f in glob.glob(".coverage.*")]
+        self.assertEqual(len(data_files), 2)
+        child_file, = [f for f in data_files if f != shared_file]
+        self.assertCountEqual(self.read_data(child_file).lines(self.a_py), [3])
+
+        combined = CoverageData()
+        combine_parallel_data(combined)
+        self.assertCountEqual(combined.lines(self.a_py), [1, 3])
+
+    def test_unshared_data_gets_its_own_file(self):
+        covdata = SharedData(suffix=True)
+        covdata.share([self.a_py])
+        covdata.set_context("")
+        covdata.add_lines({self.a_py: {1: None, 17: None}, self.b_py: {1: None}})
+        self.assertCountEqual(covdata.measured_files(), [self.a_py, self.b_py])
+        self.assertCountEqual(covdata.lines(self.a_py), [1, 17])
+        covdata.write()
+
+        data_files = glob.glob(".coverage.*")
+        self.assertEqual(len(data_files), 2)
+        other_file, = [f for f in data_files if os.path.abspath(f) != covdata.filename]
+        other_data = self.read_data(other_file)
+        self.assertCountEqual(other_data.lines(self.a_py), [17])
+        self.assertCountEqual(other_data.lines(self.b_py), [1])
+
+    def test_arcs(self):
+        covdata = SharedData(suffix=True)
+        covdata.share([self.a_py], branch=True)
+        covdata.add_arcs({self.a_py: {(-1, 1): None, (1, 2): None}})
+        self.assertTrue(covdata.has_arcs())
+        covdata.write()
+        data_file, = glob.glob(".coverage.*")
+        self.assertCountEqual(self.read_data(data_file).arcs(self.a_py), [(-1, 1), (1, 2)])
+
+    def test_empty_file_has_line_one(self):
+        self.make_file("empty.py", "")
+        empty_py = os.path.abspath("empty.py")
+        covdata = SharedData(suffix=True)
+        covdata.share([empty_py])
+        covdata.add_lines({empty_py: {1: None}})
+        covdata.write()
+        # Line 1 fit in the map, so there's no per-process data file.
+        data_file, = glob.glob(".coverage.*")
+        self.assertCountEqual(self.read_data(data_file).lines(empty_py), [1])
+
+    def test_granularity_is_shared(self):
+        covdata = SharedData(suffix=True)
+        covdata.share([self.a_py], granularity="function")
+        self.assertTrue(covdata.has_functions())
+
+        def child():
+            """Measure a function, and save it."""
+            covdata.add_functions({self.a_py: {1: None}})
+            covdata.write()
+        self.fork(child)
+
+        # The starting process never added functions itself.
+        covdata.write()
+        data_file, = glob.glob(".coverage.*")
+        data = self.read_data(data_file)
+        self.assertTrue(data.has_functions())
+        self.assertCountEqual(data.lines(self.a_py), [1])
+
+    def test_last_process_writes_if_starting_process_doesnt(self):
+        done_r, done_w = os.pipe()
+
+        def starter():
+            """Start sharing, fork a child, and end without saving."""
+            covdata = SharedData(suffix=True)
+            covdata.share([self.a_py])
+            covdata.add_lines({self.a_py: {1: None}})
+            exited_r, exited_w = os.pipe()
+            if os.fork() == 0:
+                # Wait for the starting process to end, then save.
+                os.close(exited_w)
+                os.read(exited_r, 1)
+                covdata.add_lines({self.a_py: {2: None}})
+                covdata.write()
+                os.write(done_w, b"x")
+                os._exit(0)
+        self.fork(starter)
+        os.close(done_w)
+        os.read(done_r, 1)
+        os.close(done_r)
+
+        data_file, = glob.glob(".coverage.*")
+        self.assertCountEqual(self.read_data(data_file).lines(self.a_py), [1, 2])
+
+    def test_forked_processes_with_coverage_run(self):
+        self.make_file("pkg/__init__.py", "")
+        self.make_file("pkg/work.py", """\
+            def work(n):
+                if n % 2:
+                    return 1
+                return 2
+
+            def never():
+                return 3
+            """)
+        self.make_file("prog.py", """\
+            import os, sys
+            from pkg.work import work
+            pids = []
+            for i in range(4):
+                pid = os.fork()
+                if pid == 0:
+                    work(i)
+                    sys.exit(0)
+                pids.append(pid)
+            for pid in pids:
+                os.waitpid(pid, 0)
+            """)
+        self.make_file(".coveragerc", """\
+            [run]
+            parallel = True
+            shared_memory = True
+            source = pkg
+            """)
+        self.run_command("coverage run prog.py")
+        self.assert_file_count(".coverage.*", 1)
+        self.run_command("coverage combine")
+        covdata = self.read_data(".coverage")
+        self.assertCountEqual(
+            covdata.lines(os.path.abspath("pkg/work.py")), [1, 2, 3, 4, 6]
+        )
+
+    def test_forked_processes_dont_save_data_from_before_the_fork(self):
+        if not hasattr(os, "register_at_fork"):
+            self.skipTest("Needs os.register_at_fork")
+        self.make_file("pkg/__init__.py", "")
+        self.make_file("prog.py", """\
+            import os, sys
+            # A module that wasn't there at the start isn't shared.
+            with open("pkg/late.py", "w") as f:
+                f.write("a = 1\\n")
+            import pkg.late
+            pids = []
+            for i in range(4):
+                pid = os.fork()
+                if pid == 0:
+                    sys.exit(0)
+                pids.append(pid)
+            for pid in pids:
+                os.waitpid(pid, 0)
+            """)
+        self.make_file(".coveragerc", """\
+            [run]
+            parallel = True
+            shared_memory = True
+            source = pkg
+            """)
+        self.run_command("coverage run prog.py")
+        # The shared data file, and the starting process's own data file.
+        self.assert_file_count(".coverage.*", 2)
+
+    def test_no_source_warns(self):
+        self.make_file("prog.py", "a = 1\n")
+        self.make_file(".coveragerc", """\
+            [run]
+            parallel = True
+            shared_memory = True
+            """)
+        out = self.run_command("coverage run prog.py")
+        self.assertIn("shared_memory needs [run] source (no-shared-files)", out)
@@ -478,6 +478,44 @@ class SummaryTest(UsingModulesMixin, CoverageTest):
         self.assertEqual(squeezed[4], "not_covered.py 4 0 2 1 83.333%")
         self.assertEqual(squeezed[6], "TOTAL 13 0 4 1 94.118%")
 
+    def test_report_rollup_depth(self):
+        self.make_file("top.py", """\
+            import pkg.mod
+            import pkg.sub.mod
+            """)
+        self.make_file("pkg/__init__.py", "")
+        self.make_file("pkg/mod.py", "a = 1\nb = 2\n")
+        self.make_file("pkg/sub/__init__.py", "")
+        self.make_file("pkg/sub/mod.py", "c = 1\nif c > 1:\n    d = 3\n")
+        self.run_command("coverage run top.py")
+        report = self.report_from_command("coverage report --rollup-depth=1")
+        lines = self.squeezed_lines(report)
+
+        # Name Stmts Miss Cover
+        # -----------------------------
+        # pkg/__init__.py ...
+        # ...
+        # top.py ...
+        # -----------------------------
+        # pkg/ ...
+        # -----------------------------
+        # TOTAL ...
+        rows = dict((line.split()[0], line.split()[1:3]) for line in lines[2:-4])
+        self.assertEqual(len(rows), 5)
+        pkg_files = [name for name in rows if name.startswith("pkg/")]
+        pkg_stmts = sum(int(rows[name][0]) for name in pkg_files)
+        pkg_miss = sum(int(rows[name][1]) for name in pkg_files)
+        self.assertEqual(lines[-3].split()[:3], ["pkg/", str(pkg_stmts), str(pkg_miss)])
+        self.assertEqual(lines[-1].split()[0], "TOTAL")
+
+        report = self.report_from_command("coverage report --rollup-depth=2")
+        lines = self.squeezed_lines(report)
+        self.assertEqual(lines[-4].split()[0], "pkg/")
+        self.assertEqual(lines[-3].split()[:3], ["pkg/sub/"] + rows["pkg/sub/mod.py"])
+
+        report = self.report_from_command("coverage report")
+        self.assertNotIn("pkg/ ", report)
+
     def test_dotpy_not_python(self):
         # We run a .py file, and when reporting, we can't parse it as Python.
         # We should get an error message in the report.
@@ -711,6 +749,22 @@ class SummaryTest2(UsingModulesMixin, CoverageTest):
         self.assertIn("tests/modules/pkg1/__init__.py 1 0 0 0 100%", report)
         self.assertIn("tests/modules/pkg2/__init__.py 0 0 0 0 100%", report)
 
+    def test_file_reporters_are_released(self):
+        # Once a file is summarized, its source and parsing aren't kept.
+        cov = coverage.Coverage(branch=True)
+        cov.start()
+        import usepkgs  # pragma: nested # pylint: disable=import-error, unused-variable
+        cov.stop()      # pragma: nested
+
+        reporter = SummaryReporter(cov, cov.config)
+        reporter.config.show_missing = True
+        reporter.report(None, StringIO())
+        file_reporters = reporter._file_reporters
+        self.assertGreater(len(file_reporters), 1)
+        for fr in file_reporters:
+            self.assertIsNone(fr._parser)
+            self.assertIsNone(fr._source)
+
 
 class ReportingReturnValueTest(CoverageTest):
     """Tests of reporting functions returning values."""
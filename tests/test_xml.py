@@ -108,6 +108,13 @@ class XmlReportTest(XmlTestHelpers, CoverageTest):
         cov.xml_report(ignore_errors=True)
         self.assert_exists("coverage.xml")
 
+    def test_empty_output_setting_writes_to_stdout(self):
+        self.make_file(".coveragerc", "[xml]\noutput =\n")
+        cov = self.run_doit()
+        cov.xml_report()
+        self.assertIn('filename="sub/doit.py"', self.stdout())
+        self.assert_doesnt_exist("coverage.xml")
+
     def test_filename_format_showing_everything(self):
         cov = self.run_doit()
         cov.xml_report(outfile="-")